@@ -6,16 +6,18 @@ import re
 import sys
 import traceback
 
+import numpy as np
+
 # logger
 from pandacommon.pandalogger.PandaLogger import PandaLogger
 from pandaserver.dataservice.DataServiceUtils import select_scope
 from pandaserver.taskbuffer import JobUtils
 
-from pandajedi.jedicore import Interaction, JediCoreUtils
+from pandajedi.jedicore import Interaction, JediCoreUtils, JobStatsSnapshot
 from pandajedi.jedicore.MsgWrapper import MsgWrapper
 from pandajedi.jedicore.SiteCandidate import SiteCandidate
 
-from . import AtlasBrokerUtils
+from . import AtlasBrokerUtils, SiteColumns
 from .JobBrokerBase import JobBrokerBase
 
 logger = PandaLogger().getLogger(__name__.split(".")[-1])
@@ -34,7 +36,9 @@ class AtlasAnalJobBroker(JobBrokerBase):
 
         # load the SW availability map
         try:
-            self.sw_map = taskBufferIF.load_sw_map()
+            tmp_stat, self.sw_map = AtlasBrokerUtils.getSwMap(taskBufferIF)
+            if not tmp_stat:
+                logger.error("Failed to load the SW tags map!!!")
         except Exception:
             logger.error("Failed to load the SW tags map!!!")
             self.sw_map = {}
@@ -373,6 +377,9 @@ class AtlasAnalJobBroker(JobBrokerBase):
         for scanSiteList, checkDataLocality in scanSiteLists:
             useUnionLocality = False
             self.init_summary_list("Job brokerage summary", f"data locality check: {checkDataLocality}", scanSiteList)
+
+            # columnar site attributes for mask-based filtering
+            siteColumns = SiteColumns.getSiteColumns(self.siteMapper)
             if checkDataLocality:
                 tmpLog.debug("!!! look for candidates WITH data locality check")
             else:
@@ -419,7 +426,7 @@ class AtlasAnalJobBroker(JobBrokerBase):
                         if datasetName.startswith("ddo"):
                             tmpLog.debug(f" {len(tmpRet)} sites")
                         else:
-                            tmpLog.debug(f" {len(tmpRet)} sites : {str(tmpRet)}")
+                            tmpLog.debug(" %s sites : %s", len(tmpRet), tmpRet)
                             # check if distributed
                             if tmpRet != {}:
                                 isDistributed = True
@@ -553,29 +560,26 @@ class AtlasAnalJobBroker(JobBrokerBase):
 
             ######################################
             # selection for status
-            newScanSiteList = []
             oldScanSiteList = copy.copy(scanSiteList)
-            for tmpSiteName in scanSiteList:
-                tmpSiteSpec = self.siteMapper.getSite(tmpSiteName)
-                # skip unified queues
-                if tmpSiteSpec.is_unified:
-                    continue
-                # check site status
-                skipFlag = False
-                if tmpSiteSpec.status in ["offline"]:
-                    skipFlag = True
-                elif tmpSiteSpec.status in ["brokeroff", "test"]:
-                    if siteListPreAssigned:
-                        pass
-                    elif not sitePreAssigned:
-                        skipFlag = True
-                    elif preassignedSite not in [tmpSiteName, tmpSiteSpec.get_unified_name()]:
-                        skipFlag = True
-                if not skipFlag:
-                    newScanSiteList.append(tmpSiteName)
+            siteStatus = siteColumns.get(scanSiteList, "status")
+            # skip unified queues without message
+            isUnified = siteColumns.get(scanSiteList, "is_unified")
+            # check site status
+            skipFlags = siteStatus == "offline"
+            if not siteListPreAssigned:
+                limitedStatus = np.isin(siteStatus, ["brokeroff", "test"])
+                if not sitePreAssigned:
+                    skipFlags |= limitedStatus
                 else:
-                    tmpLog.info(f"  skip site={tmpSiteName} due to status={tmpSiteSpec.status} criteria=-status")
-            scanSiteList = newScanSiteList
+                    isPreassigned = np.fromiter((tmpSiteName == preassignedSite for tmpSiteName in scanSiteList), dtype=bool, count=len(scanSiteList))
+                    isPreassigned |= siteColumns.get(scanSiteList, "unified_name") == preassignedSite
+                    skipFlags |= limitedStatus & ~isPreassigned
+            scanSiteList = SiteColumns.filterSites(
+                scanSiteList,
+                ~isUnified & ~skipFlags,
+                tmpLog,
+                lambda idx, tmpSiteName: None if isUnified[idx] else f"  skip site={tmpSiteName} due to status={siteStatus[idx]} criteria=-status",
+            )
             tmpLog.info(f"{len(scanSiteList)} candidates passed site status check")
             self.add_summary_message(oldScanSiteList, scanSiteList, "status check")
             if not scanSiteList:
@@ -664,19 +668,22 @@ class AtlasAnalJobBroker(JobBrokerBase):
                     continue
             ######################################
             # selection for MP
-            newScanSiteList = []
             oldScanSiteList = copy.copy(scanSiteList)
-            for tmpSiteName in scanSiteList:
-                tmpSiteSpec = self.siteMapper.getSite(tmpSiteName)
-                # check at the site
-                if useMP == "any" or (useMP == "only" and tmpSiteSpec.coreCount > 1) or (useMP == "unuse" and tmpSiteSpec.coreCount in [0, 1, None]):
-                    newScanSiteList.append(tmpSiteName)
-                else:
-                    tmpLog.info(
-                        "  skip site=%s due to core mismatch cores_site=%s <> cores_task=%s criteria=-cpucore"
-                        % (tmpSiteName, tmpSiteSpec.coreCount, taskSpec.coreCount)
-                    )
-            scanSiteList = newScanSiteList
+            siteCoreCount = siteColumns.get(scanSiteList, "coreCount")
+            # check at the site
+            if useMP == "only":
+                coreMatched = siteCoreCount > 1
+            elif useMP == "unuse":
+                coreMatched = siteCoreCount <= 1
+            else:
+                coreMatched = np.full(len(scanSiteList), useMP == "any")
+            scanSiteList = SiteColumns.filterSites(
+                scanSiteList,
+                coreMatched,
+                tmpLog,
+                lambda idx, tmpSiteName: "  skip site=%s due to core mismatch cores_site=%s <> cores_task=%s criteria=-cpucore"
+                % (tmpSiteName, self.siteMapper.getSite(tmpSiteName).coreCount, taskSpec.coreCount),
+            )
             tmpLog.info(f"{len(scanSiteList)} candidates passed for useMP={useMP}")
             self.add_summary_message(oldScanSiteList, scanSiteList, "CPU core check")
             if not scanSiteList:
@@ -897,40 +904,32 @@ class AtlasAnalJobBroker(JobBrokerBase):
             # selection for memory
             origMinRamCount = inputChunk.getMaxRamCount()
             if origMinRamCount not in [0, None]:
-                newScanSiteList = []
                 oldScanSiteList = copy.copy(scanSiteList)
-                for tmpSiteName in scanSiteList:
+                # scale RAM by nCores
+                minRamCounts = np.full(len(scanSiteList), origMinRamCount, dtype=float)
+                if taskSpec.ramPerCore() and not inputChunk.isMerging:
+                    siteCoreCount = siteColumns.get(scanSiteList, "coreCount")
+                    minRamCounts = np.where(siteCoreCount != 0, minRamCounts * siteCoreCount, minRamCounts)
+                minRamCounts = np.trunc(minRamCounts * JobUtils.MEMORY_COMPENSATION).astype(np.int64)
+                # site max and min memory requirements
+                site_maxmemory = siteColumns.get(scanSiteList, "maxrss")
+                site_minmemory = siteColumns.get(scanSiteList, "minrss")
+                lowMemory = (site_maxmemory != 0) & (minRamCounts != 0) & (minRamCounts > site_maxmemory)
+                highMemory = ~lowMemory & (site_minmemory != 0) & (minRamCounts != 0) & (minRamCounts < site_minmemory)
+
+                def _make_memory_message(idx, tmpSiteName):
                     tmpSiteSpec = self.siteMapper.getSite(tmpSiteName)
-                    # scale RAM by nCores
-                    minRamCount = origMinRamCount
-                    if taskSpec.ramPerCore() and not inputChunk.isMerging:
-                        if tmpSiteSpec.coreCount not in [None, 0]:
-                            minRamCount = origMinRamCount * tmpSiteSpec.coreCount
-                    minRamCount = JobUtils.compensate_ram_count(minRamCount)
-                    # site max memory requirement
-                    site_maxmemory = 0
-                    if tmpSiteSpec.maxrss not in [0, None]:
-                        site_maxmemory = tmpSiteSpec.maxrss
-                    if site_maxmemory not in [0, None] and minRamCount != 0 and minRamCount > site_maxmemory:
-                        tmpLog.info(
-                            "  skip site={0} due to site RAM shortage. site_maxmemory={1} < job_minramcount={2} criteria=-lowmemory".format(
-                                tmpSiteName, site_maxmemory, minRamCount
-                            )
+                    if lowMemory[idx]:
+                        return "  skip site={0} due to site RAM shortage. site_maxmemory={1} < job_minramcount={2} criteria=-lowmemory".format(
+                            tmpSiteName, tmpSiteSpec.maxrss, minRamCounts[idx]
                         )
-                        continue
-                    # site min memory requirement
-                    site_minmemory = 0
-                    if tmpSiteSpec.minrss not in [0, None]:
-                        site_minmemory = tmpSiteSpec.minrss
-                    if site_minmemory not in [0, None] and minRamCount != 0 and minRamCount < site_minmemory:
-                        tmpLog.info(
-                            "  skip site={0} due to job RAM shortage. site_minmemory={1} > job_minramcount={2} criteria=-highmemory".format(
-                                tmpSiteName, site_minmemory, minRamCount
-                            )
-                        )
-                        continue
-                    newScanSiteList.append(tmpSiteName)
-                scanSiteList = newScanSiteList
+                    return "  skip site={0} due to job RAM shortage. site_minmemory={1} > job_minramcount={2} criteria=-highmemory".format(
+                        tmpSiteName, tmpSiteSpec.minrss, minRamCounts[idx]
+                    )
+
+                scanSiteList = SiteColumns.filterSites(scanSiteList, ~lowMemory & ~highMemory, tmpLog, _make_memory_message)
+                # the value for the last candidate is shown in the summary
+                minRamCount = minRamCounts[-1] if len(minRamCounts) > 0 else origMinRamCount
                 ramUnit = taskSpec.ramUnit
                 if ramUnit is None:
                     ramUnit = "MB"
@@ -1207,7 +1206,7 @@ class AtlasAnalJobBroker(JobBrokerBase):
             sitesUsedByTask = self.get_unified_sites(sitesUsedByTask)
             ######################################
             # calculate weight
-            tmpSt, jobStatPrioMap = self.taskBufferIF.getJobStatisticsByGlobalShare(taskSpec.vo)
+            tmpSt, jobStatPrioMap = JobStatsSnapshot.getJobStatisticsByGlobalShare(self.taskBufferIF, taskSpec.vo)
             if not tmpSt:
                 tmpLog.error("failed to get job statistics with priority")
                 taskSpec.setErrDiag(tmpLog.uploadLog(taskSpec.jediTaskID))
@@ -1267,7 +1266,7 @@ class AtlasAnalJobBroker(JobBrokerBase):
             # cap with resource type
             if not sitePreAssigned:
                 # count jobs per resource type
-                tmpRet, tmpStatMap = self.taskBufferIF.getJobStatisticsByResourceTypeSite(workQueue)
+                tmpRet, tmpStatMap = JobStatsSnapshot.getJobStatisticsByResourceTypeSite(self.taskBufferIF, workQueue)
                 newScanSiteList = []
                 oldScanSiteList = copy.copy(scanSiteList)
                 RT_Cap = 2
@@ -1388,7 +1387,7 @@ class AtlasAnalJobBroker(JobBrokerBase):
                     # get conditions of the site whether to throttle
                     if nQueue_pq_in_gshare < base_queue_length_per_pq:
                         # not throttle since overall queue length of the site is not large enough
-                        tmpLog.debug(f"not throttle on {tmpSiteName} since nQ({nQueue_pq_in_gshare}) < base queue length ({base_queue_length_per_pq})")
+                        tmpLog.debug("not throttle on %s since nQ(%s) < base queue length (%s)", tmpSiteName, nQueue_pq_in_gshare, base_queue_length_per_pq)
                         continue
                     allowed_queue_length_from_wait_time = base_expected_wait_hour_on_pq * to_running_rate
                     if nQueue_pq_in_gshare < allowed_queue_length_from_wait_time:
@@ -1587,7 +1586,7 @@ class AtlasAnalJobBroker(JobBrokerBase):
                 nWorkers = min(nWorkersCutoff, nWorkers)
             # use nWorkers to bootstrap
             if tmpSiteName in nPilotMap and nPilotMap[tmpSiteName] > 0 and nRunning < nWorkersCutoff and nWorkers > nRunning:
-                tmpLog.debug(f"using nWorkers={nWorkers} as nRunning at {tmpPseudoSiteName} since original nRunning={nRunning} is low")
+                tmpLog.debug("using nWorkers=%s as nRunning at %s since original nRunning=%s is low", nWorkers, tmpPseudoSiteName, nRunning)
                 nRunning = nWorkers
             # take into account the number of standby jobs
             numStandby = tmpSiteSpec.getNumStandby(taskSpec.gshare, taskSpec.resource_type)
@@ -1596,11 +1595,11 @@ class AtlasAnalJobBroker(JobBrokerBase):
             elif numStandby == 0:
                 # use the number of starting jobs as the number of standby jobs
                 nRunning = nStarting + nRunning
-                tmpLog.debug(f"using dynamic workload provisioning at {tmpPseudoSiteName} to set nRunning={nRunning}")
+                tmpLog.debug("using dynamic workload provisioning at %s to set nRunning=%s", tmpPseudoSiteName, nRunning)
             else:
                 # the number of standby jobs is defined
                 nRunning = max(int(numStandby / tmpSiteSpec.coreCount), nRunning)
-                tmpLog.debug(f"using static workload provisioning at {tmpPseudoSiteName} with nStandby={numStandby} to set nRunning={nRunning}")
+                tmpLog.debug("using static workload provisioning at %s with nStandby=%s to set nRunning=%s", tmpPseudoSiteName, numStandby, nRunning)
             nFailed = 0
             nClosed = 0
             nFinished = 0
@@ -2,16 +2,17 @@ import datetime
 import json
 import os
 import re
-import socket
 import sys
+import threading
 import time
 import traceback
 
+import numpy as np
 from dataservice.DataServiceUtils import select_scope
 from pandaserver.dataservice import DataServiceUtils
 from pandaserver.taskbuffer import JobUtils, ProcessGroups
 
-from pandajedi.jedicore import Interaction
+from pandajedi.jedicore import CacheUtils, Interaction
 
 
 # get nuclei where data is available
@@ -479,386 +480,610 @@ def getSiteInputStorageEndpointMap(site_list, site_mapper, prod_source_label, jo
 
 
 # get to-running rate of sites from various resources
-CACHE_SiteToRunRateStats = {}
-
-
+@CacheUtils.memoize(
+    lambda a: a["cache_lifetime"],
+    sharedKey=("AtlasSites", "SiteToRunRate"),
+    lockComponent="Cache.SiteToRunRate",
+    lockLabel="user",
+    lockVO=lambda a: a["vo"],
+    lockMinutes=5,
+)
 def getSiteToRunRateStats(tbIF, vo, time_window=21600, cutoff=300, cache_lifetime=600):
-    # initialize
-    ret_val = False
-    ret_map = {}
-    # DB cache keys
-    dc_main_key = "AtlasSites"
-    dc_sub_key = "SiteToRunRate"
-    # arguments for process lock
-    this_prodsourcelabel = "user"
-    this_pid = f"{socket.getfqdn().split('.')[0]}-{os.getpid()}_{os.getpgrp()}-broker"
-    this_component = "Cache.SiteToRunRate"
     # timestamps
     current_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
     starttime_max = current_time - datetime.timedelta(seconds=cutoff)
     starttime_min = current_time - datetime.timedelta(seconds=time_window)
-    # rounded with 10 minutes
-    starttime_max_rounded = starttime_max.replace(minute=starttime_max.minute // 10 * 10, second=0, microsecond=0)
-    starttime_min_rounded = starttime_min.replace(minute=starttime_min.minute // 10 * 10, second=0, microsecond=0)
-    real_interval_hours = (starttime_max_rounded - starttime_min_rounded).total_seconds() / 3600
-    # local cache key
-    local_cache_key = (starttime_min_rounded, starttime_max_rounded)
-    # condition of query
-    if local_cache_key in CACHE_SiteToRunRateStats and current_time <= CACHE_SiteToRunRateStats[local_cache_key]["exp"]:
-        # query from local cache
-        ret_val = True
-        ret_map = CACHE_SiteToRunRateStats[local_cache_key]["data"]
-    else:
-        # try some times
-        for _ in range(99):
-            # skip if too long after original current time
-            if datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - current_time > datetime.timedelta(seconds=min(10, cache_lifetime / 4)):
-                # break trying
-                break
-            try:
-                # query from DB cache
-                cache_spec = tbIF.getCache_JEDI(main_key=dc_main_key, sub_key=dc_sub_key)
-                if cache_spec is not None:
-                    expired_time = cache_spec.last_update + datetime.timedelta(seconds=cache_lifetime)
-                    if current_time <= expired_time:
-                        # valid DB cache
-                        ret_val = True
-                        ret_map = json.loads(cache_spec.data)
-                        # fill local cache
-                        CACHE_SiteToRunRateStats[local_cache_key] = {"exp": expired_time, "data": ret_map}
-                        # break trying
-                        break
-                # got process lock
-                got_lock = tbIF.lockProcess_JEDI(
-                    vo=vo,
-                    prodSourceLabel=this_prodsourcelabel,
-                    cloud=None,
-                    workqueue_id=None,
-                    resource_name=None,
-                    component=this_component,
-                    pid=this_pid,
-                    timeLimit=5,
-                )
-                if not got_lock:
-                    # not getting lock, sleep and query cache again
-                    time.sleep(1)
-                    continue
-                # query from PanDA DB directly
-                ret_val, ret_map = tbIF.getSiteToRunRateStats(vo=vo, exclude_rwq=False, starttime_min=starttime_min, starttime_max=starttime_max)
-                if ret_val:
-                    # expired time
-                    expired_time = current_time + datetime.timedelta(seconds=cache_lifetime)
-                    # fill local cache
-                    CACHE_SiteToRunRateStats[local_cache_key] = {"exp": expired_time, "data": ret_map}
-                    # json of data
-                    data_json = json.dumps(ret_map)
-                    # fill DB cache
-                    tbIF.updateCache_JEDI(main_key=dc_main_key, sub_key=dc_sub_key, data=data_json)
-                # unlock process
-                tbIF.unlockProcess_JEDI(
-                    vo=vo, prodSourceLabel=this_prodsourcelabel, cloud=None, workqueue_id=None, resource_name=None, component=this_component, pid=this_pid
-                )
-                # break trying
-                break
-            except Exception as e:
-                # dump error message
-                err_str = f"AtlasBrokerUtils.getSiteToRunRateStats got {e.__class__.__name__}: {e} \n"
-                sys.stderr.write(err_str)
-                # break trying
-                break
-        # delete outdated entries in local cache
-        for lc_key in list(CACHE_SiteToRunRateStats.keys()):
-            lc_time_min, lc_time_max = lc_key
-            if lc_time_max < starttime_max_rounded - datetime.timedelta(seconds=cache_lifetime):
-                try:
-                    del CACHE_SiteToRunRateStats[lc_key]
-                except Exception as e:
-                    err_str = f"AtlasBrokerUtils.getSiteToRunRateStats when deleting outdated entries got {e.__class__.__name__}: {e} \n"
-                    sys.stderr.write(err_str)
-    # return
-    return ret_val, ret_map
+    # query from PanDA DB directly
+    return tbIF.getSiteToRunRateStats(vo=vo, exclude_rwq=False, starttime_min=starttime_min, starttime_max=starttime_max)
 
 
 # get users jobs stats from various resources
-CACHE_UsersJobsStats = {}
-
-
+@CacheUtils.memoize(
+    lambda a: a["cache_lifetime"],
+    sharedKey=("AtlasSites", "UsersJobsStats"),
+    lockComponent="Cache.UsersJobsStats",
+    lockLabel=lambda a: a["prod_source_label"],
+    lockVO=lambda a: a["vo"],
+    lockMinutes=lambda a: a["cache_lifetime"] * 0.75 / 60,
+    waitTime=15,
+)
 def getUsersJobsStats(tbIF, vo, prod_source_label, cache_lifetime=60):
-    # initialize
-    ret_val = False
-    ret_map = {}
-    # DB cache keys
-    dc_main_key = "AtlasSites"
-    dc_sub_key = "UsersJobsStats"
-    # arguments for process lock
-    this_prodsourcelabel = prod_source_label
-    this_pid = this_pid = f"{socket.getfqdn().split('.')[0]}-{os.getpid()}_{os.getpgrp()}-broker"
-    this_component = "Cache.UsersJobsStats"
-    # local cache key; a must if not using global variable
-    local_cache_key = "_main"
-    # timestamps
-    current_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
-    # condition of query
-    if local_cache_key in CACHE_UsersJobsStats and current_time <= CACHE_UsersJobsStats[local_cache_key]["exp"]:
-        # query from local cache
-        ret_val = True
-        ret_map = CACHE_UsersJobsStats[local_cache_key]["data"]
-    else:
-        # try some times
-        for _ in range(99):
-            # skip if too long after original current time
-            if datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - current_time > datetime.timedelta(seconds=min(15, cache_lifetime / 4)):
-                # break trying
-                break
-            try:
-                # query from DB cache
-                cache_spec = tbIF.getCache_JEDI(main_key=dc_main_key, sub_key=dc_sub_key)
-                if cache_spec is not None:
-                    expired_time = cache_spec.last_update + datetime.timedelta(seconds=cache_lifetime)
-                    if current_time <= expired_time:
-                        # valid DB cache
-                        ret_val = True
-                        ret_map = json.loads(cache_spec.data)
-                        # fill local cache
-                        CACHE_UsersJobsStats[local_cache_key] = {"exp": expired_time, "data": ret_map}
-                        # break trying
-                        break
-                # got process lock
-                got_lock = tbIF.lockProcess_JEDI(
-                    vo=vo,
-                    prodSourceLabel=this_prodsourcelabel,
-                    cloud=None,
-                    workqueue_id=None,
-                    resource_name=None,
-                    component=this_component,
-                    pid=this_pid,
-                    timeLimit=(cache_lifetime * 0.75 / 60),
-                )
-                if not got_lock:
-                    # not getting lock, sleep and query cache again
-                    time.sleep(1)
-                    continue
-                # query from PanDA DB directly
-                ret_map = tbIF.getUsersJobsStats_JEDI(prod_source_label=this_prodsourcelabel)
-                if ret_map is not None:
-                    # expired time
-                    expired_time = current_time + datetime.timedelta(seconds=cache_lifetime)
-                    # fill local cache
-                    CACHE_UsersJobsStats[local_cache_key] = {"exp": expired_time, "data": ret_map}
-                    # json of data
-                    data_json = json.dumps(ret_map)
-                    # fill DB cache
-                    tbIF.updateCache_JEDI(main_key=dc_main_key, sub_key=dc_sub_key, data=data_json)
-                    # make True return
-                    ret_val = True
-                # unlock process
-                tbIF.unlockProcess_JEDI(
-                    vo=vo, prodSourceLabel=this_prodsourcelabel, cloud=None, workqueue_id=None, resource_name=None, component=this_component, pid=this_pid
-                )
-                # break trying
-                break
-            except Exception as e:
-                # dump error message
-                err_str = f"AtlasBrokerUtils.getUsersJobsStats got {e.__class__.__name__}: {e} \n"
-                sys.stderr.write(err_str)
-                # break trying
-                break
-    # return
-    return ret_val, ret_map
+    # query from PanDA DB directly
+    ret_map = tbIF.getUsersJobsStats_JEDI(prod_source_label=prod_source_label)
+    if ret_map is None:
+        return False, {}
+    return True, ret_map
 
 
 # get gshare usage
+@CacheUtils.memoize(60)
 def getGShareUsage(tbIF, gshare, fresher_than_minutes_ago=15):
     # initialize
     ret_val = False
     ret_map = {}
     # timestamps
-    current_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
-    # try some times
-    for _ in range(99):
-        now_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
-        # skip if too long after original current time
-        if now_time - current_time > datetime.timedelta(seconds=max(3, fresher_than_minutes_ago / 3)):
-            # break trying
-            break
-        try:
-            # query from PanDA DB directly
-            sql_get_gshare = (
-                """SELECT m.value_json """
-                """FROM ATLAS_PANDA.Metrics m """
-                """WHERE m.metric=:metric """
-                """AND m.gshare=:gshare """
-                """AND m.timestamp>=:min_timestamp """
-            )
-            # varMap
-            varMap = {
-                ":metric": "gshare_preference",
-                ":gshare": gshare,
-                ":min_timestamp": now_time - datetime.timedelta(minutes=fresher_than_minutes_ago),
-            }
-            # result
-            res = tbIF.querySQL(sql_get_gshare, varMap)
-            if res:
-                value_json = res[0][0]
-                # json of data
-                ret_map = json.loads(value_json)
-                # make True return
-                ret_val = True
-            # break trying
-            break
-        except Exception as e:
-            # dump error message
-            err_str = f"AtlasBrokerUtils.getGShareUsage got {e.__class__.__name__}: {e} \n"
-            sys.stderr.write(err_str)
-            # break trying
-            break
+    now_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    # query from PanDA DB directly
+    sql_get_gshare = (
+        """SELECT m.value_json """
+        """FROM ATLAS_PANDA.Metrics m """
+        """WHERE m.metric=:metric """
+        """AND m.gshare=:gshare """
+        """AND m.timestamp>=:min_timestamp """
+    )
+    # varMap
+    varMap = {
+        ":metric": "gshare_preference",
+        ":gshare": gshare,
+        ":min_timestamp": now_time - datetime.timedelta(minutes=fresher_than_minutes_ago),
+    }
+    # result
+    res = tbIF.querySQL(sql_get_gshare, varMap)
+    if res:
+        value_json = res[0][0]
+        # json of data
+        ret_map = json.loads(value_json)
+        # make True return
+        ret_val = True
     # return
     return ret_val, ret_map
 
 
 # get user evaluation
+@CacheUtils.memoize(60)
 def getUserEval(tbIF, user, fresher_than_minutes_ago=20):
     # initialize
     ret_val = False
     ret_map = {}
     # timestamps
-    current_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
-    # try some times
-    for _ in range(99):
-        now_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
-        # skip if too long after original current time
-        if now_time - current_time > datetime.timedelta(seconds=max(3, fresher_than_minutes_ago / 3)):
-            # break trying
-            break
-        try:
-            # query from PanDA DB directly
-            sql_get_user_eval = f'SELECT m.value_json."{user}" FROM ATLAS_PANDA.Metrics m WHERE m.metric=:metric AND m.timestamp>=:min_timestamp '
-            # varMap
-            varMap = {
-                ":metric": "analy_user_eval",
-                ":min_timestamp": now_time - datetime.timedelta(minutes=fresher_than_minutes_ago),
-            }
-            # result
-            res = tbIF.querySQL(sql_get_user_eval, varMap)
-            if res:
-                value_json = res[0][0]
-                # json of data
-                ret_map = json.loads(value_json) if value_json else None
-                # make True return
-                ret_val = True
-            # break trying
-            break
-        except Exception as e:
-            # dump error message
-            err_str = f"AtlasBrokerUtils.getUserEval got {e.__class__.__name__}: {e} \n"
-            sys.stderr.write(err_str)
-            # break trying
-            break
+    now_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    # query from PanDA DB directly
+    sql_get_user_eval = f'SELECT m.value_json."{user}" FROM ATLAS_PANDA.Metrics m WHERE m.metric=:metric AND m.timestamp>=:min_timestamp '
+    # varMap
+    varMap = {
+        ":metric": "analy_user_eval",
+        ":min_timestamp": now_time - datetime.timedelta(minutes=fresher_than_minutes_ago),
+    }
+    # result
+    res = tbIF.querySQL(sql_get_user_eval, varMap)
+    if res:
+        value_json = res[0][0]
+        # json of data
+        ret_map = json.loads(value_json) if value_json else None
+        # make True return
+        ret_val = True
     # return
     return ret_val, ret_map
 
 
 # get user task evaluation
+@CacheUtils.memoize(60)
 def getUserTaskEval(tbIF, taskID, fresher_than_minutes_ago=15):
     # initialize
     ret_val = False
     ret_map = {}
     # timestamps
-    current_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
-    # try some times
-    for _ in range(99):
-        now_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
-        # skip if too long after original current time
-        if now_time - current_time > datetime.timedelta(seconds=max(3, fresher_than_minutes_ago / 3)):
-            # break trying
-            break
-        try:
-            # query from PanDA DB directly
-            sql_get_task_eval = (
-                """SELECT tev.value_json """
-                """FROM ATLAS_PANDA.Task_Evaluation tev """
-                """WHERE tev.metric=:metric """
-                """AND tev.jediTaskID=:taskID """
-                """AND tev.timestamp>=:min_timestamp """
-            )
-            # varMap
-            varMap = {
-                ":metric": "analy_task_eval",
-                ":taskID": taskID,
-                ":min_timestamp": now_time - datetime.timedelta(minutes=fresher_than_minutes_ago),
-            }
-            # result
-            res = tbIF.querySQL(sql_get_task_eval, varMap)
-            if res:
-                value_json = res[0][0]
-                # json of data
-                ret_map = json.loads(value_json) if value_json else None
-                # make True return
-                ret_val = True
-            # break trying
-            break
-        except Exception as e:
-            # dump error message
-            err_str = f"AtlasBrokerUtils.getUserTaskEval got {e.__class__.__name__}: {e} \n"
-            sys.stderr.write(err_str)
-            # break trying
-            break
+    now_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    # query from PanDA DB directly
+    sql_get_task_eval = (
+        """SELECT tev.value_json """
+        """FROM ATLAS_PANDA.Task_Evaluation tev """
+        """WHERE tev.metric=:metric """
+        """AND tev.jediTaskID=:taskID """
+        """AND tev.timestamp>=:min_timestamp """
+    )
+    # varMap
+    varMap = {
+        ":metric": "analy_task_eval",
+        ":taskID": taskID,
+        ":min_timestamp": now_time - datetime.timedelta(minutes=fresher_than_minutes_ago),
+    }
+    # result
+    res = tbIF.querySQL(sql_get_task_eval, varMap)
+    if res:
+        value_json = res[0][0]
+        # json of data
+        ret_map = json.loads(value_json) if value_json else None
+        # make True return
+        ret_val = True
     # return
     return ret_val, ret_map
 
 
 # get analysis sites class
+@CacheUtils.memoize(120)
 def getAnalySitesClass(tbIF, fresher_than_minutes_ago=60):
     # initialize
     ret_val = False
     ret_map = {}
     # timestamps
-    current_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
-    # try some times
-    for _ in range(99):
-        now_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
-        # skip if too long after original current time
-        if now_time - current_time > datetime.timedelta(seconds=max(3, fresher_than_minutes_ago / 3)):
-            # break trying
-            break
-        try:
-            # query from PanDA DB directly
-            sql_get_task_eval = (
-                """SELECT m.computingSite, m.value_json.class """
-                """FROM ATLAS_PANDA.Metrics m """
-                """WHERE m.metric=:metric """
-                """AND m.timestamp>=:min_timestamp """
-            )
-            # varMap
-            varMap = {
-                ":metric": "analy_site_eval",
-                ":min_timestamp": now_time - datetime.timedelta(minutes=fresher_than_minutes_ago),
-            }
-            # result
-            res = tbIF.querySQL(sql_get_task_eval, varMap)
-            if res:
-                for site, class_value in res:
-                    ret_map[site] = int(class_value)
-                    # make True return
-                ret_val = True
-            # break trying
-            break
-        except Exception as e:
-            # dump error message
-            err_str = f"AtlasBrokerUtils.getAnalySitesEval got {e.__class__.__name__}: {e} \n"
-            sys.stderr.write(err_str)
-            # break trying
-            break
+    now_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    # query from PanDA DB directly
+    sql_get_task_eval = "SELECT m.computingSite, m.value_json.class FROM ATLAS_PANDA.Metrics m WHERE m.metric=:metric AND m.timestamp>=:min_timestamp "
+    # varMap
+    varMap = {
+        ":metric": "analy_site_eval",
+        ":min_timestamp": now_time - datetime.timedelta(minutes=fresher_than_minutes_ago),
+    }
+    # result
+    res = tbIF.querySQL(sql_get_task_eval, varMap)
+    if res:
+        for site, class_value in res:
+            ret_map[site] = int(class_value)
+        # make True return
+        ret_val = True
     # return
     return ret_val, ret_map
 
 
+# convert network metric values to numbers
+def _to_network_values(values):
+    return [int(value) if value.is_integer() else value for value in values]
+
+
+# dense matrix of network metrics from sources to destinations. Destinations are limited to dst_list, typically nuclei,
+# since the number of sources is much larger than the number of destinations used in brokerage
+class NetworkMetricsMatrix:
+    # constructor
+    def __init__(self, key_list, rows, dst_list):
+        self.create_time = time.time()
+        self.key_list = list(key_list)
+        self.key_index = {key: i for i, key in enumerate(self.key_list)}
+        self.dst_index = {dst: i for i, dst in enumerate(sorted(set(dst_list)))}
+        self.src_index = {}
+        for src, dst, key, value in rows:
+            if dst in self.dst_index:
+                self.src_index.setdefault(src, len(self.src_index))
+        # values with NaN for missing links
+        self.values = np.full((len(self.key_list), len(self.src_index), len(self.dst_index)), np.nan)
+        # totals per destination
+        self.totals = {}
+        for src, dst, key, value in rows:
+            if key not in self.key_index or dst not in self.dst_index:
+                continue
+            self.totals.setdefault(dst, {})
+            self.totals[dst].setdefault(key, 0)
+            if value is None:
+                continue
+            self.values[self.key_index[key], self.src_index[src], self.dst_index[dst]] = value
+            try:
+                self.totals[dst][key] += value
+            except Exception:
+                pass
+
+    # get age in seconds
+    def get_age(self):
+        return time.time() - self.create_time
+
+    # check if a destination is covered
+    def has_destination(self, dst):
+        return dst in self.dst_index
+
+    # get a view to a destination which behaves as the map returned by getNetworkMetrics
+    def get_view(self, dst, key_list):
+        return NetworkMetricsView(self, dst, key_list)
+
+
+# view of network metrics to a destination
+class NetworkMetricsView:
+    # constructor
+    def __init__(self, matrix, dst, key_list):
+        self.matrix = matrix
+        self.dst_idx = matrix.dst_index.get(dst)
+        self.key_list = [key for key in key_list if key in matrix.key_index]
+        self.total = {key: value for key, value in matrix.totals.get(dst, {}).items() if key in self.key_list}
+
+    # get metrics from a source
+    def get(self, src, default=None):
+        src_idx = self.matrix.src_index.get(src)
+        if src_idx is None or self.dst_idx is None:
+            return default
+        ret_map = {}
+        for key in self.key_list:
+            value = float(self.matrix.values[self.matrix.key_index[key], src_idx, self.dst_idx])
+            if not np.isnan(value):
+                ret_map[key] = _to_network_values([value])[0]
+        if not ret_map:
+            return default
+        return ret_map
+
+    # get values of metrics from sources as an array of keys x sources. NaN for missing
+    def get_values(self, src_list, key_list):
+        ret_array = np.full((len(key_list), len(src_list)), np.nan)
+        if self.dst_idx is None:
+            return ret_array
+        src_idx = np.fromiter((self.matrix.src_index.get(src, -1) for src in src_list), dtype=np.int64, count=len(src_list))
+        mask = src_idx >= 0
+        for i, key in enumerate(key_list):
+            if key in self.key_list:
+                ret_array[i, mask] = self.matrix.values[self.matrix.key_index[key], src_idx[mask], self.dst_idx]
+        return ret_array
+
+    def __contains__(self, src):
+        if src == "total":
+            return True
+        return self.get(src) is not None
+
+    def __getitem__(self, src):
+        if src == "total":
+            return self.total
+        ret_map = self.get(src)
+        if ret_map is None:
+            raise KeyError(src)
+        return ret_map
+
+
+# get values of network metrics from sources to a destination as an array of keys x sources. NaN for missing
+def getNetworkValues(network_map, src_list, key_list):
+    if isinstance(network_map, NetworkMetricsView):
+        return network_map.get_values(src_list, key_list)
+    ret_array = np.full((len(key_list), len(src_list)), np.nan)
+    for j, src in enumerate(src_list):
+        if src not in network_map:
+            continue
+        for i, key in enumerate(key_list):
+            value = network_map[src].get(key)
+            if value is not None:
+                ret_array[i, j] = value
+    return ret_array
+
+
+# network metrics matrix refreshed in the background
+CACHE_NetworkMetricsMatrix = {"matrix": None, "pid": None, "dst_list": []}
+CACHE_NetworkMetricsMatrixLock = threading.Lock()
+
+
+# load network metrics matrix
+def _load_network_metrics_matrix(tbIF, key_list):
+    try:
+        dst_list = CACHE_NetworkMetricsMatrix["dst_list"]
+        if not dst_list:
+            return
+        rows = tbIF.getNetworkMetricsMatrix_JEDI(key_list, dst_list)
+        if rows is not None:
+            CACHE_NetworkMetricsMatrix["matrix"] = NetworkMetricsMatrix(key_list, rows, dst_list)
+    except Exception as e:
+        err_str = f"AtlasBrokerUtils.getNetworkMetricsMatrix got {e.__class__.__name__}: {e} \n"
+        sys.stderr.write(err_str)
+
+
+# refresh network metrics matrix periodically
+def _refresh_network_metrics_matrix(tbIF, key_list, refresh_interval):
+    while True:
+        time.sleep(refresh_interval)
+        _load_network_metrics_matrix(tbIF, key_list)
+
+
+# get network metrics matrix to destinations in dst_list. None if unavailable or too old. Destinations added later
+# are loaded at the next refresh, so has_destination of the matrix needs to be checked
+def getNetworkMetricsMatrix(tbIF, key_list, refresh_interval, dst_list):
+    dst_list = sorted(set(dst_list))
+    if CACHE_NetworkMetricsMatrix["dst_list"] != dst_list:
+        CACHE_NetworkMetricsMatrix["dst_list"] = dst_list
+    if CACHE_NetworkMetricsMatrix["pid"] != os.getpid():
+        with CACHE_NetworkMetricsMatrixLock:
+            if CACHE_NetworkMetricsMatrix["pid"] != os.getpid():
+                # the first load and a thread for each process
+                CACHE_NetworkMetricsMatrix["matrix"] = None
+                _load_network_metrics_matrix(tbIF, key_list)
+                thr = threading.Thread(target=_refresh_network_metrics_matrix, args=(tbIF, key_list, refresh_interval), daemon=True)
+                thr.start()
+                CACHE_NetworkMetricsMatrix["pid"] = os.getpid()
+    matrix = CACHE_NetworkMetricsMatrix["matrix"]
+    # not to use the matrix when refresh has been failing
+    if matrix is None or matrix.get_age() > 2 * refresh_interval:
+        return None
+    return matrix
+
+
+# inverted index of software availability built once per sw_map
+class SoftwareIndex:
+    # max number of memoized hardware specs and container names
+    max_memo = 200
+
+    # constructor
+    def __init__(self, sw_map):
+        self.sw_map = sw_map
+        # architectures per site and errors to convert them
+        self.architecture_maps = {}
+        self.architecture_errors = {}
+        # sites with any or /cvmfs in containers, and with any in containers
+        self.sites_with_any_container = set()
+        self.sites_with_strict_any_container = set()
+        # sites per logical container name and per full path in tags
+        self.container_name_sites = {}
+        self.container_source_sites = {}
+        # sites per prefix in containers
+        self.container_prefix_sites = {}
+        # sources of container names in ALL tags
+        self.all_tag_sources = {}
+        # sites per cmt config
+        self.cmt_config_sites = {}
+        # sites per cmt config and the list of cmt configs to keep the order
+        self.site_cmt_configs = {}
+        # sites with any in cvmfs and per cvmfs tag
+        self.sites_with_any_cvmfs = set()
+        self.cvmfs_tag_sites = {}
+        # sites per (cmtconfig, project, release) in tags
+        self.tag_sites = {}
+        # memoized results
+        self.hardware_memo = {}
+        self.prefix_memo = {}
+        self.resolved_cmt_configs = {}
+        for site_name, site_map in sw_map.items():
+            # convert to a dict
+            architecture_map = {}
+            try:
+                if "architectures" in site_map:
+                    for arch_spec in site_map["architectures"]:
+                        if "type" in arch_spec:
+                            architecture_map[arch_spec["type"]] = arch_spec
+            except Exception as e:
+                self.architecture_errors[site_name] = (e, traceback.format_exc())
+            self.architecture_maps[site_name] = architecture_map
+            containers = site_map.get("containers", [])
+            if "any" in containers or "/cvmfs" in containers:
+                self.sites_with_any_container.add(site_name)
+            if "any" in containers:
+                self.sites_with_strict_any_container.add(site_name)
+            for tmp_prefix in set(containers):
+                self.container_prefix_sites.setdefault(tmp_prefix, set()).add(site_name)
+            for tag in site_map.get("tags", []):
+                if tag.get("container_name"):
+                    self.container_name_sites.setdefault(tag["container_name"], set()).add(site_name)
+                if tag.get("sources"):
+                    for source in tag["sources"]:
+                        self.container_source_sites.setdefault(source, set()).add(site_name)
+                self.tag_sites.setdefault((tag.get("cmtconfig"), tag.get("project"), tag.get("release")), set()).add(site_name)
+                if site_name == "ALL":
+                    self.all_tag_sources.setdefault(tag.get("container_name"), []).extend(tag.get("sources") or [])
+            self.site_cmt_configs[site_name] = site_map.get("cmtconfigs", [])
+            for cmt_config in set(self.site_cmt_configs[site_name]):
+                self.cmt_config_sites.setdefault(cmt_config, set()).add(site_name)
+            cvmfs_list = site_map.get("cvmfs", [])
+            if "any" in cvmfs_list:
+                self.sites_with_any_cvmfs.add(site_name)
+            for cvmfs_tag in set(cvmfs_list):
+                self.cvmfs_tag_sites.setdefault(cvmfs_tag, set()).add(site_name)
+
+    # check hardware of a site. Exceptions are caught by the caller
+    def _check_hardware(self, site_name, host_cpu_specs, host_gpu_spec):
+        architecture_map = self.architecture_maps[site_name]
+        # check if need CPU
+        if "cpu" in architecture_map:
+            need_cpu = False
+            for k in architecture_map["cpu"]:
+                if isinstance(architecture_map["cpu"][k], list):
+                    if "excl" in architecture_map["cpu"][k]:
+                        need_cpu = True
+                        break
+            if need_cpu and host_cpu_specs is None:
+                return False
+        # check if need GPU
+        if "gpu" in architecture_map:
+            need_gpu = False
+            for k in architecture_map["gpu"]:
+                if isinstance(architecture_map["gpu"][k], list):
+                    if "excl" in architecture_map["gpu"][k]:
+                        need_gpu = True
+                        break
+            if need_gpu and host_gpu_spec is None:
+                return False
+        if host_cpu_specs or host_gpu_spec:
+            # skip since the PQ doesn't describe HW spec
+            if not architecture_map:
+                return False
+            # check CPU
+            if host_cpu_specs:
+                host_ok = False
+                for host_cpu_spec in host_cpu_specs:
+                    # CPU not specified
+                    if "cpu" not in architecture_map:
+                        continue
+                    # check architecture
+                    if host_cpu_spec["arch"] == "*":
+                        if "excl" in architecture_map["cpu"]["arch"]:
+                            continue
+                    else:
+                        if "any" not in architecture_map["cpu"]["arch"]:
+                            if host_cpu_spec["arch"] not in architecture_map["cpu"]["arch"]:
+                                # check with regex
+                                if not [True for iii in architecture_map["cpu"]["arch"] if re.search("^" + host_cpu_spec["arch"] + "$", iii)]:
+                                    continue
+                    # check vendor
+                    if host_cpu_spec["vendor"] == "*":
+                        # task doesn't specify a vendor and PQ explicitly requests a specific vendor
+                        if "vendor" in architecture_map["cpu"] and "excl" in architecture_map["cpu"]["vendor"]:
+                            continue
+                    else:
+                        # task specifies a vendor and PQ doesn't request any specific vendor
+                        if "vendor" not in architecture_map["cpu"]:
+                            continue
+                        # task specifies a vendor and PQ doesn't accept any vendor or the specific vendor
+                        if "any" not in architecture_map["cpu"]["vendor"] and host_cpu_spec["vendor"] not in architecture_map["cpu"]["vendor"]:
+                            continue
+                    # check instruction set
+                    if host_cpu_spec["instr"] == "*":
+                        if "instr" in architecture_map["cpu"] and "excl" in architecture_map["cpu"]["instr"]:
+                            continue
+                    else:
+                        if "instr" not in architecture_map["cpu"]:
+                            continue
+                        if "any" not in architecture_map["cpu"]["instr"] and host_cpu_spec["instr"] not in architecture_map["cpu"]["instr"]:
+                            continue
+                    host_ok = True
+                    break
+                if not host_ok:
+                    return False
+            # check GPU
+            if host_gpu_spec:
+                # GPU not specified
+                if "gpu" not in architecture_map:
+                    return False
+                # check vendor
+                if host_gpu_spec["vendor"] == "*":
+                    # task doesn't specify CPU vendor and PQ explicitly requests a specific vendor
+                    if "vendor" in architecture_map["gpu"] and "excl" in architecture_map["gpu"]["vendor"]:
+                        return False
+                else:
+                    # task specifies a vendor and PQ doesn't request any specific vendor
+                    if "vendor" not in architecture_map["gpu"]:
+                        return False
+                    # task specifies a vendor and PQ doesn't accept any vendor or the specific vendor
+                    if "any" not in architecture_map["gpu"]["vendor"] and host_gpu_spec["vendor"] not in architecture_map["gpu"]["vendor"]:
+                        return False
+                # check model
+                if host_gpu_spec["model"] == "*":
+                    if "model" in architecture_map["gpu"] and "excl" in architecture_map["gpu"]["model"]:
+                        return False
+                else:
+                    if "model" not in architecture_map["gpu"] or (
+                        "any" not in architecture_map["gpu"]["model"] and host_gpu_spec["model"] not in architecture_map["gpu"]["model"]
+                    ):
+                        return False
+        return True
+
+    # get sites passing the hardware check and errors for sites failed to be checked
+    def get_hardware_sites(self, host_cpu_specs, host_gpu_spec):
+        memo_key = json.dumps([host_cpu_specs, host_gpu_spec], sort_keys=True, default=str)
+        result = self.hardware_memo.get(memo_key)
+        if result is None:
+            ok_sites = set()
+            errors = {}
+            for site_name, architecture_map in self.architecture_maps.items():
+                if site_name in self.architecture_errors:
+                    e, tb = self.architecture_errors[site_name]
+                    errors[site_name] = f"json check {str(architecture_map)} failed for {site_name} {str(e)} {tb} "
+                    continue
+                try:
+                    if self._check_hardware(site_name, host_cpu_specs, host_gpu_spec):
+                        ok_sites.add(site_name)
+                except Exception as e:
+                    errors[site_name] = f"json check {str(architecture_map)} failed for {site_name} {str(e)} {traceback.format_exc()} "
+            result = (ok_sites, errors)
+            if len(self.hardware_memo) >= self.max_memo:
+                self.hardware_memo.clear()
+            self.hardware_memo[memo_key] = result
+        return result
+
+    # get sites where a container is available with prefixes in containers
+    def get_container_prefix_sites(self, container_name):
+        ok_sites = self.prefix_memo.get(container_name)
+        if ok_sites is None:
+            ok_sites = set()
+            source_list_in_all_tag = self.all_tag_sources.get(container_name, [])
+            for tmp_prefix, site_names in self.container_prefix_sites.items():
+                if container_name.startswith(tmp_prefix) or any(source.startswith(tmp_prefix) for source in source_list_in_all_tag):
+                    ok_sites |= site_names
+            if len(self.prefix_memo) >= self.max_memo:
+                self.prefix_memo.clear()
+            self.prefix_memo[container_name] = ok_sites
+        return ok_sites
+
+    # get sites where software is available. None if no software check is required
+    def get_software_sites(self, cvmfs_tag, sw_project, sw_version, cmt_config, need_cvmfs, cmt_config_only, need_container, container_name, only_tags_fc):
+        # check for fat container
+        if container_name:
+            ok_sites = self.container_name_sites.get(container_name, set()) | self.container_source_sites.get(container_name, set())
+            if not only_tags_fc:
+                ok_sites = ok_sites | self.sites_with_any_container | self.get_container_prefix_sites(container_name)
+            return ok_sites
+        # only cmt config check
+        if cmt_config_only:
+            if not cmt_config:
+                return None
+            return self.cmt_config_sites.get(cmt_config, set())
+        # check if CVMFS is available
+        cvmfs_sites = self.sites_with_any_cvmfs | self.cvmfs_tag_sites.get(cvmfs_tag, set())
+        # check if container is available or cmt config
+        ok_sites = self.sites_with_any_container
+        if not need_container:
+            ok_sites = ok_sites | self.cmt_config_sites.get(cmt_config, set())
+        ok_sites = cvmfs_sites & ok_sites
+        if not need_cvmfs:
+            # check tags
+            tag_sites = self.tag_sites.get((cmt_config, sw_project, sw_version), set()) - cvmfs_sites
+            if need_container:
+                tag_sites = tag_sites & self.sites_with_strict_any_container
+            ok_sites = ok_sites | tag_sites
+        return ok_sites
+
+    # resolve cmt config at a site without base platform
+    def resolve_cmt_config(self, queue_name, cmt_config):
+        memo_key = (queue_name, cmt_config)
+        result = self.resolved_cmt_configs.get(memo_key)
+        if result is None:
+            resolved = None
+            # None if cmt_config is valid
+            if queue_name not in self.cmt_config_sites.get(cmt_config, set()):
+                # check if cmt_config matches with any of the queue's cmt_configs
+                for tmp_cmt_config in self.site_cmt_configs[queue_name]:
+                    if re.search("^" + cmt_config + "$", tmp_cmt_config):
+                        resolved = tmp_cmt_config
+                        break
+            result = (resolved,)
+            if len(self.resolved_cmt_configs) >= 100 * self.max_memo:
+                self.resolved_cmt_configs.clear()
+            self.resolved_cmt_configs[memo_key] = result
+        return result[0]
+
+
+# get the SW availability map shared by brokers so that the software index is built once per reload
+@CacheUtils.memoize(300)
+def getSwMap(tbIF):
+    sw_map = tbIF.load_sw_map()
+    if sw_map is None:
+        return False, {}
+    return True, sw_map
+
+
+# software indexes which are rebuilt when sw_map is reloaded
+CACHE_SoftwareIndex = []
+CACHE_SoftwareIndexLock = threading.Lock()
+
+
+# get software index for sw_map
+def get_sw_index(sw_map):
+    if sw_map is None:
+        sw_map = {}
+    with CACHE_SoftwareIndexLock:
+        for sw_index in CACHE_SoftwareIndex:
+            if sw_index.sw_map is sw_map:
+                return sw_index
+        sw_index = SoftwareIndex(sw_map)
+        # keep a few since brokers have their own maps
+        CACHE_SoftwareIndex.insert(0, sw_index)
+        del CACHE_SoftwareIndex[4:]
+        return sw_index
+
+
 # check SW with json
 class JsonSoftwareCheck:
     # constructor
     def __init__(self, site_mapper, sw_map):
         self.siteMapper = site_mapper
         self.sw_map = sw_map
+        self.sw_index = get_sw_index(sw_map)
 
     # get lists
     def check(
@@ -879,171 +1104,21 @@ class JsonSoftwareCheck:
     ):
         okSite = []
         noAutoSite = []
+        hw_sites, hw_errors = self.sw_index.get_hardware_sites(host_cpu_specs, host_gpu_spec)
+        # only HW check
+        if not (cvmfs_tag or cmt_config or sw_project or sw_version or container_name) and (host_cpu_specs or host_gpu_spec):
+            sw_sites = None
+        else:
+            sw_sites = self.sw_index.get_software_sites(
+                cvmfs_tag, sw_project, sw_version, cmt_config, need_cvmfs, cmt_config_only, need_container, container_name, only_tags_fc
+            )
         for tmpSiteName in site_list:
             tmpSiteSpec = self.siteMapper.getSite(tmpSiteName)
             if tmpSiteSpec.releases == ["AUTO"] and tmpSiteName in self.sw_map:
-                try:
-                    go_ahead = False
-                    # convert to a dict
-                    architecture_map = {}
-                    if "architectures" in self.sw_map[tmpSiteName]:
-                        for arch_spec in self.sw_map[tmpSiteName]["architectures"]:
-                            if "type" in arch_spec:
-                                architecture_map[arch_spec["type"]] = arch_spec
-                    # check if need CPU
-                    if "cpu" in architecture_map:
-                        need_cpu = False
-                        for k in architecture_map["cpu"]:
-                            if isinstance(architecture_map["cpu"][k], list):
-                                if "excl" in architecture_map["cpu"][k]:
-                                    need_cpu = True
-                                    break
-                        if need_cpu and host_cpu_specs is None:
-                            continue
-                    # check if need GPU
-                    if "gpu" in architecture_map:
-                        need_gpu = False
-                        for k in architecture_map["gpu"]:
-                            if isinstance(architecture_map["gpu"][k], list):
-                                if "excl" in architecture_map["gpu"][k]:
-                                    need_gpu = True
-                                    break
-                        if need_gpu and host_gpu_spec is None:
-                            continue
-                    if host_cpu_specs or host_gpu_spec:
-                        # skip since the PQ doesn't describe HW spec
-                        if not architecture_map:
-                            continue
-                        # check CPU
-                        if host_cpu_specs:
-                            host_ok = False
-                            for host_cpu_spec in host_cpu_specs:
-                                # CPU not specified
-                                if "cpu" not in architecture_map:
-                                    continue
-                                # check architecture
-                                if host_cpu_spec["arch"] == "*":
-                                    if "excl" in architecture_map["cpu"]["arch"]:
-                                        continue
-                                else:
-                                    if "any" not in architecture_map["cpu"]["arch"]:
-                                        if host_cpu_spec["arch"] not in architecture_map["cpu"]["arch"]:
-                                            # check with regex
-                                            if not [True for iii in architecture_map["cpu"]["arch"] if re.search("^" + host_cpu_spec["arch"] + "$", iii)]:
-                                                continue
-                                # check vendor
-                                if host_cpu_spec["vendor"] == "*":
-                                    # task doesn't specify a vendor and PQ explicitly requests a specific vendor
-                                    if "vendor" in architecture_map["cpu"] and "excl" in architecture_map["cpu"]["vendor"]:
-                                        continue
-                                else:
-                                    # task specifies a vendor and PQ doesn't request any specific vendor
-                                    if "vendor" not in architecture_map["cpu"]:
-                                        continue
-                                    # task specifies a vendor and PQ doesn't accept any vendor or the specific vendor
-                                    if "any" not in architecture_map["cpu"]["vendor"] and host_cpu_spec["vendor"] not in architecture_map["cpu"]["vendor"]:
-                                        continue
-                                # check instruction set
-                                if host_cpu_spec["instr"] == "*":
-                                    if "instr" in architecture_map["cpu"] and "excl" in architecture_map["cpu"]["instr"]:
-                                        continue
-                                else:
-                                    if "instr" not in architecture_map["cpu"]:
-                                        continue
-                                    if "any" not in architecture_map["cpu"]["instr"] and host_cpu_spec["instr"] not in architecture_map["cpu"]["instr"]:
-                                        continue
-                                host_ok = True
-                                break
-                            if not host_ok:
-                                continue
-                        # check GPU
-                        if host_gpu_spec:
-                            # GPU not specified
-                            if "gpu" not in architecture_map:
-                                continue
-                            # check vendor
-                            if host_gpu_spec["vendor"] == "*":
-                                # task doesn't specify CPU vendor and PQ explicitly requests a specific vendor
-                                if "vendor" in architecture_map["gpu"] and "excl" in architecture_map["gpu"]["vendor"]:
-                                    continue
-                            else:
-                                # task specifies a vendor and PQ doesn't request any specific vendor
-                                if "vendor" not in architecture_map["gpu"]:
-                                    continue
-                                # task specifies a vendor and PQ doesn't accept any vendor or the specific vendor
-                                if "any" not in architecture_map["gpu"]["vendor"] and host_gpu_spec["vendor"] not in architecture_map["gpu"]["vendor"]:
-                                    continue
-                            # check model
-                            if host_gpu_spec["model"] == "*":
-                                if "model" in architecture_map["gpu"] and "excl" in architecture_map["gpu"]["model"]:
-                                    continue
-                            else:
-                                if "model" not in architecture_map["gpu"] or (
-                                    "any" not in architecture_map["gpu"]["model"] and host_gpu_spec["model"] not in architecture_map["gpu"]["model"]
-                                ):
-                                    continue
-                    go_ahead = True
-                except Exception as e:
-                    if log_stream:
-                        log_stream.error(f"json check {str(architecture_map)} failed for {tmpSiteName} {str(e)} {traceback.format_exc()} ")
-                if not go_ahead:
-                    continue
-                # only HW check
-                if not (cvmfs_tag or cmt_config or sw_project or sw_version or container_name) and (host_cpu_specs or host_gpu_spec):
+                if tmpSiteName in hw_errors and log_stream:
+                    log_stream.error(hw_errors[tmpSiteName])
+                if tmpSiteName in hw_sites and (sw_sites is None or tmpSiteName in sw_sites):
                     okSite.append(tmpSiteName)
-                    continue
-                # check for fat container
-                if container_name:
-                    # check for container
-                    if not only_tags_fc and ("any" in self.sw_map[tmpSiteName]["containers"] or "/cvmfs" in self.sw_map[tmpSiteName]["containers"]):
-                        # any in containers
-                        okSite.append(tmpSiteName)
-                    elif container_name in set([t["container_name"] for t in self.sw_map[tmpSiteName]["tags"] if t["container_name"]]):
-                        # logical name in tags or any in containers
-                        okSite.append(tmpSiteName)
-                    elif container_name in set([s for t in self.sw_map[tmpSiteName]["tags"] for s in t["sources"] if t["sources"]]):
-                        # full path in sources
-                        okSite.append(tmpSiteName)
-                    elif not only_tags_fc:
-                        # get sources in all tag list
-                        if "ALL" in self.sw_map:
-                            source_list_in_all_tag = [s for t in self.sw_map["ALL"]["tags"] for s in t["sources"] if t["container_name"] == container_name]
-                        else:
-                            source_list_in_all_tag = []
-                        # prefix with full path
-                        for tmp_prefix in self.sw_map[tmpSiteName]["containers"]:
-                            if container_name.startswith(tmp_prefix):
-                                okSite.append(tmpSiteName)
-                                break
-                            toBreak = False
-                            for source_in_all_tag in source_list_in_all_tag:
-                                if source_in_all_tag.startswith(tmp_prefix):
-                                    okSite.append(tmpSiteName)
-                                    toBreak = True
-                                    break
-                            if toBreak:
-                                break
-                    continue
-                # only cmt config check
-                if cmt_config_only:
-                    if not cmt_config or cmt_config in self.sw_map[tmpSiteName]["cmtconfigs"]:
-                        okSite.append(tmpSiteName)
-                    continue
-                # check if CVMFS is available
-                if "any" in self.sw_map[tmpSiteName]["cvmfs"] or cvmfs_tag in self.sw_map[tmpSiteName]["cvmfs"]:
-                    # check if container is available
-                    if "any" in self.sw_map[tmpSiteName]["containers"] or "/cvmfs" in self.sw_map[tmpSiteName]["containers"]:
-                        okSite.append(tmpSiteName)
-                    # check cmt config
-                    elif not need_container and cmt_config in self.sw_map[tmpSiteName]["cmtconfigs"]:
-                        okSite.append(tmpSiteName)
-                elif not need_cvmfs:
-                    if not need_container or "any" in self.sw_map[tmpSiteName]["containers"]:
-                        # check tags
-                        for tag in self.sw_map[tmpSiteName]["tags"]:
-                            if tag["cmtconfig"] == cmt_config and tag["project"] == sw_project and tag["release"] == sw_version:
-                                okSite.append(tmpSiteName)
-                                break
                 # don't pass to subsequent check if AUTO is enabled
                 continue
             # use only AUTO for container or HW
@@ -1066,15 +1141,8 @@ def resolve_cmt_config(queue_name: str, cmt_config: str, base_platform, sw_map:
     # return None if queue_name is unavailable
     if queue_name not in sw_map:
         return None
-    # return None if cmt_config is valid
-    if cmt_config in sw_map[queue_name]["cmtconfigs"]:
-        return None
-    # check if cmt_config matches with any of the queue's cmt_configs
-    for tmp_cmt_config in sw_map[queue_name]["cmtconfigs"]:
-        if re.search("^" + cmt_config + "$", tmp_cmt_config):
-            if base_platform:
-                # add base_platform if necessary
-                tmp_cmt_config = tmp_cmt_config + "@" + base_platform
-            return tmp_cmt_config
-    # return None if cmt_config is unavailable
-    return None
+    tmp_cmt_config = get_sw_index(sw_map).resolve_cmt_config(queue_name, cmt_config)
+    if tmp_cmt_config is not None and base_platform:
+        # add base_platform if necessary
+        tmp_cmt_config = tmp_cmt_config + "@" + base_platform
+    return tmp_cmt_config
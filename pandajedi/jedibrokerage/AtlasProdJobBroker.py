@@ -2,6 +2,7 @@ import copy
 import datetime
 import re
 
+import numpy as np
 from dataservice.DataServiceUtils import select_scope
 
 # logger
@@ -9,11 +10,11 @@ from pandacommon.pandalogger.PandaLogger import PandaLogger
 from pandaserver.dataservice import DataServiceUtils
 from pandaserver.taskbuffer import EventServiceUtils, JobUtils
 
-from pandajedi.jedicore import Interaction, JediCoreUtils
+from pandajedi.jedicore import Interaction, JediCoreUtils, JobStatsSnapshot
 from pandajedi.jedicore.MsgWrapper import MsgWrapper
 from pandajedi.jedicore.SiteCandidate import SiteCandidate
 
-from . import AtlasBrokerUtils
+from . import AtlasBrokerUtils, SiteColumns
 from .JobBrokerBase import JobBrokerBase
 
 logger = PandaLogger().getLogger(__name__.split(".")[-1])
@@ -53,6 +54,9 @@ class AtlasProdJobBroker(JobBrokerBase):
         if self.nwActive is None:
             self.nwActive = False
 
+        # refresh interval of the network metrics matrix in seconds. None to query per task
+        self.nwMatrixRefresh = taskBufferIF.getConfigValue(COMPONENT, "NW_MATRIX_REFRESH", APP, VO)
+
         self.nwQueueImportance = taskBufferIF.getConfigValue(COMPONENT, "NW_QUEUE_IMPORTANCE", APP, VO)
         if self.nwQueueImportance is None:
             self.nwQueueImportance = 0.5
@@ -84,22 +88,85 @@ class AtlasProdJobBroker(JobBrokerBase):
 
         # load the SW availability map
         try:
-            self.sw_map = taskBufferIF.load_sw_map()
+            tmp_stat, self.sw_map = AtlasBrokerUtils.getSwMap(taskBufferIF)
+            if not tmp_stat:
+                logger.error("Failed to load the SW tags map!!!")
         except BaseException:
             logger.error("Failed to load the SW tags map!!!")
             self.sw_map = {}
 
+    # MBps thresholds in ascending order and weights for values above each of them
+    mbps_thresholds = np.array([1, 2, 10, 20, 50, 75, 100, 200])
+    mbps_weights = np.array([1, 1.1, 1.2, 1.3, 1.5, 1.6, 1.8, 1.9, 2])
+
     def convertMBpsToWeight(self, mbps):
         """
-        Takes MBps value and converts to a weight between 1 and 2
+        Takes MBps value or array of values and converts to weights between 1 and 2
         """
-        mbps_thresholds = [200, 100, 75, 50, 20, 10, 2, 1]
-        weights = [2, 1.9, 1.8, 1.6, 1.5, 1.3, 1.2, 1.1]
+        weights = self.mbps_weights[np.searchsorted(self.mbps_thresholds, mbps, side="left")]
+        if np.ndim(weights) == 0:
+            return weights.item()
+        return weights
 
-        for threshold, weight in zip(mbps_thresholds, weights):
-            if mbps > threshold:
-                return weight
-        return 1
+    def getNetworkWeights(self, nucleus, networkMap, queued_tag, siteNameList, storageMapping, tmpLog):
+        """
+        Calculates network weights for all candidate sites at once
+        """
+        atlasSiteNames = []
+        for tmpSiteName in siteNameList:
+            try:
+                atlasSiteNames.append(storageMapping[tmpSiteName]["default"])
+            except KeyError:
+                tmpLog.debug("Panda site %s was not in site mapping. Default network values will be given", tmpSiteName)
+                atlasSiteNames.append(None)
+        closeness, nFilesInQueue, mbps1W, mbps1D, mbps1H = AtlasBrokerUtils.getNetworkValues(
+            networkMap, atlasSiteNames, [AGIS_CLOSENESS, queued_tag, FTS_1W, FTS_1D, FTS_1H]
+        )
+        # defaults for missing values
+        noCloseness = np.isnan(closeness)
+        closeness[noCloseness] = MAX_CLOSENESS * 0.7
+        noQueued = np.isnan(nFilesInQueue)
+        nFilesInQueue[noQueued] = 0
+        # take the finest FTS throughput following 1w, 1d, and 1h
+        has1W = ~np.isnan(mbps1W)
+        has1D = has1W & ~np.isnan(mbps1D)
+        has1H = has1D & ~np.isnan(mbps1H)
+        mbps = np.where(has1H, mbps1H, np.where(has1D, mbps1D, mbps1W))
+        # queue weight: the more in queue, the lower the weight
+        weightNwQueue = 2 - (nFilesInQueue / self.queue_threshold)
+        # throughput weight: the higher the throughput, the higher the weight
+        weightNwThroughput = np.where(has1W, self.convertMBpsToWeight(np.nan_to_num(mbps)), 1 + ((MAX_CLOSENESS - closeness) / (MAX_CLOSENESS - MIN_CLOSENESS)))
+        # 25 per cent weight boost for processing in nucleus itself
+        inNucleus = np.fromiter((tmpAtlasSiteName == nucleus for tmpAtlasSiteName in atlasSiteNames), dtype=bool, count=len(atlasSiteNames))
+        weightNwQueue[inNucleus] = 2.5
+        weightNwThroughput[inNucleus] = 2.5
+        # combine queue and throughput weights
+        weightNw = self.nwQueueImportance * weightNwQueue + self.nwThroughputImportance * weightNwThroughput
+        # log missing values
+        for idx in np.flatnonzero(noCloseness | noQueued | ~has1W):
+            tmpSiteName, tmpAtlasSiteName = siteNameList[idx], atlasSiteNames[idx]
+            if noCloseness[idx]:
+                tmpLog.debug("No %s information found in network matrix from %s(%s) to %s", AGIS_CLOSENESS, tmpAtlasSiteName, tmpSiteName, nucleus)
+            if noQueued[idx]:
+                tmpLog.debug("No %s information found in network matrix from %s (%s) to %s", queued_tag, tmpAtlasSiteName, tmpSiteName, nucleus)
+            if not has1W[idx]:
+                tmpLog.debug("No dynamic FTS mbps information found in network matrix from %s(%s) to %s", tmpAtlasSiteName, tmpSiteName, nucleus)
+        # make map of site: (atlasSiteName, closeness, nFilesInQueue, mbps, weightNw, weightNwQueue, weightNwThroughput)
+        mbpsList = [value if hasValue else None for value, hasValue in zip(AtlasBrokerUtils._to_network_values(mbps.tolist()), has1W.tolist())]
+        return dict(
+            zip(
+                siteNameList,
+                zip(
+                    atlasSiteNames,
+                    AtlasBrokerUtils._to_network_values(closeness.tolist()),
+                    AtlasBrokerUtils._to_network_values(nFilesInQueue.tolist()),
+                    mbpsList,
+                    weightNw.tolist(),
+                    weightNwQueue.tolist(),
+                    weightNwThroughput.tolist(),
+                ),
+            )
+        )
 
     # main
     def doBrokerage(self, taskSpec, cloudName, inputChunk, taskParamMap, hintForTB=False, siteListForTB=None, glLog=None):
@@ -203,7 +270,7 @@ class AtlasProdJobBroker(JobBrokerBase):
             esHigh = False
 
         # get job statistics
-        tmpSt, jobStatMap = self.taskBufferIF.getJobStatisticsByGlobalShare(taskSpec.vo)
+        tmpSt, jobStatMap = JobStatsSnapshot.getJobStatisticsByGlobalShare(self.taskBufferIF, taskSpec.vo)
         if not tmpSt:
             tmpLog.error("failed to get job statistics")
             taskSpec.setErrDiag(tmpLog.uploadLog(taskSpec.jediTaskID))
@@ -264,35 +331,22 @@ class AtlasProdJobBroker(JobBrokerBase):
         # init summary list
         self.init_summary_list("Job brokerage summary", None, scanSiteList)
 
+        # columnar site attributes for mask-based filtering
+        siteColumns = SiteColumns.getSiteColumns(self.siteMapper)
+
         ######################################
         # selection for status
         if not sitePreAssigned and not siteListPreAssigned:
-            newScanSiteList = []
             oldScanSiteList = copy.copy(scanSiteList)
-            for tmpSiteName in scanSiteList:
-                tmpSiteSpec = self.siteMapper.getSite(tmpSiteName)
-
-                # skip unified queues
-                if tmpSiteSpec.is_unified:
-                    continue
-                # check site status
-                msgFlag = False
-                skipFlag = False
-
-                if tmpSiteSpec.status in ["online", "standby"]:
-                    newScanSiteList.append(tmpSiteName)
-                else:
-                    msgFlag = True
-                    skipFlag = True
-
-                if msgFlag:
-                    tmpStr = f"  skip site={tmpSiteName} due to status={tmpSiteSpec.status} criteria=-status"
-                    if skipFlag:
-                        tmpLog.info(tmpStr)
-                    else:
-                        siteSkippedTmp[tmpSiteName] = tmpStr
-
-            scanSiteList = newScanSiteList
+            siteStatus = siteColumns.get(scanSiteList, "status")
+            # skip unified queues without message
+            isUnified = siteColumns.get(scanSiteList, "is_unified")
+            scanSiteList = SiteColumns.filterSites(
+                scanSiteList,
+                ~isUnified & np.isin(siteStatus, ["online", "standby"]),
+                tmpLog,
+                lambda idx, tmpSiteName: None if isUnified[idx] else f"  skip site={tmpSiteName} due to status={siteStatus[idx]} criteria=-status",
+            )
             tmpLog.info(f"{len(scanSiteList)} candidates passed site status check")
             self.add_summary_message(oldScanSiteList, scanSiteList, "status check")
             if not scanSiteList:
@@ -315,7 +369,19 @@ class AtlasProdJobBroker(JobBrokerBase):
                 transferred_tag = f"{PRD_ACTIVITY}{TRANSFERRED_6H}"
                 queued_tag = f"{PRD_ACTIVITY}{QUEUED}"
 
-            networkMap = self.taskBufferIF.getNetworkMetrics(nucleus, [AGIS_CLOSENESS, transferred_tag, queued_tag, FTS_1H, FTS_1D, FTS_1W])
+            networkKeys = [AGIS_CLOSENESS, transferred_tag, queued_tag, FTS_1H, FTS_1D, FTS_1W]
+            networkMatrix = None
+            if self.nwMatrixRefresh:
+                allNetworkKeys = [AGIS_CLOSENESS, FTS_1H, FTS_1D, FTS_1W]
+                for tmpActivity in [URG_ACTIVITY, PRD_ACTIVITY]:
+                    allNetworkKeys += [f"{tmpActivity}{TRANSFERRED_6H}", f"{tmpActivity}{QUEUED}"]
+                networkMatrix = AtlasBrokerUtils.getNetworkMetricsMatrix(
+                    self.taskBufferIF, allNetworkKeys, self.nwMatrixRefresh, list(self.siteMapper.nuclei) + [nucleus]
+                )
+            if networkMatrix is not None and networkMatrix.has_destination(nucleus):
+                networkMap = networkMatrix.get_view(nucleus, networkKeys)
+            else:
+                networkMap = self.taskBufferIF.getNetworkMetrics(nucleus, networkKeys)
 
         #####################################################
         # filtering out blacklisted or links with long queues
@@ -575,22 +641,28 @@ class AtlasProdJobBroker(JobBrokerBase):
         ######################################
         # selection for MP
         if not sitePreAssigned:
-            newScanSiteList = []
             oldScanSiteList = copy.copy(scanSiteList)
-            for tmpSiteName in scanSiteList:
+            siteCoreCount = siteColumns.get(scanSiteList, "coreCount")
+            # check at the site
+            if useMP == "only":
+                coreMatched = siteCoreCount > 1
+            elif useMP == "unuse":
+                coreMatched = siteCoreCount <= 1
+            else:
+                coreMatched = np.full(len(scanSiteList), useMP == "any")
+            max_core_count = taskSpec.get_max_core_count()
+            if max_core_count:
+                tooManyCores = siteCoreCount > max_core_count
+            else:
+                tooManyCores = np.zeros(len(scanSiteList), dtype=bool)
+
+            def _make_core_message(idx, tmpSiteName):
                 tmpSiteSpec = self.siteMapper.getSite(tmpSiteName)
-                # check at the site
-                if useMP == "any" or (useMP == "only" and tmpSiteSpec.coreCount > 1) or (useMP == "unuse" and tmpSiteSpec.coreCount in [0, 1, None]):
-                    max_core_count = taskSpec.get_max_core_count()
-                    if max_core_count and tmpSiteSpec.coreCount and tmpSiteSpec.coreCount > max_core_count:
-                        tmpLog.info(
-                            f"  skip site={tmpSiteName} due to larger core count site:{tmpSiteSpec.coreCount} than task_max={max_core_count} criteria=-cpucore"
-                        )
-                    else:
-                        newScanSiteList.append(tmpSiteName)
-                else:
-                    tmpLog.info(f"  skip site={tmpSiteName} due to core mismatch site:{tmpSiteSpec.coreCount} <> task:{taskCoreCount} criteria=-cpucore")
-            scanSiteList = newScanSiteList
+                if not coreMatched[idx]:
+                    return f"  skip site={tmpSiteName} due to core mismatch site:{tmpSiteSpec.coreCount} <> task:{taskCoreCount} criteria=-cpucore"
+                return f"  skip site={tmpSiteName} due to larger core count site:{tmpSiteSpec.coreCount} than task_max={max_core_count} criteria=-cpucore"
+
+            scanSiteList = SiteColumns.filterSites(scanSiteList, coreMatched & ~tooManyCores, tmpLog, _make_core_message)
             tmpLog.info(f"{len(scanSiteList)} candidates passed for core count check with policy={useMP}")
             self.add_summary_message(oldScanSiteList, scanSiteList, "core count check")
             if not scanSiteList:
@@ -713,39 +785,33 @@ class AtlasProdJobBroker(JobBrokerBase):
                 strMinRamCount = f"{origMinRamCount}({taskSpec.ramUnit})"
             if not inputChunk.isMerging and taskSpec.baseRamCount not in [0, None]:
                 strMinRamCount += f"+{taskSpec.baseRamCount}"
-            newScanSiteList = []
             oldScanSiteList = copy.copy(scanSiteList)
-            for tmpSiteName in scanSiteList:
+            # job memory requirement
+            minRamCount = np.full(len(scanSiteList), origMinRamCount, dtype=float)
+            if taskSpec.ramPerCore() and not inputChunk.isMerging:
+                siteCoreCount = siteColumns.get(scanSiteList, "coreCount")
+                minRamCount = np.where(siteCoreCount != 0, minRamCount * siteCoreCount, minRamCount)
+                minRamCount += taskSpec.baseRamCount
+            # compensate
+            minRamCount = np.trunc(minRamCount * JobUtils.MEMORY_COMPENSATION).astype(np.int64)
+            # site max and min memory requirements
+            site_maxmemory = siteColumns.get(scanSiteList, "maxrss")
+            site_minmemory = siteColumns.get(scanSiteList, "minrss")
+            # check at the site
+            lowMemory = (site_maxmemory != 0) & (minRamCount != 0) & (minRamCount > site_maxmemory)
+            highMemory = ~lowMemory & (site_minmemory != 0) & (minRamCount != 0) & (minRamCount < site_minmemory)
+
+            def _make_memory_message(idx, tmpSiteName):
                 tmpSiteSpec = self.siteMapper.getSite(tmpSiteName)
-                # job memory requirement
-                minRamCount = origMinRamCount
-                if taskSpec.ramPerCore() and not inputChunk.isMerging:
-                    if tmpSiteSpec.coreCount not in [None, 0]:
-                        minRamCount = origMinRamCount * tmpSiteSpec.coreCount
-                    minRamCount += taskSpec.baseRamCount
-                # compensate
-                minRamCount = JobUtils.compensate_ram_count(minRamCount)
-                # site max memory requirement
-                site_maxmemory = 0
-                if tmpSiteSpec.maxrss not in [0, None]:
-                    site_maxmemory = tmpSiteSpec.maxrss
-                # check at the site
-                if site_maxmemory not in [0, None] and minRamCount != 0 and minRamCount > site_maxmemory:
-                    tmpMsg = f"  skip site={tmpSiteName} due to site RAM shortage {site_maxmemory}(site upper limit) less than {minRamCount} "
+                if lowMemory[idx]:
+                    tmpMsg = f"  skip site={tmpSiteName} due to site RAM shortage {tmpSiteSpec.maxrss}(site upper limit) less than {minRamCount[idx]} "
                     tmpMsg += "criteria=-lowmemory"
-                    tmpLog.info(tmpMsg)
-                    continue
-                # site min memory requirement
-                site_minmemory = 0
-                if tmpSiteSpec.minrss not in [0, None]:
-                    site_minmemory = tmpSiteSpec.minrss
-                if site_minmemory not in [0, None] and minRamCount != 0 and minRamCount < site_minmemory:
-                    tmpMsg = f"  skip site={tmpSiteName} due to job RAM shortage {site_minmemory}(site lower limit) greater than {minRamCount} "
+                else:
+                    tmpMsg = f"  skip site={tmpSiteName} due to job RAM shortage {tmpSiteSpec.minrss}(site lower limit) greater than {minRamCount[idx]} "
                     tmpMsg += "criteria=-highmemory"
-                    tmpLog.info(tmpMsg)
-                    continue
-                newScanSiteList.append(tmpSiteName)
-            scanSiteList = newScanSiteList
+                return tmpMsg
+
+            scanSiteList = SiteColumns.filterSites(scanSiteList, ~lowMemory & ~highMemory, tmpLog, _make_memory_message)
             tmpLog.info(f"{len(scanSiteList)} candidates passed memory check {strMinRamCount}")
             self.add_summary_message(oldScanSiteList, scanSiteList, "memory check")
             if not scanSiteList:
@@ -1171,7 +1237,7 @@ class AtlasProdJobBroker(JobBrokerBase):
                     tmp_stat_dict = core_statistics.get(tmpSiteName, {})
                     n_running_cores = tmp_stat_dict.get("running", 0)
                     n_starting_cores = tmp_stat_dict.get("starting", 0)
-                    tmpLog.debug(f"  {tmpSiteName} running={n_running_cores} starting={n_starting_cores}")
+                    tmpLog.debug("  %s running=%s starting=%s", tmpSiteName, n_running_cores, n_starting_cores)
                     if n_running_cores + n_starting_cores > tmpSiteSpec.pledgedCPU:
                         tmpMsg = f"  skip site={tmpSiteName} since nCores(running+starting)={n_running_cores+n_starting_cores} more than pledgedCPU={tmpSiteSpec.pledgedCPU} "
                         tmpMsg += "in case of work shortage "
@@ -1470,15 +1536,15 @@ class AtlasProdJobBroker(JobBrokerBase):
         jobStatPrioMapGS = dict()
         jobStatPrioMapGSOnly = dict()
         if workQueue.is_global_share:
-            tmpSt, jobStatPrioMap = self.taskBufferIF.getJobStatisticsByGlobalShare(taskSpec.vo)
+            tmpSt, jobStatPrioMap = JobStatsSnapshot.getJobStatisticsByGlobalShare(self.taskBufferIF, taskSpec.vo)
         else:
-            tmpSt, jobStatPrioMap = self.taskBufferIF.getJobStatisticsWithWorkQueue_JEDI(taskSpec.vo, taskSpec.prodSourceLabel)
+            tmpSt, jobStatPrioMap = JobStatsSnapshot.getJobStatisticsWithWorkQueue_JEDI(self.taskBufferIF, taskSpec.vo, taskSpec.prodSourceLabel)
             if tmpSt:
-                tmpSt, jobStatPrioMapGS = self.taskBufferIF.getJobStatisticsByGlobalShare(taskSpec.vo)
-                tmpSt, jobStatPrioMapGSOnly = self.taskBufferIF.getJobStatisticsByGlobalShare(taskSpec.vo, True)
+                tmpSt, jobStatPrioMapGS = JobStatsSnapshot.getJobStatisticsByGlobalShare(self.taskBufferIF, taskSpec.vo)
+                tmpSt, jobStatPrioMapGSOnly = JobStatsSnapshot.getJobStatisticsByGlobalShare(self.taskBufferIF, taskSpec.vo, True)
         if tmpSt:
             # count jobs per resource type
-            tmpSt, tmpStatMapRT = self.taskBufferIF.getJobStatisticsByResourceTypeSite(workQueue)
+            tmpSt, tmpStatMapRT = JobStatsSnapshot.getJobStatisticsByResourceTypeSite(self.taskBufferIF, workQueue)
         if not tmpSt:
             tmpLog.error("failed to get job statistics with priority")
             taskSpec.setErrDiag(tmpLog.uploadLog(taskSpec.jediTaskID))
@@ -1497,6 +1563,9 @@ class AtlasProdJobBroker(JobBrokerBase):
         weightMapJumbo = {}
         largestNumRun = None
         newScanSiteList = []
+        # network weights for all candidates
+        if nucleus:
+            networkWeightMap = self.getNetworkWeights(nucleus, networkMap, queued_tag, self.get_unified_sites(scanSiteList), storageMapping, tmpLog)
         for tmpPseudoSiteName in scanSiteList:
             tmpSiteSpec = self.siteMapper.getSite(tmpPseudoSiteName)
             tmpSiteName = tmpSiteSpec.get_unified_name()
@@ -1545,7 +1614,7 @@ class AtlasProdJobBroker(JobBrokerBase):
                 and tmpSiteName in upsQueues
                 and taskSpec.currentPriority <= self.max_prio_for_bootstrap
             ):
-                tmpLog.debug(f"using nWorkers={nWorkers} as nRunning at {tmpPseudoSiteName} since original nRunning={nRunning} is low")
+                tmpLog.debug("using nWorkers=%s as nRunning at %s since original nRunning=%s is low", nWorkers, tmpPseudoSiteName, nRunning)
                 nRunning = nWorkers
             # take into account the number of standby jobs
             numStandby = tmpSiteSpec.getNumStandby(wq_tag, taskSpec.resource_type)
@@ -1553,15 +1622,15 @@ class AtlasProdJobBroker(JobBrokerBase):
                 pass
             elif taskSpec.currentPriority > self.max_prio_for_bootstrap:
                 # don't use numSlots for high prio tasks
-                tmpLog.debug(f"ignored numSlots at {tmpPseudoSiteName} due to prio={taskSpec.currentPriority} > {self.max_prio_for_bootstrap}")
+                tmpLog.debug("ignored numSlots at %s due to prio=%s > %s", tmpPseudoSiteName, taskSpec.currentPriority, self.max_prio_for_bootstrap)
             elif numStandby == 0:
                 # use the number of starting jobs as the number of standby jobs
                 nRunning = nStarting + nRunning
-                tmpLog.debug(f"using nStarting+nRunning at {tmpPseudoSiteName} to set nRunning={nRunning} due to numSlot={numStandby}")
+                tmpLog.debug("using nStarting+nRunning at %s to set nRunning=%s due to numSlot=%s", tmpPseudoSiteName, nRunning, numStandby)
             else:
                 # the number of standby jobs is defined
                 nRunning = max(int(numStandby / tmpSiteSpec.coreCount), nRunning)
-                tmpLog.debug(f"using numSlots={numStandby}/coreCount at {tmpPseudoSiteName} to set nRunning={nRunning}")
+                tmpLog.debug("using numSlots=%s/coreCount at %s to set nRunning=%s", numStandby, tmpPseudoSiteName, nRunning)
             manyAssigned = float(nAssigned + 1) / float(nActivated + 1)
             manyAssigned = min(2.0, manyAssigned)
             manyAssigned = max(1.0, manyAssigned)
@@ -1629,49 +1698,8 @@ class AtlasProdJobBroker(JobBrokerBase):
                 weightStr += f"nRunningAll={nRunningAll} "
             # apply network metrics to weight
             if nucleus:
-                tmpAtlasSiteName = None
-                try:
-                    tmpAtlasSiteName = storageMapping[tmpSiteName]["default"]
-                except KeyError:
-                    tmpLog.debug(f"Panda site {tmpSiteName} was not in site mapping. Default network values will be given")
-
-                try:
-                    closeness = networkMap[tmpAtlasSiteName][AGIS_CLOSENESS]
-                except KeyError:
-                    tmpLog.debug(f"No {AGIS_CLOSENESS} information found in network matrix from {tmpAtlasSiteName}({tmpSiteName}) to {nucleus}")
-                    closeness = MAX_CLOSENESS * 0.7
-
-                try:
-                    nFilesInQueue = networkMap[tmpAtlasSiteName][queued_tag]
-                except KeyError:
-                    tmpLog.debug(f"No {queued_tag} information found in network matrix from {tmpAtlasSiteName} ({tmpSiteName}) to {nucleus}")
-                    nFilesInQueue = 0
-
-                mbps = None
-                try:
-                    mbps = networkMap[tmpAtlasSiteName][FTS_1W]
-                    mbps = networkMap[tmpAtlasSiteName][FTS_1D]
-                    mbps = networkMap[tmpAtlasSiteName][FTS_1H]
-                except KeyError:
-                    if mbps is None:
-                        tmpLog.debug(f"No dynamic FTS mbps information found in network matrix from {tmpAtlasSiteName}({tmpSiteName}) to {nucleus}")
-
                 # network weight: value between 1 and 2, except when nucleus == satellite
-                if nucleus == tmpAtlasSiteName:  # 25 per cent weight boost for processing in nucleus itself
-                    weightNwQueue = 2.5
-                    weightNwThroughput = 2.5
-                else:
-                    # queue weight: the more in queue, the lower the weight
-                    weightNwQueue = 2 - (nFilesInQueue * 1.0 / self.queue_threshold)
-
-                    # throughput weight: the higher the throughput, the higher the weight
-                    if mbps is not None:
-                        weightNwThroughput = self.convertMBpsToWeight(mbps)
-                    else:
-                        weightNwThroughput = 1 + ((MAX_CLOSENESS - closeness) * 1.0 / (MAX_CLOSENESS - MIN_CLOSENESS))
-
-                # combine queue and throughput weights
-                weightNw = self.nwQueueImportance * weightNwQueue + self.nwThroughputImportance * weightNwThroughput
+                tmpAtlasSiteName, closeness, nFilesInQueue, mbps, weightNw, weightNwQueue, weightNwThroughput = networkWeightMap[tmpSiteName]
 
                 weightStr += f"weightNw={weightNw} ( closeness={closeness} nFilesQueued={nFilesInQueue} throughputMBps={mbps} Network weight:{self.nwActive} )"
 
@@ -3,7 +3,7 @@ import re
 
 from pandacommon.pandalogger.PandaLogger import PandaLogger
 
-from pandajedi.jedicore import Interaction, JediCoreUtils
+from pandajedi.jedicore import Interaction, JediCoreUtils, JobStatsSnapshot
 from pandajedi.jedicore.MsgWrapper import MsgWrapper
 from pandajedi.jedicore.SiteCandidate import SiteCandidate
 from pandajedi.jedirefine import RefinerUtils
@@ -317,7 +317,7 @@ class GenJobBroker(JobBrokerBase):
                 return retTmpError
         ######################################
         # calculate weight
-        tmpSt, jobStatPrioMap = self.taskBufferIF.getJobStatisticsByGlobalShare(taskSpec.vo)
+        tmpSt, jobStatPrioMap = JobStatsSnapshot.getJobStatisticsByGlobalShare(self.taskBufferIF, taskSpec.vo)
         if not tmpSt:
             tmpLog.error("failed to get job statistics with priority")
             taskSpec.setErrDiag(tmpLog.uploadLog(taskSpec.jediTaskID))
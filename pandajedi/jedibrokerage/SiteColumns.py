@@ -0,0 +1,107 @@
+"""
+columnar site attributes for brokerage
+
+"""
+
+import threading
+import weakref
+
+import numpy as np
+
+# site columns per site mapper
+_siteColumnsMap = weakref.WeakKeyDictionary()
+_siteColumnsLock = threading.Lock()
+
+
+# site attributes stored in arrays for mask-based filtering
+class SiteColumns(object):
+    # numeric attributes. None is converted to 0 and can be checked with getMask
+    numericAttributes = ("coreCount", "maxrss", "minrss")
+    # other attributes
+    objectAttributes = ("status", "is_unified", "unified_name")
+
+    # constructor
+    def __init__(self, siteMapper):
+        # weak reference not to keep the site mapper alive
+        self.siteMapperRef = weakref.ref(siteMapper)
+        # (index, rows, arrays) replaced as a whole when sites are added so that readers see a consistent state
+        self.state = ({}, [], {})
+        self.lock = threading.Lock()
+
+    # get values of a site
+    def makeRow(self, siteName):
+        siteSpec = self.siteMapperRef().getSite(siteName)
+        row = {attr: getattr(siteSpec, attr, None) for attr in self.numericAttributes}
+        row["status"] = siteSpec.status
+        row["is_unified"] = bool(siteSpec.is_unified)
+        row["unified_name"] = siteSpec.get_unified_name()
+        return row
+
+    # get the state including sites and indices of the sites
+    def getIndices(self, siteList):
+        state = self.state
+        index = state[0]
+        if any(siteName not in index for siteName in siteList):
+            with self.lock:
+                index, rows, arrays = self.state
+                missing = [siteName for siteName in siteList if siteName not in index]
+                if missing:
+                    index = dict(index)
+                    rows = list(rows)
+                    for siteName in missing:
+                        if siteName not in index:
+                            rows.append(self.makeRow(siteName))
+                            index[siteName] = len(rows) - 1
+                    self.state = (index, rows, {})
+                state = self.state
+            index = state[0]
+        return state, np.fromiter((index[siteName] for siteName in siteList), dtype=np.int64, count=len(siteList))
+
+    # get full array of an attribute and mask of non-null values
+    def getArray(self, state, attr):
+        index, rows, arrays = state
+        if attr not in arrays:
+            values = [row[attr] for row in rows]
+            mask = np.fromiter((v is not None for v in values), dtype=bool, count=len(values))
+            if attr in self.numericAttributes:
+                array = np.fromiter((0 if v is None else v for v in values), dtype=float, count=len(values))
+            elif attr == "is_unified":
+                array = np.array(values, dtype=bool)
+            else:
+                array = np.empty(len(values), dtype=object)
+                array[:] = values
+            arrays[attr] = (array, mask)
+        return arrays[attr]
+
+    # get values of an attribute for sites
+    def get(self, siteList, attr):
+        state, indices = self.getIndices(siteList)
+        return self.getArray(state, attr)[0][indices]
+
+    # get mask of non-null values of an attribute for sites
+    def getMask(self, siteList, attr):
+        state, indices = self.getIndices(siteList)
+        return self.getArray(state, attr)[1][indices]
+
+
+# get site columns for a site mapper which are shared until the site mapper is refreshed
+def getSiteColumns(siteMapper):
+    with _siteColumnsLock:
+        siteColumns = _siteColumnsMap.get(siteMapper)
+        if siteColumns is None:
+            siteColumns = SiteColumns(siteMapper)
+            _siteColumnsMap[siteMapper] = siteColumns
+    return siteColumns
+
+
+# filter sites with a mask and log messages for sites to skip
+def filterSites(siteList, mask, tmpLog, makeMessage=None):
+    newSiteList = []
+    for idx, (siteName, toKeep) in enumerate(zip(siteList, mask.tolist())):
+        if toKeep:
+            newSiteList.append(siteName)
+        elif makeMessage is not None:
+            tmpMsg = makeMessage(idx, siteName)
+            if tmpMsg:
+                tmpLog.info(tmpMsg)
+    return newSiteList
@@ -0,0 +1,368 @@
+"""
+memoization with a local LRU tier and a shared tier on JEDI_Cache
+
+"""
+
+import collections
+import copy
+import datetime
+import inspect
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+from pandajedi.jediconfig import jedi_config
+from pandajedi.jedicore.JediCacheSpec import JediCacheSpec, encodeCacheData
+
+# all memoized functions to dump statistics
+_memoizedFunctions = []
+
+
+# get a parameter which is a constant or a function of call arguments
+def _resolve(param, arguments):
+    if callable(param):
+        return param(arguments)
+    return param
+
+
+# get UTC now without tzinfo as used in JEDI_Cache
+def _utcNow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+# use compact payloads when writing to JEDI_Cache
+def useCompactCache():
+    return hasattr(jedi_config.db, "compactCache") and jedi_config.db.compactCache
+
+
+# entry in JEDI_Cache with a local copy which is fetched and decoded only when changed
+class SharedCacheEntry(object):
+    # constructor
+    def __init__(self, tbIF, mainKey, subKey):
+        self.tbIF = tbIF
+        self.mainKey = mainKey
+        self.subKey = subKey
+        self.cacheSpec = None
+        self.cacheData = None
+        self.lock = threading.RLock()
+
+    # refresh the local copy if changed. False if failed
+    def sync(self):
+        with self.lock:
+            lastUpdate = None if self.cacheSpec is None else self.cacheSpec.last_update
+            # the local copy of written data is fetched again since last_update is unknown
+            version = None if lastUpdate is None else self.cacheSpec.getVersion()
+            changed, cacheSpec = self.tbIF.getCacheIfChanged_JEDI(self.mainKey, self.subKey, lastUpdate, version)
+            if changed is None:
+                return False
+            if changed:
+                self.cacheSpec = cacheSpec
+                self.cacheData = None if cacheSpec is None else cacheSpec.getCacheData()
+            return True
+
+    # get version of the local copy. None if missing
+    def getVersion(self):
+        with self.lock:
+            if self.cacheSpec is None:
+                return None
+            return self.cacheSpec.getVersion()
+
+    # get data of the local copy. Only some top-level values are decoded if keys are given
+    def get(self, keys=None, default=None, toCopy=True):
+        with self.lock:
+            if self.cacheData is None:
+                return default
+            if keys is None:
+                data = self.cacheData.getData()
+            else:
+                data = {}
+                for key in keys:
+                    value = self.cacheData.get(key, self)
+                    if value is not self:
+                        data[key] = value
+        if toCopy:
+            return copy.deepcopy(data)
+        return data
+
+    # write data. Plain JSON is written without compare-and-swap unless compact payloads are enabled.
+    # With compare-and-swap, changes of top-level items against the local copy are applied again on
+    # the latest data when another process has updated it in the meantime. False if failed
+    def put(self, data, maxAttempts=3):
+        with self.lock:
+            if not useCompactCache():
+                retVal = self.tbIF.updateCache_JEDI(main_key=self.mainKey, sub_key=self.subKey, data=json.dumps(data))
+                # fetch again at the next sync
+                self.cacheSpec = None
+                self.cacheData = None
+                return retVal
+            baseData = self.get(default={}, toCopy=False)
+            for iAttempt in range(maxAttempts):
+                expectedVersion = self.getVersion()
+                payload = encodeCacheData(data, (expectedVersion or 0) + 1)
+                if self.tbIF.compareAndSwapCache_JEDI(self.mainKey, self.subKey, payload, expectedVersion):
+                    # keep the written data as the local copy for subsequent updates. last_update is unknown
+                    # so that it is fetched again at the next sync
+                    cacheSpec = JediCacheSpec()
+                    cacheSpec.main_key = self.mainKey
+                    cacheSpec.sub_key = self.subKey
+                    cacheSpec.data = payload
+                    self.cacheSpec = cacheSpec
+                    self.cacheData = cacheSpec.getCacheData()
+                    return True
+                # conflict or failure
+                if iAttempt + 1 >= maxAttempts or not isinstance(data, dict) or not isinstance(baseData, dict):
+                    break
+                self.cacheSpec = None
+                self.cacheData = None
+                if not self.sync():
+                    break
+                latestData = self.get(default={})
+                if not isinstance(latestData, dict):
+                    break
+                # apply the changes on the latest data
+                for key in baseData:
+                    if key not in data:
+                        latestData.pop(key, None)
+                for key, value in data.items():
+                    if key not in baseData or baseData[key] != value:
+                        latestData[key] = value
+                baseData = self.get(default={}, toCopy=False)
+                data = latestData
+            # fetch again at the next sync
+            self.cacheSpec = None
+            self.cacheData = None
+            return False
+
+
+# cached result
+class CacheEntry(object):
+    __slots__ = ("result", "isGood", "freshUntil", "staleUntil")
+
+    # constructor
+    def __init__(self, result, isGood, freshUntil, staleUntil):
+        self.result = result
+        self.isGood = isGood
+        self.freshUntil = freshUntil
+        self.staleUntil = staleUntil
+
+
+# function memoized with a local LRU+TTL tier and an optional shared tier on JEDI_Cache.
+# The function takes tbIF as the first argument and returns (ret_val, ret_map). Good results
+# are cached for lifetime and served while being refreshed in the background for staleLifetime more,
+# while bad results are cached for negativeLifetime to avoid hammering the DB
+class MemoizedFunction(object):
+    # constructor
+    def __init__(
+        self,
+        func,
+        lifetime,
+        staleLifetime=None,
+        negativeLifetime=10,
+        maxEntries=1000,
+        key=None,
+        sharedKey=None,
+        lockComponent=None,
+        lockLabel=None,
+        lockVO=None,
+        lockMinutes=5,
+        waitTime=10,
+    ):
+        self.func = func
+        self.name = f"{func.__module__.split('.')[-1]}.{func.__name__}"
+        self.signature = inspect.signature(func)
+        self.lifetime = lifetime
+        self.staleLifetime = staleLifetime
+        self.negativeLifetime = negativeLifetime
+        self.maxEntries = maxEntries
+        self.key = key
+        # (main_key, sub_key) in JEDI_Cache
+        self.sharedKey = sharedKey
+        self.sharedEntry = None
+        # parameters for process lock to refresh the shared tier
+        self.lockComponent = lockComponent
+        self.lockLabel = lockLabel
+        self.lockVO = lockVO
+        self.lockMinutes = lockMinutes
+        # max time to wait for another process refreshing the shared tier when nothing is available
+        self.waitTime = waitTime
+        self.entries = collections.OrderedDict()
+        self.inFlight = {}
+        self.lock = threading.Lock()
+        self.counters = collections.Counter()
+        _memoizedFunctions.append(self)
+
+    # call
+    def __call__(self, *args, **kwargs):
+        bound = self.signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = bound.arguments
+        if self.key is not None:
+            key = self.key(arguments)
+        else:
+            key = tuple(v for k, v in arguments.items() if k != "tbIF")
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if now <= entry.freshUntil:
+                    self.entries.move_to_end(key)
+                    self.counters["hit" if entry.isGood else "negative_hit"] += 1
+                    return entry.result
+                if now <= entry.staleUntil:
+                    # serve the stale value and refresh in the background unless another thread is doing it
+                    self.entries.move_to_end(key)
+                    self.counters["stale_hit"] += 1
+                    if key not in self.inFlight:
+                        self.inFlight[key] = threading.Event()
+                        thr = threading.Thread(target=self.refresh, args=(key, arguments), daemon=True)
+                        thr.start()
+                    return entry.result
+            self.counters["miss"] += 1
+            event = self.inFlight.get(key)
+            if event is None:
+                self.inFlight[key] = threading.Event()
+        if event is not None:
+            # single flight: wait for the thread refreshing the same key
+            self.countUp("wait")
+            event.wait(self.waitTime)
+            with self.lock:
+                entry = self.entries.get(key)
+            if entry is not None and time.monotonic() <= entry.staleUntil:
+                return entry.result
+            return False, {}
+        return self.refresh(key, arguments)
+
+    # refresh an entry
+    def refresh(self, key, arguments):
+        try:
+            lifetime = _resolve(self.lifetime, arguments)
+            try:
+                result = None
+                if self.sharedKey is not None:
+                    result = self.loadShared(arguments, lifetime)
+                if result is None:
+                    self.countUp("load")
+                    result = self.func(**arguments)
+            except Exception as e:
+                sys.stderr.write(f"{self.name} got {e.__class__.__name__}: {e} \n")
+                result = None
+            isGood = result is not None and bool(result[0])
+            if not isGood:
+                self.countUp("failure")
+                result = (False, {})
+            self.store(key, result, isGood, lifetime)
+            return result
+        finally:
+            with self.lock:
+                event = self.inFlight.pop(key, None)
+            if event is not None:
+                event.set()
+
+    # store a result in the local tier
+    def store(self, key, result, isGood, lifetime):
+        now = time.monotonic()
+        if isGood:
+            staleLifetime = self.staleLifetime
+            if staleLifetime is None:
+                staleLifetime = lifetime
+            entry = CacheEntry(result, True, now + lifetime, now + lifetime + staleLifetime)
+        else:
+            entry = CacheEntry(result, False, now + self.negativeLifetime, now + self.negativeLifetime)
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+
+    # load from the shared tier, or refresh it when holding the process lock
+    def loadShared(self, arguments, lifetime):
+        tbIF = arguments["tbIF"]
+        staleLifetime = self.staleLifetime
+        if staleLifetime is None:
+            staleLifetime = lifetime
+        vo = _resolve(self.lockVO, arguments)
+        label = _resolve(self.lockLabel, arguments)
+        pid = f"{socket.getfqdn().split('.')[0]}-{os.getpid()}_{os.getpgrp()}-broker"
+        startTime = time.monotonic()
+        waitTime = min(self.waitTime, lifetime / 4)
+        sharedEntry = self.getSharedEntry(tbIF)
+        while True:
+            staleData = None
+            if sharedEntry.sync() and sharedEntry.cacheSpec is not None:
+                age = (_utcNow() - sharedEntry.cacheSpec.last_update).total_seconds()
+                if age <= lifetime:
+                    self.countUp("shared_hit")
+                    return True, sharedEntry.get(toCopy=False)
+                if age <= lifetime + staleLifetime:
+                    staleData = sharedEntry.get(toCopy=False)
+            # only one process refreshes the shared tier
+            gotLock = tbIF.lockProcess_JEDI(
+                vo=vo,
+                prodSourceLabel=label,
+                cloud=None,
+                workqueue_id=None,
+                resource_name=None,
+                component=self.lockComponent,
+                pid=pid,
+                timeLimit=_resolve(self.lockMinutes, arguments),
+            )
+            if gotLock:
+                try:
+                    self.countUp("load")
+                    result = self.func(**arguments)
+                    if result[0]:
+                        sharedEntry.put(result[1])
+                    return result
+                finally:
+                    tbIF.unlockProcess_JEDI(
+                        vo=vo, prodSourceLabel=label, cloud=None, workqueue_id=None, resource_name=None, component=self.lockComponent, pid=pid
+                    )
+            # another process is refreshing
+            if staleData is not None:
+                self.countUp("shared_stale_hit")
+                return True, staleData
+            if time.monotonic() - startTime > waitTime:
+                return False, {}
+            time.sleep(1)
+
+    # get the entry of the shared tier
+    def getSharedEntry(self, tbIF):
+        with self.lock:
+            if self.sharedEntry is None:
+                self.sharedEntry = SharedCacheEntry(tbIF, *self.sharedKey)
+            else:
+                self.sharedEntry.tbIF = tbIF
+            return self.sharedEntry
+
+    # increment a counter
+    def countUp(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    # invalidate the local tier
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    # get statistics
+    def getStats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self.entries)
+        return stats
+
+
+# decorator to memoize a function. See MemoizedFunction for parameters
+def memoize(lifetime, **kwargs):
+    def _decorator(func):
+        return MemoizedFunction(func, lifetime, **kwargs)
+
+    return _decorator
+
+
+# get statistics of all memoized functions
+def getStats():
+    return {memoizedFunction.name: memoizedFunction.getStats() for memoizedFunction in _memoizedFunctions}
@@ -2,9 +2,11 @@ import copy
 import math
 import random
 
+import numpy as np
 from pandacommon.pandalogger.PandaLogger import PandaLogger
 
 from . import JediCoreUtils
+from .JediFileColumns import JediFileColumns, JediFileView
 
 logger = PandaLogger().getLogger(__name__.split(".")[-1])
 
@@ -19,6 +21,10 @@ class InputChunk:
     maxInputSizeAvalanche = 500000
     # max number of input files
     maxTotalNumFiles = 1000
+    # min number of master files to use the vectorized planner
+    minFilesToPlan = 100
+    # max number of cached plans
+    maxCachedPlans = 10
 
     def __str__(self):
         sb = []
@@ -70,6 +76,8 @@ class InputChunk:
         self.file_checkpoints = {}
         # list of bootstrapped sites
         self.bootstrapped = set()
+        # cache for the vectorized planner
+        self.planCache = {}
 
     # add master dataset
     def addMasterDS(self, masterDataset):
@@ -393,6 +401,177 @@ class InputChunk:
         except Exception:
             return None
 
+    # get files in a range. lightweight views are returned for columnar file lists
+    def getFilesInRange(self, datasetSpec, start, stop=None):
+        if isinstance(datasetSpec.Files, JediFileColumns):
+            return datasetSpec.Files.getViews(start, stop)
+        return datasetSpec.Files[start:stop]
+
+    # get numeric arrays of files in a dataset
+    def getFileArrays(self, datasetSpec):
+        files = datasetSpec.Files
+        cacheKey = ("files", datasetSpec.datasetID, id(files), len(files))
+        if cacheKey in self.planCache:
+            return self.planCache[cacheKey]
+        arrays = {}
+        for attr in ("fsize", "nEvents", "startEvent", "endEvent"):
+            if isinstance(files, JediFileColumns):
+                arrays[attr] = files.getColumn(attr)
+                arrays[attr + "_mask"] = files.getMask(attr)
+            else:
+                values = [getattr(tmpFileSpec, attr) for tmpFileSpec in files]
+                arrays[attr + "_mask"] = np.fromiter((v is not None for v in values), dtype=bool, count=len(values))
+                arrays[attr] = np.fromiter((0 if v is None else v for v in values), dtype=np.int64, count=len(values))
+        # None in fsize or event ranges without nEvents are not handled
+        hasRange = arrays["nEvents_mask"] & arrays["startEvent_mask"] & arrays["endEvent_mask"]
+        if not arrays["fsize_mask"].all() or (hasRange & (arrays["nEvents"] == 0)).any():
+            arrays = None
+        else:
+            # effective file size in MB, as JediCoreUtils.getEffectiveFileSize
+            inMB = 1024 * 1024
+            fsize = arrays["fsize"].astype(np.float64)
+            nEventsInRange = np.where(arrays["startEvent_mask"] & arrays["endEvent_mask"], arrays["endEvent"] - arrays["startEvent"] + 1, 0)
+            effectiveFsize = np.where(hasRange, np.trunc(fsize * nEventsInRange / np.where(hasRange, arrays["nEvents"], 1)), fsize)
+            effectiveFsize = np.where((arrays["fsize"] == 0) | (effectiveFsize == 0), inMB, effectiveFsize)
+            arrays["effectiveFsize"] = effectiveFsize / inMB
+            # effective number of events, as JediFileSpec.getEffectiveNumEvents
+            effectiveNumEvents = np.where(arrays["nEvents_mask"] & (arrays["nEvents"] > 0), arrays["nEvents"], 1)
+            effectiveNumEvents = np.where(
+                arrays["startEvent_mask"] & arrays["endEvent_mask"], np.where(nEventsInRange > 0, nEventsInRange, 1), effectiveNumEvents
+            )
+            arrays["effectiveNumEvents"] = effectiveNumEvents
+        self.putPlanCache(cacheKey, arrays)
+        return arrays
+
+    # put an object to the plan cache
+    def putPlanCache(self, cacheKey, value):
+        while len(self.planCache) >= self.maxCachedPlans:
+            del self.planCache[next(iter(self.planCache))]
+        self.planCache[cacheKey] = value
+
+    # get cumulative sums of input size, disk size, output size, and walltime over master files
+    def getCumulativeSums(self, sizeGradients, sizeGradientsPerInSize, useDirectIO, walltimeGradient, coreCount, corePower, multiplicity):
+        files = self.masterDataset.Files
+        cacheKey = (
+            "sums",
+            self.masterDataset.datasetID,
+            id(files),
+            len(files),
+            sizeGradients,
+            sizeGradientsPerInSize,
+            useDirectIO,
+            walltimeGradient,
+            coreCount,
+            corePower,
+            multiplicity,
+        )
+        if cacheKey in self.planCache:
+            return self.planCache[cacheKey]
+        arrays = self.getFileArrays(self.masterDataset)
+        sums = None
+        if arrays is not None:
+            effectiveFsize = arrays["effectiveFsize"]
+            effectiveNumEvents = arrays["effectiveNumEvents"].astype(np.float64)
+            # output size
+            if self.taskSpec.outputScaleWithEvents():
+                outSize = np.trunc(sizeGradients * effectiveNumEvents).astype(np.int64)
+            else:
+                outSize = np.trunc(sizeGradients * effectiveFsize).astype(np.int64)
+            if sizeGradientsPerInSize is not None:
+                outSize += np.trunc(effectiveFsize * sizeGradientsPerInSize).astype(np.int64)
+            inSize = outSize + arrays["fsize"]
+            if useDirectIO:
+                diskSize = outSize
+            else:
+                diskSize = inSize
+            # walltime
+            if self.taskSpec.useHS06():
+                walltime = walltimeGradient * effectiveNumEvents / float(coreCount)
+                if corePower not in [None, 0]:
+                    walltime /= corePower
+                if self.taskSpec.cpuEfficiency == 0:
+                    walltime = np.zeros(len(files))
+                else:
+                    walltime /= float(self.taskSpec.cpuEfficiency) / 100.0
+            else:
+                walltime = walltimeGradient * effectiveFsize / float(coreCount)
+            if multiplicity is not None:
+                walltime /= float(multiplicity)
+            walltime = np.trunc(walltime).astype(np.int64)
+            # boundaries are searched only when sums are monotonic
+            if min(outSize.min(), inSize.min(), diskSize.min(), walltime.min()) >= 0:
+                sums = {}
+                for key, values in (("inSize", inSize), ("diskSize", diskSize), ("outSize", outSize), ("walltime", walltime)):
+                    sums[key] = np.concatenate(([0], np.cumsum(values)))
+        self.putPlanCache(cacheKey, sums)
+        return sums
+
+    # get the number of master files and expected walltime for the next subchunk using cumulative sums and binary search.
+    # return None when the plan cannot be made, so that files are checked one by one
+    def planSubChunk(
+        self,
+        maxNumFiles,
+        maxSize,
+        sizeGradients,
+        sizeIntercepts,
+        walltimeGradient,
+        maxWalltime,
+        sizeGradientsPerInSize,
+        maxOutSize,
+        coreCount,
+        corePower,
+        multiplicity,
+        useDirectIO,
+        maxDiskSize,
+    ):
+        if len(self.masterDataset.Files) < self.minFilesToPlan:
+            return None
+        if self.taskSpec.useHS06() and self.taskSpec.baseWalltime is None:
+            return None
+        if None in (sizeGradients, sizeIntercepts, coreCount) or coreCount == 0:
+            return None
+        # limits to take the first file
+        for limit in (maxNumFiles, maxSize, maxOutSize, maxDiskSize):
+            if limit is not None and limit < 0:
+                return None
+        try:
+            sums = self.getCumulativeSums(sizeGradients, sizeGradientsPerInSize, useDirectIO, walltimeGradient, coreCount, corePower, multiplicity)
+        except Exception:
+            sums = None
+        if sums is None:
+            return None
+        iStart = self.datasetMap[self.masterDataset.datasetID]["used"]
+        nRemaining = len(self.masterDataset.Files) - iStart
+        # values when 1, 2, ..., nWindow files are used
+        nWindow = min(nRemaining, maxNumFiles + 1, self.maxTotalNumFiles + 1)
+        iEnd = iStart + nWindow + 1
+        inSize = sums["inSize"][iStart + 1 : iEnd] - sums["inSize"][iStart] + sizeIntercepts
+        diskSize = sums["diskSize"][iStart + 1 : iEnd] - sums["diskSize"][iStart]
+        outSize = sums["outSize"][iStart + 1 : iEnd] - sums["outSize"][iStart]
+        walltime = sums["walltime"][iStart + 1 : iEnd] - sums["walltime"][iStart]
+        if self.taskSpec.useHS06():
+            walltime += self.taskSpec.baseWalltime
+        # the first number of files exceeding limits
+        nViolated = min(maxNumFiles, self.maxTotalNumFiles) + 1
+        if maxSize is not None:
+            nViolated = min(nViolated, np.searchsorted(inSize, maxSize, side="right") + 1)
+        if maxWalltime is not None and maxWalltime > 0:
+            nViolated = min(nViolated, np.searchsorted(walltime, maxWalltime, side="right") + 1)
+        if maxOutSize is not None:
+            nViolated = min(nViolated, np.searchsorted(outSize, maxOutSize, side="right") + 1)
+        if maxDiskSize is not None:
+            nViolated = min(nViolated, np.searchsorted(diskSize, maxDiskSize, side="right") + 1)
+        # the first file is always used
+        nViolated = max(nViolated, 2)
+        # too large input size compared to small output
+        if maxSize is not None:
+            nCheck = min(nViolated - 1, nWindow)
+            tooLarge = (outSize[1:nCheck] < self.defaultOutputSize) & (maxSize - self.defaultOutputSize < inSize[1:nCheck] - outSize[1:nCheck])
+            if tooLarge.any():
+                nViolated = int(np.argmax(tooLarge)) + 2
+        nFiles = min(int(nViolated) - 1, nRemaining)
+        return nFiles, int(walltime[nFiles - 1])
+
     # get subchunk with a selection criteria
     def getSubChunk(
         self,
@@ -498,14 +677,52 @@ class InputChunk:
         totalNumFiles = 0
         dumpStr = ""
         currentLFN = None
-        while no_split or (
-            (maxNumFiles is None or (not dynNumEvents and inputNumFiles <= maxNumFiles) or (dynNumEvents and len(inputFileSet) <= maxNumFiles))
-            and (maxSize is None or (maxSize is not None and fileSize <= maxSize))
-            and (maxWalltime is None or maxWalltime <= 0 or expWalltime <= maxWalltime)
-            and (maxNumEvents is None or (maxNumEvents is not None and inputNumEvents <= maxNumEvents))
-            and (maxOutSize is None or self.getOutSize(outSizeMap) <= maxOutSize)
-            and (maxDiskSize is None or diskSize <= maxDiskSize)
-            and totalNumFiles <= self.maxTotalNumFiles
+        # use the vectorized planner when only master files are split without grouping
+        plan = None
+        if (
+            not no_split
+            and not dynNumEvents
+            and not splitWithBoundaryID
+            and not respectLB
+            and splitByFields is None
+            and nFilesPerJob is None
+            and maxNumEvents is None
+            and multiplicand == 1
+            and maxNumFiles is not None
+            and not self.secondaryDatasetList
+        ):
+            plan = self.planSubChunk(
+                maxNumFiles,
+                maxSize,
+                sizeGradients,
+                sizeIntercepts,
+                walltimeGradient,
+                maxWalltime,
+                sizeGradientsPerInSize,
+                maxOutSize,
+                coreCount,
+                corePower,
+                multiplicity,
+                useDirectIO,
+                maxDiskSize,
+            )
+        if plan is not None:
+            nPlannedFiles, expWalltime = plan
+            datasetUsage = self.datasetMap[self.masterDataset.datasetID]
+            inputFileMap[self.masterDataset.datasetID] = self.getFilesInRange(self.masterDataset, datasetUsage["used"], datasetUsage["used"] + nPlannedFiles)
+            datasetUsage["used"] += nPlannedFiles
+            inputNumFiles = numMaster = nPlannedFiles
+        while plan is None and (
+            no_split
+            or (
+                (maxNumFiles is None or (not dynNumEvents and inputNumFiles <= maxNumFiles) or (dynNumEvents and len(inputFileSet) <= maxNumFiles))
+                and (maxSize is None or (maxSize is not None and fileSize <= maxSize))
+                and (maxWalltime is None or maxWalltime <= 0 or expWalltime <= maxWalltime)
+                and (maxNumEvents is None or (maxNumEvents is not None and inputNumEvents <= maxNumEvents))
+                and (maxOutSize is None or self.getOutSize(outSizeMap) <= maxOutSize)
+                and (maxDiskSize is None or diskSize <= maxDiskSize)
+                and totalNumFiles <= self.maxTotalNumFiles
+            )
         ):
             # get one file (or one file group for MP) from master
             datasetUsage = self.datasetMap[self.masterDataset.datasetID]
@@ -513,7 +730,7 @@ class InputChunk:
                 outSizeMap[self.masterDataset.datasetID] = 0
             boundaryIDs = set()
             primaryHasEvents = False
-            for tmpFileSpec in self.masterDataset.Files[datasetUsage["used"] : datasetUsage["used"] + multiplicand]:
+            for tmpFileSpec in self.getFilesInRange(self.masterDataset, datasetUsage["used"], datasetUsage["used"] + multiplicand):
                 # check start event to keep continuity
                 if (maxNumEvents is not None or dynNumEvents) and tmpFileSpec.startEvent is not None:
                     if nextStartEvent is not None and nextStartEvent != tmpFileSpec.startEvent:
@@ -662,7 +879,7 @@ class InputChunk:
                     # reset nUsed
                     if datasetSpec.isReusable() and datasetUsage["used"] + nSecondary > len(datasetSpec.Files):
                         datasetUsage["used"] = 0
-                    for tmpFileSpec in datasetSpec.Files[datasetUsage["used"] : datasetUsage["used"] + nSecondary]:
+                    for tmpFileSpec in self.getFilesInRange(datasetSpec, datasetUsage["used"], datasetUsage["used"] + nSecondary):
                         # check boundaryID
                         if (
                             (splitWithBoundaryID or (useBoundary is not None and useBoundary["inSplit"] == 3 and datasetSpec.getRatioToMaster() > 1))
@@ -749,7 +966,7 @@ class InputChunk:
             newTotalNumFiles = totalNumFiles
             if self.masterDataset.datasetID not in newOutSizeMap:
                 newOutSizeMap[self.masterDataset.datasetID] = 0
-            for tmpFileSpec in self.masterDataset.Files[datasetUsage["used"] : datasetUsage["used"] + multiplicand]:
+            for tmpFileSpec in self.getFilesInRange(self.masterDataset, datasetUsage["used"], datasetUsage["used"] + multiplicand):
                 # check continuity of event
                 if maxNumEvents is not None and tmpFileSpec.startEvent is not None and tmpFileSpec.endEvent is not None:
                     primaryHasEvents = True
@@ -859,7 +1076,7 @@ class InputChunk:
                     newSecMap[datasetSpec.datasetID]["nSec"] = newNumSecondary
                     newSecMap[datasetSpec.datasetID]["nSecReal"] = 0
                     datasetUsage = self.datasetMap[datasetSpec.datasetID]
-                    for tmpFileSpec in datasetSpec.Files[datasetUsage["used"] : datasetUsage["used"] + newNumSecondary]:
+                    for tmpFileSpec in self.getFilesInRange(datasetSpec, datasetUsage["used"], datasetUsage["used"] + newNumSecondary):
                         # check boundaryID
                         if (
                             splitWithBoundaryID
@@ -955,7 +1172,7 @@ class InputChunk:
         # check min walltime
         if dynNumEvents and min_walltime and min_walltime > expWalltime:
             if enableLog and tmpLog:
-                tmpLog.debug(f"expected walltime {expWalltime} less than min walltime {min_walltime} at {siteName}")
+                tmpLog.debug("expected walltime %s less than min walltime %s at %s", expWalltime, min_walltime, siteName)
                 return [], is_short
         # make copy to return
         returnList = []
@@ -965,7 +1182,10 @@ class InputChunk:
                 # split par site or get atomic subchunk
                 if siteName is not None:
                     # make copy to individually set locality
-                    newFileSpec = copy.copy(tmpFileSpec)
+                    if isinstance(tmpFileSpec, JediFileView):
+                        newFileSpec = tmpFileSpec.getFileSpec(cached=False)
+                    else:
+                        newFileSpec = copy.copy(tmpFileSpec)
                     # set locality
                     newFileSpec.locality = siteCandidate.getFileLocality(tmpFileSpec)
                     if newFileSpec.locality == "remote":
@@ -974,6 +1194,8 @@ class InputChunk:
                     tmpRetList.append(newFileSpec)
                 else:
                     # getting atomic subchunk
+                    if isinstance(tmpFileSpec, JediFileView):
+                        tmpFileSpec = tmpFileSpec.getFileSpec()
                     tmpRetList.append(tmpFileSpec)
             # add to return map
             tmpDatasetSpec = self.getDatasetWithID(tmpDatasetID)
@@ -1045,7 +1267,7 @@ class InputChunk:
         currentLFN = None
         maxChunk = 0
         datasetUsage = self.datasetMap[self.masterDataset.datasetID]
-        for tmpFileSpec in self.masterDataset.Files[datasetUsage["used"] :]:
+        for tmpFileSpec in self.getFilesInRange(self.masterDataset, datasetUsage["used"]):
             if tmpFileSpec.startEvent is not None:
                 if nextStartEvent is not None and nextStartEvent != tmpFileSpec.startEvent:
                     maxChunk = max(maxChunk, totalEvents)
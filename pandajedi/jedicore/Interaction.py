@@ -1,9 +1,13 @@
+import collections
 import datetime
+import itertools
 import multiprocessing
+import multiprocessing.managers
 import multiprocessing.reduction
 import os
 import signal
 import sys
+import threading
 import time
 
 try:
@@ -11,6 +15,8 @@ try:
 except ImportError:
     from multiprocessing.reduction import reduce_connection
 
+from pandajedi.jediconfig import jedi_config
+
 # import multiprocessing
 # logger = multiprocessing.log_to_stderr()
 # logger.setLevel(multiprocessing.SUBDEBUG)
@@ -73,6 +79,19 @@ def dumpStdOut(sender, message):
     print(f"{str(timeNow)} {sender}: INFO    {message}")
 
 
+# counter to make request IDs
+requestCounter = itertools.count()
+
+
+# make unique request ID
+def makeRequestID():
+    return f"{os.getpid()}-{next(requestCounter)}"
+
+
+# method name to let child processes retire after in-flight calls
+retireMethodName = "__retire__"
+
+
 # object class for command
 class CommandObject(object):
     # constructor
@@ -80,15 +99,265 @@ class CommandObject(object):
         self.methodName = methodName
         self.argList = argList
         self.argMap = argMap
+        self.requestID = makeRequestID()
 
 
 # object class for response
 class ReturnObject(object):
     # constructor
-    def __init__(self):
+    def __init__(self, requestID=None):
         self.statusCode = None
         self.errorValue = None
         self.returnValue = None
+        self.requestID = requestID
+
+
+# receive response for a request
+def receiveResponse(pipe, requestID, timeoutPeriod):
+    if not pipe.poll(timeoutPeriod):
+        raise JEDITimeoutError(f"did not get response for {timeoutPeriod}sec")
+    ret = pipe.recv()
+    if ret.requestID != requestID:
+        raise JEDIProtocolError(f"got response for requestID={ret.requestID} while waiting for requestID={requestID}")
+    return ret
+
+
+# convert response to exception type
+def getExceptionType(ret):
+    if ret.statusCode == SC_FAILED:
+        return JEDITemporaryError
+    elif ret.statusCode == SC_FATAL:
+        return JEDIFatalError
+    return None
+
+
+# update and access times of cached values in the manager process, ordered from the least recently used
+class ResultTimeMap(object):
+    # constructor
+    def __init__(self):
+        self.timeMap = collections.OrderedDict()
+
+    # get (update time, last access time)
+    def get(self, key):
+        return self.timeMap.get(key)
+
+    # set times and mark the value as most recently used
+    def touch(self, key, timeItem):
+        self.timeMap[key] = timeItem
+        self.timeMap.move_to_end(key)
+
+    # remove least recently used values beyond maxSize and return their keys
+    def evict(self, maxSize):
+        keyList = []
+        while len(self.timeMap) > maxSize:
+            keyList.append(self.timeMap.popitem(last=False)[0])
+        return keyList
+
+    # get the number of values
+    def size(self):
+        return len(self.timeMap)
+
+
+# manager of result caches
+class ResultCacheManager(multiprocessing.managers.SyncManager):
+    pass
+
+
+ResultCacheManager.register("ResultTimeMap", ResultTimeMap)
+
+
+# manager process for result caches, which is shared by all interfaces
+resultCacheManager = None
+resultCacheManagerLock = threading.Lock()
+
+
+# get manager for result caches
+def getResultCacheManager():
+    global resultCacheManager
+    with resultCacheManagerLock:
+        if resultCacheManager is None:
+            resultCacheManager = ResultCacheManager()
+            resultCacheManager.start()
+        return resultCacheManager
+
+
+# result cache shared by child processes
+class ResultCache(object):
+    # constructor
+    def __init__(self, maxSize=1000, shared=True, maxWait=60, lockTimeout=10):
+        self.maxSize = maxSize
+        # max time in seconds to wait for the value being made by another process
+        self.maxWait = maxWait
+        # max time in seconds to wait for the lock of the shared store, which is never released if the holder was killed
+        self.lockTimeout = lockTimeout
+        # the shared store is skipped until this time after the lock timed out
+        self.skipSharedUntil = 0
+        # local copy in each process. key -> (update time, value)
+        self.localMap = collections.OrderedDict()
+        self.localStats = {"hits": 0, "misses": 0, "evictions": 0, "waits": 0, "lockTimeouts": 0}
+        # hits of local copies not yet added to the shared statistics
+        self.pendingHits = 0
+        # shared store
+        self.manager = None
+        if shared:
+            try:
+                self.manager = getResultCacheManager()
+                self.lock = self.manager.Lock()
+                # key -> value
+                self.valueMap = self.manager.dict()
+                # key -> (update time, last access time)
+                self.timeMap = self.manager.ResultTimeMap()
+                # key -> time when a process started making the value
+                self.inFlightMap = self.manager.dict()
+                self.statMap = self.manager.dict({"hits": 0, "misses": 0, "evictions": 0, "waits": 0})
+            except Exception:
+                errtype, errvalue = sys.exc_info()[:2]
+                dumpStdOut(self.__class__.__name__, f"failed to start shared cache with {errtype.__name__}:{errvalue}")
+                self.manager = None
+
+    # acquire the lock of the shared store. returns False to make values locally when the lock is not available in time
+    def acquireLock(self):
+        if time.time() < self.skipSharedUntil:
+            return False
+        if self.lock.acquire(timeout=self.lockTimeout):
+            return True
+        self.skipSharedUntil = time.time() + self.maxWait
+        self.localStats["lockTimeouts"] += 1
+        dumpStdOut(self.__class__.__name__, f"skip shared cache for {self.maxWait} sec since lock timed out after {self.lockTimeout} sec")
+        return False
+
+    # increment counter
+    def incrementStat(self, key):
+        self.localStats[key] += 1
+        if self.manager is not None and self.acquireLock():
+            try:
+                self.statMap[key] += 1
+                self.flushHits()
+            finally:
+                self.lock.release()
+
+    # add hits of local copies to the shared statistics. Called with the lock when the shared store is accessed anyway
+    def flushHits(self):
+        if self.pendingHits > 0:
+            self.statMap["hits"] += self.pendingHits
+            self.pendingHits = 0
+
+    # keep value in local copy
+    def putLocal(self, key, updateTime, value):
+        self.localMap[key] = (updateTime, value)
+        self.localMap.move_to_end(key)
+        while len(self.localMap) > self.maxSize:
+            self.localMap.popitem(last=False)
+
+    # get fresh value from the shared store. returns (True, value) if found or (False, None) otherwise
+    def getShared(self, key, timeRange, timeNow):
+        timeItem = self.timeMap.get(key)
+        if timeItem is None or timeItem[0] + timeRange <= timeNow:
+            return False, None
+        updateTime = timeItem[0]
+        # transfer value only when the local copy is outdated
+        if key in self.localMap and self.localMap[key][0] == updateTime:
+            value = self.localMap[key][1]
+        else:
+            value = self.valueMap[key]
+        self.putLocal(key, updateTime, value)
+        self.timeMap.touch(key, (updateTime, timeNow))
+        return True, value
+
+    # get value. returns (True, value) if a fresh value is cached or (False, None) otherwise.
+    # With the shared store, the caller of a miss is in charge of making the value and must call put or release
+    # while other processes wait for the value up to maxWait
+    def get(self, key, timeRange):
+        timeNow = time.time()
+        try:
+            # local copy is used first not to access the shared store
+            if key in self.localMap and self.localMap[key][0] + timeRange > timeNow:
+                self.localMap.move_to_end(key)
+                self.localStats["hits"] += 1
+                if self.manager is not None:
+                    self.pendingHits += 1
+                return True, self.localMap[key][1]
+            if self.manager is not None:
+                startTime = timeNow
+                sleepTime = 0.05
+                while self.acquireLock():
+                    try:
+                        isCached, value = self.getShared(key, timeRange, timeNow)
+                        if isCached:
+                            self.pendingHits += 1
+                            self.flushHits()
+                            return True, value
+                        # nobody is making the value or the process has not finished in time
+                        inFlightTime = self.inFlightMap.get(key)
+                        if inFlightTime is None or inFlightTime + self.maxWait < timeNow or startTime + self.maxWait < timeNow:
+                            self.inFlightMap[key] = timeNow
+                            break
+                        if startTime == timeNow:
+                            self.statMap["waits"] += 1
+                    finally:
+                        self.lock.release()
+                    # wait for the value
+                    time.sleep(sleepTime)
+                    sleepTime = min(sleepTime * 2, 1)
+                    timeNow = time.time()
+        except Exception:
+            errtype, errvalue = sys.exc_info()[:2]
+            dumpStdOut(self.__class__.__name__, f"failed to get {key[:100]} with {errtype.__name__}:{errvalue}")
+        try:
+            self.incrementStat("misses")
+        except Exception:
+            pass
+        return False, None
+
+    # put value
+    def put(self, key, value):
+        timeNow = time.time()
+        self.putLocal(key, timeNow, value)
+        if self.manager is None:
+            return
+        try:
+            if not self.acquireLock():
+                return
+            try:
+                self.valueMap[key] = value
+                self.timeMap.touch(key, (timeNow, timeNow))
+                self.inFlightMap.pop(key, None)
+                self.flushHits()
+                # evict least recently used values
+                evictedKeys = self.timeMap.evict(self.maxSize)
+                for tmpKey in evictedKeys:
+                    self.valueMap.pop(tmpKey, None)
+                if evictedKeys:
+                    self.statMap["evictions"] += len(evictedKeys)
+            finally:
+                self.lock.release()
+        except Exception:
+            errtype, errvalue = sys.exc_info()[:2]
+            dumpStdOut(self.__class__.__name__, f"failed to put {key[:100]} with {errtype.__name__}:{errvalue}")
+
+    # release the key when the value was not made so that another process can make it
+    def release(self, key):
+        if self.manager is None:
+            return
+        try:
+            self.inFlightMap.pop(key, None)
+        except Exception:
+            errtype, errvalue = sys.exc_info()[:2]
+            dumpStdOut(self.__class__.__name__, f"failed to release {key[:100]} with {errtype.__name__}:{errvalue}")
+
+    # get statistics. Hits of local copies in child processes are added when they access the shared store
+    def getStats(self):
+        try:
+            if self.manager is not None:
+                retMap = dict(self.statMap)
+                retMap["size"] = self.timeMap.size()
+                retMap["lockTimeouts"] = self.localStats["lockTimeouts"]
+                return retMap
+        except Exception:
+            pass
+        retMap = dict(self.localStats)
+        retMap["size"] = len(self.localMap)
+        return retMap
 
 
 # process class
@@ -137,6 +406,289 @@ class ProcessClass(object):
         else:
             return None
 
+    # read RSS in MB
+    def readRSS(self):
+        return readRSS(self.pid)
+
+
+# page size to convert RSS
+try:
+    pageSize = os.sysconf("SC_PAGE_SIZE")
+except Exception:
+    pageSize = 4096
+
+
+# read RSS in MB from /proc without parsing the status file
+def readRSS(pid):
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * pageSize / 1024 / 1024
+    except Exception:
+        return None
+
+
+# check if a process is alive
+def isProcessAlive(pid):
+    try:
+        if os.waitpid(pid, os.WNOHANG)[0] != 0:
+            return False
+        return True
+    except ChildProcessError:
+        # not a child of this process
+        pass
+    except Exception:
+        return False
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("State:"):
+                    return "Z" not in line.split()[1]
+        return True
+    except Exception:
+        return False
+
+
+# lock to make supervisors
+supervisorLock = threading.Lock()
+
+
+# reset lock in child processes since it could be forked while locked
+def resetSupervisorLock():
+    global supervisorLock
+    supervisorLock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=resetSupervisorLock)
+
+
+# supervisor to recycle child processes in background and to collect their telemetry in each process
+class ChildSupervisor(object):
+    # constructor
+    def __init__(self, voIF, memLimit, maxCalls, sparePercent, maxSpares, drainTimeout, sampleInterval, statsInterval):
+        self.pid = os.getpid()
+        self.voIF = voIF
+        self.memLimit = memLimit
+        self.maxCalls = maxCalls
+        self.spareThreshold = sparePercent / 100
+        self.maxSpares = maxSpares
+        self.drainTimeout = drainTimeout
+        self.sampleInterval = sampleInterval
+        self.statsInterval = statsInterval
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        # children to retire
+        self.toRetire = collections.deque()
+        # warm replacements, the number of replacements to be launched, and children which requested them
+        self.spares = collections.deque()
+        self.nSparesToLaunch = 0
+        self.spareRequesters = set()
+        # number of children to be launched and put into the queue
+        self.nToLaunch = 0
+        # RSS in MB of children used in this process and the last time they were used
+        self.rssMap = {}
+        self.lastUsed = {}
+        # latency and memory growth per method. [n, total, max]
+        self.latencyStats = {}
+        self.memGrowthStats = {}
+        self.nRetired = 0
+        self.nKilled = 0
+        self.lastDump = time.time()
+        thr = threading.Thread(target=self.run, name=f"ChildSupervisor-{voIF.className}")
+        thr.daemon = True
+        thr.start()
+
+    # add a value to stats
+    def addStat(self, statMap, key, value):
+        tmpStat = statMap.setdefault(key, [0, 0, 0])
+        tmpStat[0] += 1
+        tmpStat[1] += value
+        tmpStat[2] = max(tmpStat[2], value)
+
+    # record a call and return the current RSS of the child
+    def recordCall(self, child_process, methodName, callTime):
+        memUsed = child_process.readRSS()
+        with self.lock:
+            if callTime is not None:
+                self.addStat(self.latencyStats, methodName, callTime)
+            if memUsed is not None:
+                if child_process.pid in self.rssMap:
+                    self.addStat(self.memGrowthStats, methodName, memUsed - self.rssMap[child_process.pid])
+                self.rssMap[child_process.pid] = memUsed
+                self.lastUsed[child_process.pid] = time.time()
+        return memUsed
+
+    # check if the child is close to limits to prepare a replacement
+    def isCloseToLimits(self, child_process, memUsed):
+        return child_process.nused > self.spareThreshold * self.maxCalls or (memUsed is not None and memUsed > self.spareThreshold * self.memLimit)
+
+    # prepare a warm replacement for a child
+    def requestSpare(self, child_process):
+        with self.lock:
+            if child_process.pid in self.spareRequesters:
+                return
+            if len(self.spares) + self.nSparesToLaunch >= self.maxSpares:
+                return
+            self.spareRequesters.add(child_process.pid)
+            self.nSparesToLaunch += 1
+        self.event.set()
+
+    # retire a child after its in-flight call and put a replacement into the queue. broken children are killed
+    def retire(self, child_process, pipe, broken):
+        with self.lock:
+            self.toRetire.append((child_process, pipe, broken))
+            self.rssMap.pop(child_process.pid, None)
+            self.lastUsed.pop(child_process.pid, None)
+            self.spareRequesters.discard(child_process.pid)
+            if self.spares:
+                spare = self.spares.popleft()
+            else:
+                spare = None
+                self.nToLaunch += 1
+                # the replacement is not ready yet
+                if self.nSparesToLaunch > 0:
+                    self.nSparesToLaunch -= 1
+        if spare is not None:
+            self.voIF.connectionQueue.put(spare)
+        self.event.set()
+
+    # terminate a child
+    def terminate(self, child_process, pipe, broken):
+        if not broken:
+            # let the child exit by itself
+            try:
+                pipe.send(CommandObject(retireMethodName, [], {}))
+            except Exception:
+                broken = True
+        try:
+            pipe.close()
+        except Exception:
+            pass
+        if not broken:
+            deadline = time.time() + self.drainTimeout
+            while time.time() < deadline:
+                if not isProcessAlive(child_process.pid):
+                    self.nRetired += 1
+                    return
+                time.sleep(0.1)
+        try:
+            os.kill(child_process.pid, signal.SIGKILL)
+            self.nKilled += 1
+            os.waitpid(child_process.pid, 0)
+        except Exception:
+            pass
+
+    # launch children
+    def launchChildren(self):
+        while True:
+            with self.lock:
+                if self.nToLaunch > 0:
+                    self.nToLaunch -= 1
+                    toQueue = True
+                elif self.nSparesToLaunch > 0:
+                    self.nSparesToLaunch -= 1
+                    toQueue = False
+                else:
+                    return
+            try:
+                processObj = self.voIF.makeChild()
+            except Exception:
+                errtype, errvalue = sys.exc_info()[:2]
+                dumpStdOut(self.voIF.className, f"supervisor failed to launch child with {errtype.__name__}:{errvalue}")
+                if toQueue:
+                    with self.lock:
+                        self.nToLaunch += 1
+                return
+            if toQueue:
+                self.voIF.connectionQueue.put(processObj)
+            else:
+                with self.lock:
+                    self.spares.append(processObj)
+
+    # forget children which requested spares but are gone, e.g. retired in another process, and drop spares no longer requested
+    def pruneSpares(self):
+        with self.lock:
+            pidList = list(self.spareRequesters)
+        deadPids = [pid for pid in pidList if not isProcessAlive(pid)]
+        toDrop = []
+        with self.lock:
+            self.spareRequesters.difference_update(deadPids)
+            nExcess = len(self.spares) + self.nSparesToLaunch - len(self.spareRequesters)
+            while nExcess > 0 and self.nSparesToLaunch > 0:
+                self.nSparesToLaunch -= 1
+                nExcess -= 1
+            while nExcess > 0 and self.spares:
+                toDrop.append(self.spares.pop())
+                nExcess -= 1
+        for spare in toDrop:
+            try:
+                pipe = spare.connection()
+            except Exception:
+                pipe = None
+            self.terminate(spare, pipe, pipe is None)
+
+    # sample RSS of children used recently
+    def sample(self):
+        timeNow = time.time()
+        with self.lock:
+            pidList = list(self.rssMap)
+        for pid in pidList:
+            memUsed = readRSS(pid)
+            with self.lock:
+                if memUsed is None or timeNow - self.lastUsed.get(pid, 0) > 3600:
+                    self.rssMap.pop(pid, None)
+                    self.lastUsed.pop(pid, None)
+                elif pid in self.rssMap:
+                    self.rssMap[pid] = memUsed
+
+    # get stats
+    def getStats(self):
+        with self.lock:
+            return {
+                "rss": dict(self.rssMap),
+                "latency": {k: list(v) for k, v in self.latencyStats.items()},
+                "memGrowth": {k: list(v) for k, v in self.memGrowthStats.items()},
+                "nRetired": self.nRetired,
+                "nKilled": self.nKilled,
+                "nSpares": len(self.spares),
+            }
+
+    # dump stats
+    def dumpStats(self):
+        tmpStats = self.getStats()
+        msg = f"children used in pid={self.pid} nRetired={tmpStats['nRetired']} nKilled={tmpStats['nKilled']} nSpares={tmpStats['nSpares']} rss="
+        msg += ",".join(f"{pid}:{memUsed:.0f}MB" for pid, memUsed in sorted(tmpStats["rss"].items()))
+        for methodName, (n, total, maxVal) in sorted(tmpStats["latency"].items()):
+            msg += f" ; {methodName} n={n} avg={total / n:.3f}s max={maxVal:.3f}s"
+            if methodName in tmpStats["memGrowth"]:
+                nGrowth, totalGrowth, maxGrowth = tmpStats["memGrowth"][methodName]
+                msg += f" memGrowth avg={totalGrowth / nGrowth:.2f}MB max={maxGrowth:.2f}MB"
+        dumpStdOut(self.voIF.className, msg)
+
+    # main loop
+    def run(self):
+        while True:
+            try:
+                self.event.wait(self.sampleInterval)
+                self.event.clear()
+                self.pruneSpares()
+                # restore the pool first
+                self.launchChildren()
+                while True:
+                    with self.lock:
+                        if not self.toRetire:
+                            break
+                        child_process, pipe, broken = self.toRetire.popleft()
+                    self.terminate(child_process, pipe, broken)
+                    # launch replacements requested while terminating
+                    self.launchChildren()
+                self.sample()
+                if time.time() - self.lastDump > self.statsInterval:
+                    self.lastDump = time.time()
+                    self.dumpStats()
+            except Exception:
+                errtype, errvalue = sys.exc_info()[:2]
+                dumpStdOut(self.voIF.className, f"supervisor got {errtype.__name__}:{errvalue}")
+
 
 # method class
 class MethodClass(object):
@@ -157,6 +709,8 @@ class MethodClass(object):
             # exceptions
             retException = None
             strException = None
+            pipe = None
+            callTime = None
             try:
                 stepIdx = 0
                 # get child process
@@ -164,80 +718,31 @@ class MethodClass(object):
                 # get pipe
                 stepIdx = 1
                 pipe = child_process.connection()
-                # get ack
-                stepIdx = 2
-                timeoutPeriodACK = 30
-                if not pipe.poll(timeoutPeriodACK):
-                    raise JEDITimeoutError(f"did not get ACK for {timeoutPeriodACK}sec")
-                ack = pipe.recv()
                 # send command
-                stepIdx = 3
+                stepIdx = 2
                 pipe.send(commandObj)
                 # wait response
-                stepIdx = 4
+                stepIdx = 3
                 timeoutPeriod = 600
                 timeNow = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
-                if not pipe.poll(timeoutPeriod):
-                    raise JEDITimeoutError(f"did not get response for {timeoutPeriod}sec")
+                ret = receiveResponse(pipe, commandObj.requestID, timeoutPeriod)
                 regTime = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - timeNow
+                callTime = regTime.total_seconds()
                 if regTime > datetime.timedelta(seconds=60):
                     dumpStdOut(
                         self.className,
                         f"methodName={self.methodName} took {regTime.seconds}.{int(regTime.microseconds / 1000):03d} sec in pid={child_process.pid}",
                     )
-                # get response
-                stepIdx = 5
-                ret = pipe.recv()
                 # set exception type based on error
-                stepIdx = 6
-                if ret.statusCode == SC_FAILED:
-                    retException = JEDITemporaryError
-                elif ret.statusCode == SC_FATAL:
-                    retException = JEDIFatalError
+                stepIdx = 4
+                retException = getExceptionType(ret)
             except Exception:
                 errtype, errvalue = sys.exc_info()[:2]
                 retException = errtype
                 argStr = f"args={str(args)} kargs={str(kwargs)}"
                 strException = f"VO={self.vo} type={errtype.__name__} stepIdx={stepIdx} : {self.className}.{self.methodName} {errvalue} {argStr[:200]}"
-            # increment nused
-            child_process.nused += 1
-            # memory check
-            largeMemory = False
-            memUsed = child_process.getMemUsage()
-            if memUsed is not None:
-                memStr = f"pid={child_process.pid} memory={memUsed}MB"
-                if memUsed > 1.5 * 1024:
-                    largeMemory = True
-                    memStr += " exceeds memory limit"
-                    dumpStdOut(self.className, memStr)
-            # kill old or problematic process
-            if child_process.nused > 1000 or retException not in [None, JEDITemporaryError, JEDIFatalError] or largeMemory:
-                dumpStdOut(
-                    self.className,
-                    f"methodName={self.methodName} ret={retException} nused={child_process.nused} {strException} in pid={child_process.pid}",
-                )
-                # close connection
-                try:
-                    pipe.close()
-                except Exception:
-                    pass
-                # terminate child process
-                try:
-                    dumpStdOut(self.className, f"killing pid={child_process.pid}")
-                    os.kill(child_process.pid, signal.SIGKILL)
-                    dumpStdOut(self.className, f"waiting pid={child_process.pid}")
-                    os.waitpid(child_process.pid, 0)
-                    dumpStdOut(self.className, f"terminated pid={child_process.pid}")
-                except Exception:
-                    errtype, errvalue = sys.exc_info()[:2]
-                    if "No child processes" not in str(errvalue):
-                        dumpStdOut(self.className, f"failed to terminate {child_process.pid} with {errtype}:{errvalue}")
-                # make new child process
-                self.voIF.launchChild()
-            else:
-                # reduce process object to avoid deadlock due to rebuilding of connection
-                child_process.reduceConnection(pipe)
-                self.connectionQueue.put(child_process)
+            # release child process
+            self.voIF.releaseChild(child_process, pipe, 1, self.methodName, retException, strException, callTime)
             # success, fatal error, or maximally attempted
             if retException in [None, JEDIFatalError] or (iTry + 1 == nTry):
                 break
@@ -258,17 +763,201 @@ class MethodClass(object):
 # interface class to send command
 class CommandSendInterface(object):
     # constructor
-    def __init__(self, vo, maxChild, moduleName, className):
+    def __init__(self, vo, maxChild, moduleName, className, cacheSize=1000):
         self.vo = vo
         self.maxChild = maxChild
         self.connectionQueue = multiprocessing.Queue(maxChild)
         self.moduleName = moduleName
         self.className = className
+        # cache for useResultCache shared by all child processes
+        self.resultCache = ResultCache(cacheSize)
+        # supervisor of child processes in each process
+        self.supervisor = None
+        self.useSupervisor = hasattr(jedi_config.master, "childSupervisor") and jedi_config.master.childSupervisor
+
+    # get supervisor for this process
+    def getSupervisor(self):
+        if not self.useSupervisor:
+            return None
+        supervisor = self.supervisor
+        if supervisor is not None and supervisor.pid == os.getpid():
+            return supervisor
+        with supervisorLock:
+            if self.supervisor is None or self.supervisor.pid != os.getpid():
+                self.supervisor = ChildSupervisor(
+                    self,
+                    getattr(jedi_config.master, "childMemoryLimit", 1536),
+                    getattr(jedi_config.master, "childMaxCalls", 1000),
+                    getattr(jedi_config.master, "childSparePercent", 80),
+                    getattr(jedi_config.master, "childMaxSpares", 2),
+                    getattr(jedi_config.master, "childDrainTimeout", 60),
+                    getattr(jedi_config.master, "childSampleInterval", 60),
+                    getattr(jedi_config.master, "childStatsInterval", 600),
+                )
+            return self.supervisor
+
+    # get statistics of child processes used in this process
+    def getChildStats(self):
+        supervisor = self.getSupervisor()
+        if supervisor is None:
+            return None
+        return supervisor.getStats()
 
     # factory method
     def __getattr__(self, attrName):
         return MethodClass(self.className, attrName, self.vo, self.connectionQueue, self)
 
+    # get statistics of result cache
+    def getResultCacheStats(self):
+        return self.resultCache.getStats()
+
+    # put child process back to the queue or kill it if it is old or problematic
+    def releaseChild(self, child_process, pipe, nCalls, methodName, retException, strException, callTime=None):
+        # increment nused
+        child_process.nused += nCalls
+        # recycle in background
+        supervisor = self.getSupervisor()
+        if supervisor is not None:
+            memUsed = supervisor.recordCall(child_process, methodName, callTime)
+            largeMemory = memUsed is not None and memUsed > supervisor.memLimit
+            broken = retException not in [None, JEDITemporaryError, JEDIFatalError] or pipe is None
+            if child_process.nused > supervisor.maxCalls or largeMemory or broken:
+                dumpStdOut(
+                    self.className,
+                    f"methodName={methodName} ret={retException} nused={child_process.nused} memory={memUsed}MB {strException} retire pid={child_process.pid}",
+                )
+                supervisor.retire(child_process, pipe, broken)
+            else:
+                if supervisor.isCloseToLimits(child_process, memUsed):
+                    supervisor.requestSpare(child_process)
+                # reduce process object to avoid deadlock due to rebuilding of connection
+                child_process.reduceConnection(pipe)
+                self.connectionQueue.put(child_process)
+            return
+        # memory check
+        largeMemory = False
+        memUsed = child_process.getMemUsage()
+        if memUsed is not None:
+            memStr = f"pid={child_process.pid} memory={memUsed}MB"
+            if memUsed > 1.5 * 1024:
+                largeMemory = True
+                memStr += " exceeds memory limit"
+                dumpStdOut(self.className, memStr)
+        # kill old or problematic process
+        if child_process.nused > 1000 or retException not in [None, JEDITemporaryError, JEDIFatalError] or largeMemory or pipe is None:
+            dumpStdOut(
+                self.className,
+                f"methodName={methodName} ret={retException} nused={child_process.nused} {strException} in pid={child_process.pid}",
+            )
+            # close connection
+            try:
+                pipe.close()
+            except Exception:
+                pass
+            # terminate child process
+            try:
+                dumpStdOut(self.className, f"killing pid={child_process.pid}")
+                os.kill(child_process.pid, signal.SIGKILL)
+                dumpStdOut(self.className, f"waiting pid={child_process.pid}")
+                os.waitpid(child_process.pid, 0)
+                dumpStdOut(self.className, f"terminated pid={child_process.pid}")
+            except Exception:
+                errtype, errvalue = sys.exc_info()[:2]
+                if "No child processes" not in str(errvalue):
+                    dumpStdOut(self.className, f"failed to terminate {child_process.pid} with {errtype}:{errvalue}")
+            # make new child process
+            self.launchChild()
+        else:
+            # reduce process object to avoid deadlock due to rebuilding of connection
+            child_process.reduceConnection(pipe)
+            self.connectionQueue.put(child_process)
+
+    # send multiple commands to one child process without waiting for each response.
+    # commandList is a list of (methodName, argList, argMap). Returns a list of return values
+    # or exception instances in the same order as commandList. Commands without responses are sent again
+    # to another child process when the child process died or timed out, as MethodClass does for single calls
+    def pipelineCall(self, commandList, maxInFlight=10, timeoutPeriod=600):
+        commandObjs = [CommandObject(methodName, argList, argMap) for methodName, argList, argMap in commandList]
+        retMap = {}
+        nTry = 3
+        for iTry in range(nTry):
+            pendingObjs = [commandObj for commandObj in commandObjs if commandObj.requestID not in retMap]
+            retException, strException = self.sendPipeline(pendingObjs, retMap, maxInFlight, timeoutPeriod)
+            # success or maximally attempted
+            if retException is None or iTry + 1 == nTry:
+                break
+            # sleep
+            time.sleep(1)
+        if retException is not None:
+            raise retException(strException)
+        # make return list
+        retList = []
+        for commandObj in commandObjs:
+            ret = retMap[commandObj.requestID]
+            if ret.statusCode == SC_SUCCEEDED:
+                retList.append(ret.returnValue)
+            else:
+                retList.append(getExceptionType(ret)(f"VO={self.vo} {ret.errorValue}"))
+        return retList
+
+    # send commands to one child process and put responses into retMap. Returns (exception type, message) if failed
+    def sendPipeline(self, commandObjs, retMap, maxInFlight, timeoutPeriod):
+        retException = None
+        strException = None
+        pipe = None
+        stepIdx = 0
+        nResponses = 0
+        # get child process
+        child_process = self.connectionQueue.get()
+        startTime = time.time()
+        try:
+            # get pipe
+            stepIdx = 1
+            pipe = child_process.connection()
+            # send commands in another thread to avoid deadlock when both pipe buffers are full
+            stepIdx = 2
+            slots = threading.Semaphore(maxInFlight)
+            senderErrors = []
+            aborted = threading.Event()
+
+            def sender():
+                try:
+                    for commandObj in commandObjs:
+                        slots.acquire()
+                        if aborted.is_set():
+                            break
+                        pipe.send(commandObj)
+                except Exception as e:
+                    senderErrors.append(e)
+
+            senderThr = threading.Thread(target=sender)
+            senderThr.daemon = True
+            senderThr.start()
+            # receive responses in order
+            stepIdx = 3
+            for commandObj in commandObjs:
+                if senderErrors:
+                    raise senderErrors[0]
+                retMap[commandObj.requestID] = receiveResponse(pipe, commandObj.requestID, timeoutPeriod)
+                nResponses += 1
+                slots.release()
+            senderThr.join()
+        except Exception:
+            # stop sender
+            if stepIdx >= 2:
+                aborted.set()
+                slots.release()
+            errtype, errvalue = sys.exc_info()[:2]
+            retException = errtype
+            strException = (
+                f"VO={self.vo} type={errtype.__name__} stepIdx={stepIdx} : {self.className}.pipelineCall {errvalue} "
+                f"nCommands={len(commandObjs)} nResponses={nResponses}"
+            )
+        # release child process
+        methodNames = ",".join(sorted(set(commandObj.methodName for commandObj in commandObjs)))
+        self.releaseChild(child_process, pipe, nResponses, methodNames, retException, strException, time.time() - startTime)
+        return retException, strException
+
     # launcher for child processe
     def launcher(self, channel):
         # import module
@@ -282,13 +971,20 @@ class CommandSendInterface(object):
         dumpStdOut(self.moduleName, msg)
         timeNow = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
         try:
-            cls(channel).start()
+            receiver = cls(channel)
+            receiver.resultCache = self.resultCache
+            receiver.start()
         except Exception:
             errtype, errvalue = sys.exc_info()[:2]
             dumpStdOut(self.className, f"launcher crashed with {errtype}:{errvalue}")
 
     # launch child processes to interact with DDM
     def launchChild(self):
+        # ready
+        self.connectionQueue.put(self.makeChild())
+
+    # make a child process
+    def makeChild(self):
         # make pipe
         parent_conn, child_conn = multiprocessing.Pipe()
         # make child process
@@ -302,8 +998,7 @@ class CommandSendInterface(object):
         pipe = processObj.connection()
         pipe.recv()
         processObj.reduceConnection(pipe)
-        # ready
-        self.connectionQueue.put(processObj)
+        return processObj
 
     # initialize
     def initialize(self):
@@ -316,7 +1011,8 @@ class CommandReceiveInterface(object):
     # constructor
     def __init__(self, con):
         self.con = con
-        self.cacheMap = {}
+        # cache for useResultCache, which is replaced with the cache shared by all child processes at launch
+        self.resultCache = ResultCache(shared=False)
 
     # make key for cache
     def makeKey(self, className, methodName, argList, argMap):
@@ -337,12 +1033,13 @@ class CommandReceiveInterface(object):
         self.con.send("ready")
         # main loop
         while True:
-            # send ACK
-            self.con.send("ack")
             # get command
             commandObj = self.con.recv()
+            # retire after in-flight calls
+            if commandObj.methodName == retireMethodName:
+                return
             # make return
-            retObj = ReturnObject()
+            retObj = ReturnObject(commandObj.requestID)
             # get class name
             className = self.__class__.__name__
             # check method name
@@ -365,10 +1062,9 @@ class CommandReceiveInterface(object):
                         if tmpCacheKey is not None:
                             useCache = True
                             # cache is fresh
-                            if tmpCacheKey in self.cacheMap and self.cacheMap[tmpCacheKey]["utime"] + datetime.timedelta(
-                                seconds=timeRange
-                            ) > datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None):
-                                tmpRet = self.cacheMap[tmpCacheKey]["value"]
+                            isCached, tmpCachedRet = self.resultCache.get(tmpCacheKey, timeRange)
+                            if isCached:
+                                tmpRet = tmpCachedRet
                                 doExec = False
                     # exec
                     if doExec:
@@ -402,8 +1098,11 @@ class CommandReceiveInterface(object):
                     retObj.statusCode = self.SC_FATAL
                     retObj.errorValue = f"type={errtype.__name__} : {className}.{commandObj.methodName} : {errvalue}"
                 # cache
-                if useCache and doExec and retObj.statusCode == self.SC_SUCCEEDED:
-                    self.cacheMap[tmpCacheKey] = {"utime": datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None), "value": tmpRet}
+                if useCache and doExec:
+                    if retObj.statusCode == self.SC_SUCCEEDED:
+                        self.resultCache.put(tmpCacheKey, tmpRet)
+                    else:
+                        self.resultCache.release(tmpCacheKey)
             # return
             self.con.send(retObj)
 
@@ -431,3 +1130,8 @@ class JEDIFatalError(Exception):
 # exception for timeout error
 class JEDITimeoutError(Exception):
     pass
+
+
+# exception for inconsistent request and response
+class JEDIProtocolError(Exception):
+    pass
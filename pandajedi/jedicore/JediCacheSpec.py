@@ -3,6 +3,127 @@ cache specification for JEDI
 
 """
 
+import base64
+import json
+import struct
+import zlib
+
+# prefix of compact payloads : JC1:<version>:<base64 of segments>
+COMPACT_PREFIX = "JC1:"
+
+# approximate size of JSON in a segment
+SEGMENT_SIZE = 32 * 1024
+
+# structure of length fields
+_lengthField = struct.Struct("!I")
+
+
+# compress JSON of a value
+def _compressJson(value):
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode())
+
+
+# decompress JSON of a value
+def _decompressJson(data):
+    return json.loads(zlib.decompress(data))
+
+
+# encode data into a compact payload with a version. A map is split into compressed segments
+# with an index of keys, so that readers can decode only segments for keys they need
+def encodeCacheData(data, version):
+    chunks = []
+    if isinstance(data, dict) and all(isinstance(k, str) for k in data):
+        flag = b"M"
+        keyLists = []
+        segments = []
+        segment = {}
+        segmentSize = 0
+        for key, value in data.items():
+            segment[key] = value
+            segmentSize += len(key) + len(json.dumps(value, separators=(",", ":")))
+            if segmentSize >= SEGMENT_SIZE:
+                keyLists.append(list(segment))
+                segments.append(_compressJson(segment))
+                segment = {}
+                segmentSize = 0
+        if segment:
+            keyLists.append(list(segment))
+            segments.append(_compressJson(segment))
+        chunks = [_compressJson(keyLists)] + segments
+    else:
+        flag = b"V"
+        chunks = [_compressJson(data)]
+    body = flag + b"".join(_lengthField.pack(len(chunk)) + chunk for chunk in chunks)
+    return f"{COMPACT_PREFIX}{version}:{base64.b64encode(body).decode()}"
+
+
+# get version of a payload. 0 for plain JSON
+def getCacheDataVersion(payload):
+    if payload and payload.startswith(COMPACT_PREFIX):
+        return int(payload[len(COMPACT_PREFIX) : payload.index(":", len(COMPACT_PREFIX))])
+    return 0
+
+
+# decoded view of a payload
+class CacheData(object):
+    # constructor
+    def __init__(self, payload):
+        self.version = getCacheDataVersion(payload)
+        self.isMap = False
+        # index of key to segment number
+        self.keyIndex = {}
+        self.segments = []
+        self.values = {}
+        if self.version == 0:
+            # plain JSON
+            value = json.loads(payload)
+            if isinstance(value, dict):
+                self.isMap = True
+                self.values = value
+            else:
+                self.values[""] = value
+            return
+        body = base64.b64decode(payload[payload.index(":", len(COMPACT_PREFIX)) + 1 :])
+        self.isMap = body[:1] == b"M"
+        chunks = []
+        offset = 1
+        while offset < len(body):
+            (chunkLen,) = _lengthField.unpack_from(body, offset)
+            offset += _lengthField.size
+            chunks.append(body[offset : offset + chunkLen])
+            offset += chunkLen
+        if not self.isMap:
+            self.values[""] = _decompressJson(chunks[0])
+            return
+        for idx, keyList in enumerate(_decompressJson(chunks[0])):
+            for key in keyList:
+                self.keyIndex[key] = idx
+        self.segments = chunks[1:]
+
+    # get keys of a map
+    def keys(self):
+        if self.version == 0 or not self.isMap:
+            return list(self.values.keys())
+        return list(self.keyIndex.keys())
+
+    # get a top-level value of a map
+    def get(self, key, default=None):
+        if key not in self.values:
+            if key not in self.keyIndex:
+                return default
+            # decode the segment
+            idx = self.keyIndex[key]
+            if self.segments[idx] is not None:
+                self.values.update(_decompressJson(self.segments[idx]))
+                self.segments[idx] = None
+        return self.values[key]
+
+    # get whole data
+    def getData(self):
+        if not self.isMap:
+            return self.values[""]
+        return {key: self.get(key) for key in self.keys()}
+
 
 class JediCacheSpec(object):
     # attributes
@@ -19,6 +140,14 @@ class JediCacheSpec(object):
         for attr in self.attributes:
             object.__setattr__(self, attr, None)
 
+    # get version of data
+    def getVersion(self):
+        return getCacheDataVersion(self.data)
+
+    # get decoded view of data
+    def getCacheData(self):
+        return CacheData(self.data)
+
     # return map of values
     def valuesMap(self):
         ret = {}
@@ -1,9 +1,9 @@
-import copy
 import datetime
 import math
 import os
 import re
 
+import numpy
 from pandaserver.taskbuffer import JobUtils
 
 
@@ -121,15 +121,16 @@ def getConfigParam(configStr, vo, sourceLabel):
 
 # get percentile until numpy 1.5.X becomes available
 def percentile(inList, percent, idMap):
-    inList = sorted(copy.copy(inList))
     k = (len(inList) - 1) * float(percent) / 100
     f = math.floor(k)
     c = math.ceil(k)
+    # select order statistics without sorting the whole list
+    order = numpy.argpartition(numpy.asarray(inList, dtype=float), sorted({int(f), int(c)}))
     if f == c:
-        retVal = inList[int(f)]
+        retVal = inList[order[int(f)]]
         return retVal, [retVal]
-    val0 = inList[int(f)]
-    val1 = inList[int(c)]
+    val0 = inList[order[int(f)]]
+    val1 = inList[order[int(c)]]
     d0 = val0 * (c - k)
     d1 = val1 * (k - f)
     retVal = d0 + d1
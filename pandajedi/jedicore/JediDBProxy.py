@@ -18,9 +18,9 @@ from pandaserver.taskbuffer import EventServiceUtils, JobUtils, OraDBProxy
 
 from pandajedi.jediconfig import jedi_config
 
-from . import JediCoreUtils, ParseJobXML
+from . import JediCoreUtils, ParseJobXML, WakeupBus
 from .InputChunk import InputChunk
-from .JediCacheSpec import JediCacheSpec
+from .JediCacheSpec import JediCacheSpec, getCacheDataVersion
 from .JediDatasetSpec import JediDatasetSpec
 from .JediFileSpec import JediFileSpec
 from .JediTaskSpec import JediTaskSpec, is_msg_driven, push_status_changes
@@ -377,6 +377,13 @@ class DBProxy(OraDBProxy.DBProxy):
         failedRet = False, 0, None, diagMap
         harmlessRet = None, 0, None, diagMap
         regStart = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        # number of files inserted in each bulk insert
+        insertPageSize = self.getConfigValue("confeeder", "INSERT_PAGE_SIZE", "jedi")
+        if not insertPageSize:
+            insertPageSize = 10000
+        # minimum number of files to resolve new and lost files through the temporary table, None to disable.
+        # JEDI_Dataset_Contents_Temp needs to be created beforehand as described in INSTALL.txt
+        bulkIngestionMinFiles = self.getConfigValue("confeeder", "BULK_INGESTION_MIN_FILES", "jedi")
         # mutable
         fake_mutable_for_skip_short_output = False
         if (noWaitParent or inputPreStaging) and datasetState == "mutable":
@@ -713,6 +720,9 @@ class DBProxy(OraDBProxy.DBProxy):
                     return failedRet
             missingFileList = []
             tmpLog.debug(f"{len(missingFileList)} files missing")
+            # use bulk ingestion
+            useBulkIngestion = bulkIngestionMinFiles is not None and len(uniqueFileKeyList) >= bulkIngestionMinFiles
+            tmpLog.debug(f"useBulkIngestion={useBulkIngestion}")
             # sql to check if task is locked
             sqlTL = f"SELECT status,lockedBy FROM {jedi_config.db.schemaJEDI}.JEDI_Tasks WHERE jediTaskID=:jediTaskID FOR UPDATE NOWAIT "
             # sql to check dataset status
@@ -726,6 +736,38 @@ class DBProxy(OraDBProxy.DBProxy):
             # sql to count existing files
             sqlCo = f"SELECT count(*) FROM {jedi_config.db.schemaJEDI}.JEDI_Dataset_Contents "
             sqlCo += "WHERE jediTaskID=:jediTaskID AND datasetID=:datasetID "
+            # sql to count existing files per status for bulk ingestion
+            sqlCS = "SELECT status,COUNT(*),SUM(CASE WHEN attemptNr>=maxAttempt OR failedAttempt>=maxFailure THEN 1 ELSE 0 END),"
+            sqlCS += "SUM(CASE WHEN startEvent IS NOT NULL AND endEvent IS NOT NULL THEN endEvent-startEvent+1 ELSE nEvents END) "
+            sqlCS += f"FROM {jedi_config.db.schemaJEDI}.JEDI_Dataset_Contents "
+            sqlCS += "WHERE jediTaskID=:jediTaskID AND datasetID=:datasetID GROUP BY status "
+            # sql to get pending files for bulk ingestion
+            sqlCP = f"SELECT fileID,startEvent,endEvent FROM {jedi_config.db.schemaJEDI}.JEDI_Dataset_Contents "
+            sqlCP += "WHERE jediTaskID=:jediTaskID AND datasetID=:datasetID AND status=:status FOR UPDATE "
+            # sql to get lumiblocks of staging files for bulk ingestion
+            sqlSL = f"SELECT DISTINCT lumiBlockNr FROM {jedi_config.db.schemaJEDI}.JEDI_Dataset_Contents "
+            sqlSL += "WHERE jediTaskID=:jediTaskID AND datasetID=:datasetID AND status=:status "
+            # sql to stage incoming files into the temporary table
+            sqlTI = f"INSERT INTO {jedi_config.db.schemaJEDI}.JEDI_Dataset_Contents_Temp (jediTaskID,datasetID,lfn,startEvent,endEvent,boundaryID) "
+            sqlTI += "VALUES (:jediTaskID,:datasetID,:lfn,:startEvent,:endEvent,:boundaryID) "
+            # sql to clean up the temporary table
+            sqlTD = f"DELETE FROM {jedi_config.db.schemaJEDI}.JEDI_Dataset_Contents_Temp "
+            sqlTD += "WHERE jediTaskID=:jediTaskID AND datasetID=:datasetID "
+            # condition to match staged and existing files
+            sqlMC = "tabC.jediTaskID=tabT.jediTaskID AND tabC.datasetID=tabT.datasetID AND tabC.lfn=tabT.lfn "
+            for tmpAttr in ["startEvent", "endEvent", "boundaryID"]:
+                sqlMC += f"AND (tabC.{tmpAttr}=tabT.{tmpAttr} OR (tabC.{tmpAttr} IS NULL AND tabT.{tmpAttr} IS NULL)) "
+            # sql to get staged files which don't exist yet
+            sqlTN = f"SELECT tabT.lfn,tabT.startEvent,tabT.endEvent,tabT.boundaryID FROM {jedi_config.db.schemaJEDI}.JEDI_Dataset_Contents_Temp tabT "
+            sqlTN += "WHERE tabT.jediTaskID=:jediTaskID AND tabT.datasetID=:datasetID "
+            sqlTN += f"AND NOT EXISTS (SELECT 1 FROM {jedi_config.db.schemaJEDI}.JEDI_Dataset_Contents tabC WHERE {sqlMC}) "
+            # sql to get existing files which are not staged
+            sqlTM = "SELECT tabC.fileID,tabC.lfn,tabC.status,tabC.startEvent,tabC.endEvent,tabC.boundaryID,tabC.nEvents,"
+            sqlTM += "tabC.attemptNr,tabC.maxAttempt,tabC.failedAttempt,tabC.maxFailure "
+            sqlTM += f"FROM {jedi_config.db.schemaJEDI}.JEDI_Dataset_Contents tabC "
+            sqlTM += "WHERE tabC.jediTaskID=:jediTaskID AND tabC.datasetID=:datasetID AND tabC.status IN (:status1,:status2,:status3) "
+            sqlTM += f"AND NOT EXISTS (SELECT 1 FROM {jedi_config.db.schemaJEDI}.JEDI_Dataset_Contents_Temp tabT WHERE {sqlMC}) "
+            sqlTM += "FOR UPDATE "
             # sql for insert
             sqlIn = f"INSERT INTO {jedi_config.db.schemaJEDI}.JEDI_Dataset_Contents ({JediFileSpec.columnNames()}) "
             sqlIn += JediFileSpec.bindValuesExpression(useSeq=False)
@@ -735,6 +777,8 @@ class DBProxy(OraDBProxy.DBProxy):
             # sql to update file status
             sqlFU = f"UPDATE {jedi_config.db.schemaJEDI}.JEDI_Dataset_Contents SET status=:status "
             sqlFU += "WHERE jediTaskID=:jediTaskID AND datasetID=:datasetID AND fileID=:fileID "
+            # sql to update status of lost files only if unchanged
+            sqlFL = sqlFU + "AND status=:oldStatus "
             # sql to get master status
             sqlMS = f"SELECT status FROM {jedi_config.db.schemaJEDI}.JEDI_Datasets "
             sqlMS += "WHERE jediTaskID=:jediTaskID AND datasetID=:datasetID "
@@ -892,74 +936,205 @@ class DBProxy(OraDBProxy.DBProxy):
                         tmpLog.debug(f"ds.state={dsStateInDB} in DB")
                         if not nFilesUsedInDS:
                             nFilesUsedInDS = 0
-                        # get existing file list
-                        varMap = {}
-                        varMap[":jediTaskID"] = datasetSpec.jediTaskID
-                        varMap[":datasetID"] = datasetSpec.datasetID
-                        self.cur.execute(sqlCh + comment, varMap)
-                        tmpRes = self.cur.fetchall()
-                        tmpLog.debug(f"{len(tmpRes)} file records in DB")
                         existingFiles = {}
                         statusMap = {}
-                        for (
-                            fileID,
-                            lfn,
-                            status,
-                            startEvent,
-                            endEvent,
-                            boundaryID,
-                            nEventsInDS,
-                            lumiBlockNr,
-                            attemptNr,
-                            maxAttempt,
-                            failedAttempt,
-                            maxFailure,
-                        ) in tmpRes:
-                            statusMap.setdefault(status, 0)
-                            statusMap[status] += 1
-                            uniqueFileKey = f"{lfn}.{startEvent}.{endEvent}.{boundaryID}"
-                            existingFiles[uniqueFileKey] = {"fileID": fileID, "status": status}
-                            if startEvent is not None and endEvent is not None:
-                                existingFiles[uniqueFileKey]["nevents"] = endEvent - startEvent + 1
-                            elif nEventsInDS is not None:
-                                existingFiles[uniqueFileKey]["nevents"] = nEventsInDS
-                            else:
-                                existingFiles[uniqueFileKey]["nevents"] = None
-                            existingFiles[uniqueFileKey]["is_failed"] = False
-                            lostFlag = False
-                            if status == "ready":
-                                if (maxAttempt is not None and attemptNr is not None and attemptNr >= maxAttempt) or (
-                                    failedAttempt is not None and maxFailure is not None and failedAttempt >= maxFailure
-                                ):
-                                    nUsed += 1
-                                    existingFiles[uniqueFileKey]["is_failed"] = True
-                                    nFailed += 1
+                        newFileKeys = None
+                        if useBulkIngestion:
+                            # count existing files per status
+                            varMap = {}
+                            varMap[":jediTaskID"] = datasetSpec.jediTaskID
+                            varMap[":datasetID"] = datasetSpec.datasetID
+                            self.cur.execute(sqlCS + comment, varMap)
+                            resCS = self.cur.fetchall()
+                            nExistingFiles = 0
+                            for status, tmpCount, tmpFailed, tmpNumEvents in resCS:
+                                statusMap[status] = tmpCount
+                                nExistingFiles += tmpCount
+                                if not tmpFailed:
+                                    tmpFailed = 0
+                                if status == "ready":
+                                    nUsed += tmpFailed
+                                    nFailed += tmpFailed
+                                    nReady += tmpCount - tmpFailed
+                                elif status == "pending":
+                                    nPending += tmpCount
+                                elif status == "staging":
+                                    nStaging += tmpCount
+                                elif status not in ["lost", "missing"]:
+                                    nUsed += tmpCount
                                 else:
-                                    nReady += 1
-                            elif status == "pending":
-                                nPending += 1
-                                pendingFID.append(fileID)
-                                # count number of events for scouts with event-level splitting
-                                if isEventSplit:
-                                    try:
-                                        if nEventsToUseEventSplit < sizePendingEventChunk:
-                                            nEventsToUseEventSplit += endEvent - startEvent + 1
-                                            nFilesToUseEventSplit += 1
-                                    except Exception:
-                                        pass
-                            elif status == "staging":
-                                nStaging += 1
-                                stagingLB.add(lumiBlockNr)
-                            elif status not in ["lost", "missing"]:
-                                nUsed += 1
-                            elif status in ["lost", "missing"]:
-                                nLost += 1
-                                lostFlag = True
-                            if existingFiles[uniqueFileKey]["nevents"] is not None:
-                                if lostFlag:
-                                    nEventsLost += existingFiles[uniqueFileKey]["nevents"]
+                                    nLost += tmpCount
+                                if tmpNumEvents is not None:
+                                    if status in ["lost", "missing"]:
+                                        nEventsLost += tmpNumEvents
+                                    else:
+                                        nEventsExist += tmpNumEvents
+                            tmpLog.debug(f"{nExistingFiles} file records in DB")
+                            # get pending files
+                            if nPending > 0:
+                                varMap = {}
+                                varMap[":jediTaskID"] = datasetSpec.jediTaskID
+                                varMap[":datasetID"] = datasetSpec.datasetID
+                                varMap[":status"] = "pending"
+                                self.cur.execute(sqlCP + comment, varMap)
+                                resCP = self.cur.fetchall()
+                                for fileID, startEvent, endEvent in resCP:
+                                    pendingFID.append(fileID)
+                                    # count number of events for scouts with event-level splitting
+                                    if isEventSplit:
+                                        try:
+                                            if nEventsToUseEventSplit < sizePendingEventChunk:
+                                                nEventsToUseEventSplit += endEvent - startEvent + 1
+                                                nFilesToUseEventSplit += 1
+                                        except Exception:
+                                            pass
+                            # get lumiblocks of staging files
+                            if nStaging > 0:
+                                varMap = {}
+                                varMap[":jediTaskID"] = datasetSpec.jediTaskID
+                                varMap[":datasetID"] = datasetSpec.datasetID
+                                varMap[":status"] = "staging"
+                                self.cur.execute(sqlSL + comment, varMap)
+                                resSL = self.cur.fetchall()
+                                for (lumiBlockNr,) in resSL:
+                                    stagingLB.add(lumiBlockNr)
+                            # stage incoming files into the temporary table
+                            varMap = {}
+                            varMap[":jediTaskID"] = datasetSpec.jediTaskID
+                            varMap[":datasetID"] = datasetSpec.datasetID
+                            self.cur.execute(sqlTD + comment, varMap)
+                            for iPage in range(0, len(uniqueFileKeyList), insertPageSize):
+                                varMaps = []
+                                for uniqueFileKey in uniqueFileKeyList[iPage : iPage + insertPageSize]:
+                                    fileSpec = fileSpecMap[uniqueFileKey]
+                                    varMap = {}
+                                    varMap[":jediTaskID"] = datasetSpec.jediTaskID
+                                    varMap[":datasetID"] = datasetSpec.datasetID
+                                    varMap[":lfn"] = fileSpec.lfn
+                                    varMap[":startEvent"] = fileSpec.startEvent
+                                    varMap[":endEvent"] = fileSpec.endEvent
+                                    varMap[":boundaryID"] = fileSpec.boundaryID
+                                    varMaps.append(varMap)
+                                self.cur.executemany(sqlTI + comment, varMaps)
+                            tmpLog.debug(f"staged {len(uniqueFileKeyList)} files")
+                            # get new files
+                            varMap = {}
+                            varMap[":jediTaskID"] = datasetSpec.jediTaskID
+                            varMap[":datasetID"] = datasetSpec.datasetID
+                            self.cur.execute(sqlTN + comment, varMap)
+                            resTN = self.cur.fetchall()
+                            newFileKeys = set()
+                            for lfn, startEvent, endEvent, boundaryID in resTN:
+                                newFileKeys.add(f"{lfn}.{startEvent}.{endEvent}.{boundaryID}")
+                            tmpLog.debug(f"{len(newFileKeys)} new files")
+                            # get files which are not in the incoming list and could be lost
+                            if not datasetSpec.isSeqNumber():
+                                varMap = {}
+                                varMap[":jediTaskID"] = datasetSpec.jediTaskID
+                                varMap[":datasetID"] = datasetSpec.datasetID
+                                varMap[":status1"] = "ready"
+                                varMap[":status2"] = "pending"
+                                varMap[":status3"] = "staging"
+                                self.cur.execute(sqlTM + comment, varMap)
+                                resTM = self.cur.fetchall()
+                                for (
+                                    fileID,
+                                    lfn,
+                                    status,
+                                    startEvent,
+                                    endEvent,
+                                    boundaryID,
+                                    nEventsInDS,
+                                    attemptNr,
+                                    maxAttempt,
+                                    failedAttempt,
+                                    maxFailure,
+                                ) in resTM:
+                                    uniqueFileKey = f"{lfn}.{startEvent}.{endEvent}.{boundaryID}"
+                                    existingFiles[uniqueFileKey] = {"fileID": fileID, "status": status}
+                                    if startEvent is not None and endEvent is not None:
+                                        existingFiles[uniqueFileKey]["nevents"] = endEvent - startEvent + 1
+                                    elif nEventsInDS is not None:
+                                        existingFiles[uniqueFileKey]["nevents"] = nEventsInDS
+                                    else:
+                                        existingFiles[uniqueFileKey]["nevents"] = None
+                                    existingFiles[uniqueFileKey]["is_failed"] = status == "ready" and (
+                                        (maxAttempt is not None and attemptNr is not None and attemptNr >= maxAttempt)
+                                        or (failedAttempt is not None and maxFailure is not None and failedAttempt >= maxFailure)
+                                    )
+                            # clean up the temporary table
+                            varMap = {}
+                            varMap[":jediTaskID"] = datasetSpec.jediTaskID
+                            varMap[":datasetID"] = datasetSpec.datasetID
+                            self.cur.execute(sqlTD + comment, varMap)
+                        else:
+                            # get existing file list
+                            varMap = {}
+                            varMap[":jediTaskID"] = datasetSpec.jediTaskID
+                            varMap[":datasetID"] = datasetSpec.datasetID
+                            self.cur.execute(sqlCh + comment, varMap)
+                            tmpRes = self.cur.fetchall()
+                            tmpLog.debug(f"{len(tmpRes)} file records in DB")
+                            for (
+                                fileID,
+                                lfn,
+                                status,
+                                startEvent,
+                                endEvent,
+                                boundaryID,
+                                nEventsInDS,
+                                lumiBlockNr,
+                                attemptNr,
+                                maxAttempt,
+                                failedAttempt,
+                                maxFailure,
+                            ) in tmpRes:
+                                statusMap.setdefault(status, 0)
+                                statusMap[status] += 1
+                                uniqueFileKey = f"{lfn}.{startEvent}.{endEvent}.{boundaryID}"
+                                existingFiles[uniqueFileKey] = {"fileID": fileID, "status": status}
+                                if startEvent is not None and endEvent is not None:
+                                    existingFiles[uniqueFileKey]["nevents"] = endEvent - startEvent + 1
+                                elif nEventsInDS is not None:
+                                    existingFiles[uniqueFileKey]["nevents"] = nEventsInDS
                                 else:
-                                    nEventsExist += existingFiles[uniqueFileKey]["nevents"]
+                                    existingFiles[uniqueFileKey]["nevents"] = None
+                                existingFiles[uniqueFileKey]["is_failed"] = False
+                                lostFlag = False
+                                if status == "ready":
+                                    if (maxAttempt is not None and attemptNr is not None and attemptNr >= maxAttempt) or (
+                                        failedAttempt is not None and maxFailure is not None and failedAttempt >= maxFailure
+                                    ):
+                                        nUsed += 1
+                                        existingFiles[uniqueFileKey]["is_failed"] = True
+                                        nFailed += 1
+                                    else:
+                                        nReady += 1
+                                elif status == "pending":
+                                    nPending += 1
+                                    pendingFID.append(fileID)
+                                    # count number of events for scouts with event-level splitting
+                                    if isEventSplit:
+                                        try:
+                                            if nEventsToUseEventSplit < sizePendingEventChunk:
+                                                nEventsToUseEventSplit += endEvent - startEvent + 1
+                                                nFilesToUseEventSplit += 1
+                                        except Exception:
+                                            pass
+                                elif status == "staging":
+                                    nStaging += 1
+                                    stagingLB.add(lumiBlockNr)
+                                elif status not in ["lost", "missing"]:
+                                    nUsed += 1
+                                elif status in ["lost", "missing"]:
+                                    nLost += 1
+                                    lostFlag = True
+                                if existingFiles[uniqueFileKey]["nevents"] is not None:
+                                    if lostFlag:
+                                        nEventsLost += existingFiles[uniqueFileKey]["nevents"]
+                                    else:
+                                        nEventsExist += existingFiles[uniqueFileKey]["nevents"]
+                            nExistingFiles = len(existingFiles)
                         tmStr = "inDB nReady={} nPending={} nUsed={} nUsedInDB={} nLost={} nStaging={} nFailed={}"
                         tmpLog.debug(tmStr.format(nReady, nPending, nUsed, nFilesUsedInDS, nLost, nStaging, nFailed))
                         tmpLog.debug(f"inDB {str(statusMap)}")
@@ -995,7 +1170,10 @@ class DBProxy(OraDBProxy.DBProxy):
                                 if nMaxEvents is not None and totalNumEventsE > nMaxEvents:
                                     break
                             # avoid duplication
-                            if uniqueFileKey in existingFiles:
+                            if newFileKeys is None:
+                                if uniqueFileKey in existingFiles:
+                                    continue
+                            elif uniqueFileKey not in newFileKeys:
                                 continue
                             if inputPreStaging:
                                 # go to staging
@@ -1037,15 +1215,13 @@ class DBProxy(OraDBProxy.DBProxy):
                         newFileIDs.sort()
                         # set fileID
                         tmpLog.debug("set fileIDs")
-                        varMaps = []
                         for fileID, fileSpec in zip(newFileIDs, fileSpecsForInsert):
                             fileSpec.fileID = fileID
-                            # make vars
-                            varMap = fileSpec.valuesMap()
-                            varMaps.append(varMap)
-                        # bulk insert
-                        tmpLog.debug(f"bulk insert {len(varMaps)} files")
-                        self.cur.executemany(sqlIn + comment, varMaps)
+                        # bulk insert page by page to avoid making bind variables for all files at once
+                        tmpLog.debug(f"bulk insert {len(fileSpecsForInsert)} files with pageSize={insertPageSize}")
+                        for iPage in range(0, len(fileSpecsForInsert), insertPageSize):
+                            varMaps = [fileSpec.valuesMap() for fileSpec in fileSpecsForInsert[iPage : iPage + insertPageSize]]
+                            self.cur.executemany(sqlIn + comment, varMaps)
                         # keep original pendingFID
                         orig_pendingFID = set(pendingFID)
                         # respect split rule
@@ -1228,6 +1404,7 @@ class DBProxy(OraDBProxy.DBProxy):
                             nReady += nInsert
                             toActivateFID = orig_pendingFID
                         tmpLog.debug(f"length of pendingFID {len(orig_pendingFID)} -> {len(toActivateFID)}")
+                        varMaps = []
                         for tmpFileID in toActivateFID:
                             if tmpFileID in orig_pendingFID:
                                 varMap = {}
@@ -1235,9 +1412,11 @@ class DBProxy(OraDBProxy.DBProxy):
                                 varMap[":jediTaskID"] = datasetSpec.jediTaskID
                                 varMap[":datasetID"] = datasetSpec.datasetID
                                 varMap[":fileID"] = tmpFileID
-                                self.cur.execute(sqlFU + comment, varMap)
+                                varMaps.append(varMap)
                                 nActivatedPending += 1
                                 nReady += 1
+                        for iPage in range(0, len(varMaps), insertPageSize):
+                            self.cur.executemany(sqlFU + comment, varMaps[iPage : iPage + insertPageSize])
                         tmpLog.debug(f"nReady={nReady} nPending={nPending} nActivatedPending={nActivatedPending} after activation")
                         # lost or recovered files
                         if datasetSpec.isSeqNumber():
@@ -1259,9 +1438,15 @@ class DBProxy(OraDBProxy.DBProxy):
                                     elif fileVarMap["status"] != "ready":
                                         lostInPending = True
                                     varMap["status"] = "lost"
-                                    tmpLog.debug(f"{uniqueFileKey} was lost")
+                                    varMap[":oldStatus"] = fileVarMap["status"]
                                 else:
                                     continue
+                                # count only files updated since the status may have been changed concurrently
+                                self.cur.execute(sqlFL + comment, varMap)
+                                if not self.cur.rowcount:
+                                    tmpLog.debug(f"skip {uniqueFileKey} since status changed from {fileVarMap['status']}")
+                                    continue
+                                tmpLog.debug(f"{uniqueFileKey} was lost")
                                 if varMap["status"] == "ready":
                                     nLost -= 1
                                     nReady += 1
@@ -1275,7 +1460,6 @@ class DBProxy(OraDBProxy.DBProxy):
                                         nEventsExist -= fileVarMap["nevents"]
                                     if fileVarMap["is_failed"]:
                                         nUsed -= 1
-                                self.cur.execute(sqlFU + comment, varMap)
                             tmpLog.debug(
                                 "nReady={} nLost={} nUsed={} nUsedInDB={} nUsedConsistent={} after lost/recovery check".format(
                                     nReady, nLost, nUsed, nFilesUsedInDS, nUsed == nFilesUsedInDS
@@ -1298,7 +1482,7 @@ class DBProxy(OraDBProxy.DBProxy):
                         varMap = {}
                         varMap[":jediTaskID"] = datasetSpec.jediTaskID
                         varMap[":datasetID"] = datasetSpec.datasetID
-                        varMap[":nFiles"] = nInsert + len(existingFiles) - nLost
+                        varMap[":nFiles"] = nInsert + nExistingFiles - nLost
                         if skip_short_output:
                             # remove pending files to avoid wrong task transition due to nFiles>nFilesTobeUsed
                             varMap[":nFiles"] -= nPending - nActivatedPending
@@ -1942,6 +2126,11 @@ class DBProxy(OraDBProxy.DBProxy):
             # commit
             if not self._commit():
                 raise RuntimeError("Commit error")
+            # wake up agents to take care of the task
+            if taskStatus == "assigning":
+                WakeupBus.wakeup("taskbroker")
+            elif taskStatus == "ready":
+                WakeupBus.wakeup("jobgen")
             if not getTaskStatus:
                 return True
             else:
@@ -2857,6 +3046,64 @@ class DBProxy(OraDBProxy.DBProxy):
             self.dumpErrorMessage(tmpLog)
             return False, {}
 
+    # get raw job statistics to make a snapshot shared by throttlers and brokers
+    def getJobStatisticsSnapshot_JEDI(self, vo):
+        comment = " /* JediDBProxy.getJobStatisticsSnapshot_JEDI */"
+        methodName = self.getMethodName(comment)
+        methodName += f" < vo={vo} >"
+        tmpLog = MsgWrapper(logger, methodName)
+        tmpLog.debug("start")
+        # sql to get job statistics per share and resource type
+        sqlSH = "SELECT /*+ RESULT_CACHE */ computingSite, gshare, workqueue_id, resource_type, jobstatus, SUM(njobs) FROM %s WHERE vo=:vo "
+        sqlSH += "GROUP BY computingSite, gshare, workqueue_id, resource_type, jobstatus "
+        shareTables = [f"{jedi_config.db.schemaPANDA}.JOBS_SHARE_STATS", f"{jedi_config.db.schemaPANDA}.JOBSDEFINED_SHARE_STATS"]
+        # sql to get resource work queues
+        sqlRQ = f"SELECT queue_id FROM {jedi_config.db.schemaPANDA}.jedi_work_queue WHERE queue_function=:func "
+        # sql to get job statistics per work queue
+        sqlWQ = "SELECT computingSite, prodSourceLabel, jobStatus, workQueue_ID, COUNT(*) FROM %s WHERE vo=:vo "
+        sqlWQ += "GROUP BY computingSite, prodSourceLabel, jobStatus, workQueue_ID "
+        sqlWQMV = re.sub("COUNT\\(\\*\\)", "SUM(num_of_jobs)", sqlWQ)
+        sqlWQMV = re.sub("SELECT ", "SELECT /*+ RESULT_CACHE */ ", sqlWQMV)
+        # sql to get standby jobs
+        sqlSB = f"SELECT /* use_json_type */ panda_queue, scj.data.catchall FROM {jedi_config.db.schemaJEDI}.schedconfig_json scj "
+        sqlSB += "WHERE scj.data.status=:status "
+        retMap = {"share": [], "resourceQueues": set(), "workQueue": [], "standby": []}
+        try:
+            self.conn.begin()
+            self.cur.arraysize = 10000
+            # job statistics per share and resource type. the table index is kept to follow overwriting in getJobStatisticsByResourceType
+            for tableIdx, table in enumerate(shareTables):
+                self.cur.execute((sqlSH + comment) % table, {":vo": vo})
+                for computingSite, gshare, workqueue_id, resource_type, jobstatus, nJobs in self.cur.fetchall():
+                    retMap["share"].append((tableIdx, computingSite, gshare, workqueue_id, resource_type, jobstatus, nJobs))
+            # resource work queues
+            self.cur.execute(sqlRQ + comment, {":func": "Resource"})
+            for (queue_id,) in self.cur.fetchall():
+                retMap["resourceQueues"].add(queue_id)
+            # job statistics per work queue
+            for table in [f"{jedi_config.db.schemaPANDA}.MV_JOBSACTIVE4_STATS", f"{jedi_config.db.schemaPANDA}.jobsDefined4"]:
+                if table.endswith("_STATS"):
+                    sqlExe = (sqlWQMV + comment) % table
+                else:
+                    sqlExe = (sqlWQ + comment) % table
+                self.cur.execute(sqlExe, {":vo": vo})
+                retMap["workQueue"] += self.cur.fetchall()
+            # standby jobs
+            self.cur.arraysize = 1000
+            self.cur.execute(sqlSB + comment, {":status": "standby"})
+            retMap["standby"] = self.cur.fetchall()
+            # commit
+            if not self._commit():
+                raise RuntimeError("Commit error")
+            tmpLog.debug(f"done with {len(retMap['share'])} share rows and {len(retMap['workQueue'])} work queue rows")
+            return True, retMap
+        except Exception:
+            # roll back
+            self._rollback()
+            # error
+            self.dumpErrorMessage(tmpLog)
+            return False, {}
+
     # generate output files for task, and instantiate template datasets if necessary
     def getOutputFiles_JEDI(
         self,
@@ -3231,6 +3478,91 @@ class DBProxy(OraDBProxy.DBProxy):
             self.dumpErrorMessage(tmpLog)
             return False
 
+    # bulk read attributes of candidate tasks for getTasksToBeProcessed_JEDI. Values depending on datasets are checked under the task lock
+    def bulkReadTaskAttrsForJobGen_JEDI(self, jediTaskIDs, userNames):
+        comment = " /* JediDBProxy.bulkReadTaskAttrsForJobGen_JEDI */"
+        methodName = self.getMethodName(comment)
+        methodName += f" <nTasks={len(jediTaskIDs)}>"
+        tmpLog = MsgWrapper(logger, methodName)
+        tmpLog.debug("start")
+        retMap = {
+            "numAvalanche": {},
+            "dn": {},
+            "jobParamsTemplate": {},
+            "secondaryDatasets": {},
+            "datasetState": {},
+        }
+        if not jediTaskIDs:
+            return retMap
+        try:
+            # bind variables for task IDs
+            taskVarMap = {}
+            taskBinds = []
+            for tmpIdx, tmpTaskID in enumerate(jediTaskIDs):
+                tmpKey = f":jediTaskID{tmpIdx}"
+                taskVarMap[tmpKey] = tmpTaskID
+                taskBinds.append(tmpKey)
+            taskBinds = ",".join(taskBinds)
+            # begin transaction
+            self.conn.begin()
+            self.cur.arraysize = 100000
+            # datasets of the tasks, from which the number of files for avalanche and secondary datasets are derived.
+            # The state of datasets is kept to check later under the task lock if the values are still valid
+            sqlDS = "SELECT jediTaskID,masterID,datasetID,type,status,nFiles,nFilesToBeUsed,nFilesUsed "
+            sqlDS += f"FROM {jedi_config.db.schemaJEDI}.JEDI_Datasets WHERE jediTaskID IN ({taskBinds}) "
+            self.cur.execute(sqlDS + comment, taskVarMap)
+            inputTypes = JediDatasetSpec.getInputTypes()
+            for tmpTaskID, masterID, datasetID, datasetType, datasetStatus, nFiles, nFilesToBeUsed, nFilesUsed in self.cur.fetchall():
+                retMap["datasetState"].setdefault(tmpTaskID, {})
+                retMap["datasetState"][tmpTaskID][datasetID] = (datasetStatus, nFiles, nFilesToBeUsed, nFilesUsed)
+                if masterID is None:
+                    # count the number of files for avalanche in the same way as SUM(nFiles-nFilesToBeUsed)
+                    if datasetType in inputTypes:
+                        retMap["numAvalanche"].setdefault(tmpTaskID, None)
+                        if nFiles is not None and nFilesToBeUsed is not None:
+                            retMap["numAvalanche"][tmpTaskID] = (retMap["numAvalanche"][tmpTaskID] or 0) + nFiles - nFilesToBeUsed
+                else:
+                    # secondary datasets
+                    retMap["secondaryDatasets"].setdefault((tmpTaskID, masterID), [])
+                    retMap["secondaryDatasets"][(tmpTaskID, masterID)].append((datasetID, datasetType, datasetStatus, nFilesToBeUsed, nFilesUsed))
+            # DN for user names
+            if userNames:
+                varMap = {}
+                sqlDN = f"SELECT name,dn FROM {jedi_config.db.schemaMETA}.users WHERE name IN ("
+                for tmpIdx, tmpUserName in enumerate(userNames):
+                    tmpKey = f":name{tmpIdx}"
+                    varMap[tmpKey] = tmpUserName
+                    sqlDN += f"{tmpKey},"
+                sqlDN = sqlDN[:-1]
+                sqlDN += ") "
+                self.cur.execute(sqlDN + comment, varMap)
+                for tmpUserName, tmpDN in self.cur.fetchall():
+                    retMap["dn"][tmpUserName] = tmpDN
+            # job parameter templates
+            sqlJobP = f"SELECT jediTaskID,jobParamsTemplate FROM {jedi_config.db.schemaJEDI}.JEDI_JobParams_Template "
+            sqlJobP += f"WHERE jediTaskID IN ({taskBinds}) "
+            self.cur.execute(sqlJobP + comment, taskVarMap)
+            for tmpTaskID, clobJobP in self.cur:
+                retMap["jobParamsTemplate"][tmpTaskID] = clobJobP
+            # commit
+            if not self._commit():
+                raise RuntimeError("Commit error")
+            tmpLog.debug(
+                "done with nAvalanche={} nDN={} nJobParams={} nSecondary={}".format(
+                    len(retMap["numAvalanche"]),
+                    len(retMap["dn"]),
+                    len(retMap["jobParamsTemplate"]),
+                    len(retMap["secondaryDatasets"]),
+                )
+            )
+            return retMap
+        except Exception:
+            # roll back
+            self._rollback()
+            # error
+            self.dumpErrorMessage(tmpLog)
+            return None
+
     # get tasks to be processed
     def getTasksToBeProcessed_JEDI(
         self,
@@ -3282,6 +3614,12 @@ class DBProxy(OraDBProxy.DBProxy):
         superHighPrioTaskRatio = self.getConfigValue("dbproxy", "SUPER_HIGH_PRIO_TASK_RATIO", "jedi")
         if superHighPrioTaskRatio is None:
             superHighPrioTaskRatio = 30
+        # number of tasks of which attributes are read in bulk, 0 to read them task by task
+        bulkReadWindow = self.getConfigValue("jobgen", "BULK_READ_TASK_WINDOW", "jedi")
+        if bulkReadWindow is None:
+            bulkReadWindow = 100
+        # minimum number of files in master datasets to keep files in a columnar list, None to disable
+        minFilesForColumns = self.getConfigValue("jobgen", "FILE_COLUMNS_MIN_FILES", "jedi")
         # time limit to avoid duplication
         if hasattr(jedi_config.jobgen, "lockInterval"):
             lockInterval = jedi_config.jobgen.lockInterval
@@ -3318,7 +3656,7 @@ class DBProxy(OraDBProxy.DBProxy):
                 varMap[":timeLimit"] = timeLimit
                 varMap[":useJumboLack"] = JediTaskSpec.enum_useJumbo["lack"]
                 sql = "SELECT tabT.jediTaskID,datasetID,currentPriority,nFilesToBeUsed-nFilesUsed,tabD.type,tabT.status,"
-                sql += f"tabT.{attrNameForGroupBy},nFiles,nEvents,nFilesWaiting,tabT.useJumbo "
+                sql += f"tabT.{attrNameForGroupBy},nFiles,nEvents,nFilesWaiting,tabT.useJumbo,tabT.userName "
                 sql += "FROM {0}.JEDI_Tasks tabT,{0}.JEDI_Datasets tabD,{0}.JEDI_AUX_Status_MinTaskID tabA ".format(jedi_config.db.schemaJEDI)
                 sql += "WHERE tabT.status=tabA.status AND tabT.jediTaskID>=tabA.min_jediTaskID AND tabT.jediTaskID=tabD.jediTaskID "
                 sql += "AND tabT.vo=:vo "
@@ -3393,10 +3731,10 @@ class DBProxy(OraDBProxy.DBProxy):
                 varMap = {}
                 if not fullSimulation:
                     sql = "SELECT tabT.jediTaskID,datasetID,currentPriority,nFilesToBeUsed-nFilesUsed,tabD.type,tabT.status,"
-                    sql += f"tabT.{attrNameForGroupBy},nFiles,nEvents,nFilesWaiting,tabT.useJumbo "
+                    sql += f"tabT.{attrNameForGroupBy},nFiles,nEvents,nFilesWaiting,tabT.useJumbo,tabT.userName "
                 else:
                     sql = "SELECT tabT.jediTaskID,datasetID,currentPriority,nFilesToBeUsed,tabD.type,tabT.status,"
-                    sql += f"tabT.{attrNameForGroupBy},nFiles,nEvents,nFilesWaiting,tabT.useJumbo "
+                    sql += f"tabT.{attrNameForGroupBy},nFiles,nEvents,nFilesWaiting,tabT.useJumbo,tabT.userName "
                 sql += f"FROM {jedi_config.db.schemaJEDI}.JEDI_Tasks tabT,{jedi_config.db.schemaJEDI}.JEDI_Datasets tabD "
                 sql += "WHERE tabT.jediTaskID=tabD.jediTaskID AND tabT.jediTaskID IN ("
                 if simTasks:
@@ -3449,6 +3787,7 @@ class DBProxy(OraDBProxy.DBProxy):
             taskPrioMap = {}
             taskUseJumboMap = {}
             taskUserMap = {}
+            taskUserNameMap = {}
             expressAttr = "express_group_by"
             taskMergeMap = {}
             for (
@@ -3463,6 +3802,7 @@ class DBProxy(OraDBProxy.DBProxy):
                 tmpNumInputEvents,
                 tmpNumFilesWaiting,
                 useJumbo,
+                taskUserName,
             ) in resList:
                 tmpLog.debug(
                     "jediTaskID={0} datasetID={1} tmpNumFiles={2} type={3} prio={4} useJumbo={5} nFilesWaiting={6}".format(
@@ -3479,6 +3819,7 @@ class DBProxy(OraDBProxy.DBProxy):
                 taskUseJumboMap[jediTaskID] = useJumbo
                 # task and usermap
                 taskUserMap[jediTaskID] = groupByAttr
+                taskUserNameMap[jediTaskID] = taskUserName
                 # make task-dataset mapping
                 if jediTaskID not in taskDatasetMap:
                     taskDatasetMap[jediTaskID] = []
@@ -3700,12 +4041,19 @@ class DBProxy(OraDBProxy.DBProxy):
             # sql to set frozenTime
             sqlFZT = f"UPDATE {jedi_config.db.schemaJEDI}.JEDI_Tasks SET frozenTime=:frozenTime WHERE jediTaskID=:jediTaskID "
             # sql to check files
-            selCKF = f"SELECT nFilesToBeUsed-nFilesUsed FROM {jedi_config.db.schemaJEDI}.JEDI_Datasets WHERE jediTaskID=:jediTaskID AND datasetID=:datasetID "
+            selCKF = f"SELECT datasetID,nFilesToBeUsed-nFilesUsed FROM {jedi_config.db.schemaJEDI}.JEDI_Datasets "
+            selCKF += "WHERE jediTaskID=:jediTaskID AND masterID IS NULL "
+            # sql to check datasets read in bulk
+            selDSS = f"SELECT datasetID,status,nFiles,nFilesToBeUsed,nFilesUsed FROM {jedi_config.db.schemaJEDI}.JEDI_Datasets "
+            selDSS += "WHERE jediTaskID=:jediTaskID "
             # loop over all tasks
             iTasks = 0
             lockedTasks = []
             lockedByAnother = []
             memoryExceed = False
+            bulkReadTasks = set()
+            bulkReadOK = set()
+            bulkAttrs = {"numAvalanche": {}, "dn": {}, "jobParamsTemplate": {}, "secondaryDatasets": {}, "datasetState": {}}
             for tmpIdxTask, jediTaskID in enumerate(jediTaskIDList):
                 # process only merging if enough jobs are already generated
                 dsWithfakeCoJumbo = set()
@@ -3742,6 +4090,20 @@ class DBProxy(OraDBProxy.DBProxy):
                 if jediTaskID in lockedByAnother:
                     tmpLog.debug(f"skip locked by another jediTaskID={jediTaskID}")
                     continue
+                # read attributes of upcoming tasks in bulk
+                if bulkReadWindow > 0 and jediTaskID not in bulkReadTasks:
+                    tmpTaskIDs = [tmpTaskID for tmpTaskID in jediTaskIDList[tmpIdxTask:] if tmpTaskID not in lockedByAnother][: min(bulkReadWindow, 1000)]
+                    bulkReadTasks.update(tmpTaskIDs)
+                    tmpUserNames = set()
+                    for tmpTaskID in tmpTaskIDs:
+                        if taskUserNameMap[tmpTaskID] and taskUserNameMap[tmpTaskID] not in bulkAttrs["dn"]:
+                            tmpUserNames.add(taskUserNameMap[tmpTaskID])
+                    tmpUserNames = sorted(tmpUserNames)
+                    tmpBulkAttrs = self.bulkReadTaskAttrsForJobGen_JEDI(tmpTaskIDs, tmpUserNames)
+                    if tmpBulkAttrs is not None:
+                        bulkReadOK.update(tmpTaskIDs)
+                        for tmpKey, tmpVal in tmpBulkAttrs.items():
+                            bulkAttrs[tmpKey].update(tmpVal)
                 # begin transaction
                 self.conn.begin()
                 # read task
@@ -3752,11 +4114,11 @@ class DBProxy(OraDBProxy.DBProxy):
                     varMap[":jediTaskID"] = jediTaskID
                     varMap[":statusInDB"] = taskStatusMap[jediTaskID]
                     if jediTaskID not in lockedTasks:
-                        tmpLog.debug(sqlRT + comment + str(varMap))
+                        tmpLog.debug("%s%s%s", sqlRT, comment, varMap)
                         self.cur.execute(sqlRT + comment, varMap)
                     else:
                         varMap[":newLockedBy"] = pid
-                        tmpLog.debug(sqlRL + comment + str(varMap))
+                        tmpLog.debug("%s%s%s", sqlRL, comment, varMap)
                         self.cur.execute(sqlRL + comment, varMap)
                     resRT = self.cur.fetchone()
                     # locked by another
@@ -3773,15 +4135,15 @@ class DBProxy(OraDBProxy.DBProxy):
                     # check nFiles in datasets
                     if simTasks is None and not ignore_lock and not target_tasks:
                         toSkip = False
+                        varMap = {}
+                        varMap[":jediTaskID"] = jediTaskID
+                        self.cur.execute(selCKF + comment, varMap)
+                        newNumFilesMap = dict(self.cur.fetchall())
                         for tmp_item in taskDatasetMap[jediTaskID]:
                             datasetID, tmpNumFiles = tmp_item[:2]
-                            varMap = {}
-                            varMap[":jediTaskID"] = jediTaskID
-                            varMap[":datasetID"] = datasetID
-                            self.cur.execute(selCKF + comment, varMap)
-                            (newNumFiles,) = self.cur.fetchone()
-                            tmpLog.debug(f"jediTaskID={jediTaskID} datasetID={datasetID} nFilesToBeUsed-nFilesUsed old:{tmpNumFiles} new:{newNumFiles}")
-                            if tmpNumFiles > newNumFiles:
+                            newNumFiles = newNumFilesMap.get(datasetID)
+                            tmpLog.debug("jediTaskID=%s datasetID=%s nFilesToBeUsed-nFilesUsed old:%s new:%s", jediTaskID, datasetID, tmpNumFiles, newNumFiles)
+                            if newNumFiles is None or tmpNumFiles > newNumFiles:
                                 tmpLog.debug(f"skip jediTaskID={jediTaskID} since nFilesToBeUsed-nFilesUsed decreased")
                                 lockedByAnother.append(jediTaskID)
                                 toSkip = True
@@ -3804,7 +4166,7 @@ class DBProxy(OraDBProxy.DBProxy):
                         varMap[":newLockedBy"] = pid
                         varMap[":status"] = taskStatusMap[jediTaskID]
                         varMap[":timeLimit"] = timeLimit
-                        tmpLog.debug(sqlLock + comment + str(varMap))
+                        tmpLog.debug("%s%s%s", sqlLock, comment, varMap)
                         self.cur.execute(sqlLock + comment, varMap)
                         nRow = self.cur.rowcount
                         if nRow != 1:
@@ -3829,16 +4191,31 @@ class DBProxy(OraDBProxy.DBProxy):
                     else:
                         # failed with something else
                         raise errType(errValue)
-                # count the number of files for avalanche
-                if not toSkip:
+                # check if datasets were changed after they were read in bulk, and use per-task queries if changed
+                if not toSkip and jediTaskID in bulkReadOK:
                     varMap = {}
                     varMap[":jediTaskID"] = jediTaskID
-                    for tmpType in JediDatasetSpec.getInputTypes():
-                        mapKey = ":type_" + tmpType
-                        varMap[mapKey] = tmpType
-                    tmpLog.debug(sqlAV + comment + str(varMap))
-                    self.cur.execute(sqlAV + comment, varMap)
-                    resAV = self.cur.fetchone()
+                    self.cur.execute(selDSS + comment, varMap)
+                    newDatasetState = {}
+                    for datasetID, datasetStatus, nFiles, nFilesToBeUsed, nFilesUsed in self.cur.fetchall():
+                        newDatasetState[datasetID] = (datasetStatus, nFiles, nFilesToBeUsed, nFilesUsed)
+                    if newDatasetState != bulkAttrs["datasetState"].pop(jediTaskID, {}):
+                        tmpLog.debug(f"discard attributes read in bulk for jediTaskID={jediTaskID} since datasets were changed")
+                        bulkReadOK.discard(jediTaskID)
+                        bulkAttrs["numAvalanche"].pop(jediTaskID, None)
+                # count the number of files for avalanche
+                if not toSkip:
+                    if jediTaskID in bulkAttrs["numAvalanche"]:
+                        resAV = (bulkAttrs["numAvalanche"][jediTaskID],)
+                    else:
+                        varMap = {}
+                        varMap[":jediTaskID"] = jediTaskID
+                        for tmpType in JediDatasetSpec.getInputTypes():
+                            mapKey = ":type_" + tmpType
+                            varMap[mapKey] = tmpType
+                        tmpLog.debug("%s%s%s", sqlAV, comment, varMap)
+                        self.cur.execute(sqlAV + comment, varMap)
+                        resAV = self.cur.fetchone()
                     tmpLog.debug(str(resAV))
                     if resAV is None:
                         # no file info
@@ -3850,11 +4227,14 @@ class DBProxy(OraDBProxy.DBProxy):
                 if not toSkip:
                     # for analysis use DN as userName
                     if origTaskSpec.prodSourceLabel in ["user"]:
-                        varMap = {}
-                        varMap[":name"] = origTaskSpec.userName
-                        tmpLog.debug(sqlDN + comment + str(varMap))
-                        self.cur.execute(sqlDN + comment, varMap)
-                        resDN = self.cur.fetchone()
+                        if origTaskSpec.userName in bulkAttrs["dn"]:
+                            resDN = (bulkAttrs["dn"][origTaskSpec.userName],)
+                        else:
+                            varMap = {}
+                            varMap[":name"] = origTaskSpec.userName
+                            tmpLog.debug("%s%s%s", sqlDN, comment, varMap)
+                            self.cur.execute(sqlDN + comment, varMap)
+                            resDN = self.cur.fetchone()
                         tmpLog.debug(resDN)
                         if resDN is None:
                             # no user info
@@ -3983,7 +4363,8 @@ class DBProxy(OraDBProxy.DBProxy):
                             else:
                                 varMap[":status"] = "ready"
                         self.cur.arraysize = 100000
-                        # figure out if there are different memory requirements in the dataset
+                        # figure out if there are different memory requirements in the dataset. Not read in bulk since ramCount
+                        # of files may be changed without changing datasets
                         if datasetID not in dsWithfakeCoJumbo or useJumbo == JediTaskSpec.enum_useJumbo["lack"]:
                             self.cur.execute(sqlRM + comment, varMap)
                         else:
@@ -4104,7 +4485,23 @@ class DBProxy(OraDBProxy.DBProxy):
                                     tmpLog.debug(f"skip jediTaskID={jediTaskID} datasetID={primaryDatasetID} due to non-merge + enough jobs")
                                     continue
                         # read secondary dataset IDs
-                        if not toSkip:
+                        if not toSkip and jediTaskID in bulkReadOK:
+                            # use secondary datasets read in bulk
+                            if datasetType not in JediDatasetSpec.getMergeProcessTypes():
+                                tmpSecTypes = JediDatasetSpec.getInputTypes()
+                            else:
+                                tmpSecTypes = JediDatasetSpec.getMergeProcessTypes()
+                            for tmpDatasetID, tmpType, tmpStatus, tmpNumFilesToBeUsed, tmpNumFilesUsed in bulkAttrs["secondaryDatasets"].get(
+                                (jediTaskID, datasetID), []
+                            ):
+                                if tmpType not in tmpSecTypes:
+                                    continue
+                                if not fullSimulation and (tmpNumFilesToBeUsed is None or tmpNumFilesUsed is None or tmpNumFilesToBeUsed < tmpNumFilesUsed):
+                                    continue
+                                if simTasks is None and tmpStatus != "ready":
+                                    continue
+                                datasetIDs.append(tmpDatasetID)
+                        elif not toSkip:
                             # sql to get seconday dataset list
                             sqlDS = f"SELECT datasetID FROM {jedi_config.db.schemaJEDI}.JEDI_Datasets WHERE jediTaskID=:jediTaskID "
                             if not fullSimulation:
@@ -4159,6 +4556,8 @@ class DBProxy(OraDBProxy.DBProxy):
                                             datasetSpec.streamName = re.sub("^LOG", "TRN_LOG", datasetSpec.streamName)
                                         # add to InputChunk
                                         if datasetSpec.isMaster():
+                                            if minFilesForColumns is not None and datasetSpec.nFiles is not None and datasetSpec.nFiles >= minFilesForColumns:
+                                                datasetSpec.useFileColumns()
                                             inputChunk.addMasterDS(datasetSpec)
                                         else:
                                             inputChunk.addSecondaryDS(datasetSpec)
@@ -4181,13 +4580,18 @@ class DBProxy(OraDBProxy.DBProxy):
                         # read job params and files
                         if not toSkip:
                             # read template to generate job parameters
-                            varMap = {}
-                            varMap[":jediTaskID"] = jediTaskID
-                            self.cur.execute(sqlJobP + comment, varMap)
-                            for (clobJobP,) in self.cur:
+                            if jediTaskID in bulkReadOK:
+                                clobJobP = bulkAttrs["jobParamsTemplate"].get(jediTaskID)
                                 if clobJobP is not None:
                                     taskSpec.jobParamsTemplate = clobJobP
-                                break
+                            else:
+                                varMap = {}
+                                varMap[":jediTaskID"] = jediTaskID
+                                self.cur.execute(sqlJobP + comment, varMap)
+                                for (clobJobP,) in self.cur:
+                                    if clobJobP is not None:
+                                        taskSpec.jobParamsTemplate = clobJobP
+                                    break
                             # typical number of files
                             typicalNumFilesPerJob = 5
                             if taskSpec.getNumFilesPerJob() is not None:
@@ -4646,6 +5050,8 @@ class DBProxy(OraDBProxy.DBProxy):
             # commit
             if not self._commit():
                 raise RuntimeError("Commit error")
+            # wake up TaskRefiner
+            WakeupBus.wakeup("taskrefine")
 
             tmpLog.debug(f"done new jediTaskID={jediTaskID}")
             return True, jediTaskID
@@ -5961,7 +6367,16 @@ class DBProxy(OraDBProxy.DBProxy):
 
     # get scout job data
     def getScoutJobData_JEDI(
-        self, jediTaskID, useTransaction=False, scoutSuccessRate=None, mergeScout=False, flagJob=False, setPandaID=None, site_mapper=None, task_spec=None
+        self,
+        jediTaskID,
+        useTransaction=False,
+        scoutSuccessRate=None,
+        mergeScout=False,
+        flagJob=False,
+        setPandaID=None,
+        site_mapper=None,
+        task_spec=None,
+        scout_cache=None,
     ):
         comment = " /* JediDBProxy.getScoutJobData_JEDI */"
         methodName = self.getMethodName(comment)
@@ -6037,20 +6452,6 @@ class DBProxy(OraDBProxy.DBProxy):
         sqlCSSR += ") AND tabD.masterID IS NULL "
         sqlCSSR += ") tmp_sub "
 
-        # sql to get normal scout job data from Panda
-        sqlSCDN = "SELECT eventService, jobsetID, PandaID, jobStatus, outputFileBytes, jobMetrics, cpuConsumptionTime, "
-        sqlSCDN += "actualCoreCount, coreCount, startTime, endTime, computingSite, maxPSS, jobMetrics, nEvents, "
-        sqlSCDN += "totRBYTES, totWBYTES, inputFileBytes, memory_leak, memory_leak_x2 "
-        sqlSCDN += f"FROM {jedi_config.db.schemaPANDA}.jobsArchived4 "
-        sqlSCDN += "WHERE PandaID=:pandaID AND jobStatus=:jobStatus AND jediTaskID=:jediTaskID "
-        sqlSCDN += "UNION "
-        sqlSCDN += "SELECT eventService, jobsetID, PandaID, jobStatus, outputFileBytes, jobMetrics, cpuConsumptionTime, "
-        sqlSCDN += "actualCoreCount, coreCount, startTime, endTime, computingSite, maxPSS, jobMetrics, nEvents, "
-        sqlSCDN += "totRBYTES, totWBYTES, inputFileBytes, memory_leak, memory_leak_x2 "
-        sqlSCDN += f"FROM {jedi_config.db.schemaPANDAARCH}.jobsArchived "
-        sqlSCDN += "WHERE PandaID=:pandaID AND jobStatus=:jobStatus AND jediTaskID=:jediTaskID "
-        sqlSCDN += "AND modificationTime>(CURRENT_DATE-30) "
-
         # sql to get ES scout job data from Panda
         sqlSCDE = "SELECT eventService, jobsetID, PandaID, jobStatus, outputFileBytes, jobMetrics, cpuConsumptionTime, "
         sqlSCDE += "actualCoreCount, coreCount, startTime, endTime, computingSite, maxPSS, jobMetrics, nEvents, "
@@ -6071,10 +6472,28 @@ class DBProxy(OraDBProxy.DBProxy):
         sqlLIB += "tabD.jediTaskID=tabF.jediTaskID AND tabD.jediTaskID=:jediTaskID AND tabF.status=:status AND "
         sqlLIB += "tabD.type=:type AND tabF.type=:type "
 
+        # sql to get normal scout job data from Panda
+        sqlSCDB = "SELECT eventService, jobsetID, PandaID, jobStatus, outputFileBytes, jobMetrics, cpuConsumptionTime, "
+        sqlSCDB += "actualCoreCount, coreCount, startTime, endTime, computingSite, maxPSS, jobMetrics, nEvents, "
+        sqlSCDB += "totRBYTES, totWBYTES, inputFileBytes, memory_leak, memory_leak_x2 "
+        sqlSCDB += f"FROM {jedi_config.db.schemaPANDA}.jobsArchived4 "
+        sqlSCDB += "WHERE PandaID IN ({0}) AND jobStatus=:jobStatus AND jediTaskID=:jediTaskID "
+        sqlSCDB += "UNION "
+        sqlSCDB += "SELECT eventService, jobsetID, PandaID, jobStatus, outputFileBytes, jobMetrics, cpuConsumptionTime, "
+        sqlSCDB += "actualCoreCount, coreCount, startTime, endTime, computingSite, maxPSS, jobMetrics, nEvents, "
+        sqlSCDB += "totRBYTES, totWBYTES, inputFileBytes, memory_leak, memory_leak_x2 "
+        sqlSCDB += f"FROM {jedi_config.db.schemaPANDAARCH}.jobsArchived "
+        sqlSCDB += "WHERE PandaID IN ({0}) AND jobStatus=:jobStatus AND jediTaskID=:jediTaskID "
+        sqlSCDB += "AND modificationTime>(CURRENT_DATE-30) "
+
         # get core power
         sqlCore = f"SELECT /* use_json_type */ scj.data.corepower FROM {jedi_config.db.schemaJEDI}.schedconfig_json scj "
         sqlCore += "WHERE panda_queue=:site "
 
+        # get core power in bulk
+        sqlCoreB = f"SELECT /* use_json_type */ scj.panda_queue, scj.data.corepower FROM {jedi_config.db.schemaJEDI}.schedconfig_json scj "
+        sqlCoreB += "WHERE panda_queue IN ({0}) "
+
         # get num of new jobs
         sqlNumJobs = f"SELECT SUM(nFiles),SUM(nFilesFinished),SUM(nFilesUsed) FROM {jedi_config.db.schemaJEDI}.JEDI_Datasets "
         sqlNumJobs += "WHERE jediTaskID=:jediTaskID AND type IN ("
@@ -6266,7 +6685,11 @@ class DBProxy(OraDBProxy.DBProxy):
         inFSizeList = []
         inFSizeMap = {}
         inEventsMap = {}
-        corePowerMap = {}
+        # core power is shared among tasks when scout data of many tasks are evaluated
+        if scout_cache is not None:
+            corePowerMap = scout_cache.setdefault("corePowerMap", {})
+        else:
+            corePowerMap = {}
         jMetricsMap = {}
         execTimeMap = {}
         siteMap = {}
@@ -6334,15 +6757,35 @@ class DBProxy(OraDBProxy.DBProxy):
         loopPandaIDs = list(inFSizeMap.keys())
         random.shuffle(loopPandaIDs)
         loopPandaIDs = loopPandaIDs[:1000]
-        for loopPandaID in loopPandaIDs:
-            totalFSize = inFSizeMap[loopPandaID]
-            # get job data
+        # get job data in bulk
+        jobDataMap = {}
+        nChunk = 200
+        for iChunk in range(0, len(loopPandaIDs), nChunk):
             varMap = {}
-            varMap[":pandaID"] = loopPandaID
             varMap[":jobStatus"] = "finished"
             varMap[":jediTaskID"] = jediTaskID
-            self.cur.execute(sqlSCDN + comment, varMap)
-            resData = self.cur.fetchone()
+            for tmpIdx, tmpPandaID in enumerate(loopPandaIDs[iChunk : iChunk + nChunk]):
+                varMap[f":pandaID{tmpIdx}"] = tmpPandaID
+            tmpKeys = ",".join(k for k in varMap if k.startswith(":pandaID"))
+            self.cur.execute(sqlSCDB.format(tmpKeys) + comment, varMap)
+            for tmpData in self.cur.fetchall():
+                jobDataMap.setdefault(tmpData[2], tmpData)
+        # get core power of sites in bulk
+        tmpSites = sorted({tmpData[11] for tmpData in jobDataMap.values() if tmpData[11] not in corePowerMap})
+        for iChunk in range(0, len(tmpSites), nChunk):
+            varMap = {}
+            for tmpIdx, tmpSite in enumerate(tmpSites[iChunk : iChunk + nChunk]):
+                varMap[f":site{tmpIdx}"] = tmpSite
+                corePowerMap[tmpSite] = None
+            self.cur.execute(sqlCoreB.format(",".join(varMap.keys())) + comment, varMap)
+            for tmpSite, corePower in self.cur.fetchall():
+                if corePower is not None:
+                    corePower = float(corePower)
+                corePowerMap[tmpSite] = corePower
+        for loopPandaID in loopPandaIDs:
+            totalFSize = inFSizeMap[loopPandaID]
+            # get job data
+            resData = jobDataMap.get(loopPandaID)
             if resData is not None:
                 eventServiceJob = resData[0]
                 jobsetID = resData[1]
@@ -6779,8 +7222,40 @@ class DBProxy(OraDBProxy.DBProxy):
         tmpLog.debug(f"succeeded={scoutSucceeded} data={str(returnMap)} extra={str(extraInfo)} tag={jobTagMap}")
         return scoutSucceeded, returnMap, extraInfo
 
-    # set scout job data
-    def setScoutJobData_JEDI(self, taskSpec, useCommit, useExhausted, site_mapper):
+    # get scout success rate to evaluate scouts and the min rate to send tasks to exhausted
+    def getScoutSuccessRateForExhausted(self, taskSpec):
+        # send tasks to exhausted when task.successRate > rate >= thr
+        minNumOkScoutsForExhausted = self.getConfigValue("dbproxy", f"SCOUT_MIN_OK_RATE_EXHAUSTED_{taskSpec.prodSourceLabel}", "jedi")
+        scoutSuccessRate = taskSpec.getScoutSuccessRate()
+        if scoutSuccessRate and minNumOkScoutsForExhausted:
+            if scoutSuccessRate > minNumOkScoutsForExhausted * 10:
+                scoutSuccessRate = minNumOkScoutsForExhausted * 10
+            else:
+                minNumOkScoutsForExhausted = None
+        return scoutSuccessRate, minNumOkScoutsForExhausted
+
+    # update scout job data of tasks with array updates
+    def updateScoutJobDataOfTasks_JEDI(self, scoutDataMap, comment, tmpLog):
+        # group tasks by attributes to update
+        varMapsPerKeys = {}
+        for jediTaskID, scoutData in scoutDataMap.items():
+            scoutKeys = tuple(sorted(scoutKey for scoutKey in scoutData if scoutKey not in ["newNG"]))
+            if not scoutKeys:
+                continue
+            varMap = {}
+            varMap[":jediTaskID"] = jediTaskID
+            for scoutKey in scoutKeys:
+                varMap[f":{scoutKey}"] = scoutData[scoutKey]
+            varMapsPerKeys.setdefault(scoutKeys, []).append(varMap)
+        for scoutKeys, varMaps in varMapsPerKeys.items():
+            sqlTSD = f"UPDATE {jedi_config.db.schemaJEDI}.JEDI_Tasks SET "
+            sqlTSD += ",".join(f"{scoutKey}=:{scoutKey}" for scoutKey in scoutKeys)
+            sqlTSD += " WHERE jediTaskID=:jediTaskID "
+            tmpLog.debug(f"{sqlTSD}{comment} for {len(varMaps)} tasks")
+            self.cur.executemany(sqlTSD + comment, varMaps)
+
+    # set scout job data. scout_result is given when scout job data were already evaluated and set to the task
+    def setScoutJobData_JEDI(self, taskSpec, useCommit, useExhausted, site_mapper, scout_result=None):
         comment = " /* JediDBProxy.setScoutJobData_JEDI */"
         methodName = self.getMethodName(comment)
         jediTaskID = taskSpec.jediTaskID
@@ -6793,36 +7268,22 @@ class DBProxy(OraDBProxy.DBProxy):
             ramThr = 4
         ramThr *= 1024
         # send tasks to exhausted when task.successRate > rate >= thr
-        minNumOkScoutsForExhausted = self.getConfigValue("dbproxy", f"SCOUT_MIN_OK_RATE_EXHAUSTED_{taskSpec.prodSourceLabel}", "jedi")
-        scoutSuccessRate = taskSpec.getScoutSuccessRate()
-        if scoutSuccessRate and minNumOkScoutsForExhausted:
-            if scoutSuccessRate > minNumOkScoutsForExhausted * 10:
-                scoutSuccessRate = minNumOkScoutsForExhausted * 10
-            else:
-                minNumOkScoutsForExhausted = None
+        scoutSuccessRate, minNumOkScoutsForExhausted = self.getScoutSuccessRateForExhausted(taskSpec)
         if useCommit:
             # begin transaction
             self.conn.begin()
         # set average job data
-        scoutSucceeded, scoutData, extraInfo = self.getScoutJobData_JEDI(
-            jediTaskID, scoutSuccessRate=scoutSuccessRate, flagJob=True, site_mapper=site_mapper, task_spec=taskSpec
-        )
+        if scout_result is not None:
+            scoutSucceeded, scoutData, extraInfo = scout_result
+        else:
+            scoutSucceeded, scoutData, extraInfo = self.getScoutJobData_JEDI(
+                jediTaskID, scoutSuccessRate=scoutSuccessRate, flagJob=True, site_mapper=site_mapper, task_spec=taskSpec
+            )
         # sql to update task data
         if scoutData != {}:
-            varMap = {}
-            varMap[":jediTaskID"] = jediTaskID
-            sqlTSD = f"UPDATE {jedi_config.db.schemaJEDI}.JEDI_Tasks SET "
-            for scoutKey, scoutVal in scoutData.items():
-                # skip new NG
-                if scoutKey in ["newNG"]:
-                    continue
-                tmpScoutKey = f":{scoutKey}"
-                varMap[tmpScoutKey] = scoutVal
-                sqlTSD += f"{scoutKey}={tmpScoutKey},"
-            sqlTSD = sqlTSD[:-1]
-            sqlTSD += " WHERE jediTaskID=:jediTaskID "
-            tmpLog.debug(sqlTSD + comment + str(varMap))
-            self.cur.execute(sqlTSD + comment, varMap)
+            # set scout job data unless already set
+            if scout_result is None:
+                self.updateScoutJobDataOfTasks_JEDI({jediTaskID: scoutData}, comment, tmpLog)
             # update NG
             if "newNG" in scoutData:
                 taskSpec.setSplitRule("nGBPerJob", str(scoutData["newNG"]))
@@ -7108,36 +7569,59 @@ class DBProxy(OraDBProxy.DBProxy):
             # commit
             if not self._commit():
                 raise RuntimeError("Commit error")
-            nTasks = 0
+            # get tasks
+            taskSpecList = []
             for (jediTaskID,) in resList:
-                # get task
                 tmpStat, taskSpec = self.getTaskWithID_JEDI(jediTaskID, False)
                 if tmpStat:
-                    tmpLog.debug(f"set jediTaskID={jediTaskID}")
-                    self.setScoutJobData_JEDI(taskSpec, True, True, site_mapper)
-                    # update exhausted task status
-                    if taskSpec.status == "exhausted":
-                        # begin transaction
-                        self.conn.begin()
-                        # update task status
-                        varMap = {}
-                        varMap[":jediTaskID"] = taskSpec.jediTaskID
-                        varMap[":newStatus"] = taskSpec.status
-                        varMap[":oldStatus"] = "running"
-                        varMap[":errorDialog"] = taskSpec.errorDialog
-                        self.cur.execute(sqlTU + comment, varMap)
-                        nRow = self.cur.rowcount
-                        # update DEFT task
-                        if nRow > 0:
-                            self.setDeftStatus_JEDI(taskSpec.jediTaskID, taskSpec.status)
-                            self.setSuperStatus_JEDI(taskSpec.jediTaskID, taskSpec.status)
-                            self.record_task_status_change(taskSpec.jediTaskID)
-                            self.push_task_status_message(taskSpec, taskSpec.jediTaskID, taskSpec.status)
-                        # commit
-                        if not self._commit():
-                            raise RuntimeError("Commit error")
-                        tmpLog.debug(f"set status={taskSpec.status} to jediTaskID={taskSpec.jediTaskID} with {nRow} since {taskSpec.errorDialog}")
-                    nTasks += 1
+                    taskSpecList.append(taskSpec)
+            # evaluate scout job data of all tasks sharing core power of sites
+            scoutCache = {}
+            scoutResultMap = {}
+            for taskSpec in taskSpecList:
+                scoutSuccessRate, _ = self.getScoutSuccessRateForExhausted(taskSpec)
+                scoutResultMap[taskSpec.jediTaskID] = self.getScoutJobData_JEDI(
+                    taskSpec.jediTaskID,
+                    useTransaction=True,
+                    scoutSuccessRate=scoutSuccessRate,
+                    flagJob=True,
+                    site_mapper=site_mapper,
+                    task_spec=taskSpec,
+                    scout_cache=scoutCache,
+                )
+            # set scout job data to tasks at once
+            self.conn.begin()
+            self.updateScoutJobDataOfTasks_JEDI({k: v[1] for k, v in scoutResultMap.items()}, comment, tmpLog)
+            if not self._commit():
+                raise RuntimeError("Commit error")
+            nTasks = 0
+            for taskSpec in taskSpecList:
+                jediTaskID = taskSpec.jediTaskID
+                tmpLog.debug(f"set jediTaskID={jediTaskID}")
+                self.setScoutJobData_JEDI(taskSpec, True, True, site_mapper, scout_result=scoutResultMap[jediTaskID])
+                # update exhausted task status
+                if taskSpec.status == "exhausted":
+                    # begin transaction
+                    self.conn.begin()
+                    # update task status
+                    varMap = {}
+                    varMap[":jediTaskID"] = taskSpec.jediTaskID
+                    varMap[":newStatus"] = taskSpec.status
+                    varMap[":oldStatus"] = "running"
+                    varMap[":errorDialog"] = taskSpec.errorDialog
+                    self.cur.execute(sqlTU + comment, varMap)
+                    nRow = self.cur.rowcount
+                    # update DEFT task
+                    if nRow > 0:
+                        self.setDeftStatus_JEDI(taskSpec.jediTaskID, taskSpec.status)
+                        self.setSuperStatus_JEDI(taskSpec.jediTaskID, taskSpec.status)
+                        self.record_task_status_change(taskSpec.jediTaskID)
+                        self.push_task_status_message(taskSpec, taskSpec.jediTaskID, taskSpec.status)
+                    # commit
+                    if not self._commit():
+                        raise RuntimeError("Commit error")
+                    tmpLog.debug(f"set status={taskSpec.status} to jediTaskID={taskSpec.jediTaskID} with {nRow} since {taskSpec.errorDialog}")
+                nTasks += 1
             # return
             tmpLog.debug(f"done with {nTasks} tasks")
             return True
@@ -12080,6 +12564,39 @@ class DBProxy(OraDBProxy.DBProxy):
 
         return networkMap
 
+    # get the network metrics between all sources and given destinations
+    def getNetworkMetricsMatrix_JEDI(self, keyList, dstList):
+        comment = " /* JediDBProxy.getNetworkMetricsMatrix_JEDI */"
+        methodName = self.getMethodName(comment)
+        tmpLog = MsgWrapper(logger, methodName)
+        tmpLog.debug("start")
+        try:
+            latest_validity = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(minutes=60)
+            varMap = {":latest_validity": latest_validity}
+            for i, key in enumerate(keyList):
+                varMap[f":key{i}"] = key
+            key_bindings = ",".join(f":key{i}" for i in range(len(keyList)))
+            for i, dst in enumerate(dstList):
+                varMap[f":dst{i}"] = dst
+            dst_bindings = ",".join(f":dst{i}" for i in range(len(dstList)))
+            sql = f"SELECT src, dst, key, value FROM {jedi_config.db.schemaJEDI}.network_matrix_kv "
+            sql += f"WHERE key IN ({key_bindings}) AND dst IN ({dst_bindings}) AND ts > :latest_validity "
+            self.conn.begin()
+            self.cur.arraysize = 100000
+            self.cur.execute(sql + comment, varMap)
+            resList = self.cur.fetchall()
+            # commit
+            if not self._commit():
+                raise RuntimeError("Commit error")
+            tmpLog.debug(f"got {len(resList)} values")
+            return resList
+        except Exception:
+            # roll back
+            self._rollback()
+            # error
+            self.dumpErrorMessage(tmpLog)
+            return None
+
     def getBackloggedNuclei(self):
         """
         Return a list of nuclei, which has built up transfer backlog. We will consider a nucleus as backlogged,
@@ -13895,6 +14412,11 @@ class DBProxy(OraDBProxy.DBProxy):
         methodName += f" < msg_type={msg_type} jediTaskID={jedi_task_id} >"
         tmpLog = MsgWrapper(logger, methodName)
         tmpLog.debug("start")
+        # wake up local agents as well since messages may not be consumed or MQ may be unavailable
+        if msg_type == "jedi_contents_feeder":
+            WakeupBus.wakeup("confeeder")
+        elif msg_type == "jedi_job_generator":
+            WakeupBus.wakeup("jobgen")
         # send task status messages to mq
         try:
             now_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
@@ -14378,6 +14900,107 @@ class DBProxy(OraDBProxy.DBProxy):
             # error
             self.dumpErrorMessage(tmpLog)
 
+    # get cache only if changed from version for compact payloads, or from last_update otherwise
+    def getCacheIfChanged_JEDI(self, main_key, sub_key, last_update, version=None):
+        comment = " /* JediDBProxy.getCacheIfChanged_JEDI */"
+        methodName = self.getMethodName(comment)
+        # defaults
+        if sub_key is None:
+            sub_key = "default"
+        methodName += f" <main_key={main_key} sub_key={sub_key}>"
+        tmpLog = MsgWrapper(logger, methodName)
+        tmpLog.debug("start")
+        try:
+            # sql to check with the header of payload which contains the version
+            sqlC = f"SELECT last_update,SUBSTR(data,1,32) FROM {jedi_config.db.schemaJEDI}.Cache WHERE main_key=:main_key AND sub_key=:sub_key "
+            # sql to get
+            sqlG = f"SELECT {JediCacheSpec.columnNames()} FROM {jedi_config.db.schemaJEDI}.Cache WHERE main_key=:main_key AND sub_key=:sub_key "
+            varMap = {}
+            varMap[":main_key"] = main_key
+            varMap[":sub_key"] = sub_key
+            # check without fetching data
+            self.cur.execute(sqlC + comment, varMap)
+            resC = self.cur.fetchone()
+            if resC is None:
+                tmpLog.debug("got nothing, skipped")
+                return True, None
+            # versions of compact payloads increase with every write while last_update has a resolution of seconds
+            current_version = getCacheDataVersion(resC[1])
+            if version is not None and current_version > 0:
+                unchanged = current_version == version
+            else:
+                unchanged = last_update is not None and resC[0] == last_update
+            if unchanged:
+                tmpLog.debug("unchanged")
+                return False, None
+            self.cur.execute(sqlG + comment, varMap)
+            resG = self.cur.fetchone()
+            if resG is None:
+                tmpLog.debug("deleted, skipped")
+                return True, None
+            cache_spec = JediCacheSpec()
+            cache_spec.pack(resG)
+            tmpLog.debug("got cache, done")
+            return True, cache_spec
+        except Exception:
+            # roll back
+            self._rollback()
+            # error
+            self.dumpErrorMessage(tmpLog)
+            return None, None
+
+    # update cache only if the version of the current data is expected_version
+    def compareAndSwapCache_JEDI(self, main_key, sub_key, data, expected_version):
+        comment = " /* JediDBProxy.compareAndSwapCache_JEDI */"
+        methodName = self.getMethodName(comment)
+        # defaults
+        if sub_key is None:
+            sub_key = "default"
+        methodName += f" <main_key={main_key} sub_key={sub_key} expected_version={expected_version}>"
+        tmpLog = MsgWrapper(logger, methodName)
+        tmpLog.debug("start")
+        try:
+            retVal = False
+            # sql to lock
+            sqlC = f"SELECT data FROM {jedi_config.db.schemaJEDI}.Cache WHERE main_key=:main_key AND sub_key=:sub_key FOR UPDATE "
+            # sql to insert
+            sqlI = f"INSERT INTO {jedi_config.db.schemaJEDI}.Cache ({JediCacheSpec.columnNames()}) {JediCacheSpec.bindValuesExpression()} "
+            # sql to update
+            sqlU = f"UPDATE {jedi_config.db.schemaJEDI}.Cache SET {JediCacheSpec.bindUpdateChangesExpression()} WHERE main_key=:main_key AND sub_key=:sub_key "
+            # start transaction
+            self.conn.begin()
+            varMap = {}
+            varMap[":main_key"] = main_key
+            varMap[":sub_key"] = sub_key
+            self.cur.execute(sqlC + comment, varMap)
+            resC = self.cur.fetchone()
+            last_update = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            if resC is None:
+                current_version = None
+            else:
+                current_version = getCacheDataVersion(resC[0])
+            if current_version != expected_version:
+                tmpLog.debug(f"conflict with version={current_version}")
+            else:
+                varMap[":data"] = data
+                varMap[":last_update"] = last_update
+                if resC is None:
+                    self.cur.execute(sqlI + comment, varMap)
+                else:
+                    self.cur.execute(sqlU + comment, varMap)
+                retVal = True
+            # commit
+            if not self._commit():
+                raise RuntimeError("Commit error")
+            tmpLog.debug(f"done with {retVal}")
+            return retVal
+        except Exception:
+            # roll back
+            self._rollback()
+            # error
+            self.dumpErrorMessage(tmpLog)
+            return False
+
     # extend lifetime of sandbox file
     def extendSandboxLifetime_JEDI(self, jedi_taskid, file_name):
         comment = " /* JediDBProxy.extendSandboxLifetime_JEDI */"
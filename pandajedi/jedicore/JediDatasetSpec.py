@@ -8,15 +8,17 @@ import re
 
 from pandajedi.jediconfig import jedi_config
 
+from .JediFileColumns import JediFileColumns
+
 
 class JediDatasetSpec(object):
     def __str__(self):
         sb = []
-        for key in self.__dict__:
+        for key in self._stateAttrs:
             if key == "Files":
-                sb.append(f"{key}='{len(self.__dict__[key])}'")
+                sb.append(f"{key}='{len(self.Files)}'")
             else:
-                sb.append(f"{key}='{self.__dict__[key]}'")
+                sb.append(f"{key}='{getattr(self, key, None)}'")
         return ", ".join(sb)
 
     def __repr__(self):
@@ -64,6 +66,12 @@ class JediDatasetSpec(object):
     _zeroAttrs = ()
     # attributes to force update
     _forceUpdateAttrs = ("lockedBy", "lockedTime")
+    # bit of each attribute in the bitset of changed attributes
+    _attrBits = {attr: 1 << i for i, attr in enumerate(_attributes)}
+    # attributes in pickle
+    _stateAttrs = _attributes + ("Files", "_changedBits", "distributed")
+    # slots instead of __dict__ to save memory
+    __slots__ = _stateAttrs
     # mapping between sequence and attr
     _seqAttrMap = {"datasetID": f"{jedi_config.db.schemaJEDI}.JEDI_DATASETS_ID_SEQ.nextval"}
     # token for attributes
@@ -91,8 +99,8 @@ class JediDatasetSpec(object):
             object.__setattr__(self, attr, None)
         # file list
         object.__setattr__(self, "Files", [])
-        # map of changed attributes
-        object.__setattr__(self, "_changedAttrs", {})
+        # bitset of changed attributes
+        object.__setattr__(self, "_changedBits", 0)
         # distributed
         object.__setattr__(self, "distributed", False)
 
@@ -101,34 +109,53 @@ class JediDatasetSpec(object):
         oldVal = getattr(self, name)
         object.__setattr__(self, name, value)
         newVal = getattr(self, name)
-        # collect changed attributes
-        if oldVal != newVal or name in self._forceUpdateAttrs:
-            self._changedAttrs[name] = value
+        # collect changed attributes. Checked with the name first not to compare file lists element-wise
+        if name in self._attrBits and (oldVal != newVal or name in self._forceUpdateAttrs):
+            object.__setattr__(self, "_changedBits", self._changedBits | self._attrBits[name])
+
+    # get state for pickle and copy since slots cannot be restored through __setattr__
+    def __getstate__(self):
+        return tuple(getattr(self, attr, None) for attr in self._stateAttrs)
+
+    # set state
+    def __setstate__(self, state):
+        for attr, val in zip(self._stateAttrs, state):
+            object.__setattr__(self, attr, val)
 
     # add File to files list
     def addFile(self, fileSpec):
         # append
         self.Files.append(fileSpec)
 
+    # keep files in a columnar list to save memory
+    def useFileColumns(self):
+        if not isinstance(self.Files, JediFileColumns):
+            object.__setattr__(self, "Files", JediFileColumns(self.Files))
+
+    # check if files are kept in a columnar list
+    def hasFileColumns(self):
+        return isinstance(self.Files, JediFileColumns)
+
     # reset changed attribute list
     def resetChangedList(self):
-        object.__setattr__(self, "_changedAttrs", {})
+        object.__setattr__(self, "_changedBits", 0)
 
     # force update
     def forceUpdate(self, name):
-        if name in self._attributes:
-            self._changedAttrs[name] = getattr(self, name)
+        if name in self._attrBits:
+            object.__setattr__(self, "_changedBits", self._changedBits | self._attrBits[name])
 
     # return map of values
     def valuesMap(self, useSeq=False, onlyChanged=False):
         ret = {}
-        for attr in self._attributes:
+        changedBits = self._changedBits
+        for attr, bit in self._attrBits.items():
             # use sequence
             if useSeq and attr in self._seqAttrMap:
                 continue
             # only changed attributes
             if onlyChanged:
-                if attr not in self._changedAttrs:
+                if not changedBits & bit:
                     continue
             val = getattr(self, attr)
             if val is None:
@@ -141,9 +168,7 @@ class JediDatasetSpec(object):
 
     # pack tuple into FileSpec
     def pack(self, values):
-        for i in range(len(self._attributes)):
-            attr = self._attributes[i]
-            val = values[i]
+        for attr, val in zip(self._attributes, values):
             object.__setattr__(self, attr, val)
 
     # return column names for INSERT
@@ -175,8 +200,9 @@ class JediDatasetSpec(object):
     # return an expression of bind variables for UPDATE to update only changed attributes
     def bindUpdateChangesExpression(self):
         ret = ""
-        for attr in self._attributes:
-            if attr in self._changedAttrs:
+        changedBits = self._changedBits
+        for attr, bit in self._attrBits.items():
+            if changedBits & bit:
                 ret += f"{attr}=:{attr},"
         ret = ret[:-1]
         ret += " "
@@ -548,4 +574,9 @@ class JediDatasetSpec(object):
 
     # sort files by old PandaIDs and move files with no PandaIDs to the end
     def sort_files_by_panda_ids(self):
-        self.Files = sorted([f for f in self.Files if f.PandaID is not None], key=lambda x: x.PandaID) + [f for f in self.Files if f.PandaID is None]
+        if self.hasFileColumns():
+            # reorder rows in place not to make FileSpecs
+            self.Files.sortByPandaID()
+            return
+        sortedFiles = sorted([f for f in self.Files if f.PandaID is not None], key=lambda x: x.PandaID) + [f for f in self.Files if f.PandaID is None]
+        self.Files = sortedFiles
@@ -0,0 +1,205 @@
+"""
+columnar file list for JEDI
+
+"""
+
+import numpy as np
+
+from .JediFileSpec import JediFileSpec
+
+
+# lightweight read-only view of a file in a columnar file list
+class JediFileView(object):
+    __slots__ = ("columns", "index")
+
+    def __init__(self, columns, index):
+        self.columns = columns
+        self.index = index
+
+    # get the full FileSpec
+    def getFileSpec(self, cached=True):
+        if cached:
+            return self.columns[self.index]
+        return self.columns.makeFileSpec(self.index)
+
+    # helpers shared with FileSpec
+    getEffectiveNumEvents = JediFileSpec.getEffectiveNumEvents
+    extractFieldsStr = JediFileSpec.extractFieldsStr
+
+
+# install read-only accessors for attributes
+def _install_view_attr(attr_index):
+    return property(lambda self: self.columns.getValue(self.index, attr_index))
+
+
+for _attr_index, _attr in enumerate(JediFileSpec._attributes):
+    setattr(JediFileView, _attr, _install_view_attr(_attr_index))
+
+
+# list of files stored as rows and numeric columns instead of FileSpec objects
+class JediFileColumns(object):
+    # numeric columns available as arrays
+    numericColumns = (
+        "fileID",
+        "fsize",
+        "nEvents",
+        "startEvent",
+        "endEvent",
+        "boundaryID",
+        "lumiBlockNr",
+        "ramCount",
+    )
+    # index of attributes in rows
+    _attrIndex = {attr: i for i, attr in enumerate(JediFileSpec._attributes)}
+
+    # constructor
+    def __init__(self, files=None):
+        # raw values of files in the order of JediFileSpec._attributes
+        self.rows = []
+        # numeric arrays built on demand
+        self._arrays = {}
+        # FileSpecs materialized so far. They are kept to share changes
+        self._fileSpecs = {}
+        # indices of FileSpecs changed after their rows were written
+        self._dirty = set()
+        if files is not None:
+            self.extend(files)
+
+    # add a file
+    def append(self, fileSpec):
+        if isinstance(fileSpec, JediFileView):
+            self.rows.append(fileSpec.columns.getRow(fileSpec.index))
+        else:
+            self.rows.append(tuple(getattr(fileSpec, attr) for attr in JediFileSpec._attributes))
+        self._arrays = {}
+
+    # add files
+    def extend(self, files):
+        for fileSpec in files:
+            self.append(fileSpec)
+
+    # add a file with raw values
+    def appendRow(self, values):
+        self.rows.append(tuple(values))
+        self._arrays = {}
+
+    # mark a materialized FileSpec as changed. Called by JediFileSpec
+    def setDirty(self, index):
+        self._dirty.add(index)
+
+    # write back a change of a materialized FileSpec to the row
+    def syncRow(self, index):
+        fileSpec = self._fileSpecs[index]
+        self.rows[index] = tuple(getattr(fileSpec, attr) for attr in JediFileSpec._attributes)
+        self._dirty.discard(index)
+        self._arrays = {}
+
+    # write back changes of materialized FileSpecs to rows
+    def syncRows(self):
+        for index in list(self._dirty):
+            self.syncRow(index)
+
+    # get raw values of a file
+    def getRow(self, index):
+        if index in self._dirty:
+            self.syncRow(index)
+        return self.rows[index]
+
+    # get a raw value
+    def getValue(self, index, attrIndex):
+        fileSpec = self._fileSpecs.get(index)
+        if fileSpec is not None:
+            return getattr(fileSpec, JediFileSpec._attributes[attrIndex])
+        return self.rows[index][attrIndex]
+
+    # make a new FileSpec
+    def makeFileSpec(self, index):
+        return JediFileSpec.fromTuple(self.getRow(index))
+
+    # get shared FileSpec
+    def getFileSpec(self, index):
+        if index < 0:
+            index += len(self.rows)
+        fileSpec = self._fileSpecs.get(index)
+        if fileSpec is None:
+            fileSpec = JediFileSpec.fromTuple(self.rows[index])
+            object.__setattr__(fileSpec, "_columnsRef", (self, index))
+            self._fileSpecs[index] = fileSpec
+        return fileSpec
+
+    # sort files by PandaIDs and move files with no PandaIDs to the end, as JediDatasetSpec.sort_files_by_panda_ids
+    def sortByPandaID(self):
+        self.syncRows()
+        pandaIdx = self._attrIndex["PandaID"]
+        rows = self.rows
+        order = sorted((i for i, row in enumerate(rows) if row[pandaIdx] is not None), key=lambda i: rows[i][pandaIdx])
+        order += [i for i, row in enumerate(rows) if row[pandaIdx] is None]
+        newIndex = [0] * len(order)
+        for index, oldIndex in enumerate(order):
+            newIndex[oldIndex] = index
+        self.rows = [rows[i] for i in order]
+        fileSpecs = {}
+        for oldIndex, fileSpec in self._fileSpecs.items():
+            fileSpecs[newIndex[oldIndex]] = fileSpec
+            object.__setattr__(fileSpec, "_columnsRef", (self, newIndex[oldIndex]))
+        self._fileSpecs = fileSpecs
+        self._arrays = {}
+
+    # get views
+    def getViews(self, start=0, stop=None):
+        return [JediFileView(self, i) for i in range(*slice(start, stop).indices(len(self.rows)))]
+
+    # get a numeric column. None is converted to 0 and can be checked with getMask
+    def getColumn(self, attr):
+        self.syncRows()
+        if attr not in self._arrays:
+            attrIndex = self._attrIndex[attr]
+            values = [row[attrIndex] for row in self.rows]
+            mask = np.fromiter((v is not None for v in values), dtype=bool, count=len(values))
+            array = np.fromiter((0 if v is None else v for v in values), dtype=np.int64, count=len(values))
+            self._arrays[attr] = (array, mask)
+        return self._arrays[attr][0]
+
+    # get mask of non-null values in a numeric column
+    def getMask(self, attr):
+        self.getColumn(attr)
+        return self._arrays[attr][1]
+
+    # get fileIDs
+    def getFileIDs(self):
+        return self.getColumn("fileID")
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.getFileSpec(i) for i in range(*index.indices(len(self.rows)))]
+        return self.getFileSpec(index)
+
+    def __iter__(self):
+        for i in range(len(self.rows)):
+            yield self.getFileSpec(i)
+
+    def __eq__(self, other):
+        if isinstance(other, JediFileColumns):
+            self.syncRows()
+            other.syncRows()
+            return self.rows == other.rows
+        if isinstance(other, list):
+            return len(other) == len(self.rows) and list(self) == other
+        return NotImplemented
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    # drop cached objects when pickled
+    def __getstate__(self):
+        self.syncRows()
+        return {"rows": self.rows}
+
+    def __setstate__(self, state):
+        self.rows = state["rows"]
+        self._arrays = {}
+        self._fileSpecs = {}
+        self._dirty = set()
@@ -45,45 +45,63 @@ class JediFileSpec(object):
     _zeroAttrs = ("fsize", "attemptNr", "failedAttempt", "ramCount")
     # mapping between sequence and attr
     _seqAttrMap = {"fileID": "ATLAS_PANDA.JEDI_DATASET_CONT_FILEID_SEQ.nextval"}
+    # bit of each attribute in the bitset of changed attributes
+    _attrBits = {attr: 1 << i for i, attr in enumerate(_attributes)}
+    # attributes in pickle
+    _stateAttrs = _attributes + ("_changedBits", "locality", "sourceName")
+    # slots instead of __dict__ to save memory. _columnsRef is (columnar list, index) when made by JediFileColumns
+    __slots__ = _stateAttrs + ("_columnsRef",)
 
     # constructor
     def __init__(self):
         # install attributes
-        for attr in self._attributes:
-            if attr in self._zeroAttrs:
-                object.__setattr__(self, attr, 0)
-            else:
-                object.__setattr__(self, attr, None)
-        # map of changed attributes
-        object.__setattr__(self, "_changedAttrs", {})
+        for setter, val in zip(self._attrSetters, self._defaultValues):
+            setter(self, val)
+        # bitset of changed attributes
+        object.__setattr__(self, "_changedBits", 0)
         # locality
         object.__setattr__(self, "locality", {})
         # source name
         object.__setattr__(self, "sourceName", None)
+        # columnar list
+        object.__setattr__(self, "_columnsRef", None)
 
     # override __setattr__ to collecte the changed attributes
     def __setattr__(self, name, value):
         oldVal = getattr(self, name)
         object.__setattr__(self, name, value)
-        newVal = getattr(self, name)
         # collect changed attributes
-        if oldVal != newVal:
-            self._changedAttrs[name] = value
+        if name in self._attrBits and oldVal != value:
+            object.__setattr__(self, "_changedBits", self._changedBits | self._attrBits[name])
+            # tell the columnar list to write back the change
+            if self._columnsRef is not None:
+                self._columnsRef[0].setDirty(self._columnsRef[1])
+
+    # get state for pickle and copy since slots cannot be restored through __setattr__
+    def __getstate__(self):
+        return tuple(getattr(self, attr) for attr in self._stateAttrs)
+
+    # set state
+    def __setstate__(self, state):
+        for attr, val in zip(self._stateAttrs, state):
+            object.__setattr__(self, attr, val)
+        object.__setattr__(self, "_columnsRef", None)
 
     # reset changed attribute list
     def resetChangedList(self):
-        object.__setattr__(self, "_changedAttrs", {})
+        object.__setattr__(self, "_changedBits", 0)
 
     # return map of values
     def valuesMap(self, useSeq=False, onlyChanged=False):
         ret = {}
-        for attr in self._attributes:
+        changedBits = self._changedBits
+        for attr, bit in self._attrBits.items():
             # use sequence
             if useSeq and attr in self._seqAttrMap:
                 continue
             # only changed attributes
             if onlyChanged:
-                if attr not in self._changedAttrs:
+                if not changedBits & bit:
                     continue
             val = getattr(self, attr)
             if val is None:
@@ -96,10 +114,21 @@ class JediFileSpec(object):
 
     # pack tuple into FileSpec
     def pack(self, values):
-        for i in range(len(self._attributes)):
-            attr = self._attributes[i]
-            val = values[i]
-            object.__setattr__(self, attr, val)
+        for setter, val in zip(self._attrSetters, values):
+            setter(self, val)
+
+    # make FileSpec from tuple, skipping default values and change tracking
+    def fromTuple(cls, values):
+        fileSpec = cls.__new__(cls)
+        for setter, val in zip(cls._attrSetters, values):
+            setter(fileSpec, val)
+        object.__setattr__(fileSpec, "_changedBits", 0)
+        object.__setattr__(fileSpec, "locality", {})
+        object.__setattr__(fileSpec, "sourceName", None)
+        object.__setattr__(fileSpec, "_columnsRef", None)
+        return fileSpec
+
+    fromTuple = classmethod(fromTuple)
 
     # return column names for INSERT
     def columnNames(cls, useSeq=False, defaultVales=None, skipDefaultAttr=False):
@@ -145,8 +174,9 @@ class JediFileSpec(object):
     # return an expression of bind variables for UPDATE to update only changed attributes
     def bindUpdateChangesExpression(self):
         ret = ""
-        for attr in self._attributes:
-            if attr in self._changedAttrs:
+        changedBits = self._changedBits
+        for attr, bit in self._attrBits.items():
+            if changedBits & bit:
                 ret += f"{attr}=:{attr},"
         ret = ret[:-1]
         ret += " "
@@ -240,3 +270,8 @@ class JediFileSpec(object):
         except Exception:
             pass
         return tmpFieldStr
+
+
+# setters of slots and default values to install attributes quickly
+JediFileSpec._attrSetters = tuple(getattr(JediFileSpec, attr).__set__ for attr in JediFileSpec._attributes)
+JediFileSpec._defaultValues = tuple(0 if attr in JediFileSpec._zeroAttrs else None for attr in JediFileSpec._attributes)
@@ -1,6 +1,9 @@
 # DB API for JEDI
 
+import collections
 import datetime
+import hashlib
+import pickle
 
 # logger
 from pandacommon.pandalogger.PandaLogger import PandaLogger
@@ -28,8 +31,18 @@ class JediTaskBuffer(TaskBuffer.TaskBuffer, CommandReceiveInterface):
         self.siteMapper = SiteMapper(self)
         # update time for site mapper
         self.dateTimeForSM = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        # versions of site mapper, work queue map, and resource types to transfer them only when they are updated
+        self.siteMapperForVersion = None
+        self.versionForSM = None
+        self.snapshotsForSM = collections.OrderedDict()
+        self.updateTimeForWQVersion = None
+        self.versionForWQ = None
         logger.debug("__init__")
 
+    # make version of an object
+    def makeVersion(self, obj):
+        return hashlib.md5(pickle.dumps(obj)).hexdigest()
+
     # query an SQL
     def querySQL(self, sql, varMap, arraySize=1000):
         with self.proxyPool.get() as proxy:
@@ -43,11 +56,67 @@ class JediTaskBuffer(TaskBuffer.TaskBuffer, CommandReceiveInterface):
             self.dateTimeForSM = timeNow
         return self.siteMapper
 
+    # get SiteMapper with version. The caller gets only site specs which were changed since the version it has
+    def getSiteMapperWithVersion(self, version=None):
+        siteMapper = self.getSiteMapper()
+        # make a snapshot when site mapper is refreshed
+        if siteMapper is not self.siteMapperForVersion:
+            baseAttrs = dict(siteMapper.__dict__)
+            siteSpecList = baseAttrs.pop("siteSpecList")
+            snapshot = {
+                "base": self.makeVersion(baseAttrs),
+                "sites": {siteName: self.makeVersion(siteSpec) for siteName, siteSpec in siteSpecList.items()},
+            }
+            self.versionForSM = self.makeVersion((snapshot["base"], sorted(snapshot["sites"].items())))
+            self.siteMapperForVersion = siteMapper
+            # keep recent snapshots
+            self.snapshotsForSM[self.versionForSM] = snapshot
+            self.snapshotsForSM.move_to_end(self.versionForSM)
+            while len(self.snapshotsForSM) > 10:
+                self.snapshotsForSM.popitem(last=False)
+        # unchanged
+        if version == self.versionForSM:
+            return self.versionForSM, "none", None
+        # changed only in site specs
+        snapshot = self.snapshotsForSM[self.versionForSM]
+        oldSnapshot = self.snapshotsForSM.get(version)
+        if oldSnapshot is not None and oldSnapshot["base"] == snapshot["base"]:
+            changedSites = {}
+            for siteName, siteVersion in snapshot["sites"].items():
+                if oldSnapshot["sites"].get(siteName) != siteVersion:
+                    changedSites[siteName] = siteMapper.siteSpecList[siteName]
+            removedSites = [siteName for siteName in oldSnapshot["sites"] if siteName not in snapshot["sites"]]
+            return self.versionForSM, "delta", (changedSites, removedSites)
+        # full
+        return self.versionForSM, "full", siteMapper
+
     # get work queue map
     def getWorkQueueMap(self):
         with self.proxyPool.get() as proxy:
             return proxy.getWorkQueueMap()
 
+    # get work queue map with version. The map is returned only when it is different from the version the caller has
+    def getWorkQueueMapWithVersion(self, version=None):
+        with self.proxyPool.get() as proxy:
+            workQueueMap = proxy.getWorkQueueMap()
+            updateTime = proxy.updateTimeForWorkQueue
+        if self.versionForWQ is None or updateTime != self.updateTimeForWQVersion:
+            self.versionForWQ = self.makeVersion(workQueueMap)
+            self.updateTimeForWQVersion = updateTime
+        if version == self.versionForWQ:
+            return self.versionForWQ, None
+        return self.versionForWQ, workQueueMap
+
+    # get resource types with version. The list is returned only when it is different from the version the caller has
+    def getResourceTypesWithVersion(self, version=None):
+        resourceTypes = self.load_resource_types()
+        if not resourceTypes:
+            return None, resourceTypes
+        newVersion = self.makeVersion(resourceTypes)
+        if version == newVersion:
+            return newVersion, None
+        return newVersion, resourceTypes
+
     # get the list of datasets to feed contents to DB
     def getDatasetsToFeedContents_JEDI(self, vo=None, prodSourceLabel=None, task_id=None):
         with self.proxyPool.get() as proxy:
@@ -300,6 +369,11 @@ class JediTaskBuffer(TaskBuffer.TaskBuffer, CommandReceiveInterface):
         with self.proxyPool.get() as proxy:
             return proxy.getJobStatisticsByResourceTypeSite(workqueue)
 
+    # get raw job statistics to make a snapshot
+    def getJobStatisticsSnapshot_JEDI(self, vo):
+        with self.proxyPool.get() as proxy:
+            return proxy.getJobStatisticsSnapshot_JEDI(vo)
+
     # generate output files for task
     def getOutputFiles_JEDI(
         self,
@@ -729,6 +803,11 @@ class JediTaskBuffer(TaskBuffer.TaskBuffer, CommandReceiveInterface):
         with self.proxyPool.get() as proxy:
             return proxy.getNetworkMetrics(dst, keyList)
 
+    # get network metrics between all sources and destinations
+    def getNetworkMetricsMatrix_JEDI(self, keyList, dstList):
+        with self.proxyPool.get() as proxy:
+            return proxy.getNetworkMetricsMatrix_JEDI(keyList, dstList)
+
     # get nuclei that have built up a long backlog
     def getBackloggedNuclei(self):
         with self.proxyPool.get() as proxy:
@@ -885,6 +964,16 @@ class JediTaskBuffer(TaskBuffer.TaskBuffer, CommandReceiveInterface):
         with self.proxyPool.get() as proxy:
             return proxy.getCache_JEDI(main_key, sub_key)
 
+    # get cache if changed
+    def getCacheIfChanged_JEDI(self, main_key, sub_key, last_update, version=None):
+        with self.proxyPool.get() as proxy:
+            return proxy.getCacheIfChanged_JEDI(main_key, sub_key, last_update, version)
+
+    # update cache with compare-and-swap
+    def compareAndSwapCache_JEDI(self, main_key, sub_key, data, expected_version):
+        with self.proxyPool.get() as proxy:
+            return proxy.compareAndSwapCache_JEDI(main_key, sub_key, data, expected_version)
+
     # get cache
     def extendSandboxLifetime_JEDI(self, jedi_taskid, file_name):
         with self.proxyPool.get() as proxy:
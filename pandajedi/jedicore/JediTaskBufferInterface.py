@@ -1,3 +1,6 @@
+import copy
+import threading
+
 from pandajedi.jediconfig import jedi_config
 from pandajedi.jedicore import Interaction
 
@@ -7,6 +10,14 @@ class JediTaskBufferInterface:
     # constructor
     def __init__(self):
         self.interface = None
+        # local copies of configuration which are updated only when they are changed in DB
+        self.lock = threading.Lock()
+        self.siteMapper = None
+        self.siteMapperVersion = None
+        self.workQueueMap = None
+        self.workQueueMapVersion = None
+        self.resourceTypes = None
+        self.resourceTypesVersion = None
 
     # setup interface
     def setupInterface(self):
@@ -21,6 +32,44 @@ class JediTaskBufferInterface:
     def __getattr__(self, attrName):
         return getattr(self.interface, attrName)
 
+    # get SiteMapper. Only site specs changed since the last call are transferred
+    def getSiteMapper(self):
+        with self.lock:
+            version, mode, data = self.interface.getSiteMapperWithVersion(self.siteMapperVersion)
+            if mode == "full":
+                self.siteMapper = data
+            elif mode == "delta":
+                changedSites, removedSites = data
+                # make new object not to change the one being used by other threads
+                siteMapper = copy.copy(self.siteMapper)
+                siteMapper.siteSpecList = dict(self.siteMapper.siteSpecList)
+                siteMapper.siteSpecList.update(changedSites)
+                for siteName in removedSites:
+                    siteMapper.siteSpecList.pop(siteName, None)
+                self.siteMapper = siteMapper
+            self.siteMapperVersion = version
+            return self.siteMapper
+
+    # get work queue map. The map is transferred only when it is updated
+    def getWorkQueueMap(self):
+        with self.lock:
+            version, workQueueMap = self.interface.getWorkQueueMapWithVersion(self.workQueueMapVersion)
+            if workQueueMap is not None:
+                self.workQueueMap = workQueueMap
+            self.workQueueMapVersion = version
+            return self.workQueueMap
+
+    # get resource types. The list is transferred only when it is updated
+    def load_resource_types(self):
+        with self.lock:
+            version, resourceTypes = self.interface.getResourceTypesWithVersion(self.resourceTypesVersion)
+            if version is None:
+                return resourceTypes
+            if resourceTypes is not None:
+                self.resourceTypes = resourceTypes
+            self.resourceTypesVersion = version
+            return self.resourceTypes
+
 
 if __name__ == "__main__":
 
@@ -1,6 +1,8 @@
+import collections
 import enum
 import math
 import re
+import types
 
 from pandaserver.taskbuffer import task_split_rules
 
@@ -96,6 +98,12 @@ class JediTaskSpec(object):
     )
     # attributes which have 0 by default
     _zeroAttrs = ()
+    # bit of each attribute in the bitset of changed attributes
+    _attrBits = {attr: 1 << i for i, attr in enumerate(attributes)}
+    # attributes in pickle. Parsed split rules are not pickled since they are rebuilt on demand
+    _stateAttrs = attributes + ("_changedBits", "jobParamsTemplate", "datasetSpecList", "origErrorDialog", "origUserName")
+    # slots instead of __dict__ to save memory
+    __slots__ = _stateAttrs + ("_parsedSplitRule",)
     # attributes to force update
     _forceUpdateAttrs = ("lockedBy", "lockedTime")
     # mapping between sequence and attr
@@ -161,8 +169,8 @@ class JediTaskSpec(object):
                 object.__setattr__(self, attr, 0)
             else:
                 object.__setattr__(self, attr, None)
-        # map of changed attributes
-        object.__setattr__(self, "_changedAttrs", {})
+        # bitset of changed attributes
+        object.__setattr__(self, "_changedBits", 0)
         # template to generate job parameters
         object.__setattr__(self, "jobParamsTemplate", "")
         # associated datasets
@@ -171,6 +179,8 @@ class JediTaskSpec(object):
         object.__setattr__(self, "origErrorDialog", None)
         # original user name
         object.__setattr__(self, "origUserName", None)
+        # parsed split rules
+        object.__setattr__(self, "_parsedSplitRule", None)
 
     # override __setattr__ to collect the changed attributes
     def __setattr__(self, name, value):
@@ -182,9 +192,22 @@ class JediTaskSpec(object):
             value = value[: self._limitLength[name]]
         object.__setattr__(self, name, value)
         newVal = getattr(self, name)
+        # invalidate parsed split rules
+        if name == "splitRule":
+            object.__setattr__(self, "_parsedSplitRule", None)
         # collect changed attributes
-        if oldVal != newVal or name in self._forceUpdateAttrs:
-            self._changedAttrs[name] = value
+        if (oldVal != newVal or name in self._forceUpdateAttrs) and name in self._attrBits:
+            object.__setattr__(self, "_changedBits", self._changedBits | self._attrBits[name])
+
+    # get state for pickle and copy since slots cannot be restored through __setattr__
+    def __getstate__(self):
+        return tuple(getattr(self, attr, None) for attr in self._stateAttrs)
+
+    # set state
+    def __setstate__(self, state):
+        for attr, val in zip(self._stateAttrs, state):
+            object.__setattr__(self, attr, val)
+        object.__setattr__(self, "_parsedSplitRule", None)
 
     # copy old attributes
     def copyAttributes(self, oldTaskSpec):
@@ -199,14 +222,12 @@ class JediTaskSpec(object):
 
     # reset changed attribute list
     def resetChangedList(self):
-        object.__setattr__(self, "_changedAttrs", {})
+        object.__setattr__(self, "_changedBits", 0)
 
     # reset changed attribute
     def resetChangedAttr(self, name):
-        try:
-            del self._changedAttrs[name]
-        except Exception:
-            pass
+        if name in self._attrBits:
+            object.__setattr__(self, "_changedBits", self._changedBits & ~self._attrBits[name])
 
     # reserve old attributes
     def reserve_old_attributes(self):
@@ -215,19 +236,20 @@ class JediTaskSpec(object):
 
     # force update
     def forceUpdate(self, name):
-        if name in self.attributes:
-            self._changedAttrs[name] = getattr(self, name)
+        if name in self._attrBits:
+            object.__setattr__(self, "_changedBits", self._changedBits | self._attrBits[name])
 
     # return map of values
     def valuesMap(self, useSeq=False, onlyChanged=False):
         ret = {}
-        for attr in self.attributes:
+        changedBits = self._changedBits
+        for attr, bit in self._attrBits.items():
             # use sequence
             if useSeq and attr in self._seqAttrMap:
                 continue
             # only changed attributes
             if onlyChanged:
-                if attr not in self._changedAttrs:
+                if not changedBits & bit:
                     continue
             val = getattr(self, attr)
             if val is None:
@@ -244,10 +266,9 @@ class JediTaskSpec(object):
 
     # pack tuple into TaskSpec
     def pack(self, values):
-        for i in range(len(self.attributes)):
-            attr = self.attributes[i]
-            val = values[i]
+        for attr, val in zip(self.attributes, values):
             object.__setattr__(self, attr, val)
+        object.__setattr__(self, "_parsedSplitRule", None)
 
     # return column names for INSERT
     def columnNames(cls, prefix=None):
@@ -278,26 +299,36 @@ class JediTaskSpec(object):
     # return an expression of bind variables for UPDATE to update only changed attributes
     def bindUpdateChangesExpression(self):
         ret = ""
-        for attr in self.attributes:
-            if attr in self._changedAttrs:
+        changedBits = self._changedBits
+        for attr, bit in self._attrBits.items():
+            if changedBits & bit:
                 ret += f"{attr}=:{attr},"
         ret = ret[:-1]
         ret += " "
         return ret
 
+    # get split rules parsed once until splitRule is changed
+    def get_split_rules(self):
+        parsed = getattr(self, "_parsedSplitRule", None)
+        if parsed is None:
+            parsed = parse_split_rule(self.splitRule)
+            object.__setattr__(self, "_parsedSplitRule", parsed)
+        return parsed
+
+    # get numeric value of split rule
+    def get_split_rule_value(self, key):
+        return self.get_split_rules().numbers.get(self.splitRuleToken[key])
+
     # check split rule
     def check_split_rule(self, key):
-        if self.splitRule is not None:
-            if re.search(self.splitRuleToken[key] + r"=(\d+)", self.splitRule):
-                return True
-        return False
+        return self.splitRuleToken[key] in self.get_split_rules().numbers
 
     # get the max size per job if defined
     def getMaxSizePerJob(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nGBPerJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                nGBPerJob = int(tmpMatch.group(1)) * 1024 * 1024 * 1024
+            tmpValue = self.get_split_rule_value("nGBPerJob")
+            if tmpValue is not None:
+                nGBPerJob = int(tmpValue) * 1024 * 1024 * 1024
                 return nGBPerJob
         return None
 
@@ -308,18 +339,18 @@ class JediTaskSpec(object):
     # get the max size per merge job if defined
     def getMaxSizePerMergeJob(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nGBPerMergeJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                nGBPerJob = int(tmpMatch.group(1)) * 1024 * 1024 * 1024
+            tmpValue = self.get_split_rule_value("nGBPerMergeJob")
+            if tmpValue is not None:
+                nGBPerJob = int(tmpValue) * 1024 * 1024 * 1024
                 return nGBPerJob
         return None
 
     # get the maxnumber of files per job if defined
     def getMaxNumFilesPerJob(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nMaxFilesPerJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("nMaxFilesPerJob")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     # set MaxNumFilesPerJob
@@ -329,17 +360,17 @@ class JediTaskSpec(object):
     # get the maxnumber of files per merge job if defined
     def getMaxNumFilesPerMergeJob(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nMaxFilesPerMergeJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("nMaxFilesPerMergeJob")
+            if tmpValue is not None:
+                return int(tmpValue)
         return 50
 
     # get the number of events per merge job if defined
     def getNumEventsPerMergeJob(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nEventsPerMergeJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("nEventsPerMergeJob")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     # check if using jumbo
@@ -351,17 +382,17 @@ class JediTaskSpec(object):
     # get the number of jumbo jobs if defined
     def getNumJumboJobs(self):
         if self.usingJumboJobs() and self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nJumboJobs"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("nJumboJobs")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     # get the max number of jumbo jobs per site if defined
     def getMaxJumboPerSite(self):
         if self.usingJumboJobs() and self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["maxJumboPerSite"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("maxJumboPerSite")
+            if tmpValue is not None:
+                return int(tmpValue)
         return 1
 
     # get the number of sites per job
@@ -369,17 +400,17 @@ class JediTaskSpec(object):
         if not self.useEventService():
             return 1
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nSitesPerJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("nSitesPerJob")
+            if tmpValue is not None:
+                return int(tmpValue)
         return 1
 
     # get the number of files per job if defined
     def getNumFilesPerJob(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nFilesPerJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                n = int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("nFilesPerJob")
+            if tmpValue is not None:
+                n = int(tmpValue)
                 if self.dynamicNumEvents():
                     inn = self.get_num_events_per_input()
                     dyn = self.get_min_granularity()
@@ -395,41 +426,41 @@ class JediTaskSpec(object):
     # get the number of files per merge job if defined
     def getNumFilesPerMergeJob(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nFilesPerMergeJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("nFilesPerMergeJob")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     # get the number of events per job if defined
     def getNumEventsPerJob(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nEventsPerJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("nEventsPerJob")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     # get offset for random seed
     def getRndmSeedOffset(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["randomSeed"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("randomSeed")
+            if tmpValue is not None:
+                return int(tmpValue)
         return 0
 
     # get offset for first event
     def getFirstEventOffset(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["firstEvent"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("firstEvent")
+            if tmpValue is not None:
+                return int(tmpValue)
         return 0
 
     # grouping with boundaryID
     def useGroupWithBoundaryID(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["groupBoundaryID"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                gbID = int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("groupBoundaryID")
+            if tmpValue is not None:
+                gbID = int(tmpValue)
                 # 1 : input - can split,    output - free
                 # 2 : input - can split,    output - mapped with provenanceID
                 # 3 : input - cannot split, output - free
@@ -467,9 +498,9 @@ class JediTaskSpec(object):
     # get job cloning type
     def getJobCloningType(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["useJobCloning"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return tmpMatch.group(1)
+            tmpValue = self.get_split_rule_value("useJobCloning")
+            if tmpValue is not None:
+                return tmpValue
         return ""
 
     # reuse secondary on demand
@@ -520,8 +551,8 @@ class JediTaskSpec(object):
     # use local IO
     def useLocalIO(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["useLocalIO"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None and int(tmpMatch.group(1)):
+            tmpValue = self.get_split_rule_value("useLocalIO")
+            if tmpValue is not None and int(tmpValue):
                 return True
         return False
 
@@ -537,9 +568,9 @@ class JediTaskSpec(object):
     # get the number of events per worker for Event Service
     def getNumEventsPerWorker(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nEventsPerWorker"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("nEventsPerWorker")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     # get the number of event service consumers
@@ -547,9 +578,9 @@ class JediTaskSpec(object):
         if not self.useEventService():
             return None
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nEsConsumers"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("nEsConsumers")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     # disable automatic retry
@@ -580,8 +611,8 @@ class JediTaskSpec(object):
     # use preprocessing
     def usePrePro(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["usePrePro"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None and tmpMatch.group(1) == self.enum_toPreProcess:
+            tmpValue = self.get_split_rule_value("usePrePro")
+            if tmpValue is not None and tmpValue == self.enum_toPreProcess:
                 return True
         return False
 
@@ -605,8 +636,8 @@ class JediTaskSpec(object):
     # check preprocessed
     def checkPreProcessed(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["usePrePro"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None and tmpMatch.group(1) == self.enum_preProcessed:
+            tmpValue = self.get_split_rule_value("usePrePro")
+            if tmpValue is not None and tmpValue == self.enum_preProcessed:
                 return True
         return False
 
@@ -823,7 +854,7 @@ class JediTaskSpec(object):
     # use scout
     def useScout(self, splitRule=None):
         if splitRule is None:
-            splitRule = self.splitRule
+            return self.get_split_rule_value("useScout") == self.enum_useScout
         if splitRule is not None:
             tmpMatch = re.search(self.splitRuleToken["useScout"] + "=(\d+)", splitRule)
             if tmpMatch is not None and tmpMatch.group(1) == self.enum_useScout:
@@ -845,8 +876,8 @@ class JediTaskSpec(object):
     # post scout
     def isPostScout(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["useScout"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None and tmpMatch.group(1) == self.enum_postScout:
+            tmpValue = self.get_split_rule_value("useScout")
+            if tmpValue is not None and tmpValue == self.enum_postScout:
                 return True
         return False
 
@@ -856,10 +887,9 @@ class JediTaskSpec(object):
 
     # input prestaging
     def inputPreStaging(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["inputPreStaging"] + "=" + self.enum_inputPreStaging["use"], self.splitRule)
-            if tmpMatch is not None:
-                return True
+        tmpValue = self.get_split_rule_value("inputPreStaging")
+        if tmpValue is not None and tmpValue.startswith(self.enum_inputPreStaging["use"]):
+            return True
         return False
 
     # set DDM backend
@@ -903,9 +933,9 @@ class JediTaskSpec(object):
     # get required success rate for scout jobs
     def getScoutSuccessRate(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["scoutSuccessRate"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("scoutSuccessRate")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     # get T1 weight
@@ -939,8 +969,8 @@ class JediTaskSpec(object):
     # check if datasets should be registered
     def toRegisterDatasets(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["registerDatasets"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None and tmpMatch.group(1) == self.enum_toRegisterDS:
+            tmpValue = self.get_split_rule_value("registerDatasets")
+            if tmpValue is not None and tmpValue == self.enum_toRegisterDS:
                 return True
         return False
 
@@ -955,17 +985,17 @@ class JediTaskSpec(object):
     # get the max number of attempts for ES events
     def getMaxAttemptES(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["maxAttemptES"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("maxAttemptES")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     # get the max number of attempts for ES jobs
     def getMaxAttemptEsJob(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["maxAttemptEsJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("maxAttemptEsJob")
+            if tmpValue is not None:
+                return int(tmpValue)
         return self.getMaxAttemptES()
 
     # check attribute length
@@ -1004,17 +1034,17 @@ class JediTaskSpec(object):
     # get IP connectivity
     def getIpConnectivity(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["ipConnectivity"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return self.enum_ipConnectivity[tmpMatch.group(1)]
+            tmpValue = self.get_split_rule_value("ipConnectivity")
+            if tmpValue is not None:
+                return self.enum_ipConnectivity[tmpValue]
         return None
 
     # get IP connectivity
     def getIpStack(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["ipStack"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return self.enum_ipStack[tmpMatch.group(1)]
+            tmpValue = self.get_split_rule_value("ipStack")
+            if tmpValue is not None:
+                return self.enum_ipStack[tmpValue]
         return None
 
     # use HS06 for walltime estimation
@@ -1063,17 +1093,17 @@ class JediTaskSpec(object):
     # dynamic number of events
     def dynamicNumEvents(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["dynamicNumEvents"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
+            tmpValue = self.get_split_rule_value("dynamicNumEvents")
+            if tmpValue is not None:
                 return True
         return False
 
     # get min granularity for dynamic number of events
     def get_min_granularity(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["dynamicNumEvents"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("dynamicNumEvents")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     # set alternative stage-out
@@ -1087,9 +1117,9 @@ class JediTaskSpec(object):
     # get alternative stage-out
     def getAltStageOut(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["altStageOut"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return self.enum_altStageOut[tmpMatch.group(1)]
+            tmpValue = self.get_split_rule_value("altStageOut")
+            if tmpValue is not None:
+                return self.enum_altStageOut[tmpValue]
         return None
 
     # allow WAN for input access
@@ -1107,9 +1137,9 @@ class JediTaskSpec(object):
     # check if LAN is used for input access
     def allowInputLAN(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["allowInputLAN"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return self.enum_inputLAN[tmpMatch.group(1)]
+            tmpValue = self.get_split_rule_value("allowInputLAN")
+            if tmpValue is not None:
+                return self.enum_inputLAN[tmpValue]
         return None
 
     # put log files to OS
@@ -1165,25 +1195,25 @@ class JediTaskSpec(object):
     # get num of input chunks to wait
     def nChunksToWait(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nChunksToWait"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("nChunksToWait")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     # get max walltime
     def getMaxWalltime(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["maxWalltime"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1)) * 60 * 60
+            tmpValue = self.get_split_rule_value("maxWalltime")
+            if tmpValue is not None:
+                return int(tmpValue) * 60 * 60
         return None
 
     # get target size of the largest output to reset NG
     def getTgtMaxOutputForNG(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["tgtMaxOutputForNG"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("tgtMaxOutputForNG")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     # not discard events
@@ -1193,9 +1223,9 @@ class JediTaskSpec(object):
     # get min CPU efficiency
     def getMinCpuEfficiency(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["minCpuEfficiency"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("minCpuEfficiency")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     # decrement attemptNr of events only when failed
@@ -1302,17 +1332,17 @@ class JediTaskSpec(object):
     # get max number of jobs
     def get_max_num_jobs(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["maxNumJobs"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("maxNumJobs")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     # get total number of jobs
     def get_total_num_jobs(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["totNumJobs"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("totNumJobs")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     # use only tags for fat container
@@ -1333,8 +1363,8 @@ class JediTaskSpec(object):
     # check if first contents feed
     def is_first_contents_feed(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["firstContentsFeed"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None and tmpMatch.group(1) == self.FirstContentsFeed.TRUE.value:
+            tmpValue = self.get_split_rule_value("firstContentsFeed")
+            if tmpValue is not None and tmpValue == self.FirstContentsFeed.TRUE.value:
                 return True
         return False
 
@@ -1365,9 +1395,9 @@ class JediTaskSpec(object):
     # get max core count
     def get_max_core_count(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["maxCoreCount"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("maxCoreCount")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     # push status changes
@@ -1405,9 +1435,9 @@ class JediTaskSpec(object):
     # get full chain flag
     def get_full_chain(self):
         if self.splitRule:
-            tmpMatch = re.search(self.splitRuleToken["fullChain"] + r"=(\d+)", self.splitRule)
-            if tmpMatch:
-                return tmpMatch.group(1)
+            tmpValue = self.get_split_rule_value("fullChain")
+            if tmpValue:
+                return tmpValue
         return None
 
     # check full chain with mode
@@ -1434,13 +1464,13 @@ class JediTaskSpec(object):
     def get_ram_for_retry(self, current_ram):
         if not self.splitRule:
             return None
-        tmpMatch = re.search(self.splitRuleToken["retryRamOffset"] + r"=(\d+)", self.splitRule)
-        if not tmpMatch:
+        tmpValue = self.get_split_rule_value("retryRamOffset")
+        if not tmpValue:
             return None
-        offset = int(tmpMatch.group(1))
-        tmpMatch = re.search(self.splitRuleToken["retryRamStep"] + r"=(\d+)", self.splitRule)
-        if tmpMatch:
-            step = int(tmpMatch.group(1))
+        offset = int(tmpValue)
+        tmpValue = self.get_split_rule_value("retryRamStep")
+        if tmpValue:
+            step = int(tmpValue)
         else:
             step = 0
         if not current_ram:
@@ -1454,16 +1484,16 @@ class JediTaskSpec(object):
     # get number of events per input
     def get_num_events_per_input(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nEventsPerInput"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("nEventsPerInput")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     def get_max_events_per_job(self):
         if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["maxEventsPerJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+            tmpValue = self.get_split_rule_value("maxEventsPerJob")
+            if tmpValue is not None:
+                return int(tmpValue)
         return None
 
     # set order input by
@@ -1477,9 +1507,9 @@ class JediTaskSpec(object):
     # get full chain flag
     def order_input_by(self):
         if self.splitRule:
-            tmpMatch = re.search(self.splitRuleToken["orderInputBy"] + r"=(\d+)", self.splitRule)
-            if tmpMatch:
-                if tmpMatch.group(1) == self.OrderInputBy.eventsAlignment:
+            tmpValue = self.get_split_rule_value("orderInputBy")
+            if tmpValue:
+                if tmpValue == self.OrderInputBy.eventsAlignment:
                     return "eventsAlignment"
         return None
 
@@ -1499,6 +1529,28 @@ class JediTaskSpec(object):
 # utils
 
 
+# parsed split rules
+ParsedSplitRule = collections.namedtuple("ParsedSplitRule", ["values", "numbers"])
+
+# pattern for items in split rule
+split_rule_item_pattern = re.compile(r"([^,=]+)=([^,]*)")
+split_rule_number_pattern = re.compile(r"\d+")
+
+
+# parse split rule into read-only maps of token to raw value and to leading digits
+def parse_split_rule(split_rule):
+    values = {}
+    numbers = {}
+    if split_rule:
+        for tmpMatch in split_rule_item_pattern.finditer(split_rule):
+            token, value = tmpMatch.groups()
+            values.setdefault(token, value)
+            tmpNumber = split_rule_number_pattern.match(value)
+            if tmpNumber is not None:
+                numbers.setdefault(token, tmpNumber.group(0))
+    return ParsedSplitRule(types.MappingProxyType(values), types.MappingProxyType(numbers))
+
+
 # check split rule with positive integer
 def check_split_rule_positive_int(key, split_rule):
     if not split_rule:
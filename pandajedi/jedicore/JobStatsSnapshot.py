@@ -0,0 +1,221 @@
+"""
+snapshot of job statistics shared by throttlers and brokers in a process
+
+"""
+
+import threading
+import time
+
+from pandaserver.taskbuffer import JobUtils
+
+from pandajedi.jediconfig import jedi_config
+
+# snapshots per VO
+_snapshots = {}
+_snapshotsLock = threading.Lock()
+
+
+# get max age of snapshots in seconds. 0 if disabled
+def getMaxAge():
+    if hasattr(jedi_config.jobgen, "jobStatsMaxAge") and jedi_config.jobgen.jobStatsMaxAge:
+        return jedi_config.jobgen.jobStatsMaxAge
+    return 0
+
+
+# copy nested dicts since callers may modify returned maps
+def _copyMap(srcMap):
+    return {k: _copyMap(v) if isinstance(v, dict) else v for k, v in srcMap.items()}
+
+
+# snapshot of job statistics
+class JobStatsSnapshot(object):
+    # constructor
+    def __init__(self, vo, rawStats):
+        self.vo = vo
+        self.createTime = time.time()
+        self.resourceQueues = rawStats["resourceQueues"]
+        # index of share rows by gshare excluding resource queues and by workqueue_id
+        self.shareRowsByGShare = {}
+        self.shareRowsByQueueID = {}
+        # job statistics by site and global share
+        self.statsByGShare = {}
+        self.statsByGShareWithoutRWQ = {}
+        # number of starting jobs by site and resource type, with gshare and workqueue_id
+        self.nStarting = {}
+        for tableIdx, computingSite, gshare, workqueue_id, resource_type, jobstatus, nJobs in rawStats["share"]:
+            isResourceQueue = workqueue_id in self.resourceQueues
+            self.shareRowsByQueueID.setdefault(workqueue_id, []).append((tableIdx, computingSite, resource_type, jobstatus, nJobs))
+            if not isResourceQueue:
+                self.shareRowsByGShare.setdefault(gshare, []).append((tableIdx, computingSite, resource_type, jobstatus, nJobs))
+            for tmpMap, toAdd in [(self.statsByGShare, True), (self.statsByGShareWithoutRWQ, not isResourceQueue)]:
+                if toAdd:
+                    tmpMap.setdefault(computingSite, {})
+                    tmpMap[computingSite].setdefault(gshare, {})
+                    tmpMap[computingSite][gshare].setdefault(jobstatus, 0)
+                    tmpMap[computingSite][gshare][jobstatus] += nJobs
+            if tableIdx == 0 and jobstatus == "starting":
+                self.nStarting.setdefault((computingSite, resource_type), []).append((None if isResourceQueue else gshare, workqueue_id, nJobs))
+        # job statistics by label, site, and work queue
+        self.statsByWorkQueue = {}
+        for computingSite, prodSourceLabel, jobStatus, workQueue_ID, nJobs in rawStats["workQueue"]:
+            tmpMap = self.statsByWorkQueue.setdefault(prodSourceLabel, {})
+            tmpMap.setdefault(computingSite, {})
+            tmpMap[computingSite].setdefault(workQueue_ID, {})
+            tmpMap[computingSite][workQueue_ID].setdefault(jobStatus, 0)
+            tmpMap[computingSite][workQueue_ID][jobStatus] += nJobs
+        # number of standby jobs
+        self.standbyList = []
+        for siteid, catchall in rawStats["standby"]:
+            numMap = JobUtils.parseNumStandby(catchall)
+            if numMap is not None:
+                self.standbyList.append((siteid, numMap))
+        # maps derived for work queues
+        self.derivedMaps = {}
+
+    # get age in seconds
+    def getAge(self):
+        return time.time() - self.createTime
+
+    # get share rows for a work queue
+    def getShareRows(self, workqueue):
+        if workqueue.is_global_share:
+            return self.shareRowsByGShare.get(workqueue.queue_name, [])
+        return self.shareRowsByQueueID.get(workqueue.queue_id, [])
+
+    # get job statistics by global share
+    def getJobStatisticsByGlobalShare(self, exclude_rwq=False):
+        if exclude_rwq:
+            return True, _copyMap(self.statsByGShareWithoutRWQ)
+        return True, _copyMap(self.statsByGShare)
+
+    # get job statistics with work queue
+    def getJobStatisticsWithWorkQueue_JEDI(self, prodSourceLabel):
+        return True, _copyMap(self.statsByWorkQueue.get(prodSourceLabel, {}))
+
+    # get job statistics by resource type
+    def getJobStatisticsByResourceType(self, workqueue):
+        key = ("rt", workqueue.is_global_share, workqueue.queue_name, workqueue.queue_id)
+        if key not in self.derivedMaps:
+            # sum per table and then overwrite with the second table as done in the DB query
+            tmpMaps = [{}, {}]
+            for tableIdx, computingSite, resource_type, jobstatus, nJobs in self.getShareRows(workqueue):
+                tmpKey = (jobstatus, resource_type)
+                tmpMaps[tableIdx][tmpKey] = tmpMaps[tableIdx].get(tmpKey, 0) + nJobs
+            returnMap = {}
+            for tmpMap in tmpMaps:
+                for (jobstatus, resource_type), nJobs in tmpMap.items():
+                    returnMap.setdefault(jobstatus, {})
+                    returnMap[jobstatus][resource_type] = nJobs
+            self.derivedMaps[key] = returnMap
+        return True, _copyMap(self.derivedMaps[key])
+
+    # get job statistics by site and resource type
+    def getJobStatisticsByResourceTypeSite(self, workqueue):
+        key = ("rt_site", workqueue.is_global_share, workqueue.queue_name, workqueue.queue_id)
+        if key not in self.derivedMaps:
+            tmpMaps = [{}, {}]
+            for tableIdx, computingSite, resource_type, jobstatus, nJobs in self.getShareRows(workqueue):
+                tmpKey = (computingSite, resource_type, jobstatus)
+                tmpMaps[tableIdx][tmpKey] = tmpMaps[tableIdx].get(tmpKey, 0) + nJobs
+            returnMap = {}
+            for tmpMap in tmpMaps:
+                for (computingSite, resource_type, jobstatus), nJobs in tmpMap.items():
+                    returnMap.setdefault(computingSite, {})
+                    returnMap[computingSite].setdefault(resource_type, {})
+                    returnMap[computingSite][resource_type][jobstatus] = nJobs
+            self.derivedMaps[key] = returnMap
+        return True, _copyMap(self.derivedMaps[key])
+
+    # get number map for standby jobs
+    def getNumMapForStandbyJobs_JEDI(self, workqueue):
+        retMapStatic = dict()
+        retMapDynamic = dict()
+        for siteid, numMap in self.standbyList:
+            for wq_tag, resource_num in numMap.items():
+                if workqueue.is_global_share:
+                    if workqueue.queue_name != wq_tag:
+                        continue
+                else:
+                    if str(workqueue.queue_id) != wq_tag:
+                        continue
+                for resource_type, num in resource_num.items():
+                    if num == 0:
+                        retMap = retMapDynamic
+                        # dynamic : use # of starting jobs as # of standby jobs
+                        startingList = self.nStarting.get((siteid, resource_type), [])
+                        if workqueue.is_global_share:
+                            num = sum(n for g, q, n in startingList if g == workqueue.queue_name)
+                        else:
+                            num = sum(n for g, q, n in startingList if q == workqueue.queue_id)
+                    else:
+                        retMap = retMapStatic
+                    if resource_type not in retMap:
+                        retMap[resource_type] = 0
+                    retMap[resource_type] += num
+        return retMapStatic, retMapDynamic
+
+
+# get the snapshot for a VO. None if disabled or unavailable
+def getSnapshot(taskBufferIF, vo):
+    maxAge = getMaxAge()
+    if not maxAge:
+        return None
+    snapshot = _snapshots.get(vo)
+    if snapshot is not None and snapshot.getAge() < maxAge:
+        return snapshot
+    with _snapshotsLock:
+        # refreshed by another thread
+        snapshot = _snapshots.get(vo)
+        if snapshot is not None and snapshot.getAge() < maxAge:
+            return snapshot
+        try:
+            tmpStat, rawStats = taskBufferIF.getJobStatisticsSnapshot_JEDI(vo)
+        except Exception:
+            tmpStat = False
+        if not tmpStat:
+            # fall back to direct queries rather than using a too old snapshot
+            _snapshots.pop(vo, None)
+            return None
+        snapshot = JobStatsSnapshot(vo, rawStats)
+        _snapshots[vo] = snapshot
+        return snapshot
+
+
+# get job statistics by global share
+def getJobStatisticsByGlobalShare(taskBufferIF, vo, exclude_rwq=False):
+    snapshot = getSnapshot(taskBufferIF, vo)
+    if snapshot is None:
+        return taskBufferIF.getJobStatisticsByGlobalShare(vo, exclude_rwq)
+    return snapshot.getJobStatisticsByGlobalShare(exclude_rwq)
+
+
+# get job statistics with work queue
+def getJobStatisticsWithWorkQueue_JEDI(taskBufferIF, vo, prodSourceLabel):
+    snapshot = getSnapshot(taskBufferIF, vo)
+    if snapshot is None:
+        return taskBufferIF.getJobStatisticsWithWorkQueue_JEDI(vo, prodSourceLabel)
+    return snapshot.getJobStatisticsWithWorkQueue_JEDI(prodSourceLabel)
+
+
+# get job statistics by resource type
+def getJobStatisticsByResourceType(taskBufferIF, workqueue):
+    snapshot = getSnapshot(taskBufferIF, workqueue.VO)
+    if snapshot is None:
+        return taskBufferIF.getJobStatisticsByResourceType(workqueue)
+    return snapshot.getJobStatisticsByResourceType(workqueue)
+
+
+# get job statistics by site and resource type
+def getJobStatisticsByResourceTypeSite(taskBufferIF, workqueue):
+    snapshot = getSnapshot(taskBufferIF, workqueue.VO)
+    if snapshot is None:
+        return taskBufferIF.getJobStatisticsByResourceTypeSite(workqueue)
+    return snapshot.getJobStatisticsByResourceTypeSite(workqueue)
+
+
+# get number map for standby jobs
+def getNumMapForStandbyJobs_JEDI(taskBufferIF, workqueue):
+    snapshot = getSnapshot(taskBufferIF, workqueue.VO)
+    if snapshot is None:
+        return taskBufferIF.getNumMapForStandbyJobs_JEDI(workqueue)
+    return snapshot.getNumMapForStandbyJobs_JEDI(workqueue)
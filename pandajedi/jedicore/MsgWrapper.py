@@ -1,11 +1,152 @@
+import atexit
+import collections
+import copy
 import datetime
+import logging
+import logging.handlers
+import multiprocessing.util
+import os
+import queue
 import re
+import threading
 import time
 
 from pandacommon.pandalogger.PandaLogger import PandaLogger
 from pandajedi.jediconfig import jedi_config
 from pandaserver.userinterface import Client
 
+# loggers whose handlers are driven by a background thread. logger name -> (logger, queue handler, queue listener)
+_asyncLoggers = {}
+_asyncLoggersLock = threading.Lock()
+
+
+# use a background thread for I/O of loggers
+def useAsyncLogging():
+    return hasattr(jedi_config.master, "asyncLogging") and jedi_config.master.asyncLogging
+
+
+# queue handler leaving formatting and I/O to the listener thread
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # resolve the message in the caller thread since arguments may be modified later
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+# move handlers of a logger to a background thread
+def enableAsyncLogging(logger):
+    if logger.name in _asyncLoggers:
+        return
+    with _asyncLoggersLock:
+        if logger.name in _asyncLoggers or not logger.handlers:
+            return
+        if not _asyncLoggers:
+            _registerStopAsyncLogging()
+        handlers = list(logger.handlers)
+        queueHandler = _DeferredQueueHandler(queue.SimpleQueue())
+        listener = logging.handlers.QueueListener(queueHandler.queue, *handlers, respect_handler_level=True)
+        for handler in handlers:
+            logger.removeHandler(handler)
+        logger.addHandler(queueHandler)
+        listener.start()
+        _asyncLoggers[logger.name] = (logger, queueHandler, listener)
+
+
+# flush and stop listeners, and give the handlers back to the loggers to log synchronously afterwards
+def _stopAsyncLogging():
+    asyncLoggers = list(_asyncLoggers.values())
+    _asyncLoggers.clear()
+    for logger, queueHandler, listener in asyncLoggers:
+        logger.removeHandler(queueHandler)
+        for handler in listener.handlers:
+            logger.addHandler(handler)
+        try:
+            listener.stop()
+        except Exception:
+            pass
+
+
+# stop listeners at exit. Finalizers are used since multiprocessing children exit through os._exit
+# without atexit handlers. A negative priority to run them after other finalizers and children are joined
+def _registerStopAsyncLogging():
+    multiprocessing.util.Finalize(None, _stopAsyncLogging, exitpriority=-100)
+
+
+# start fresh listeners in a child process since threads are not inherited
+def _restartAsyncLogging():
+    global _asyncLoggersLock
+    _asyncLoggersLock = threading.Lock()
+    if not _asyncLoggers:
+        return
+    for loggerName, (logger, queueHandler, listener) in list(_asyncLoggers.items()):
+        # records of the parent are discarded with the old queue
+        queueHandler.queue = queue.SimpleQueue()
+        newListener = logging.handlers.QueueListener(queueHandler.queue, *listener.handlers, respect_handler_level=True)
+        newListener.start()
+        _asyncLoggers[loggerName] = (logger, queueHandler, newListener)
+    # finalizers of the parent are ignored in the child
+    _registerStopAsyncLogging()
+
+
+# token to register the finalizer again in multiprocessing children where finalizers are cleared after fork
+class _AfterForkToken(object):
+    pass
+
+
+_afterForkToken = _AfterForkToken()
+atexit.register(_stopAsyncLogging)
+os.register_at_fork(after_in_child=_restartAsyncLogging)
+multiprocessing.util.register_after_fork(_afterForkToken, lambda token: _registerStopAsyncLogging() if _asyncLoggers else None)
+
+# types of arguments which can be formatted later since they are not modified
+_immutableTypes = (str, int, float, bool, type(None))
+
+# types of arguments which are copied shallowly to be formatted later
+_copyableTypes = (dict, list, set)
+
+
+# message formatted only when it is emitted or dumped. Arguments are formatted with the % operator
+class _LazyMessage(object):
+    __slots__ = ("msg", "args", "formatted")
+
+    # constructor
+    def __init__(self, msg, args):
+        self.msg = msg
+        self.args = args
+        self.formatted = None
+
+    # check if formatting can be deferred since the message and arguments are not modified later
+    def isDeferrable(self):
+        return isinstance(self.msg, str) and all(isinstance(arg, _immutableTypes) for arg in self.args)
+
+    # copy arguments shallowly not to show later modifications when formatted. returns False if not possible
+    def snapshot(self):
+        if not isinstance(self.msg, str):
+            return False
+        args = []
+        for arg in self.args:
+            if isinstance(arg, _immutableTypes):
+                args.append(arg)
+            elif type(arg) in _copyableTypes:
+                args.append(copy.copy(arg))
+            else:
+                return False
+        self.args = tuple(args)
+        return True
+
+    # format
+    def __str__(self):
+        if self.formatted is None:
+            if self.args:
+                self.formatted = str(self.msg) % self.args
+            else:
+                self.formatted = str(self.msg)
+            # release references
+            self.msg = None
+            self.args = None
+        return self.formatted
+
 
 class MsgWrapper:
     def __init__(self, logger, token=None, lineLimit=500, monToken=None):
@@ -25,44 +166,51 @@ class MsgWrapper:
             self.monToken = re.sub("<(?P<name>[^>]+)>", "\g<name>", self.monToken)
         except Exception:
             pass
-        # message buffer
-        self.msgBuffer = []
-        self.bareMsg = []
+        # message buffer of (epoch time, message) where the oldest is dropped once full. Epoch time is converted when dumped
         self.lineLimit = lineLimit
+        self.msgBuffer = collections.deque(maxlen=lineLimit + 1)
+        # hand I/O to a background thread
+        if useAsyncLogging():
+            enableAsyncLogging(logger)
 
     def keepMsg(self, msg):
-        # keep max message depth
-        if len(self.msgBuffer) > self.lineLimit:
-            self.msgBuffer.pop(0)
-            self.bareMsg.pop(0)
-        timeNow = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
-        self.msgBuffer.append(f"{timeNow.isoformat(' ')} : {msg}")
-        self.bareMsg.append(msg)
-
-    def info(self, msg):
-        msg = str(msg)
-        self.logger.info(self.token + " " + msg)
-        self.keepMsg(msg)
-
-    def debug(self, msg):
-        msg = str(msg)
-        self.logger.debug(self.token + " " + msg)
-        self.keepMsg(msg)
-
-    def error(self, msg):
-        msg = str(msg)
-        self.logger.error(self.token + " " + msg)
-        self.keepMsg(msg)
-
-    def warning(self, msg):
-        msg = str(msg)
-        self.logger.warning(self.token + " " + msg)
-        self.keepMsg(msg)
+        self.msgBuffer.append((time.time(), msg))
+
+    # emit and keep a message. When the level is disabled for the logger, formatting is deferred until the buffer is dumped
+    # with immutable arguments as they are and dicts, lists, and sets copied shallowly
+    def emit(self, level, msg, args):
+        lazyMsg = _LazyMessage(msg, args)
+        if self.logger.isEnabledFor(level):
+            # format now not to keep objects which may be modified in the buffer
+            if not lazyMsg.isDeferrable():
+                str(lazyMsg)
+            self.logger.log(level, "%s %s", self.token, lazyMsg)
+        elif not lazyMsg.isDeferrable() and not lazyMsg.snapshot():
+            str(lazyMsg)
+        self.keepMsg(lazyMsg)
+
+    def info(self, msg, *args):
+        self.emit(logging.INFO, msg, args)
+
+    def debug(self, msg, *args):
+        self.emit(logging.DEBUG, msg, args)
+
+    def error(self, msg, *args):
+        self.emit(logging.ERROR, msg, args)
+
+    def warning(self, msg, *args):
+        self.emit(logging.WARNING, msg, args)
+
+    # get messages without timestamp
+    @property
+    def bareMsg(self):
+        return [str(msg) for timeStamp, msg in self.msgBuffer]
 
     def dumpToString(self):
         strMsg = ""
-        for msg in self.msgBuffer:
-            strMsg += msg
+        for timeStamp, msg in self.msgBuffer:
+            timeStamp = datetime.datetime.fromtimestamp(timeStamp, datetime.timezone.utc).replace(tzinfo=None)
+            strMsg += f"{timeStamp.isoformat(' ')} : {msg}"
             strMsg += "\n"
         return strMsg
 
@@ -72,7 +220,8 @@ class MsgWrapper:
         if s != 0:
             return f"failed to upload log with {s}."
         if o.startswith("http"):
-            return f"<a href=\"{o}\">log</a> : {'. '.join(self.bareMsg[-2:])}."
+            lastMsgs = [str(msg) for timeStamp, msg in list(self.msgBuffer)[-2:]]
+            return f"<a href=\"{o}\">log</a> : {'. '.join(lastMsgs)}."
         return o
 
     # send message to logger
@@ -1,3 +1,10 @@
+# get fileIDs of files, reading the column directly for columnar file lists
+def get_file_ids(files):
+    if hasattr(files, "getFileIDs"):
+        return files.getFileIDs().tolist()
+    return [f.fileID for f in files]
+
+
 class SiteCandidate(object):
     def __init__(self, siteName, unifiedName=None):
         # the site name
@@ -33,29 +40,33 @@ class SiteCandidate(object):
 
     # add local disk files
     def add_local_disk_files(self, files):
-        self.localDiskFiles = self.localDiskFiles.union([f.fileID for f in files])
+        self.localDiskFiles = self.localDiskFiles.union(get_file_ids(files))
 
     # add local tape files
     def add_local_tape_files(self, files):
-        self.localTapeFiles = self.localTapeFiles.union([f.fileID for f in files])
+        self.localTapeFiles = self.localTapeFiles.union(get_file_ids(files))
 
     # add cache files
     def add_cache_files(self, files):
-        self.cacheFiles = self.cacheFiles.union([f.fileID for f in files])
+        self.cacheFiles = self.cacheFiles.union(get_file_ids(files))
 
     # add remote files
     def add_remote_files(self, files):
-        self.remoteFiles = self.remoteFiles.union([f.fileID for f in files])
+        self.remoteFiles = self.remoteFiles.union(get_file_ids(files))
 
     # get locality of a file
     def getFileLocality(self, fileSpec):
-        if fileSpec.fileID in self.localDiskFiles:
+        return self.getFileLocalityWithID(fileSpec.fileID)
+
+    # get locality of a file with fileID
+    def getFileLocalityWithID(self, fileID):
+        if fileID in self.localDiskFiles:
             return "localdisk"
-        if fileSpec.fileID in self.localTapeFiles:
+        if fileID in self.localTapeFiles:
             return "localtape"
-        if fileSpec.fileID in self.cacheFiles:
+        if fileID in self.cacheFiles:
             return "cache"
-        if fileSpec.fileID in self.remoteFiles:
+        if fileID in self.remoteFiles:
             return "remote"
         return None
 
@@ -63,8 +74,7 @@ class SiteCandidate(object):
     def addAvailableFiles(self, fileList):
         if self.allFiles is None:
             self.allFiles = set()
-        for tmpFileSpec in fileList:
-            self.allFiles.add(tmpFileSpec.fileID)
+        self.allFiles.update(get_file_ids(fileList))
 
     # check if file is available
     def isAvailableFile(self, tmpFileSpec):
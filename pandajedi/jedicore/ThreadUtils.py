@@ -1,4 +1,5 @@
 import multiprocessing
+import queue
 import sys
 import threading
 import time
@@ -191,6 +192,92 @@ class WorkerThread(threading.Thread):
             self.workerSemaphore.release()
 
 
+# persistent pool of worker threads with a bounded work queue and deduplication of items
+class WorkerPool:
+    # constructor
+    def __init__(self, nWorkers, logger, maxQueueSize=0):
+        self.lock = threading.Lock()
+        self.workQueue = queue.Queue(maxQueueSize)
+        # keys of items which are queued or running
+        self.activeKeys = set()
+        self.nRunning = 0
+        self.logger = logger
+        self.threads = []
+        self.resize(nWorkers)
+
+    # add workers up to nWorkers
+    def resize(self, nWorkers):
+        self.lock.acquire()
+        while len(self.threads) < nWorkers:
+            thr = threading.Thread(target=self.runWorker)
+            thr.daemon = True
+            thr.start()
+            self.threads.append(thr)
+        self.lock.release()
+
+    # submit items in chunks. items being queued or processed are skipped. return the number of accepted items
+    def submit(self, items, func, getKey=None, nItems=1):
+        if getKey is None:
+            getKey = lambda item: item
+        self.lock.acquire()
+        newItems = []
+        for item in items:
+            key = getKey(item)
+            if key in self.activeKeys:
+                continue
+            self.activeKeys.add(key)
+            newItems.append((key, item))
+        self.lock.release()
+        nAccepted = 0
+        for idx in range(0, len(newItems), nItems):
+            chunk = newItems[idx : idx + nItems]
+            keys = [key for key, item in chunk]
+            try:
+                self.workQueue.put_nowait((keys, func, [item for key, item in chunk]))
+                nAccepted += len(chunk)
+            except queue.Full:
+                # release items which were not queued. they will be submitted again in the next cycle
+                self.lock.acquire()
+                for key, item in newItems[idx:]:
+                    self.activeKeys.discard(key)
+                self.lock.release()
+                break
+        return nAccepted
+
+    # main loop of workers
+    def runWorker(self):
+        while True:
+            keys, func, chunk = self.workQueue.get()
+            self.lock.acquire()
+            self.nRunning += 1
+            self.lock.release()
+            try:
+                func(chunk)
+            except Exception:
+                errtype, errvalue = sys.exc_info()[:2]
+                self.logger.error(f"{self.__class__.__name__} failed in runWorker() with {errtype.__name__}:{errvalue}")
+            self.lock.acquire()
+            self.nRunning -= 1
+            for key in keys:
+                self.activeKeys.discard(key)
+            self.lock.release()
+            self.workQueue.task_done()
+
+    # check if an item is being queued or processed
+    def isActive(self, key):
+        self.lock.acquire()
+        ret = key in self.activeKeys
+        self.lock.release()
+        return ret
+
+    # dump contents
+    def dump(self):
+        self.lock.acquire()
+        ret = f"nWorkers={len(self.threads)} nRunning={self.nRunning} nQueued={self.workQueue.qsize()} nActiveItems={len(self.activeKeys)}"
+        self.lock.release()
+        return ret
+
+
 # thread class to cleanup zombi processes
 class ZombieCleaner(threading.Thread):
     # constructor
@@ -0,0 +1,96 @@
+"""
+local bus to wake up agents on the same node
+
+"""
+
+import atexit
+import glob
+import os
+import select
+import socket
+import time
+
+from pandajedi.jediconfig import jedi_config
+
+
+# get directory for sockets. None if disabled
+def getBusDir():
+    if hasattr(jedi_config.master, "wakeupDir") and jedi_config.master.wakeupDir:
+        return jedi_config.master.wakeupDir
+    return None
+
+
+# wake up all agents with a name. wakeups are coalesced if the agents are already woken up
+def wakeup(agentName):
+    busDir = getBusDir()
+    if busDir is None:
+        return
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+    except Exception:
+        return
+    for sockPath in glob.glob(os.path.join(busDir, f"{agentName}.*.sock")):
+        try:
+            sock.sendto(b"1", sockPath)
+        except BlockingIOError:
+            # wakeups are pending
+            pass
+        except (ConnectionRefusedError, FileNotFoundError):
+            # remove socket of dead agent
+            try:
+                os.remove(sockPath)
+            except Exception:
+                pass
+        except Exception:
+            pass
+    sock.close()
+
+
+# listener of wakeups
+class WakeupListener:
+    # constructor
+    def __init__(self, agentName, busDir):
+        self.sockPath = os.path.join(busDir, f"{agentName}.{os.getpid()}.sock")
+        if os.path.exists(self.sockPath):
+            os.remove(self.sockPath)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.sockPath)
+        self.sock.setblocking(False)
+        atexit.register(self.close)
+
+    # discard pending wakeups. return the number of wakeups
+    def drain(self):
+        nWakeups = 0
+        while True:
+            try:
+                self.sock.recv(64)
+                nWakeups += 1
+            except BlockingIOError:
+                return nWakeups
+            except Exception:
+                return nWakeups
+
+    # sleep until timeout or wakeup. wakeups are ignored for minWait and coalesced for coalesceWindow. return True if woken up
+    def wait(self, timeout, minWait=0, coalesceWindow=1):
+        endTime = time.time() + timeout
+        if minWait > 0:
+            time.sleep(min(minWait, max(timeout, 0)))
+        while True:
+            remaining = endTime - time.time()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([self.sock], [], [], remaining)
+            if readable:
+                # wait for other wakeups in a burst
+                time.sleep(min(coalesceWindow, max(endTime - time.time(), 0)))
+                if self.drain() > 0:
+                    return True
+
+    # close
+    def close(self):
+        try:
+            self.sock.close()
+            os.remove(self.sockPath)
+        except Exception:
+            pass
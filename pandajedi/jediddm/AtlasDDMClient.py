@@ -1,3 +1,4 @@
+import concurrent.futures
 import datetime
 import json
 import os
@@ -34,6 +35,35 @@ from .DDMClientBase import DDMClientBase
 
 logger = PandaLogger().getLogger(__name__.split(".")[-1])
 
+# pattern to extract base LFN and attempt number
+attempt_number_pattern = re.compile(r"^(.*)\.(\d+)$")
+
+
+# get base LFN and attempt number. -1 if without attempt number
+def parse_attempt_number(lfn):
+    tmp_match = attempt_number_pattern.match(lfn)
+    if tmp_match is None:
+        return lfn, -1
+    return tmp_match.group(1), int(tmp_match.group(2))
+
+
+# convert a file record from Rucio to old dict format
+def convert_file_record(x, long_format):
+    attrs = {}
+    attrs["lfn"] = str(x["name"])
+    attrs["chksum"] = "ad:" + str(x["adler32"])
+    attrs["md5sum"] = attrs["chksum"]
+    attrs["checksum"] = attrs["chksum"]
+    attrs["fsize"] = x["bytes"]
+    attrs["filesize"] = attrs["fsize"]
+    attrs["scope"] = str(x["scope"])
+    attrs["events"] = str(x["events"])
+    if long_format:
+        attrs["lumiblocknr"] = str(x["lumiblocknr"])
+    guid = str(f"{x['guid'][0:8]}-{x['guid'][8:12]}-{x['guid'][12:16]}-{x['guid'][16:20]}-{x['guid'][20:32]}")
+    attrs["guid"] = guid
+    return guid, attrs
+
 
 # class to access to ATLAS DDM
 class AtlasDDMClient(DDMClientBase):
@@ -76,57 +106,28 @@ class AtlasDDMClient(DDMClientBase):
             # get length
             tmpMeta = client.get_metadata(scope, dsn)
             # get files
-            fileMap = {}
+            if lfn_only:
+                return_list = set()
+            else:
+                return_list = {}
+            # base LFN -> (attempt number, GUID) of the file kept
             baseLFNmap = {}
-            fileSet = set()
             for x in client.list_files(scope, dsn, long=longFormat):
-                # convert to old dict format
-                lfn = str(x["name"])
                 if lfn_only:
-                    fileSet.add(lfn)
+                    return_list.add(str(x["name"]))
                     continue
-                attrs = {}
-                attrs["lfn"] = lfn
-                attrs["chksum"] = "ad:" + str(x["adler32"])
-                attrs["md5sum"] = attrs["chksum"]
-                attrs["checksum"] = attrs["chksum"]
-                attrs["fsize"] = x["bytes"]
-                attrs["filesize"] = attrs["fsize"]
-                attrs["scope"] = str(x["scope"])
-                attrs["events"] = str(x["events"])
-                if longFormat:
-                    attrs["lumiblocknr"] = str(x["lumiblocknr"])
-                guid = str(f"{x['guid'][0:8]}-{x['guid'][8:12]}-{x['guid'][12:16]}-{x['guid'][16:20]}-{x['guid'][20:32]}")
-                attrs["guid"] = guid
-                # skip duplicated files
+                # skip duplicated files and use the largest attempt number
                 if skipDuplicate:
-                    # extract base LFN and attempt number
-                    baseLFN = re.sub("(\.(\d+))$", "", lfn)
-                    attNr = re.sub(baseLFN + "\.*", "", lfn)
-                    if attNr == "":
-                        # without attempt number
-                        attNr = -1
-                    else:
-                        attNr = int(attNr)
-                    # compare attempt numbers
-                    addMap = False
+                    baseLFN, attNr = parse_attempt_number(str(x["name"]))
                     if baseLFN in baseLFNmap:
-                        # use larger attempt number
-                        oldMap = baseLFNmap[baseLFN]
-                        if oldMap["attNr"] < attNr:
-                            del fileMap[oldMap["guid"]]
-                            addMap = True
-                    else:
-                        addMap = True
-                    # append
-                    if not addMap:
-                        continue
-                    baseLFNmap[baseLFN] = {"guid": guid, "attNr": attNr}
-                fileMap[guid] = attrs
-            if lfn_only:
-                return_list = fileSet
-            else:
-                return_list = fileMap
+                        oldAttNr, oldGUID = baseLFNmap[baseLFN]
+                        if oldAttNr >= attNr:
+                            continue
+                        del return_list[oldGUID]
+                guid, attrs = convert_file_record(x, longFormat)
+                if skipDuplicate:
+                    baseLFNmap[baseLFN] = (attNr, guid)
+                return_list[guid] = attrs
             tmpLog.debug(f"done len={len(return_list)} meta={tmpMeta['length']}")
             if tmpMeta["length"] and tmpMeta["length"] > len(return_list):
                 errMsg = f"file list length mismatch len={len(return_list)} != meta={tmpMeta['length']}"
@@ -349,11 +350,18 @@ class AtlasDDMClient(DDMClientBase):
                 return tmp_status, tmp_output
             dataset_replica_map = tmp_output
 
+            # use read-only views of files not to make FileSpecs when files are kept in a columnar list.
+            # The same objects are used in all lists of the return map
+            if dataset_spec.hasFileColumns():
+                dataset_files = dataset_spec.Files.getViews()
+            else:
+                dataset_files = dataset_spec.Files
+
             # collect GUIDs and LFNs
             file_map = {}  # GUID to LFN
             lfn_filespec_map = {}  # LFN to file spec
             scope_map = {}  # LFN to scope list
-            for tmp_file in dataset_spec.Files:
+            for tmp_file in dataset_files:
                 file_map[tmp_file.GUID] = tmp_file.lfn
                 lfn_filespec_map.setdefault(tmp_file.lfn, [])
                 lfn_filespec_map[tmp_file.lfn].append(tmp_file)
@@ -428,7 +436,7 @@ class AtlasDDMClient(DDMClientBase):
                             raise RuntimeError(tmp_files)
                         for tmp_lfn in tmp_files:
                             files_in_container[tmp_lfn] = tmp_ds_name
-                    for tmp_file in dataset_spec.Files:
+                    for tmp_file in dataset_files:
                         if tmp_file.lfn in files_in_container and files_in_container[tmp_file.lfn] in detailed_comp_replica_map:
                             rucio_lfn_to_rse_map[tmp_file.lfn] = detailed_comp_replica_map[files_in_container[tmp_file.lfn]]
 
@@ -442,14 +450,14 @@ class AtlasDDMClient(DDMClientBase):
                 # check if the dataset is cached
                 if DataServiceUtils.isCachedFile(dataset_spec.datasetName, tmp_site_spec):
                     # add to cached file list
-                    return_map[site_name]["cache"] += dataset_spec.Files
+                    return_map[site_name]["cache"] += dataset_files
 
                 # complete replicas
                 if not check_LFC:
                     for tmp_endpoint in tmp_endpoints:
                         if tmp_endpoint in complete_replica_map:
                             storage_type = complete_replica_map[tmp_endpoint]
-                            return_map[site_name][storage_type] += dataset_spec.Files
+                            return_map[site_name][storage_type] += dataset_files
                             checked_dst.add(site_name)
 
             # loop over all available LFNs
@@ -495,41 +503,62 @@ class AtlasDDMClient(DDMClientBase):
             tmp_log.error(error_message)
             return self.SC_FAILED, f"{self.__class__.__name__}.{method_name} {error_message}"
 
+    # look up replicas for a batch of files
+    def list_replicas_in_batch(self, i_loop, dids, tmp_log, client=None):
+        tmp_log.debug(f"lookup {i_loop} start")
+        if client is None:
+            client = RucioClient()
+        lfn_to_rses_map = {}
+        loopStart = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        x = client.list_replicas(dids, resolve_archives=True)
+        for tmp_dict in x:
+            try:
+                tmp_LFN = str(tmp_dict["name"])
+                lfn_to_rses_map[tmp_LFN] = tmp_dict["rses"]
+            except Exception:
+                pass
+        regTime = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - loopStart
+        tmp_log.info(f"rucio.list_replicas took {regTime.seconds} sec for {len(dids)} files in lookup {i_loop}")
+        return lfn_to_rses_map
+
     def jedi_list_replicas(self, files, storages, scopes={}):
         try:
             method_name = "jedi_list_replicas"
             method_name += f" pid={self.pid}"
             tmp_log = MsgWrapper(logger, method_name)
-            client = RucioClient()
-            i_guid = 0
-            max_guid = 1000  # do 1000 guids in each Rucio call
+            startTime = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            # number of files in each Rucio call
+            max_guid = 1000
+            if hasattr(jedi_config.ddm, "nFilesListReplicas") and jedi_config.ddm.nFilesListReplicas:
+                max_guid = int(jedi_config.ddm.nFilesListReplicas)
+            # number of concurrent Rucio calls
+            n_threads = 1
+            if hasattr(jedi_config.ddm, "nThreadsListReplicas") and jedi_config.ddm.nThreadsListReplicas:
+                n_threads = int(jedi_config.ddm.nThreadsListReplicas)
             lfn_to_rses_map = {}
+            # make batches
+            dids_list = []
             dids = []
-            i_loop = 0
-            startTime = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
-            tmp_log.debug("start")
             for guid, lfn in files.items():
-                i_guid += 1
                 scope = scopes[lfn]
                 dids.append({"scope": scope, "name": lfn})
-                if len(dids) % max_guid == 0 or i_guid == len(files):
-                    i_loop += 1
-                    tmp_log.debug(f"lookup {i_loop} start")
-                    loopStart = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
-                    x = client.list_replicas(dids, resolve_archives=True)
-                    regTime = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - loopStart
-                    tmp_log.info(f"rucio.list_replicas took {regTime.seconds} sec for {len(dids)} files")
-                    loopStart = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
-                    for tmp_dict in x:
-                        try:
-                            tmp_LFN = str(tmp_dict["name"])
-                            lfn_to_rses_map[tmp_LFN] = tmp_dict["rses"]
-                        except Exception:
-                            pass
-                    # reset the dids list for the next bulk for Rucio
+                if len(dids) == max_guid:
+                    dids_list.append(dids)
                     dids = []
-                    regTime = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - loopStart
-                    tmp_log.debug(f"lookup {i_loop} end in {regTime.seconds} sec")
+            if dids:
+                dids_list.append(dids)
+            n_threads = max(1, min(n_threads, len(dids_list)))
+            tmp_log.debug(f"start nFiles={len(files)} nBatches={len(dids_list)} nThreads={n_threads}")
+            if n_threads == 1:
+                client = RucioClient()
+                for i_loop, dids in enumerate(dids_list):
+                    lfn_to_rses_map.update(self.list_replicas_in_batch(i_loop + 1, dids, tmp_log, client))
+            else:
+                # run batches concurrently and merge results in the original order
+                with concurrent.futures.ThreadPoolExecutor(max_workers=n_threads) as executor:
+                    futures = [executor.submit(self.list_replicas_in_batch, i_loop + 1, dids, tmp_log) for i_loop, dids in enumerate(dids_list)]
+                    for future in futures:
+                        lfn_to_rses_map.update(future.result())
             regTime = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - startTime
             tmp_log.debug(f"end in {regTime.seconds} sec")
         except Exception as e:
@@ -1,6 +1,5 @@
 import copy
 import datetime
-import json
 import os
 import socket
 import sys
@@ -13,6 +12,7 @@ from pandaserver.taskbuffer.ResourceSpec import ResourceSpecMapper
 
 from pandajedi.jedibrokerage import AtlasBrokerUtils
 from pandajedi.jediconfig import jedi_config
+from pandajedi.jedicore import CacheUtils
 from pandajedi.jedicore.MsgWrapper import MsgWrapper
 
 from .WatchDogBase import WatchDogBase
@@ -45,6 +45,11 @@ class AtlasQueueFillerWatchDog(WatchDogBase):
         self.dc_sub_key_bt = "BlacklistedTasks"
         self.dc_sub_key_attr = "OriginalTaskAttributes"
         self.dc_sub_key_ses = "SiteEmptySince"
+        # local copies of cache which are fetched only when changed
+        self.dc_pt = CacheUtils.SharedCacheEntry(taskBufferIF, self.dc_main_key, self.dc_sub_key_pt)
+        self.dc_bt = CacheUtils.SharedCacheEntry(taskBufferIF, self.dc_main_key, self.dc_sub_key_bt)
+        self.dc_attr = CacheUtils.SharedCacheEntry(taskBufferIF, self.dc_main_key, self.dc_sub_key_attr)
+        self.dc_ses = CacheUtils.SharedCacheEntry(taskBufferIF, self.dc_main_key, self.dc_sub_key_ses)
 
         # initialize the resource_spec_mapper object
         resource_types = taskBufferIF.load_resource_types()
@@ -67,59 +72,43 @@ class AtlasQueueFillerWatchDog(WatchDogBase):
 
     # update preassigned task map to cache
     def _update_to_pt_cache(self, ptmap):
-        data_json = json.dumps(ptmap)
-        self.taskBufferIF.updateCache_JEDI(main_key=self.dc_main_key, sub_key=self.dc_sub_key_pt, data=data_json)
+        if not self.dc_pt.put(ptmap):
+            logger.error(f"failed to update {self.dc_sub_key_pt} in cache")
 
     # get preassigned task map from cache
     def _get_from_pt_cache(self):
-        cache_spec = self.taskBufferIF.getCache_JEDI(main_key=self.dc_main_key, sub_key=self.dc_sub_key_pt)
-        if cache_spec is not None:
-            ret_map = json.loads(cache_spec.data)
-            return ret_map
-        else:
-            return dict()
+        self.dc_pt.sync()
+        return self.dc_pt.get(default=dict())
 
     # update blacklisted task map to cache
     def _update_to_bt_cache(self, btmap):
-        data_json = json.dumps(btmap)
-        self.taskBufferIF.updateCache_JEDI(main_key=self.dc_main_key, sub_key=self.dc_sub_key_bt, data=data_json)
+        if not self.dc_bt.put(btmap):
+            logger.error(f"failed to update {self.dc_sub_key_bt} in cache")
 
     # get blacklisted task map from cache
     def _get_from_bt_cache(self):
-        cache_spec = self.taskBufferIF.getCache_JEDI(main_key=self.dc_main_key, sub_key=self.dc_sub_key_bt)
-        if cache_spec is not None:
-            ret_map = json.loads(cache_spec.data)
-            return ret_map
-        else:
-            return dict()
+        self.dc_bt.sync()
+        return self.dc_bt.get(default=dict())
 
     # update task original attributes map to cache
     def _update_to_attr_cache(self, attrmap):
-        data_json = json.dumps(attrmap)
-        self.taskBufferIF.updateCache_JEDI(main_key=self.dc_main_key, sub_key=self.dc_sub_key_attr, data=data_json)
+        if not self.dc_attr.put(attrmap):
+            logger.error(f"failed to update {self.dc_sub_key_attr} in cache")
 
     # get task original attributes map from cache
     def _get_from_attr_cache(self):
-        cache_spec = self.taskBufferIF.getCache_JEDI(main_key=self.dc_main_key, sub_key=self.dc_sub_key_attr)
-        if cache_spec is not None:
-            ret_map = json.loads(cache_spec.data)
-            return ret_map
-        else:
-            return dict()
+        self.dc_attr.sync()
+        return self.dc_attr.get(default=dict())
 
     # update site empty-since map to cache
     def _update_to_ses_cache(self, sesmap):
-        data_json = json.dumps(sesmap)
-        self.taskBufferIF.updateCache_JEDI(main_key=self.dc_main_key, sub_key=self.dc_sub_key_ses, data=data_json)
+        if not self.dc_ses.put(sesmap):
+            logger.error(f"failed to update {self.dc_sub_key_ses} in cache")
 
     # get site empty-since map from cache
     def _get_from_ses_cache(self):
-        cache_spec = self.taskBufferIF.getCache_JEDI(main_key=self.dc_main_key, sub_key=self.dc_sub_key_ses)
-        if cache_spec is not None:
-            ret_map = json.loads(cache_spec.data)
-            return ret_map
-        else:
-            return dict()
+        self.dc_ses.sync()
+        return self.dc_ses.get(default=dict())
 
     # get process lock to preassign
     def _get_lock(self):
@@ -1,9 +1,11 @@
+import concurrent.futures
 import datetime
 import math
 import os
 import re
 import socket
 import sys
+import threading
 import time
 import traceback
 import uuid
@@ -58,12 +60,16 @@ class ContentsFeeder(JediKnight):
                             logger.error("failed to get the list of datasets to feed contents")
                         else:
                             logger.debug(f"got {len(tmpList)} datasets")
+                            nWorker = jedi_config.confeeder.nWorkers
+                            if self.getWorkerPool("confeeder", nWorker) is not None:
+                                # hand over to persistent workers without waiting for stragglers
+                                self.submitToWorkerPool(tmpList, 10, lambda x: x[0], ContentsFeederThread, self.taskBufferIF, self.ddmIF, self.pid)
+                                continue
                             # put to a locked list
                             dsList = ListWithLock(tmpList)
                             # make thread pool
                             threadPool = ThreadPool()
                             # make workers
-                            nWorker = jedi_config.confeeder.nWorkers
                             for iWorker in range(nWorker):
                                 thr = ContentsFeederThread(dsList, threadPool, self.taskBufferIF, self.ddmIF, self.pid)
                                 thr.start()
@@ -76,10 +82,117 @@ class ContentsFeeder(JediKnight):
             loopCycle = jedi_config.confeeder.loopCycle
             timeDelta = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - startTime
             sleepPeriod = loopCycle - timeDelta.seconds
-            if sleepPeriod > 0:
-                time.sleep(sleepPeriod)
-            # randomize cycle
-            self.randomSleep(max_val=loopCycle)
+            if not self.sleepUntilWakeup("confeeder", sleepPeriod, timeDelta.seconds):
+                # randomize cycle
+                self.randomSleep(max_val=loopCycle)
+
+
+# prefetcher of dataset metadata and file lists from DDM for upcoming datasets
+class DatasetPrefetcher:
+    # latency per stage accumulated over all tasks in the process
+    statsLock = threading.Lock()
+    globalStats = {}
+
+    # constructor
+    def __init__(self, ddmIF, taskSpec, taskParamMap, dsList, depth):
+        self.ddmIF = ddmIF
+        self.dsList = dsList
+        self.depth = depth
+        self.futures = {}
+        self.stats = {}
+        self.executor = None
+        if depth > 0:
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=depth)
+        # arguments expected for file lookup
+        self.getNumEvents = "getNumEventsInMetadata" in taskParamMap
+        self.longFormat = taskSpec.respectLumiblock() or taskSpec.orderByLB()
+
+    # record latency of a stage
+    def record(self, stage, duration):
+        for tmpStats in [self.stats, DatasetPrefetcher.globalStats]:
+            with DatasetPrefetcher.statsLock:
+                tmpStat = tmpStats.setdefault(stage, [0, 0.0, 0.0])
+                tmpStat[0] += 1
+                tmpStat[1] += duration
+                tmpStat[2] = max(tmpStat[2], duration)
+
+    # fetch metadata and files of a dataset
+    def fetch(self, datasetSpec):
+        stateUpdateTime = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        startTime = time.time()
+        try:
+            tmpMetadata = self.ddmIF.getDatasetMetaData(datasetSpec.datasetName, ignore_missing=True)
+        finally:
+            self.record("metadata", time.time() - startTime)
+        fileArgs = None
+        tmpFiles = None
+        if tmpMetadata["state"] != "missing":
+            fileArgs = (datasetSpec.datasetName, self.getNumEvents, not datasetSpec.useDuplicatedFiles(), self.longFormat)
+            startTime = time.time()
+            try:
+                tmpFiles = self.ddmIF.getFilesInDataset(fileArgs[0], getNumEvents=fileArgs[1], skipDuplicate=fileArgs[2], longFormat=fileArgs[3])
+            except Exception as e:
+                tmpFiles = e
+            self.record("files", time.time() - startTime)
+        return stateUpdateTime, tmpMetadata, fileArgs, tmpFiles
+
+    # submit lookups for the dataset at the index and the following ones up to the depth
+    def prefetch(self, idx):
+        if self.executor is None:
+            return
+        for datasetSpec in self.dsList[idx : idx + self.depth + 1]:
+            if datasetSpec.isPseudo() or datasetSpec.datasetID in self.futures:
+                continue
+            self.futures[datasetSpec.datasetID] = self.executor.submit(self.fetch, datasetSpec)
+
+    # get the time of state check and metadata
+    def getDatasetMetaData(self, datasetSpec):
+        future = self.futures.get(datasetSpec.datasetID)
+        if future is None:
+            stateUpdateTime = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            return stateUpdateTime, self.ddmIF.getDatasetMetaData(datasetSpec.datasetName, ignore_missing=True)
+        startTime = time.time()
+        try:
+            stateUpdateTime, tmpMetadata, fileArgs, tmpFiles = future.result()
+        finally:
+            self.record("wait", time.time() - startTime)
+        return stateUpdateTime, tmpMetadata
+
+    # get files in dataset, which were prefetched if the same arguments were used
+    def getFilesInDataset(self, datasetSpec, datasetName, getNumEvents, skipDuplicate, longFormat):
+        future = self.futures.pop(datasetSpec.datasetID, None)
+        if future is not None:
+            stateUpdateTime, tmpMetadata, fileArgs, tmpFiles = future.result()
+            if fileArgs == (datasetName, getNumEvents, skipDuplicate, longFormat):
+                if isinstance(tmpFiles, Exception):
+                    raise tmpFiles
+                return tmpFiles
+        if self.executor is not None:
+            self.record("miss", 0)
+        return self.ddmIF.getFilesInDataset(datasetName, getNumEvents=getNumEvents, skipDuplicate=skipDuplicate, longFormat=longFormat)
+
+    # drop prefetched results of a dataset
+    def discard(self, datasetSpec):
+        future = self.futures.pop(datasetSpec.datasetID, None)
+        if future is not None:
+            future.cancel()
+
+    # stop prefetching
+    def close(self):
+        for future in self.futures.values():
+            future.cancel()
+        self.futures = {}
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    # dump latency per stage
+    def dump(self, globalStats=False):
+        if globalStats:
+            tmpStats = DatasetPrefetcher.globalStats
+        else:
+            tmpStats = self.stats
+        with DatasetPrefetcher.statsLock:
+            return " ".join(f"{stage}(n={n},avg={total / n:.2f}s,max={maxVal:.2f}s)" for stage, (n, total, maxVal) in sorted(tmpStats.items()) if n > 0)
 
 
 # thread for real worker
@@ -195,8 +308,14 @@ class ContentsFeederThread(WorkerThread):
                     origNumFiles = taskParamMap["nFiles"]
                 id_to_container = {}
                 [id_to_container.update({datasetSpec.datasetID: datasetSpec.containerName}) for datasetSpec in dsList]
-                for datasetSpec in dsList:
+                # prefetch metadata and files of upcoming datasets
+                prefetchDepth = 0
+                if hasattr(jedi_config.confeeder, "prefetchDepth"):
+                    prefetchDepth = jedi_config.confeeder.prefetchDepth
+                prefetcher = DatasetPrefetcher(ddmIF, taskSpec, taskParamMap, dsList, prefetchDepth)
+                for idxDataset, datasetSpec in enumerate(dsList):
                     tmpLog.debug(f"start loop for {datasetSpec.datasetName}(id={datasetSpec.datasetID})")
+                    prefetcher.prefetch(idxDataset)
                     # index consistency
                     if datasetSpec.indexConsistent():
                         datasetsIdxConsistency.append(datasetSpec.datasetID)
@@ -215,7 +334,7 @@ class ContentsFeederThread(WorkerThread):
                     stateUpdateTime = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
                     try:
                         if not datasetSpec.isPseudo():
-                            tmpMetadata = ddmIF.getDatasetMetaData(datasetSpec.datasetName, ignore_missing=True)
+                            stateUpdateTime, tmpMetadata = prefetcher.getDatasetMetaData(datasetSpec)
                         else:
                             # dummy metadata for pseudo dataset
                             tmpMetadata = {"state": "closed"}
@@ -298,7 +417,7 @@ class ContentsFeederThread(WorkerThread):
                                 longFormat = False
                                 if taskSpec.respectLumiblock() or taskSpec.orderByLB():
                                     longFormat = True
-                                tmpRet = ddmIF.getFilesInDataset(tmpDatasetName, getNumEvents=getNumEvents, skipDuplicate=skipDuplicate, longFormat=longFormat)
+                                tmpRet = prefetcher.getFilesInDataset(datasetSpec, tmpDatasetName, getNumEvents, skipDuplicate, longFormat)
                                 tmpLog.debug(f"got {len(tmpRet)} files in {tmpDatasetName}")
                             else:
                                 if datasetSpec.isSeqNumber():
@@ -518,6 +637,7 @@ class ContentsFeederThread(WorkerThread):
                                 orderBy = None
                             # feed files to the contents table
                             tmpLog.debug("update contents")
+                            timeStartInsert = time.time()
                             retDB, missingFileList, nFilesUnique, diagMap = self.taskBufferIF.insertFilesForDataset_JEDI(
                                 datasetSpec,
                                 tmpRet,
@@ -554,6 +674,7 @@ class ContentsFeederThread(WorkerThread):
                                 maxFileRecords,
                                 skip_short_output,
                             )
+                            prefetcher.record("insert", time.time() - timeStartInsert)
                             if retDB is False:
                                 taskSpec.setErrDiag(f"failed to insert files for {datasetSpec.datasetName}. {diagMap['errMsg']}")
                                 allUpdated = False
@@ -603,6 +724,10 @@ class ContentsFeederThread(WorkerThread):
                                 setFrozenTime = False
                                 break
                     tmpLog.debug("end loop")
+                prefetcher.close()
+                if prefetchDepth > 0:
+                    tmpLog.debug(f"latency with prefetchDepth={prefetchDepth} : {prefetcher.dump()}")
+                    tmpLog.debug(f"latency in total : {prefetcher.dump(True)}")
             # no master input
             if not taskOnHold and not taskBroken and allUpdated and nFilesMaster == 0 and checkedMaster:
                 tmpErrStr = "no master input files. input dataset is empty"
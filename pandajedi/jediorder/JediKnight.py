@@ -2,8 +2,9 @@ import random
 import sys
 import time
 
-from pandajedi.jedicore import Interaction
-from pandajedi.jedicore.ThreadUtils import ZombieCleaner
+from pandajedi.jediconfig import jedi_config
+from pandajedi.jedicore import Interaction, WakeupBus
+from pandajedi.jedicore.ThreadUtils import ListWithLock, WorkerPool, ZombieCleaner
 
 
 class JediKnight(Interaction.CommandReceiveInterface):
@@ -15,6 +16,10 @@ class JediKnight(Interaction.CommandReceiveInterface):
         self.logger = logger
         # intra-node message broker proxies
         self.mb_proxy_dict = kwargs.get("mb_proxy_dict")
+        # persistent worker pool
+        self.workerPool = None
+        # listener of wakeups
+        self.wakeupListener = None
         # start zombie cleaner
         ZombieCleaner().start()
 
@@ -50,6 +55,49 @@ class JediKnight(Interaction.CommandReceiveInterface):
         max_val = min(max_val, default_max_val)
         time.sleep(random.randint(min_val, max_val))
 
+    # get persistent worker pool if enabled in the config section, otherwise None
+    def getWorkerPool(self, configSection, nWorkers):
+        if self.workerPool is None:
+            tmpConfig = getattr(jedi_config, configSection)
+            if hasattr(tmpConfig, "persistentWorkers") and tmpConfig.persistentWorkers:
+                maxQueueSize = 0
+                if hasattr(tmpConfig, "workerQueueSize") and tmpConfig.workerQueueSize:
+                    maxQueueSize = tmpConfig.workerQueueSize
+                self.workerPool = WorkerPool(nWorkers, self.logger, maxQueueSize)
+        return self.workerPool
+
+    # hand over items to the persistent worker pool where a worker thread object processes each chunk of nItems
+    def submitToWorkerPool(self, itemList, nItems, getKey, threadClass, *args):
+        def workerFunc(chunk):
+            thr = threadClass(ListWithLock(chunk), None, *args)
+            thr.runImpl()
+
+        nAccepted = self.workerPool.submit(itemList, workerFunc, getKey, nItems)
+        self.logger.debug(f"submitted {nAccepted}/{len(itemList)} items to {threadClass.__name__} workers with {self.workerPool.dump()}")
+        return nAccepted
+
+    # sleep until the next cycle or a wakeup from other components. return True if woken up
+    def sleepUntilWakeup(self, agentName, sleepPeriod, elapsed=0):
+        busDir = WakeupBus.getBusDir()
+        if busDir is not None and self.wakeupListener is None:
+            try:
+                self.wakeupListener = WakeupBus.WakeupListener(agentName, busDir)
+            except Exception:
+                errtype, errvalue = sys.exc_info()[:2]
+                self.logger.error(f"failed to make wakeup listener with {errtype.__name__} {errvalue}")
+        if self.wakeupListener is None:
+            if sleepPeriod > 0:
+                time.sleep(sleepPeriod)
+            return False
+        # minimum interval between cycles to avoid hammering the DB
+        minInterval = 10
+        if hasattr(jedi_config.master, "wakeupMinInterval"):
+            minInterval = jedi_config.master.wakeupMinInterval
+        isWoken = self.wakeupListener.wait(sleepPeriod, minInterval - elapsed)
+        if isWoken:
+            self.logger.debug(f"woken up for {agentName}")
+        return isWoken
+
 
 # install SCs
 Interaction.installSC(JediKnight)
@@ -8,6 +8,7 @@ import socket
 import sys
 import time
 import traceback
+import zlib
 from urllib.parse import unquote
 
 from pandacommon.pandalogger.PandaLogger import PandaLogger
@@ -50,6 +51,121 @@ TIME_PROFILE_ON = 1
 TIME_PROFILE_DEEP = 2
 
 
+# scheduler to order and skip combinations of vo, label, cloud, queue, and resource type based on recent yields
+class CombinationScheduler(object):
+    # constructor
+    def __init__(self, inactivePollProbability, maxSkipCycles, decayPercent=50, maxSkipSeconds=600):
+        # inactive combinations are polled every N cycles instead of randomly
+        inactivePollProbability = float(inactivePollProbability)
+        if inactivePollProbability > 0:
+            self.inactiveInterval = max(1, int(round(1 / inactivePollProbability)))
+        else:
+            self.inactiveInterval = max(1, maxSkipCycles)
+        self.maxSkipCycles = max(0, maxSkipCycles)
+        # combinations are polled again after maxSkipSeconds regardless of the backoff
+        self.maxSkipSeconds = maxSkipSeconds
+        self.decay = decayPercent / 100
+        self.nCycles = 0
+        # key: {"jobs", "time", "nIdle", "lastCycle", "lastTime", "nextCycle", "outcome"}
+        self.stats = {}
+        self.nOrdered = 0
+        self.nSkipped = 0
+
+    # start a new cycle
+    def newCycle(self):
+        self.nCycles += 1
+        self.nOrdered = 0
+        self.nSkipped = 0
+
+    # make key
+    def getKey(self, vo, prodSourceLabel, cloudName, workQueue, resource_type):
+        return vo, prodSourceLabel, cloudName, workQueue.queue_id, resource_type.resource_name
+
+    # expected number of jobs per second. combinations without history come first
+    def getRate(self, key):
+        tmpStat = self.stats.get(key)
+        if tmpStat is None:
+            return float("inf")
+        return tmpStat["jobs"] / max(tmpStat["time"], 0.1)
+
+    # check if a combination is polled in this cycle
+    def toPoll(self, key, active):
+        tmpStat = self.stats.get(key)
+        if tmpStat is not None:
+            # backoff after unproductive polls
+            if tmpStat["nextCycle"] > self.nCycles and time.time() - tmpStat["lastTime"] < self.maxSkipSeconds:
+                return False, "backoff"
+            # recently productive
+            if tmpStat["nIdle"] == 0 and tmpStat["jobs"] > 0:
+                return True, None
+        if not active:
+            # stagger inactive combinations across cycles
+            if (self.nCycles + zlib.crc32(str(key).encode())) % self.inactiveInterval != 0:
+                return False, "inactive"
+        return True, None
+
+    # get ordered list of combinations to be polled in this cycle
+    def order(self, vo, prodSourceLabel, combinationList, active_gshare_rtypes, tmpLog):
+        toPollList = []
+        skipReasons = {}
+        for cloudName, workQueue, resource_type in combinationList:
+            key = self.getKey(vo, prodSourceLabel, cloudName, workQueue, resource_type)
+            active = not active_gshare_rtypes or (
+                workQueue.queue_name in active_gshare_rtypes and resource_type.resource_name in active_gshare_rtypes[workQueue.queue_name]
+            )
+            toPoll, reason = self.toPoll(key, active)
+            if toPoll:
+                toPollList.append((key, (cloudName, workQueue, resource_type)))
+            else:
+                skipReasons.setdefault(reason, 0)
+                skipReasons[reason] += 1
+        # higher yield first, then least recently polled. sort is stable for ties
+        toPollList.sort(key=lambda x: (-self.getRate(x[0]), self.stats[x[0]]["lastCycle"] if x[0] in self.stats else 0))
+        self.nOrdered += len(toPollList)
+        self.nSkipped += len(combinationList) - len(toPollList)
+        tmpLog.debug(f"cycle={self.nCycles} vo={vo} label={prodSourceLabel} polling {len(toPollList)}/{len(combinationList)} combinations skip={skipReasons}")
+        return [x[1] for x in toPollList]
+
+    # record outcome of a combination
+    def record(self, vo, prodSourceLabel, cloudName, workQueue, resource_type, outcome, nJobs, elapsed):
+        key = self.getKey(vo, prodSourceLabel, cloudName, workQueue, resource_type)
+        tmpStat = self.stats.get(key)
+        if tmpStat is None:
+            tmpStat = {"jobs": nJobs, "time": elapsed, "nIdle": 0, "lastCycle": self.nCycles, "lastTime": 0, "nextCycle": 0, "outcome": outcome}
+            self.stats[key] = tmpStat
+        tmpStat["lastCycle"] = self.nCycles
+        tmpStat["lastTime"] = time.time()
+        tmpStat["outcome"] = outcome
+        # locked by another process or failed due to a temporary problem
+        if outcome not in ["generated", "empty", "throttled"]:
+            return
+        tmpStat["jobs"] = self.decay * tmpStat["jobs"] + (1 - self.decay) * nJobs
+        tmpStat["time"] = self.decay * tmpStat["time"] + (1 - self.decay) * elapsed
+        if nJobs > 0:
+            tmpStat["nIdle"] = 0
+            tmpStat["nextCycle"] = 0
+        else:
+            # exponential backoff
+            tmpStat["nIdle"] += 1
+            nSkip = min(2 ** min(tmpStat["nIdle"] - 1, 16) - 1, self.maxSkipCycles)
+            tmpStat["nextCycle"] = self.nCycles + 1 + nSkip
+
+    # reset the backoff of combinations which had no tasks when woken up since new tasks may be ready
+    def wakeup(self):
+        for tmpStat in self.stats.values():
+            if tmpStat["outcome"] == "empty":
+                tmpStat["nIdle"] = 0
+                tmpStat["nextCycle"] = 0
+
+    # dump
+    def dump(self):
+        nOutcomes = {}
+        for tmpStat in self.stats.values():
+            nOutcomes.setdefault(tmpStat["outcome"], 0)
+            nOutcomes[tmpStat["outcome"]] += 1
+        return f"cycle={self.nCycles} polled={self.nOrdered} skipped={self.nSkipped} known={len(self.stats)} lastOutcomes={nOutcomes}"
+
+
 # worker class to generate jobs
 class JobGenerator(JediKnight):
     # constructor
@@ -77,12 +193,31 @@ class JobGenerator(JediKnight):
         except AttributeError:
             inactive_poll_probability = 0.25
 
+        # throttle and task setupper which are reused across cycles
+        throttle = None
+        taskSetupper = None
+
+        # scheduler of combinations which is reused across cycles
+        combinationScheduler = None
+        if hasattr(jedi_config.jobgen, "costBasedOrdering") and jedi_config.jobgen.costBasedOrdering:
+            if hasattr(jedi_config.jobgen, "maxSkipCycles"):
+                maxSkipCycles = jedi_config.jobgen.maxSkipCycles
+            else:
+                maxSkipCycles = 16
+            if hasattr(jedi_config.jobgen, "maxSkipSeconds"):
+                maxSkipSeconds = jedi_config.jobgen.maxSkipSeconds
+            else:
+                maxSkipSeconds = 600
+            combinationScheduler = CombinationScheduler(inactive_poll_probability, maxSkipCycles, maxSkipSeconds=maxSkipSeconds)
+
         # go into main loop
         while True:
             startTime = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
             tmpLog = MsgWrapper(logger)
             try:
                 tmpLog.debug("start")
+                if combinationScheduler is not None:
+                    combinationScheduler.newCycle()
                 # get SiteMapper
                 siteMapper = self.taskBufferIF.getSiteMapper()
                 tmpLog.debug("got siteMapper")
@@ -95,12 +230,16 @@ class JobGenerator(JediKnight):
                     raise RuntimeError("failed to get resource types")
                 tmpLog.debug("got resource types")
                 # get Throttle
-                throttle = JobThrottler(self.vos, self.prodSourceLabels)
-                throttle.initializeMods(self.taskBufferIF)
+                if throttle is None:
+                    tmpThrottle = JobThrottler(self.vos, self.prodSourceLabels)
+                    tmpThrottle.initializeMods(self.taskBufferIF)
+                    throttle = tmpThrottle
                 tmpLog.debug("got Throttle")
                 # get TaskSetupper
-                taskSetupper = TaskSetupper(self.vos, self.prodSourceLabels)
-                taskSetupper.initializeMods(self.taskBufferIF, self.ddmIF)
+                if taskSetupper is None:
+                    tmpTaskSetupper = TaskSetupper(self.vos, self.prodSourceLabels)
+                    tmpTaskSetupper.initializeMods(self.taskBufferIF, self.ddmIF)
+                    taskSetupper = tmpTaskSetupper
                 # loop over all vos
                 tmpLog.debug("go into loop")
                 for vo in self.vos:
@@ -117,34 +256,76 @@ class JobGenerator(JediKnight):
                         # loop over all clouds
                         random.shuffle(self.cloudList)
                         workQueueList = workQueueMapper.getAlignedQueueList(vo, prodSourceLabel)
-                        for cloudName in self.cloudList:
-                            tmpLog.debug(f"{len(workQueueList)} workqueues for vo:{vo} label:{prodSourceLabel}")
-                            for workQueue in workQueueList:
-                                for resource_type in resource_types:
-                                    workqueue_name_nice = "_".join(workQueue.queue_name.split(" "))
-                                    cycleStr = "pid={0} vo={1} cloud={2} queue={3} ( id={4} ) label={5} resource_type={6}".format(
-                                        self.pid, vo, cloudName, workqueue_name_nice, workQueue.queue_id, prodSourceLabel, resource_type.resource_name
-                                    )
-                                    tmpLog_inner = MsgWrapper(logger, cycleStr)
+                        tmpLog.debug(f"{len(workQueueList)} workqueues for vo:{vo} label:{prodSourceLabel}")
+                        combinationList = [
+                            (cloudName, workQueue, resource_type)
+                            for cloudName in self.cloudList
+                            for workQueue in workQueueList
+                            for resource_type in resource_types
+                        ]
+                        # order and skip combinations based on recent yields
+                        if combinationScheduler is not None:
+                            combinationList = combinationScheduler.order(vo, prodSourceLabel, combinationList, active_gshare_rtypes, tmpLog)
+                        for cloudName, workQueue, resource_type in combinationList:
+                            workqueue_name_nice = "_".join(workQueue.queue_name.split(" "))
+                            cycleStr = "pid={0} vo={1} cloud={2} queue={3} ( id={4} ) label={5} resource_type={6}".format(
+                                self.pid, vo, cloudName, workqueue_name_nice, workQueue.queue_id, prodSourceLabel, resource_type.resource_name
+                            )
+                            tmpLog_inner = MsgWrapper(logger, cycleStr)
 
-                                    # reduce the polling frequency on unused combinations
-                                    active = (
-                                        workQueue.queue_name in active_gshare_rtypes
-                                        and resource_type.resource_name in active_gshare_rtypes[workQueue.queue_name]
+                            # reduce the polling frequency on unused combinations
+                            if combinationScheduler is None:
+                                active = (
+                                    workQueue.queue_name in active_gshare_rtypes and resource_type.resource_name in active_gshare_rtypes[workQueue.queue_name]
+                                )
+                                if active_gshare_rtypes and not active:
+                                    if random.uniform(0, 1) > inactive_poll_probability:
+                                        tmpLog_inner.debug(f"skipping {cycleStr} due to inactivity")
+                                        continue
+
+                            # outcome to be recorded in the scheduler
+                            combStartTime = time.monotonic()
+                            combOutcome = None
+                            combNumJobs = 0
+                            try:
+                                tmpLog_inner.debug(f"start {cycleStr}")
+                                # check if to lock
+                                lockFlag = self.toLockProcess(vo, prodSourceLabel, workQueue.queue_name, cloudName)
+                                flagLocked = False
+                                if lockFlag:
+                                    tmpLog_inner.debug("check if to lock")
+                                    # lock
+                                    flagLocked = self.taskBufferIF.lockProcess_JEDI(
+                                        vo=vo,
+                                        prodSourceLabel=prodSourceLabel,
+                                        cloud=cloudName,
+                                        workqueue_id=workQueue.queue_id,
+                                        resource_name=resource_type.resource_name,
+                                        component=None,
+                                        pid=self.pid,
                                     )
-                                    if active_gshare_rtypes and not active:
-                                        if random.uniform(0, 1) > inactive_poll_probability:
-                                            tmpLog_inner.debug(f"skipping {cycleStr} due to inactivity")
-                                            continue
+                                    if not flagLocked:
+                                        tmpLog_inner.debug("skip since locked by another process")
+                                        combOutcome = "locked"
+                                        continue
 
-                                    tmpLog_inner.debug(f"start {cycleStr}")
-                                    # check if to lock
-                                    lockFlag = self.toLockProcess(vo, prodSourceLabel, workQueue.queue_name, cloudName)
-                                    flagLocked = False
-                                    if lockFlag:
-                                        tmpLog_inner.debug("check if to lock")
-                                        # lock
-                                        flagLocked = self.taskBufferIF.lockProcess_JEDI(
+                                # throttle
+                                tmpLog_inner.debug(f"check throttle with {throttle.getClassName(vo, prodSourceLabel)}")
+                                try:
+                                    tmpSt, thrFlag = throttle.toBeThrottled(vo, prodSourceLabel, cloudName, workQueue, resource_type.resource_name)
+                                except Exception:
+                                    errtype, errvalue = sys.exc_info()[:2]
+                                    tmpLog_inner.error(f"throttler failed with {errtype} {errvalue}")
+                                    tmpLog_inner.error(f"throttler failed with traceback {traceback.format_exc()}")
+                                    raise RuntimeError("crashed when checking throttle")
+                                if tmpSt != self.SC_SUCCEEDED:
+                                    raise RuntimeError("failed to check throttle")
+                                mergeUnThrottled = None
+                                if thrFlag is True:
+                                    if flagLocked:
+                                        tmpLog_inner.debug("throttled")
+                                        combOutcome = "throttled"
+                                        self.taskBufferIF.unlockProcess_JEDI(
                                             vo=vo,
                                             prodSourceLabel=prodSourceLabel,
                                             cloud=cloudName,
@@ -153,25 +334,16 @@ class JobGenerator(JediKnight):
                                             component=None,
                                             pid=self.pid,
                                         )
-                                        if not flagLocked:
-                                            tmpLog_inner.debug("skip since locked by another process")
-                                            continue
-
-                                    # throttle
-                                    tmpLog_inner.debug(f"check throttle with {throttle.getClassName(vo, prodSourceLabel)}")
-                                    try:
-                                        tmpSt, thrFlag = throttle.toBeThrottled(vo, prodSourceLabel, cloudName, workQueue, resource_type.resource_name)
-                                    except Exception:
-                                        errtype, errvalue = sys.exc_info()[:2]
-                                        tmpLog_inner.error(f"throttler failed with {errtype} {errvalue}")
-                                        tmpLog_inner.error(f"throttler failed with traceback {traceback.format_exc()}")
-                                        raise RuntimeError("crashed when checking throttle")
-                                    if tmpSt != self.SC_SUCCEEDED:
-                                        raise RuntimeError("failed to check throttle")
-                                    mergeUnThrottled = None
-                                    if thrFlag is True:
+                                        continue
+                                elif thrFlag is False:
+                                    pass
+                                else:
+                                    # leveled flag
+                                    mergeUnThrottled = not throttle.mergeThrottled(vo, workQueue.queue_type, thrFlag)
+                                    if not mergeUnThrottled:
+                                        tmpLog_inner.debug("throttled including merge")
                                         if flagLocked:
-                                            tmpLog_inner.debug("throttled")
+                                            combOutcome = "throttled"
                                             self.taskBufferIF.unlockProcess_JEDI(
                                                 vo=vo,
                                                 prodSourceLabel=prodSourceLabel,
@@ -182,127 +354,34 @@ class JobGenerator(JediKnight):
                                                 pid=self.pid,
                                             )
                                             continue
-                                    elif thrFlag is False:
-                                        pass
                                     else:
-                                        # leveled flag
-                                        mergeUnThrottled = not throttle.mergeThrottled(vo, workQueue.queue_type, thrFlag)
-                                        if not mergeUnThrottled:
-                                            tmpLog_inner.debug("throttled including merge")
-                                            if flagLocked:
-                                                self.taskBufferIF.unlockProcess_JEDI(
-                                                    vo=vo,
-                                                    prodSourceLabel=prodSourceLabel,
-                                                    cloud=cloudName,
-                                                    workqueue_id=workQueue.queue_id,
-                                                    resource_name=resource_type.resource_name,
-                                                    component=None,
-                                                    pid=self.pid,
-                                                )
-                                                continue
-                                        else:
-                                            tmpLog_inner.debug("only merge is unthrottled")
+                                        tmpLog_inner.debug("only merge is unthrottled")
 
-                                    tmpLog_inner.debug(f"minPriority={throttle.minPriority} maxNumJobs={throttle.maxNumJobs}")
-                                    # get typical number of files
-                                    typicalNumFilesMap = self.taskBufferIF.getTypicalNumInput_JEDI(vo, prodSourceLabel, workQueue, useResultCache=600)
-                                    if typicalNumFilesMap is None:
-                                        raise RuntimeError("failed to get typical number of files")
-                                    # get params
-                                    tmpParamsToGetTasks = self.getParamsToGetTasks(vo, prodSourceLabel, workQueue.queue_name, cloudName)
-                                    nTasksToGetTasks = tmpParamsToGetTasks["nTasks"]
-                                    nFilesToGetTasks = tmpParamsToGetTasks["nFiles"]
-                                    tmpLog_inner.debug(f"nTasks={nTasksToGetTasks} nFiles={nFilesToGetTasks} to get tasks")
-                                    # get number of tasks to generate new jumbo jobs
-                                    numTasksWithRunningJumbo = self.taskBufferIF.getNumTasksWithRunningJumbo_JEDI(vo, prodSourceLabel, cloudName, workQueue)
-                                    if not self.withThrottle:
-                                        numTasksWithRunningJumbo = 0
-                                    maxNumTasksWithRunningJumbo = 50
-                                    if numTasksWithRunningJumbo < maxNumTasksWithRunningJumbo:
-                                        numNewTaskWithJumbo = maxNumTasksWithRunningJumbo - numTasksWithRunningJumbo
-                                        if numNewTaskWithJumbo < 0:
-                                            numNewTaskWithJumbo = 0
-                                    else:
+                                tmpLog_inner.debug(f"minPriority={throttle.minPriority} maxNumJobs={throttle.maxNumJobs}")
+                                # get typical number of files
+                                typicalNumFilesMap = self.taskBufferIF.getTypicalNumInput_JEDI(vo, prodSourceLabel, workQueue, useResultCache=600)
+                                if typicalNumFilesMap is None:
+                                    raise RuntimeError("failed to get typical number of files")
+                                # get params
+                                tmpParamsToGetTasks = self.getParamsToGetTasks(vo, prodSourceLabel, workQueue.queue_name, cloudName)
+                                nTasksToGetTasks = tmpParamsToGetTasks["nTasks"]
+                                nFilesToGetTasks = tmpParamsToGetTasks["nFiles"]
+                                tmpLog_inner.debug(f"nTasks={nTasksToGetTasks} nFiles={nFilesToGetTasks} to get tasks")
+                                # get number of tasks to generate new jumbo jobs
+                                numTasksWithRunningJumbo = self.taskBufferIF.getNumTasksWithRunningJumbo_JEDI(vo, prodSourceLabel, cloudName, workQueue)
+                                if not self.withThrottle:
+                                    numTasksWithRunningJumbo = 0
+                                maxNumTasksWithRunningJumbo = 50
+                                if numTasksWithRunningJumbo < maxNumTasksWithRunningJumbo:
+                                    numNewTaskWithJumbo = maxNumTasksWithRunningJumbo - numTasksWithRunningJumbo
+                                    if numNewTaskWithJumbo < 0:
                                         numNewTaskWithJumbo = 0
-                                    # release lock when lack of jobs
-                                    lackOfJobs = False
-                                    if thrFlag is False and flagLocked and throttle.lackOfJobs:
-                                        tmpLog_inner.debug(f"unlock {cycleStr} for multiple processes to quickly fill the queue until nQueueLimit is reached")
-                                        self.taskBufferIF.unlockProcess_JEDI(
-                                            vo=vo,
-                                            prodSourceLabel=prodSourceLabel,
-                                            cloud=cloudName,
-                                            workqueue_id=workQueue.queue_id,
-                                            resource_name=resource_type.resource_name,
-                                            component=None,
-                                            pid=self.pid,
-                                        )
-                                        lackOfJobs = True
-                                    # get the list of input
-                                    tmpList = self.taskBufferIF.getTasksToBeProcessed_JEDI(
-                                        self.pid,
-                                        vo,
-                                        workQueue,
-                                        prodSourceLabel,
-                                        cloudName,
-                                        nTasks=nTasksToGetTasks,
-                                        nFiles=nFilesToGetTasks,
-                                        minPriority=throttle.minPriority,
-                                        maxNumJobs=throttle.maxNumJobs,
-                                        typicalNumFilesMap=typicalNumFilesMap,
-                                        mergeUnThrottled=mergeUnThrottled,
-                                        numNewTaskWithJumbo=numNewTaskWithJumbo,
-                                        resource_name=resource_type.resource_name,
-                                    )
-                                    if tmpList is None:
-                                        # failed
-                                        tmpLog_inner.error("failed to get the list of input chunks to generate jobs")
-                                    else:
-                                        tmpLog_inner.debug(f"got {len(tmpList)} input tasks")
-                                        if len(tmpList) != 0:
-                                            # put to a locked list
-                                            inputList = ListWithLock(tmpList)
-                                            # make thread pool
-                                            threadPool = ThreadPool()
-                                            # make lock if necessary
-                                            if lockFlag:
-                                                liveCounter = MapWithLock()
-                                            else:
-                                                liveCounter = None
-                                            # make list for brokerage lock
-                                            brokerageLockIDs = ListWithLock([])
-                                            # make workers
-                                            nWorker = jedi_config.jobgen.nWorkers
-                                            for iWorker in range(nWorker):
-                                                thr = JobGeneratorThread(
-                                                    inputList,
-                                                    threadPool,
-                                                    self.taskBufferIF,
-                                                    self.ddmIF,
-                                                    siteMapper,
-                                                    self.execJobs,
-                                                    taskSetupper,
-                                                    self.pid,
-                                                    workQueue,
-                                                    resource_type.resource_name,
-                                                    cloudName,
-                                                    liveCounter,
-                                                    brokerageLockIDs,
-                                                    lackOfJobs,
-                                                    resource_types,
-                                                )
-                                                globalThreadPool.add(thr)
-                                                thr.start()
-                                            # join
-                                            tmpLog_inner.debug("try to join")
-                                            threadPool.join(60 * 10)
-                                            # unlock locks made by brokerage
-                                            for brokeragelockID in brokerageLockIDs:
-                                                self.taskBufferIF.unlockProcessWithPID_JEDI(
-                                                    vo, prodSourceLabel, workQueue.queue_name, resource_type.resource_name, brokeragelockID, True
-                                                )
-                                            tmpLog_inner.debug(f"dump one-time pool : {threadPool.dump()} remTasks={inputList.dump()}")
-                                    # unlock
+                                else:
+                                    numNewTaskWithJumbo = 0
+                                # release lock when lack of jobs
+                                lackOfJobs = False
+                                if thrFlag is False and flagLocked and throttle.lackOfJobs:
+                                    tmpLog_inner.debug(f"unlock {cycleStr} for multiple processes to quickly fill the queue until nQueueLimit is reached")
                                     self.taskBufferIF.unlockProcess_JEDI(
                                         vo=vo,
                                         prodSourceLabel=prodSourceLabel,
@@ -312,6 +391,94 @@ class JobGenerator(JediKnight):
                                         component=None,
                                         pid=self.pid,
                                     )
+                                    lackOfJobs = True
+                                # get the list of input
+                                tmpList = self.taskBufferIF.getTasksToBeProcessed_JEDI(
+                                    self.pid,
+                                    vo,
+                                    workQueue,
+                                    prodSourceLabel,
+                                    cloudName,
+                                    nTasks=nTasksToGetTasks,
+                                    nFiles=nFilesToGetTasks,
+                                    minPriority=throttle.minPriority,
+                                    maxNumJobs=throttle.maxNumJobs,
+                                    typicalNumFilesMap=typicalNumFilesMap,
+                                    mergeUnThrottled=mergeUnThrottled,
+                                    numNewTaskWithJumbo=numNewTaskWithJumbo,
+                                    resource_name=resource_type.resource_name,
+                                )
+                                if tmpList is None:
+                                    # failed
+                                    tmpLog_inner.error("failed to get the list of input chunks to generate jobs")
+                                    combOutcome = "failed"
+                                else:
+                                    tmpLog_inner.debug(f"got {len(tmpList)} input tasks")
+                                    combOutcome = "empty"
+                                    if len(tmpList) != 0:
+                                        # put to a locked list
+                                        inputList = ListWithLock(tmpList)
+                                        # make thread pool
+                                        threadPool = ThreadPool()
+                                        # make lock if necessary
+                                        if lockFlag:
+                                            liveCounter = MapWithLock()
+                                        else:
+                                            liveCounter = None
+                                        # make list for brokerage lock
+                                        brokerageLockIDs = ListWithLock([])
+                                        # make workers
+                                        nWorker = jedi_config.jobgen.nWorkers
+                                        workerList = []
+                                        for iWorker in range(nWorker):
+                                            thr = JobGeneratorThread(
+                                                inputList,
+                                                threadPool,
+                                                self.taskBufferIF,
+                                                self.ddmIF,
+                                                siteMapper,
+                                                self.execJobs,
+                                                taskSetupper,
+                                                self.pid,
+                                                workQueue,
+                                                resource_type.resource_name,
+                                                cloudName,
+                                                liveCounter,
+                                                brokerageLockIDs,
+                                                lackOfJobs,
+                                                resource_types,
+                                            )
+                                            globalThreadPool.add(thr)
+                                            workerList.append(thr)
+                                            thr.start()
+                                        # join
+                                        tmpLog_inner.debug("try to join")
+                                        threadPool.join(60 * 10)
+                                        # unlock locks made by brokerage
+                                        for brokeragelockID in brokerageLockIDs:
+                                            self.taskBufferIF.unlockProcessWithPID_JEDI(
+                                                vo, prodSourceLabel, workQueue.queue_name, resource_type.resource_name, brokeragelockID, True
+                                            )
+                                        tmpLog_inner.debug(f"dump one-time pool : {threadPool.dump()} remTasks={inputList.dump()}")
+                                        # count generated jobs
+                                        combNumJobs = sum(thr.numGenJobs for thr in workerList)
+                                        if combNumJobs > 0:
+                                            combOutcome = "generated"
+                                # unlock
+                                self.taskBufferIF.unlockProcess_JEDI(
+                                    vo=vo,
+                                    prodSourceLabel=prodSourceLabel,
+                                    cloud=cloudName,
+                                    workqueue_id=workQueue.queue_id,
+                                    resource_name=resource_type.resource_name,
+                                    component=None,
+                                    pid=self.pid,
+                                )
+                            finally:
+                                if combinationScheduler is not None:
+                                    combinationScheduler.record(
+                                        vo, prodSourceLabel, cloudName, workQueue, resource_type, combOutcome, combNumJobs, time.monotonic() - combStartTime
+                                    )
             except Exception:
                 errtype, errvalue = sys.exc_info()[:2]
                 tmpLog.error(f"failed in {self.__class__.__name__}.start() with {errtype.__name__}:{errvalue} {traceback.format_exc()}")
@@ -337,6 +504,8 @@ class JobGenerator(JediKnight):
                 globalThreadPool.clean()
                 # dump
                 tmpLog.debug(f"dump global pool : {globalThreadPool.dump()}")
+                if combinationScheduler is not None:
+                    tmpLog.debug(f"dump combination scheduler : {combinationScheduler.dump()}")
             except Exception:
                 errtype, errvalue = sys.exc_info()[:2]
                 tmpLog.error(f"failed to dump global pool with {errtype.__name__} {errvalue}")
@@ -360,10 +529,11 @@ class JobGenerator(JediKnight):
             timeDelta = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - startTime
             sleepPeriod = loopCycle - timeDelta.seconds
             tmpLog.debug(f"loopCycle {loopCycle}s; sleeping {sleepPeriod}s")
-            if sleepPeriod > 0:
-                time.sleep(sleepPeriod)
-            # randomize cycle
-            self.randomSleep(max_val=loopCycle)
+            if not self.sleepUntilWakeup("jobgen", sleepPeriod, timeDelta.seconds):
+                # randomize cycle
+                self.randomSleep(max_val=loopCycle)
+            elif combinationScheduler is not None:
+                combinationScheduler.wakeup()
 
     # get parameters to get tasks
     def getParamsToGetTasks(self, vo, prodSourceLabel, queueName, cloudName):
@@ -221,12 +221,18 @@ class JobSplitter:
                     dynNumEvents = True
                 else:
                     dynNumEvents = False
-                tmpLog.debug(f"chosen {siteName} : {getCandidateMsg} : nQueue={siteCandidate.nQueuedJobs} nRunCap={siteCandidate.nRunningJobsCap}")
-                tmpLog.debug(f"new weight {siteCandidate.weight}")
+                tmpLog.debug("chosen %s : %s : nQueue=%s nRunCap=%s", siteName, getCandidateMsg, siteCandidate.nQueuedJobs, siteCandidate.nRunningJobsCap)
+                tmpLog.debug("new weight %s", siteCandidate.weight)
                 tmpLog.debug(
-                    f"maxSize={maxSize} maxWalltime={maxWalltime} coreCount={coreCount} corePower={corePower} maxDisk={maxDiskSize} dynNumEvents={dynNumEvents}"
+                    "maxSize=%s maxWalltime=%s coreCount=%s corePower=%s maxDisk=%s dynNumEvents=%s",
+                    maxSize,
+                    maxWalltime,
+                    coreCount,
+                    corePower,
+                    maxDiskSize,
+                    dynNumEvents,
                 )
-                tmpLog.debug(f"useDirectIO={useDirectIO} label={taskSpec.prodSourceLabel}")
+                tmpLog.debug("useDirectIO=%s label=%s", useDirectIO, taskSpec.prodSourceLabel)
             # get sub chunk
             subChunk, _ = inputChunk.getSubChunk(
                 siteName,
@@ -266,7 +272,7 @@ class JobSplitter:
                         if tmp_dataset.isDistributed() and not siteCandidate.isAvailableFile(tmp_files[-1]) and siteCandidate.isAvailableFile(tmp_files[0]):
                             change_site_for_dist_dataset = True
                             tmpLog.debug(
-                                f"change site since the last file in distributed sub-dataset was unavailable at {siteName} while the first file was available"
+                                "change site since the last file in distributed sub-dataset was unavailable at %s while the first file was available", siteName
                             )
                         break
             else:
@@ -278,7 +284,7 @@ class JobSplitter:
         if subChunks != []:
             # skip if chunk size is not enough
             if allow_chunk_size_limit and strict_chunkSize and len(subChunks) < nSubChunks:
-                tmpLog.debug(f"skip splitting since chunk size {len(subChunks)} is less than chunk size limit {nSubChunks} at {siteName}")
+                tmpLog.debug("skip splitting since chunk size %s is less than chunk size limit %s at %s", len(subChunks), nSubChunks, siteName)
                 inputChunk.rollback_file_usage()
                 isSkipped = True
             else:
@@ -60,12 +60,16 @@ class PostProcessor(JediKnight, FactoryBase):
                             tmpLog.error("failed to get tasks to be finished")
                         else:
                             tmpLog.info(f"got {len(tmpList)} tasks")
+                            nWorker = jedi_config.postprocessor.nWorkers
+                            if self.getWorkerPool("postprocessor", nWorker) is not None:
+                                # hand over to persistent workers without waiting for stragglers
+                                self.submitToWorkerPool(tmpList, 10, lambda x: x.jediTaskID, PostProcessorThread, self.taskBufferIF, self.ddmIF, self)
+                                continue
                             # put to a locked list
                             taskList = ListWithLock(tmpList)
                             # make thread pool
                             threadPool = ThreadPool()
                             # make workers
-                            nWorker = jedi_config.postprocessor.nWorkers
                             for iWorker in range(nWorker):
                                 thr = PostProcessorThread(taskList, threadPool, self.taskBufferIF, self.ddmIF, self)
                                 thr.start()
@@ -1,6 +1,5 @@
 import datetime
 import sys
-import time
 
 # logger
 from pandacommon.pandalogger.PandaLogger import PandaLogger
@@ -57,17 +56,21 @@ class TaskBroker(JediKnight, FactoryBase):
                                     tmpLog.error(msgLabel + "failed to get the list of tasks to check")
                                 else:
                                     tmpLog.debug(msgLabel + f"got tasks_to_check={len(tmpList)}")
-                                    # put to a locked list
-                                    taskList = ListWithLock(tmpList)
-                                    # make thread pool
-                                    threadPool = ThreadPool()
-                                    # make workers
                                     nWorker = jedi_config.taskbroker.nWorkers
-                                    for iWorker in range(nWorker):
-                                        thr = TaskCheckerThread(taskList, threadPool, self.taskBufferIF, self.ddmIF, self, vo, prodSourceLabel)
-                                        thr.start()
-                                    # join
-                                    threadPool.join()
+                                    if self.getWorkerPool("taskbroker", nWorker) is not None:
+                                        # hand over to persistent workers without waiting for stragglers
+                                        self.submitToWorkerPool(tmpList, 100, None, TaskCheckerThread, self.taskBufferIF, self.ddmIF, self, vo, prodSourceLabel)
+                                    else:
+                                        # put to a locked list
+                                        taskList = ListWithLock(tmpList)
+                                        # make thread pool
+                                        threadPool = ThreadPool()
+                                        # make workers
+                                        for iWorker in range(nWorker):
+                                            thr = TaskCheckerThread(taskList, threadPool, self.taskBufferIF, self.ddmIF, self, vo, prodSourceLabel)
+                                            thr.start()
+                                        # join
+                                        threadPool.join()
                                 # get the list of tasks to assign
                                 tmpList = self.taskBufferIF.getTasksToAssign_JEDI(vo, prodSourceLabel, workQueue, resource_type.resource_name)
                                 if tmpList is None:
@@ -75,16 +78,14 @@ class TaskBroker(JediKnight, FactoryBase):
                                     tmpLog.error(msgLabel + "failed to get the list of tasks to assign")
                                 else:
                                     tmpLog.debug(msgLabel + f"got tasks_to_assign={len(tmpList)}")
-                                    # put to a locked list
-                                    taskList = ListWithLock(tmpList)
-                                    # make thread pool
-                                    threadPool = ThreadPool()
-                                    # make workers
                                     nWorker = jedi_config.taskbroker.nWorkers
-                                    for iWorker in range(nWorker):
-                                        thr = TaskBrokerThread(
-                                            taskList,
-                                            threadPool,
+                                    if self.getWorkerPool("taskbroker", nWorker) is not None:
+                                        # hand over to persistent workers without waiting for stragglers
+                                        self.submitToWorkerPool(
+                                            tmpList,
+                                            100,
+                                            None,
+                                            TaskBrokerThread,
                                             self.taskBufferIF,
                                             self.ddmIF,
                                             self,
@@ -93,9 +94,27 @@ class TaskBroker(JediKnight, FactoryBase):
                                             workQueue,
                                             resource_type.resource_name,
                                         )
-                                        thr.start()
-                                    # join
-                                    threadPool.join()
+                                    else:
+                                        # put to a locked list
+                                        taskList = ListWithLock(tmpList)
+                                        # make thread pool
+                                        threadPool = ThreadPool()
+                                        # make workers
+                                        for iWorker in range(nWorker):
+                                            thr = TaskBrokerThread(
+                                                taskList,
+                                                threadPool,
+                                                self.taskBufferIF,
+                                                self.ddmIF,
+                                                self,
+                                                vo,
+                                                prodSourceLabel,
+                                                workQueue,
+                                                resource_type.resource_name,
+                                            )
+                                            thr.start()
+                                        # join
+                                        threadPool.join()
                                 tmpLog.debug(msgLabel + "done")
             except Exception:
                 errtype, errvalue = sys.exc_info()[:2]
@@ -105,10 +124,9 @@ class TaskBroker(JediKnight, FactoryBase):
             loopCycle = jedi_config.taskbroker.loopCycle
             timeDelta = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - startTime
             sleepPeriod = loopCycle - timeDelta.seconds
-            if sleepPeriod > 0:
-                time.sleep(sleepPeriod)
-            # randomize cycle
-            self.randomSleep(max_val=loopCycle)
+            if not self.sleepUntilWakeup("taskbroker", sleepPeriod, timeDelta.seconds):
+                # randomize cycle
+                self.randomSleep(max_val=loopCycle)
 
 
 # thread for real worker
@@ -141,10 +159,14 @@ class TaskCheckerThread(WorkerThread):
                 tmpLog = MsgWrapper(self.logger)
                 tmpLog.info(f"start TaskCheckerThread {idxTasks}/{totalTasks} for jediTaskID={taskList}")
                 tmpStat = Interaction.SC_SUCCEEDED
-                # get TaskSpecs
+                # get TaskSpecs. Commands are pipelined to one child process not to wait for each response
                 taskSpecList = []
-                for jediTaskID in taskList:
-                    tmpRet, taskSpec = self.taskBufferIF.getTaskWithID_JEDI(jediTaskID, False)
+                retList = self.taskBufferIF.pipelineCall([("getTaskWithID_JEDI", (jediTaskID, False), {}) for jediTaskID in taskList])
+                for jediTaskID, tmpItem in zip(taskList, retList):
+                    if isinstance(tmpItem, Exception):
+                        tmpLog.error(f"failed to get taskSpec for jediTaskID={jediTaskID} with {tmpItem.__class__.__name__}:{tmpItem}")
+                        continue
+                    tmpRet, taskSpec = tmpItem
                     if tmpRet and taskSpec is not None:
                         taskSpecList.append(taskSpec)
                     else:
@@ -217,8 +239,17 @@ class TaskBrokerThread(WorkerThread):
                 tmpStat = Interaction.SC_SUCCEEDED
                 # get TaskSpecs
                 tmpListToAssign = []
-                for tmpTaskItem in taskList:
-                    tmpListItem = self.taskBufferIF.getTasksToBeProcessed_JEDI(None, None, None, None, None, simTasks=[tmpTaskItem], readMinFiles=True)
+                retList = self.taskBufferIF.pipelineCall(
+                    [
+                        ("getTasksToBeProcessed_JEDI", (None, None, None, None, None), {"simTasks": [tmpTaskItem], "readMinFiles": True})
+                        for tmpTaskItem in taskList
+                    ]
+                )
+                for tmpTaskItem, tmpListItem in zip(taskList, retList):
+                    if isinstance(tmpListItem, Exception):
+                        tmpLog.error(f"failed to get the input chunks for jediTaskID={tmpTaskItem} with {tmpListItem.__class__.__name__}:{tmpListItem}")
+                        tmpStat = Interaction.SC_FAILED
+                        break
                     if tmpListItem is None:
                         # failed
                         tmpLog.error(f"failed to get the input chunks for jediTaskID={tmpTaskItem}")
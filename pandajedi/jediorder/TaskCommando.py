@@ -50,12 +50,16 @@ class TaskCommando(JediKnight):
                             tmpLog.error(f"failed to get the task list for vo={vo} label={prodSourceLabel}")
                         else:
                             tmpLog.debug(f"got {len(tmpList)} tasks")
+                            nWorker = jedi_config.taskrefine.nWorkers
+                            if self.getWorkerPool("tcommando", nWorker) is not None:
+                                # hand over to persistent workers without waiting for stragglers
+                                self.submitToWorkerPool(tmpList, 10, lambda x: x[0], TaskCommandoThread, self.taskBufferIF, self.ddmIF, self.pid)
+                                continue
                             # put to a locked list
                             taskList = ListWithLock(tmpList)
                             # make thread pool
                             threadPool = ThreadPool()
                             # make workers
-                            nWorker = jedi_config.taskrefine.nWorkers
                             for iWorker in range(nWorker):
                                 thr = TaskCommandoThread(taskList, threadPool, self.taskBufferIF, self.ddmIF, self.pid)
                                 thr.start()
@@ -1,6 +1,5 @@
 import datetime
 import sys
-import time
 import traceback
 
 from pandacommon.pandalogger.PandaLogger import PandaLogger
@@ -50,14 +49,18 @@ class TaskRefiner(JediKnight, FactoryBase):
                             tmpLog.error("failed to get the list of tasks to refine")
                         else:
                             tmpLog.debug(f"got {len(tmpList)} tasks")
+                            # get work queue mapper
+                            workQueueMapper = self.taskBufferIF.getWorkQueueMap()
+                            nWorker = jedi_config.taskrefine.nWorkers
+                            if self.getWorkerPool("taskrefine", nWorker) is not None:
+                                # hand over to persistent workers without waiting for stragglers
+                                self.submitToWorkerPool(tmpList, 10, lambda x: x[0], TaskRefinerThread, self.taskBufferIF, self.ddmIF, self, workQueueMapper)
+                                continue
                             # put to a locked list
                             taskList = ListWithLock(tmpList)
                             # make thread pool
                             threadPool = ThreadPool()
-                            # get work queue mapper
-                            workQueueMapper = self.taskBufferIF.getWorkQueueMap()
                             # make workers
-                            nWorker = jedi_config.taskrefine.nWorkers
                             for _ in range(nWorker):
                                 thr = TaskRefinerThread(taskList, threadPool, self.taskBufferIF, self.ddmIF, self, workQueueMapper)
                                 thr.start()
@@ -71,10 +74,9 @@ class TaskRefiner(JediKnight, FactoryBase):
             loopCycle = jedi_config.taskrefine.loopCycle
             timeDelta = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - startTime
             sleepPeriod = loopCycle - timeDelta.seconds
-            if sleepPeriod > 0:
-                time.sleep(sleepPeriod)
-            # randomize cycle
-            self.randomSleep(max_val=loopCycle)
+            if not self.sleepUntilWakeup("taskrefine", sleepPeriod, timeDelta.seconds):
+                # randomize cycle
+                self.randomSleep(max_val=loopCycle)
 
 
 # thread for real worker
@@ -0,0 +1,365 @@
+"""
+benchmark for the job generation hot path with synthetic tasks, datasets, and files.
+no DB or DDM is needed since taskBufferIF and ddmIF are replaced with stubs
+
+usage: python jobGeneratorBenchmark.py [-h] [--tasks N] [--files N] ...
+
+"""
+
+import argparse
+import copy
+import datetime
+import gc
+import random
+import resource
+import sys
+import time
+
+from pandaserver.taskbuffer.SiteSpec import SiteSpec
+
+from pandajedi.jedicore import Interaction
+from pandajedi.jedicore.InputChunk import InputChunk
+from pandajedi.jedicore.JediDatasetSpec import JediDatasetSpec
+from pandajedi.jedicore.JediFileSpec import JediFileSpec
+from pandajedi.jedicore.JediTaskSpec import JediTaskSpec
+from pandajedi.jedicore.MsgWrapper import MsgWrapper
+from pandajedi.jedicore.SiteCandidate import SiteCandidate
+from pandajedi.jediorder.JobGenerator import JobGeneratorThread, logger
+from pandajedi.jediorder.JobSplitter import JobSplitter
+
+# datasetIDs of synthetic datasets
+INPUT_DATASET_ID = 1
+OUTPUT_DATASET_ID = 2
+LOG_DATASET_ID = 3
+
+
+# site mapper with synthetic sites
+class BenchmarkSiteMapper:
+    def __init__(self, n_sites):
+        self.siteSpecList = {}
+        for i in range(n_sites):
+            site_spec = SiteSpec()
+            site_spec.sitename = f"BENCH_SITE_{i}"
+            site_spec.nickname = site_spec.sitename
+            site_spec.pandasite = site_spec.sitename
+            site_spec.cloud = "WORLD"
+            site_spec.status = "online"
+            site_spec.type = "production"
+            site_spec.coreCount = random.choice([1, 8])
+            site_spec.corepower = 10.0
+            site_spec.maxwdir = 100000
+            site_spec.maxtime = 172800
+            site_spec.mintime = 0
+            site_spec.maxrss = 16000
+            site_spec.minrss = 0
+            site_spec.catchall = ""
+            site_spec.direct_access_lan = False
+            site_spec.ddm_endpoints_input = {"default": None}
+            site_spec.ddm_endpoints_output = {"default": None}
+            site_spec.ddm_input = {"default": f"{site_spec.sitename}_DATADISK"}
+            site_spec.ddm_output = {"default": f"{site_spec.sitename}_DATADISK"}
+            self.siteSpecList[site_spec.sitename] = site_spec
+
+    def checkSite(self, site_name):
+        return site_name in self.siteSpecList
+
+    def getSite(self, site_name):
+        return self.siteSpecList[site_name]
+
+
+# task buffer which returns synthetic records without DB
+class BenchmarkTaskBuffer:
+    def __init__(self):
+        self.serial_numbers = {}
+        self.dataset_map = {}
+
+    # register a dataset
+    def add_dataset(self, dataset_spec):
+        self.dataset_map[(dataset_spec.jediTaskID, dataset_spec.datasetID)] = dataset_spec
+
+    def getConfigValue(self, component, key, app="pandaserver", vo=None):
+        return None
+
+    def lockTask_JEDI(self, jedi_task_id, pid):
+        return True
+
+    def getDatasetWithID_JEDI(self, jedi_task_id, dataset_id, lockTask=False):
+        return True, self.dataset_map[(jedi_task_id, dataset_id)]
+
+    def getDatasetsWithJediTaskID_JEDI(self, jedi_task_id, datasetTypes=None):
+        return True, [v for (t, _), v in self.dataset_map.items() if t == jedi_task_id and (datasetTypes is None or v.type in datasetTypes)]
+
+    def bulkFetchFileIDs_JEDI(self, jedi_task_id, n_ids):
+        return list(range(n_ids))
+
+    def getRandomSeed_JEDI(self, jedi_task_id, simul, n_seeds=1):
+        return True, ([], None)
+
+    # make output files in the same layout as JediDBProxy.getOutputFiles_JEDI
+    def getOutputFiles_JEDI(
+        self,
+        jedi_task_id,
+        provenance_id,
+        simul,
+        instantiate_tmpl,
+        instantiated_sites,
+        is_unmerging,
+        is_prepro,
+        xml_config_job,
+        site_ds_map,
+        middle_name,
+        register_datasets,
+        parallel_out_map,
+        file_id_pool,
+        n_files_per_chunk=1,
+        bulk_fetch_for_multiple_jobs=False,
+        master_dataset_id=None,
+    ):
+        if site_ds_map is None:
+            site_ds_map = {}
+        n_loops = n_files_per_chunk if bulk_fetch_for_multiple_jobs else 1
+        out_maps = []
+        serial_numbers = []
+        parallel_out_maps = []
+        for _ in range(n_loops):
+            serial_nr = self.serial_numbers.get(jedi_task_id, 1)
+            self.serial_numbers[jedi_task_id] = serial_nr + 1
+            out_map = {}
+            tmp_parallel_out_map = {}
+            for dataset_id, stream_name in ((OUTPUT_DATASET_ID, "OUTPUT0"), (LOG_DATASET_ID, "LOG")):
+                file_spec = JediFileSpec()
+                file_spec.jediTaskID = jedi_task_id
+                file_spec.datasetID = dataset_id
+                file_spec.fileID = serial_nr * 10 + dataset_id
+                file_spec.lfn = f"bench.{jedi_task_id}.{stream_name}._{serial_nr:06d}.root"
+                file_spec.type = "log" if stream_name == "LOG" else "output"
+                file_spec.status = "defined"
+                file_spec.keepTrack = 1
+                file_spec.scope = "bench"
+                out_map[stream_name] = file_spec
+                tmp_parallel_out_map[file_spec.fileID] = [file_spec]
+            out_maps.append(out_map)
+            serial_numbers.append(serial_nr)
+            parallel_out_maps.append(tmp_parallel_out_map)
+        if bulk_fetch_for_multiple_jobs:
+            return out_maps, serial_numbers, [], site_ds_map, parallel_out_maps
+        return out_maps[0], serial_numbers[0], [], site_ds_map, parallel_out_maps[0]
+
+
+# DDM interface which is never contacted
+class BenchmarkDDMInterface:
+    def getInterface(self, vo, cloud=None):
+        return None
+
+
+# make a synthetic task
+def make_task(jedi_task_id, args):
+    task_spec = JediTaskSpec()
+    task_spec.jediTaskID = jedi_task_id
+    task_spec.taskName = f"bench.{jedi_task_id}"
+    task_spec.vo = "atlas"
+    task_spec.prodSourceLabel = "managed"
+    task_spec.taskType = "prod"
+    task_spec.processingType = "simul"
+    task_spec.status = "running"
+    task_spec.cloud = "WORLD"
+    task_spec.nucleus = "BENCH_SITE_0"
+    task_spec.workQueue_ID = 1
+    task_spec.gshare = "Bench"
+    task_spec.reqID = jedi_task_id
+    task_spec.currentPriority = 900
+    task_spec.transPath = "bench_tf.py"
+    task_spec.transUses = "Atlas-25.0.0"
+    task_spec.transHome = "AtlasOffline-25.0.0"
+    task_spec.architecture = "x86_64-el9-gcc13-opt"
+    task_spec.walltime = 10
+    task_spec.walltimeUnit = "kSI2kseconds"
+    task_spec.cpuTime = 100
+    task_spec.cpuTimeUnit = "HS06sPerEvent"
+    task_spec.cpuEfficiency = 90
+    task_spec.baseWalltime = 600
+    task_spec.outDiskCount = 100
+    task_spec.outDiskUnit = "kB"
+    task_spec.workDiskCount = 0
+    task_spec.workDiskUnit = "MB"
+    task_spec.ramCount = 2000
+    task_spec.ramUnit = "MBPerCore"
+    task_spec.baseRamCount = 0
+    task_spec.coreCount = 8
+    task_spec.splitRule = args.split_rule
+    if args.files_per_job:
+        task_spec.setSplitRule("nFilesPerJob", str(args.files_per_job))
+    task_spec.jobParamsTemplate = (
+        "--inputEVNTFile=${IN/T} --outputHITSFile=${OUTPUT0} --maxEvents=${MAXEVENTS} "
+        "--skipEvents=${SKIPEVENTS} --jobNumber=${RNDMSEED} --randomSeed=${RNDMSEED}"
+    )
+    return task_spec
+
+
+# make a synthetic dataset
+def make_dataset(jedi_task_id, dataset_id, dataset_type, stream_name):
+    dataset_spec = JediDatasetSpec()
+    dataset_spec.jediTaskID = jedi_task_id
+    dataset_spec.datasetID = dataset_id
+    dataset_spec.datasetName = f"bench.{jedi_task_id}.{stream_name}"
+    dataset_spec.containerName = dataset_spec.datasetName + "/"
+    dataset_spec.type = dataset_type
+    dataset_spec.streamName = stream_name
+    dataset_spec.status = "ready"
+    dataset_spec.vo = "atlas"
+    dataset_spec.storageToken = "default"
+    dataset_spec.destination = None
+    return dataset_spec
+
+
+# make a synthetic input chunk
+def make_input_chunk(task_spec, site_mapper, args):
+    master_spec = make_dataset(task_spec.jediTaskID, INPUT_DATASET_ID, "input", "IN")
+    master_spec.nFiles = args.files
+    master_spec.nFilesToBeUsed = args.files
+    time_now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    for i in range(args.files):
+        file_spec = JediFileSpec()
+        file_spec.jediTaskID = task_spec.jediTaskID
+        file_spec.datasetID = INPUT_DATASET_ID
+        file_spec.fileID = i + 1
+        file_spec.lfn = f"bench.{task_spec.jediTaskID}.EVNT._{i:06d}.pool.root.1"
+        file_spec.scope = "bench"
+        file_spec.GUID = f"{task_spec.jediTaskID:08d}-0000-0000-0000-{i:012d}"
+        file_spec.type = "input"
+        file_spec.status = "picked"
+        file_spec.creationDate = time_now
+        file_spec.fsize = random.randint(args.min_file_size, args.max_file_size) * 1024 * 1024
+        file_spec.nEvents = args.events_per_file
+        file_spec.attemptNr = 0
+        file_spec.maxAttempt = 5
+        file_spec.keepTrack = 1
+        master_spec.addFile(file_spec)
+        file_spec.resetChangedList()
+    if args.columns:
+        master_spec.useFileColumns()
+    input_chunk = InputChunk(task_spec)
+    input_chunk.addMasterDS(master_spec)
+    for site_name in site_mapper.siteSpecList:
+        site_candidate = SiteCandidate(site_name)
+        site_candidate.weight = 1
+        site_candidate.add_local_disk_files(master_spec.Files)
+        input_chunk.addSiteCandidate(site_candidate)
+    return input_chunk
+
+
+# run a function and get elapsed time and number of jobs
+def measure(name, func, n_repeat):
+    gc.collect()
+    n_jobs = 0
+    start_time = time.monotonic()
+    for _ in range(n_repeat):
+        n_jobs += func()
+    elapsed = time.monotonic() - start_time
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    rate = n_jobs / elapsed if elapsed > 0 else 0
+    print(f"{name:<12} nJobs={n_jobs:<8} elapsed={elapsed:8.3f} sec  jobs/sec={rate:10.1f}  peakRSS={peak_rss:8.1f} MB")
+    return n_jobs, elapsed
+
+
+# main
+def main():
+    parser = argparse.ArgumentParser(description="benchmark for JobSplitter and JobGenerator")
+    parser.add_argument("--tasks", type=int, default=3, help="number of tasks")
+    parser.add_argument("--files", type=int, default=10000, help="number of input files per task")
+    parser.add_argument("--sites", type=int, default=20, help="number of sites")
+    parser.add_argument("--min-file-size", type=int, default=10, help="min input file size in MB")
+    parser.add_argument("--max-file-size", type=int, default=500, help="max input file size in MB")
+    parser.add_argument("--events-per-file", type=int, default=1000, help="number of events per file")
+    parser.add_argument("--files-per-job", type=int, default=None, help="nFilesPerJob. Sizes and walltime are used to split if unset")
+    parser.add_argument("--split-rule", default="", help="splitRule of tasks, e.g. RS=1,FT=1,US=2,MF=200,RX=2000,RY=1000,IP=1,RD=2,AE=1")
+    parser.add_argument("--columns", action="store_true", help="keep input files in columnar lists")
+    parser.add_argument("--repeat", type=int, default=1, help="number of repetitions")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--skip-generate", action="store_true", help="skip JobGeneratorThread.doGenerate")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    tmp_log = MsgWrapper(logger, "<benchmark>")
+    site_mapper = BenchmarkSiteMapper(args.sites)
+    task_buffer = BenchmarkTaskBuffer()
+    splitter = JobSplitter()
+    generator = JobGeneratorThread(None, None, task_buffer, BenchmarkDDMInterface(), site_mapper, False, None, None, None, "bench", None, None, None, False, [])
+
+    # make synthetic tasks
+    start_time = time.monotonic()
+    inputs = []
+    for jedi_task_id in range(1, args.tasks + 1):
+        task_spec = make_task(jedi_task_id, args)
+        for dataset_id, dataset_type, stream_name in ((OUTPUT_DATASET_ID, "output", "OUTPUT0"), (LOG_DATASET_ID, "log", "LOG")):
+            task_buffer.add_dataset(make_dataset(jedi_task_id, dataset_id, dataset_type, stream_name))
+        input_chunk = make_input_chunk(task_spec, site_mapper, args)
+        task_buffer.add_dataset(input_chunk.masterDataset)
+        inputs.append((task_spec, input_chunk))
+    print(f"made {args.tasks} tasks with {args.files} files in {time.monotonic() - start_time:.3f} sec")
+
+    # InputChunk.getSubChunk
+    def run_get_sub_chunk():
+        n_jobs = 0
+        for task_spec, input_chunk in inputs:
+            input_chunk.resetUsedCounters()
+            site_name = input_chunk.get_candidate_names()[0]
+            site_spec = site_mapper.getSite(site_name)
+            while True:
+                sub_chunk, _ = input_chunk.getSubChunk(
+                    site_name,
+                    maxSize=site_spec.maxwdir * 1024 * 1024,
+                    maxNumFiles=task_spec.getMaxNumFilesPerJob(),
+                    nFilesPerJob=task_spec.getNumFilesPerJob(),
+                    sizeGradients=task_spec.getOutDiskSize(),
+                    sizeIntercepts=task_spec.getWorkDiskSize(),
+                    walltimeGradient=task_spec.getCpuTime(),
+                    maxWalltime=site_spec.maxtime,
+                    coreCount=site_spec.coreCount,
+                    corePower=site_spec.corepower,
+                    maxOutSize=10 * 1024 * 1024 * 1024,
+                    maxDiskSize=site_spec.maxwdir * 1024 * 1024,
+                )
+                if sub_chunk is None:
+                    break
+                n_jobs += 1
+        return n_jobs
+
+    # JobSplitter.doSplit
+    split_results = []
+
+    def run_do_split():
+        n_jobs = 0
+        split_results.clear()
+        for task_spec, input_chunk in inputs:
+            input_chunk.resetUsedCounters()
+            input_chunk.bootstrapped = set()
+            tmp_stat, sub_chunks, _ = splitter.doSplit(task_spec, input_chunk, site_mapper)
+            if tmp_stat != Interaction.SC_SUCCEEDED:
+                print(f"doSplit failed for jediTaskID={task_spec.jediTaskID}")
+                sys.exit(1)
+            split_results.append((task_spec, input_chunk, sub_chunks))
+            n_jobs += sum(len(tmp_chunk["subChunks"]) for tmp_chunk in sub_chunks)
+        return n_jobs
+
+    # JobGeneratorThread.doGenerate
+    def run_do_generate():
+        n_jobs = 0
+        for task_spec, input_chunk, sub_chunks in split_results:
+            tmp_stat, panda_jobs, _, _, _, _ = generator.doGenerate(
+                task_spec, "WORLD", copy.copy(sub_chunks), input_chunk, tmp_log, simul=True, splitter=splitter
+            )
+            if tmp_stat != Interaction.SC_SUCCEEDED:
+                print(f"doGenerate failed for jediTaskID={task_spec.jediTaskID}")
+                sys.exit(1)
+            n_jobs += len(panda_jobs)
+        return n_jobs
+
+    measure("getSubChunk", run_get_sub_chunk, args.repeat)
+    measure("doSplit", run_do_split, args.repeat)
+    if not args.skip_generate:
+        measure("doGenerate", run_do_generate, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+benchmark for memory footprint and change tracking of JEDI spec classes
+
+usage: python specBenchmark.py [-h] [--files N] [--repeat N] [--baseline REV]
+
+--baseline REV runs the same measurements with the spec classes of a git revision, e.g. the revision before
+the spec classes used __slots__, and shows both numbers side by side
+
+"""
+
+import argparse
+import copy
+import gc
+import importlib
+import io
+import os
+import pickle
+import subprocess
+import sys
+import tarfile
+import tempfile
+import timeit
+import tracemalloc
+
+from pandajedi.jedicore.JediDatasetSpec import JediDatasetSpec
+from pandajedi.jedicore.JediFileColumns import JediFileColumns
+from pandajedi.jedicore.JediFileSpec import JediFileSpec
+from pandajedi.jedicore.JediTaskSpec import JediTaskSpec
+
+
+# make a row of JEDI_Dataset_Contents
+def make_file_row(file_id):
+    values = {attr: None for attr in JediFileSpec._attributes}
+    values.update(
+        {
+            "jediTaskID": 1,
+            "datasetID": 2,
+            "fileID": file_id,
+            "lfn": f"EVNT.12345678._{file_id:06d}.pool.root.1",
+            "GUID": "00000000-0000-0000-0000-000000000000",
+            "type": "input",
+            "status": "ready",
+            "fsize": 1024 * 1024 * 100,
+            "checksum": "ad:12345678",
+            "scope": "mc23_13p6TeV",
+            "attemptNr": 0,
+            "maxAttempt": 3,
+            "nEvents": 1000,
+            "keepTrack": 1,
+            "failedAttempt": 0,
+            "maxFailure": 3,
+            "ramCount": 0,
+        }
+    )
+    return tuple(values[attr] for attr in JediFileSpec._attributes)
+
+
+# check that specs survive pickle and deepcopy as done for IPC, after cached values are made
+def check_pickle(row):
+    task_spec = JediTaskSpec()
+    task_spec.jediTaskID = 1
+    task_spec.splitRule = "MF=200,RS=1"
+    task_spec.getMaxNumFilesPerJob()
+    for new_spec in (pickle.loads(pickle.dumps(task_spec)), copy.deepcopy(task_spec)):
+        assert new_spec.jediTaskID == 1 and new_spec.getMaxNumFilesPerJob() == 200
+        new_spec.splitRule = "MF=100"
+        assert new_spec.getMaxNumFilesPerJob() == 100 and task_spec.getMaxNumFilesPerJob() == 200
+    file_spec = JediFileSpec.fromTuple(row)
+    dataset_spec = JediDatasetSpec()
+    dataset_spec.addFile(file_spec)
+    for new_spec in (pickle.loads(pickle.dumps(dataset_spec)), copy.deepcopy(dataset_spec)):
+        assert new_spec.Files[0].lfn == file_spec.lfn
+    print("pickle and deepcopy of specs OK")
+
+
+# load spec classes of a git revision as a separate package
+def load_baseline(revision):
+    repo_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    archive = subprocess.run(["git", "archive", revision, "pandajedi/jedicore"], cwd=repo_dir, capture_output=True, check=True).stdout
+    tmp_dir = tempfile.mkdtemp(prefix="specBenchmark_")
+    pkg_dir = os.path.join(tmp_dir, "jedi_baseline", "jedicore")
+    os.makedirs(pkg_dir)
+    open(os.path.join(tmp_dir, "jedi_baseline", "__init__.py"), "w").close()
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        for member in tar.getmembers():
+            if member.isfile() and os.path.dirname(member.name) == "pandajedi/jedicore" and member.name.endswith(".py"):
+                with open(os.path.join(pkg_dir, os.path.basename(member.name)), "wb") as f:
+                    f.write(tar.extractfile(member).read())
+    sys.path.insert(0, tmp_dir)
+    return tuple(
+        getattr(importlib.import_module(f"jedi_baseline.jedicore.{class_name}"), class_name)
+        for class_name in ("JediFileSpec", "JediTaskSpec", "JediDatasetSpec")
+    )
+
+
+# get the min time per call in usec
+def measure(func, number, repeat):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+# run measurements for spec classes. Items not supported by the classes are None
+def run_benchmark(file_class, task_class, dataset_class, rows, repeat):
+    results = {}
+    # memory
+    for name in ("fromTuple", "pack"):
+        if name == "fromTuple" and not hasattr(file_class, "fromTuple"):
+            results[f"{name} MB"] = None
+            results[f"{name} bytes/file"] = None
+            continue
+        gc.collect()
+        tracemalloc.start()
+        file_list = []
+        for row in rows:
+            if name == "pack":
+                file_spec = file_class()
+                file_spec.pack(row)
+            else:
+                file_spec = file_class.fromTuple(row)
+            file_list.append(file_spec)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[f"{name} MB"] = size / 1024 / 1024
+        results[f"{name} bytes/file"] = size / len(rows)
+        del file_list
+
+    # CPU
+    row = rows[0]
+    file_spec = file_class()
+    file_spec.pack(row)
+
+    def set_changed():
+        file_spec.status = "running"
+        file_spec.status = "ready"
+
+    def set_unchanged():
+        file_spec.status = "ready"
+
+    def get_changes():
+        file_spec.valuesMap(onlyChanged=True)
+        file_spec.bindUpdateChangesExpression()
+
+    def make_and_pack():
+        file_class().pack(row)
+
+    if hasattr(file_class, "fromTuple"):
+        results["fromTuple usec"] = measure(lambda: file_class.fromTuple(row), 20000, repeat)
+    else:
+        results["fromTuple usec"] = None
+    results["FileSpec()+pack usec"] = measure(make_and_pack, 20000, repeat)
+    results["set changed attribute usec"] = measure(set_changed, 100000, repeat) / 2
+    results["set unchanged attribute usec"] = measure(set_unchanged, 100000, repeat)
+    results["changed values and bindings usec"] = measure(get_changes, 20000, repeat)
+    for spec_class in (task_class, dataset_class):
+        gc.collect()
+        tracemalloc.start()
+        spec_list = [spec_class() for _ in range(10000)]
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[f"{spec_class.__name__} bytes/object"] = size / len(spec_list)
+        del spec_list
+    return results
+
+
+# time full iterations over a columnar file list, which must scale linearly with the number of files
+def run_columns_benchmark(rows):
+    results = {}
+    dataset_spec = JediDatasetSpec()
+    dataset_spec.Files = JediFileColumns()
+    for row in rows:
+        dataset_spec.Files.appendRow(row)
+    start_time = timeit.default_timer()
+    for file_spec in dataset_spec.Files:
+        file_spec.PandaID = len(rows) - file_spec.fileID
+    results["columns iterate and modify sec"] = timeit.default_timer() - start_time
+    start_time = timeit.default_timer()
+    dataset_spec.Files.getColumn("fsize")
+    results["columns sync and read column sec"] = timeit.default_timer() - start_time
+    start_time = timeit.default_timer()
+    dataset_spec.sort_files_by_panda_ids()
+    dataset_spec.Files = dataset_spec.Files
+    results["columns sort by PandaID sec"] = timeit.default_timer() - start_time
+    start_time = timeit.default_timer()
+    for file_spec in dataset_spec.Files:
+        pass
+    results["columns iterate again sec"] = timeit.default_timer() - start_time
+    return results
+
+
+# format a value
+def format_value(value):
+    if value is None:
+        return f"{'n/a':>10}"
+    return f"{value:10.3f}"
+
+
+# main
+def main():
+    parser = argparse.ArgumentParser(description="benchmark for JEDI spec classes")
+    parser.add_argument("--files", type=int, default=200000, help="number of files in memory")
+    parser.add_argument("--repeat", type=int, default=15, help="number of repetitions")
+    parser.add_argument("--baseline", default=None, help="git revision of spec classes to compare with")
+    args = parser.parse_args()
+
+    rows = [make_file_row(i) for i in range(args.files)]
+    check_pickle(rows[0])
+
+    for name, value in run_columns_benchmark(rows).items():
+        print(f"{name:<35} {format_value(value)}")
+
+    current = run_benchmark(JediFileSpec, JediTaskSpec, JediDatasetSpec, rows, args.repeat)
+    print(f"nFiles={args.files}")
+    if args.baseline is None:
+        for name, value in current.items():
+            print(f"{name:<35} {format_value(value)}")
+        return
+    baseline = run_benchmark(*load_baseline(args.baseline), rows, args.repeat)
+    print(f"{'':<35} {args.baseline[:10]:>10} {'current':>10}")
+    for name, value in current.items():
+        print(f"{name:<35} {format_value(baseline[name])} {format_value(value)}")
+
+
+if __name__ == "__main__":
+    main()
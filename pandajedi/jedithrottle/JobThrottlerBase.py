@@ -1,4 +1,4 @@
-from pandajedi.jedicore import Interaction
+from pandajedi.jedicore import Interaction, JobStatsSnapshot
 from pandajedi.jedicore.MsgWrapper import MsgWrapper
 
 # throttle level
@@ -121,12 +121,12 @@ class JobThrottlerBase(object):
             ms = "SCORE"
 
         # get job statistics
-        status, wq_stats = self.taskBufferIF.getJobStatisticsByResourceType(work_queue)
+        status, wq_stats = JobStatsSnapshot.getJobStatisticsByResourceType(self.taskBufferIF, work_queue)
         if not status:
             raise RuntimeError("failed to get job statistics")
 
         # get the number of standby jobs which is used as the number of running jobs
-        standby_num_static, standby_num_static_dynamic = self.taskBufferIF.getNumMapForStandbyJobs_JEDI(work_queue)
+        standby_num_static, standby_num_static_dynamic = JobStatsSnapshot.getNumMapForStandbyJobs_JEDI(self.taskBufferIF, work_queue)
 
         # add running if the original stat doesn't have running and standby jobs are required
         if "running" not in wq_stats and (len(standby_num_static) > 0 or len(standby_num_static_dynamic) > 0):